@@ -0,0 +1,226 @@
+# Ed25519の実装（crypto_backend）ごとの署名・検証の速度を比較するベンチマーク
+# 計測の前に、RFC 8032のテストベクトルと実装間の署名の一致を確認する
+# 使い方: python benchmarks/bench_crypto.py --output crypto.json
+#        python benchmarks/bench_crypto.py --check（テストベクトルの確認だけ行う）
+import os
+import sys
+import json
+import argparse
+import platform
+from datetime import datetime
+from typing import Any
+from symbolchain.CryptoTypes import PrivateKey, PublicKey, Signature
+from symbolchain.facade.SymbolFacade import SymbolFacade, SymbolAccount
+from symbolchain import sc
+
+from bench_transactions import Fixture, measure
+
+sys.path.insert(
+  0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+)
+import crypto_backend  # noqa: E402
+
+# RFC 8032 7.1 のテストベクトル（秘密鍵, 公開鍵, メッセージ, 署名）
+VECTORS = [
+  (
+    "9d61b19deffd5a60ba844af492ec2cc44449c5697b326919703bac031cae7f60",
+    "d75a980182b10ab7d54bfed3c964073a0ee172f3daa62325af021a68f707511a",
+    "",
+    "e5564300c360ac729086e2cc806e828a84877f1eb8e5d974d873e065224901555"
+    "fb8821590a33bacc61e39701cf9b46bd25bf5f0595bbe24655141438e7a100b",
+  ),
+  (
+    "4ccd089b28ff96da9db6c346ec114e0f5b8a319f35aba624da8cf6ed4fb8a6fb",
+    "3d4017c3e843895a92b70aa74d1b7ebc9c982ccf2ec4968cc0cd55f12af4660c",
+    "72",
+    "92a009a9f0d4cab8720e820b5f642540a2b27b5416503f8fb3762223ebdb69da"
+    "085ac1e43e15996e458f3613d0f11d8c387b2eaeb4302aeeb00d291612bb0c00",
+  ),
+  (
+    "c5aa8df43f9f837bedb7442f31dcb7b166d38535076f094b85ce3a2e0b4458f7",
+    "fc51cd8e6218a1a38da47ed00230f0580816ed13ba3303ac5deb911548908025",
+    "af82",
+    "6291d657deec24024827e69c3abe01a30ce548a284743a445e3680d7db5ac3ac"
+    "18ff9b538d16f290ae67f760984dc6594a7c15e9716ed28dc027beceea1ec40a",
+  ),
+]
+# 実装間で署名を比べるランダムな鍵の数
+CROSS_CHECK_KEYS = 20
+
+
+def available_backends() -> list[Any]:
+  backends = []
+  for name in crypto_backend.BACKENDS:
+    try:
+      backends.append(crypto_backend.create_backend(name))
+    except ImportError:
+      print(name, "は使えません（インストールされていません）")
+  return backends
+
+
+# テストベクトルと実装間の一致を確認し、失敗した数を返す
+def check_vectors(backends: list[Any], facade: SymbolFacade) -> int:
+  failures = []
+  for backend in backends:
+    for private_key, public_key, message, signature in VECTORS:
+      key_pair = backend.key_pair(PrivateKey(private_key))
+      message_bytes = bytes.fromhex(message)
+      expected = Signature(signature)
+      if key_pair.public_key != PublicKey(public_key):
+        failures.append(f"{backend.name} 公開鍵 {public_key}")
+      if key_pair.sign(message_bytes) != expected:
+        failures.append(f"{backend.name} 署名 {public_key}")
+      if not backend.verify(
+        PublicKey(public_key), message_bytes, expected
+      ):
+        failures.append(f"{backend.name} 検証 {public_key}")
+      if backend.verify(
+        PublicKey(public_key), message_bytes + b"\0", expected
+      ):
+        failures.append(f"{backend.name} 改ざんの検出 {public_key}")
+
+  # 同じ鍵・同じトランザクションの署名と連署が、どの実装でも同じになること
+  fixture = Fixture(facade)
+  transactions = [
+    facade.transaction_factory.create(descriptor)
+    for descriptor in fixture.descriptors().values()
+  ]
+  for _ in range(CROSS_CHECK_KEYS):
+    private_key = PrivateKey.random()
+    accounts = [
+      SymbolAccount(facade, backend.key_pair(private_key))
+      for backend in backends
+    ]
+    for transaction in transactions:
+      transaction.signer_public_key = sc.PublicKey(
+        accounts[0].public_key.bytes
+      )
+      signatures = {
+        account.sign_transaction(transaction) for account in accounts
+      }
+      cosignatures = {
+        bytes(account.cosign_transaction(transaction).serialize())
+        for account in accounts
+      }
+      if len(signatures) != 1 or len(cosignatures) != 1:
+        failures.append(f"実装間の不一致 {accounts[0].public_key}")
+        continue
+      signature = signatures.pop()
+      for backend in backends:
+        crypto_backend.set_backend(backend.name)
+        if not crypto_backend.verify_transaction(
+          facade, transaction, signature
+        ):
+          failures.append(f"{backend.name} トランザクションの検証")
+
+  for failure in failures:
+    print("失敗", failure)
+  print(f"テストベクトル・実装間の確認: 失敗 {len(failures)}件")
+  return len(failures)
+
+
+def run_benchmarks(
+  backends: list[Any],
+  facade: SymbolFacade,
+  min_time: float,
+  repeat: int,
+) -> list[dict]:
+  fixture = Fixture(facade)
+  private_key = PrivateKey.random()
+  cases = {
+    "transfer": fixture.descriptors()["transfer"],
+    "aggregate_100": fixture.aggregate(100),
+  }
+  results = []
+  for backend in backends:
+    crypto_backend.set_backend(backend.name)
+    account = crypto_backend.create_account(facade, private_key)
+    for name, descriptor in cases.items():
+      transaction = facade.transaction_factory.create(descriptor)
+      transaction.signer_public_key = sc.PublicKey(
+        account.public_key.bytes
+      )
+      signature = account.sign_transaction(transaction)
+      operations = {
+        "sign": lambda: account.sign_transaction(transaction),
+        "verify": lambda: crypto_backend.verify_transaction(
+          facade, transaction, signature
+        ),
+        "cosign": lambda: account.cosign_transaction(transaction),
+      }
+      for operation, func in operations.items():
+        seconds, loops = measure(func, min_time, repeat)
+        result = {
+          "backend": backend.name,
+          "name": name,
+          "operation": operation,
+          "ops_per_sec": 1 / seconds,
+          "mean_us": seconds * 1e6,
+          "loops": loops,
+        }
+        results.append(result)
+        print(
+          f"{backend.name:6}{name + '.' + operation:28}"
+          f"{result['ops_per_sec']:>12,.0f} ops/s "
+          f"{result['mean_us']:>10.2f} us"
+        )
+  return results
+
+
+def print_speedups(results: list[dict]) -> None:
+  baseline = {
+    (result["name"], result["operation"]): result["ops_per_sec"]
+    for result in results
+    if result["backend"] == "sdk"
+  }
+  for result in results:
+    previous = baseline.get((result["name"], result["operation"]))
+    if result["backend"] == "sdk" or not previous:
+      continue
+    key = f"{result['name']}.{result['operation']}"
+    print(
+      f"{result['backend']}/sdk {key:28}"
+      f"{result['ops_per_sec'] / previous:.2f}x"
+    )
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="Ed25519の実装ごとの署名・検証のベンチマーク"
+  )
+  parser.add_argument(
+    "--check",
+    action="store_true",
+    help="テストベクトルの確認だけ行う",
+  )
+  parser.add_argument(
+    "--min-time", type=float, default=0.2, help="1回の計測時間（秒）"
+  )
+  parser.add_argument("--repeat", type=int, default=3, help="計測回数")
+  parser.add_argument("--output", help="結果を保存するJSONファイル")
+  args = parser.parse_args()
+
+  facade = SymbolFacade("testnet")
+  backends = available_backends()
+  if check_vectors(backends, facade):
+    sys.exit(1)
+  if args.check:
+    return
+
+  results = run_benchmarks(backends, facade, args.min_time, args.repeat)
+  print_speedups(results)
+  print("自動で選ばれる実装", crypto_backend.create_backend().name)
+
+  if args.output:
+    with open(args.output, "w") as file:
+      json.dump({
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+      }, file, indent=2)
+    print("結果", args.output)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,184 @@
+# トランザクションのステータス・転送トランザクションを大量に保持したときのメモリ使用量のベンチマーク
+# .json()のdict、convert_hex_valuesで変換したdict、records（__slots__のレコード）を比較する
+# 使い方: python benchmarks/bench_records.py --count 100000 --output records.json
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable
+from symbolchain.CryptoTypes import PrivateKey
+from symbolchain.facade.SymbolFacade import SymbolFacade
+
+sys.path.insert(
+  0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src")
+)
+import records  # noqa: E402
+from convert_hex_values import convert_hex_values  # noqa: E402
+
+# 送信者・受信者のアカウント数（実際の運用と同じく、同じアカウントが何度も現れる）
+ACCOUNTS = 1000
+CURRENCY_MOSAIC_ID = "72C0212E67A08BCE"
+# convert_hex_valuesは1件ごとにファサードを作るため遅く、この件数だけで計測する
+CONVERT_COUNT = 2000
+
+
+def random_hash() -> str:
+  return random.randbytes(32).hex().upper()
+
+
+def status_json(facade: SymbolFacade) -> str:
+  return json.dumps({
+    "group": "confirmed",
+    "code": "Success",
+    "hash": random_hash(),
+    "deadline": str(facade.now().add_hours(2).timestamp),
+    "height": str(random.randint(1, 3000000)),
+  })
+
+
+def transfer_json(
+  public_keys: list[str], addresses: list[str], height: int
+) -> str:
+  return json.dumps({
+    "id": random.randbytes(12).hex().upper(),
+    "meta": {
+      "height": str(height),
+      "hash": random_hash(),
+      "merkleComponentHash": random_hash(),
+      "index": random.randint(0, 100),
+      "timestamp": str(height * 30000),
+      "feeMultiplier": 100,
+    },
+    "transaction": {
+      "size": 193,
+      "signature": random.randbytes(64).hex().upper(),
+      "signerPublicKey": random.choice(public_keys),
+      "version": 1,
+      "network": 152,
+      "type": records.TRANSFER_TRANSACTION_TYPE,
+      "fee": "19300",
+      "deadline": str(height * 30000 + 7200000),
+      "recipientAddress": random.choice(addresses),
+      "mosaics": [{
+        "id": CURRENCY_MOSAIC_ID,
+        "amount": str(random.randint(1, 10**9)),
+      }],
+      "message": (
+        b"\0Hello, " + random.randbytes(4).hex().encode()
+      ).hex(),
+    },
+  })
+
+
+def fixtures(count: int) -> dict[str, list[str]]:
+  facade = SymbolFacade("testnet")
+  accounts = [
+    facade.create_account(PrivateKey.random())
+    for _ in range(ACCOUNTS)
+  ]
+  public_keys = [str(account.public_key) for account in accounts]
+  addresses = [
+    bytes(account.address.bytes).hex().upper() for account in accounts
+  ]
+  return {
+    "status": [status_json(facade) for _ in range(count)],
+    "transfer": [
+      transfer_json(public_keys, addresses, 1000 + index // 100)
+      for index in range(count)
+    ],
+  }
+
+
+# 表現ごとの、JSONの文字列から保持する形にする処理
+def decoders(name: str) -> dict[str, Callable[[str], Any]]:
+  parse = (
+    records.parse_status
+    if name == "status"
+    else records.parse_transaction
+  )
+  return {
+    "dict": json.loads,
+    "convert_hex_values": lambda text: convert_hex_values(
+      json.loads(text)
+    ),
+    "records": lambda text: parse(json.loads(text)),
+  }
+
+
+# すべて変換して保持したときに残る1件あたりのメモリ（バイト）と変換時間（秒）
+def measure(
+  decode: Callable[[str], Any], texts: list[str]
+) -> tuple[float, float]:
+  tracemalloc.start()
+  try:
+    baseline, _ = tracemalloc.get_traced_memory()
+    started = time.perf_counter()
+    values = [decode(text) for text in texts]
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  del values
+  return (current - baseline) / len(texts), elapsed / len(texts)
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="ステータス・転送トランザクションの保持に使うメモリの比較"
+  )
+  parser.add_argument(
+    "--count", type=int, default=100000, help="保持する件数"
+  )
+  parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+  parser.add_argument("--output", help="結果を保存するJSONファイル")
+  args = parser.parse_args()
+
+  random.seed(args.seed)
+  texts = fixtures(args.count)
+  results = []
+  for name, all_items in texts.items():
+    baseline = None
+    for representation, decode in decoders(name).items():
+      items = (
+        all_items[:CONVERT_COUNT]
+        if representation == "convert_hex_values"
+        else all_items
+      )
+      # 前の計測で作ったアドレスの変換結果を持ち越さない
+      records.decode_address.cache_clear()
+      retained, seconds = measure(decode, items)
+      baseline = baseline or retained
+      result = {
+        "name": name,
+        "representation": representation,
+        "count": len(items),
+        "bytes_per_item": retained,
+        "ratio": retained / baseline,
+        "parse_us": seconds * 1e6,
+      }
+      results.append(result)
+      print(
+        f"{name:10}{representation:20}"
+        f"{result['bytes_per_item']:>10,.0f} B/件"
+        f"{result['ratio']:>8.2f}x"
+        f"{result['parse_us']:>10.2f} us/件"
+      )
+
+  if args.output:
+    with open(args.output, "w") as file:
+      json.dump({
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+      }, file, indent=2)
+    print("結果", args.output)
+
+
+if __name__ == "__main__":
+  main()
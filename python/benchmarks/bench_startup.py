@@ -0,0 +1,127 @@
+# 起動時間のベンチマーク
+# 各シナリオと同じく最初にすべてをインポートする場合と、symbol-book（遅延インポート・常駐プロセス）を比較する
+# 使い方: python benchmarks/bench_startup.py --runs 20
+#        python benchmarks/bench_startup.py --importtime（インポートに時間のかかるモジュールを表示する）
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Optional
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+SYMBOL_BOOK = os.path.join(
+  os.path.dirname(BENCHMARK_DIR), "scripts", "symbol_book.py"
+)
+# シナリオの先頭で行っているインポートとファサードの生成
+EAGER_IMPORTS = (
+  "import asyncio, requests, dotenv; "
+  "from websockets.legacy.client import connect; "
+  "from symbolchain.CryptoTypes import PrivateKey; "
+  "from symbolchain.facade.SymbolFacade import SymbolFacade; "
+  "SymbolFacade('testnet')"
+)
+
+
+def measure(command: list[str], runs: int) -> list[float]:
+  times = []
+  for _ in range(runs):
+    started = time.perf_counter()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+    times.append(time.perf_counter() - started)
+  return times
+
+
+def print_times(label: str, times: list[float]) -> None:
+  print(
+    f"{label:40}"
+    f"{min(times) * 1000:>9.1f}ms (最小) "
+    f"{statistics.median(times) * 1000:>9.1f}ms (中央値)"
+  )
+
+
+# -X importtimeの結果から、累積時間の長いモジュールを表示する
+def print_importtime(top: int) -> None:
+  result = subprocess.run(
+    [sys.executable, "-X", "importtime", "-c", EAGER_IMPORTS],
+    check=True,
+    capture_output=True,
+    text=True,
+  )
+  rows = []
+  for line in result.stderr.splitlines():
+    if not line.startswith("import time:") or "cumulative" in line:
+      continue
+    _, cumulative, name = line[len("import time:"):].split("|")
+    rows.append((int(cumulative), name.strip()))
+  print(f"===== インポート時間（累積）上位{top}件 =====")
+  for cumulative, name in sorted(rows, reverse=True)[:top]:
+    print(f"{name:50}{cumulative / 1000:>9.1f}ms")
+
+
+def start_worker(socket_path: str) -> Optional[subprocess.Popen]:
+  if not hasattr(os, "fork"):
+    return None
+  worker = subprocess.Popen(
+    [sys.executable, SYMBOL_BOOK, "--socket", socket_path, "worker"],
+    stderr=subprocess.DEVNULL,
+  )
+  for _ in range(100):
+    if os.path.exists(socket_path):
+      return worker
+    time.sleep(0.1)
+  worker.terminate()
+  return None
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="起動時間のベンチマーク")
+  parser.add_argument("--runs", type=int, default=10, help="計測回数")
+  parser.add_argument(
+    "--importtime",
+    action="store_true",
+    help="インポートに時間のかかるモジュールを表示する",
+  )
+  args = parser.parse_args()
+
+  socket_path = os.path.join(
+    os.environ.get("TMPDIR", "/tmp"), f"symbol-book-bench-{os.getpid()}.sock"
+  )
+  cases = [
+    ("python（何もしない）", [sys.executable, "-c", "pass"]),
+    ("シナリオと同じインポート", [sys.executable, "-c", EAGER_IMPORTS]),
+    (
+      "symbol-book list（SDKを読み込まない）",
+      [sys.executable, SYMBOL_BOOK, "--no-worker", "list"],
+    ),
+    (
+      "symbol-book accounts",
+      [sys.executable, SYMBOL_BOOK, "--no-worker", "accounts"],
+    ),
+  ]
+  for label, command in cases:
+    print_times(label, measure(command, args.runs))
+
+  worker = start_worker(socket_path)
+  if worker is None:
+    print("常駐プロセスを使えないため、常駐プロセスの計測は省略します")
+  else:
+    try:
+      print_times(
+        "symbol-book accounts（常駐プロセス）",
+        measure(
+          [sys.executable, SYMBOL_BOOK, "--socket", socket_path, "accounts"],
+          args.runs,
+        ),
+      )
+    finally:
+      worker.terminate()
+      worker.wait()
+
+  if args.importtime:
+    print_importtime(15)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,364 @@
+# トランザクションの生成・署名・シリアライズ・ハッシュ計算の速度を、種類ごとに計測するベンチマーク
+# 使い方: python benchmarks/bench_transactions.py --output result.json
+#        python benchmarks/bench_transactions.py --compare result.json（前回の結果と比較）
+import os
+import re
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from datetime import datetime
+from importlib.metadata import version
+from typing import Any, Callable, Optional
+from symbolchain.CryptoTypes import PrivateKey
+from symbolchain.facade.SymbolFacade import SymbolFacade
+from symbolchain.symbol.IdGenerator import (
+  generate_mosaic_id,
+  generate_namespace_id,
+)
+from symbolchain.sc import TransactionFactory
+
+# 前回の結果と比較して、これより遅くなった場合は性能の低下として表示する
+DEFAULT_THRESHOLD = 0.1
+# アグリゲートのサイズを変えて計測するインナートランザクション数
+AGGREGATE_SWEEP = [1, 10, 25, 50, 100]
+# 1件のトランザクションハッシュの値（ロック用の固定値）
+SAMPLE_HASH = "AB" * 32
+
+
+class Fixture:
+  """ベンチマークで使うアカウントとトランザクションの定義"""
+
+  def __init__(self, facade: SymbolFacade) -> None:
+    self.facade = facade
+    self.account = facade.create_account(PrivateKey.random())
+    self.cosigner = facade.create_account(PrivateKey.random())
+    self.deadline = facade.now().add_hours(2).timestamp
+    self.mosaic_id = generate_mosaic_id(self.account.address, 1)
+    self.namespace_id = generate_namespace_id("benchmark")
+
+  def _base(self, descriptor: dict) -> dict:
+    return {
+      **descriptor,
+      "signer_public_key": self.account.public_key,
+      "deadline": self.deadline,
+    }
+
+  def _transfer(self, index: int = 0) -> dict:
+    return {
+      "type": "transfer_transaction_v1",
+      "recipient_address": self.cosigner.address,
+      "mosaics": [
+        {"mosaic_id": 0x72C0212E67A08BCE, "amount": 1000000 + index}
+      ],
+      "message": b"\0Hello, Symbol!",
+    }
+
+  # シナリオで使っているトランザクションの種類ごとの定義
+  def descriptors(self) -> dict[str, dict]:
+    return {
+      "transfer": self._base(self._transfer()),
+      "multisig_modification": self._base({
+        "type": "multisig_account_modification_transaction_v1",
+        "min_approval_delta": 1,
+        "min_removal_delta": 1,
+        "address_additions": [self.cosigner.address],
+      }),
+      "hash_lock": self._base({
+        "type": "hash_lock_transaction_v1",
+        "mosaic": {"mosaic_id": 0x72C0212E67A08BCE, "amount": 10000000},
+        "duration": 5760,
+        "hash": SAMPLE_HASH,
+      }),
+      "secret_lock": self._base({
+        "type": "secret_lock_transaction_v1",
+        "recipient_address": self.cosigner.address,
+        "mosaic": {"mosaic_id": 0x72C0212E67A08BCE, "amount": 1000000},
+        "duration": 480,
+        "secret": SAMPLE_HASH,
+        "hash_algorithm": "sha3_256",
+      }),
+      "secret_proof": self._base({
+        "type": "secret_proof_transaction_v1",
+        "recipient_address": self.cosigner.address,
+        "secret": SAMPLE_HASH,
+        "hash_algorithm": "sha3_256",
+        "proof": os.urandom(20),
+      }),
+      "account_metadata": self._base({
+        "type": "account_metadata_transaction_v1",
+        "target_address": self.account.address,
+        "scoped_metadata_key": 0x1234,
+        "value_size_delta": 16,
+        "value": b"benchmark-value!",
+      }),
+      "mosaic_definition": self._base({
+        "type": "mosaic_definition_transaction_v1",
+        "id": self.mosaic_id,
+        "duration": 0,
+        "nonce": 1,
+        "flags": "transferable restrictable",
+        "divisibility": 2,
+      }),
+      "mosaic_supply_change": self._base({
+        "type": "mosaic_supply_change_transaction_v1",
+        "mosaic_id": self.mosaic_id,
+        "delta": 1000000,
+        "action": "increase",
+      }),
+      "namespace_registration": self._base({
+        "type": "namespace_registration_transaction_v1",
+        "id": self.namespace_id,
+        "registration_type": "root",
+        "duration": 86400,
+        "name": b"benchmark",
+      }),
+      "account_address_restriction": self._base({
+        "type": "account_address_restriction_transaction_v1",
+        "restriction_flags": "address",
+        "restriction_additions": [self.cosigner.address],
+      }),
+      "mosaic_global_restriction": self._base({
+        "type": "mosaic_global_restriction_transaction_v1",
+        "mosaic_id": self.mosaic_id,
+        "restriction_key": 0x1234,
+        "new_restriction_value": 1,
+        "new_restriction_type": "eq",
+      }),
+      "aggregate_complete": self.aggregate(3),
+    }
+
+  # インナートランザクション（転送）を指定数含むアグリゲートの定義
+  def aggregate(self, count: int) -> dict:
+    embedded = self.embedded_transactions(count)
+    return self._base({
+      "type": "aggregate_complete_transaction_v2",
+      "transactions_hash": self.facade.hash_embedded_transactions(
+        embedded
+      ),
+      "transactions": embedded,
+    })
+
+  def embedded_transactions(self, count: int) -> list:
+    return [
+      self.facade.transaction_factory.create_embedded({
+        **self._transfer(index),
+        "signer_public_key": self.account.public_key,
+      })
+      for index in range(count)
+    ]
+
+
+# 1回あたりの実行時間が最小計測時間を超えるよう回数を決めて繰り返し計測し、最速の結果を返す
+def measure(
+  func: Callable[[], Any], min_time: float, repeat: int
+) -> tuple[float, int]:
+  loops = 1
+  while True:
+    started = time.perf_counter()
+    for _ in range(loops):
+      func()
+    elapsed = time.perf_counter() - started
+    if elapsed >= min_time / 10:
+      break
+    loops *= 10
+  loops = max(int(loops * min_time / max(elapsed, 1e-9)), 1)
+
+  best = float("inf")
+  for _ in range(repeat):
+    started = time.perf_counter()
+    for _ in range(loops):
+      func()
+    best = min(best, (time.perf_counter() - started) / loops)
+  return best, loops
+
+
+# 1回の実行で確保されるメモリの最大量（バイト）と、解放されずに残るブロック数
+def measure_allocations(
+  func: Callable[[], Any], iterations: int = 100
+) -> tuple[int, float]:
+  func()
+  tracemalloc.start()
+  try:
+    peak = 0
+    for _ in range(10):
+      tracemalloc.reset_peak()
+      baseline, _ = tracemalloc.get_traced_memory()
+      func()
+      _, current_peak = tracemalloc.get_traced_memory()
+      peak = max(peak, current_peak - baseline)
+
+    blocks = sys.getallocatedblocks()
+    results = [func() for _ in range(iterations)]
+    retained = (sys.getallocatedblocks() - blocks) / iterations
+    del results
+  finally:
+    tracemalloc.stop()
+  return peak, retained
+
+
+# 種類ごとに計測する処理（名前, 処理を返す関数）の一覧
+def operations(
+  facade: SymbolFacade, fixture: Fixture, descriptor: dict
+) -> list[tuple[str, Callable[[], Any]]]:
+  factory = facade.transaction_factory
+  account = fixture.account
+  transaction = factory.create(descriptor)
+  signature = account.sign_transaction(transaction)
+  factory.attach_signature(transaction, signature)
+  payload = transaction.serialize()
+
+  result = [
+    ("create", lambda: factory.create(descriptor)),
+    ("sign", lambda: account.sign_transaction(transaction)),
+    (
+      "attach_signature",
+      lambda: factory.attach_signature(transaction, signature),
+    ),
+    ("serialize", transaction.serialize),
+    ("hash_transaction", lambda: facade.hash_transaction(transaction)),
+    ("deserialize", lambda: TransactionFactory.deserialize(payload)),
+  ]
+  embedded = getattr(transaction, "transactions", None)
+  if embedded is not None:
+    result.append((
+      "hash_embedded_transactions",
+      lambda: facade.hash_embedded_transactions(embedded),
+    ))
+    result.append((
+      "cosign_transaction",
+      lambda: fixture.cosigner.cosign_transaction(transaction),
+    ))
+  return result
+
+
+def run_benchmarks(
+  pattern: Optional[str],
+  min_time: float,
+  repeat: int,
+  allocations: bool,
+) -> list[dict]:
+  facade = SymbolFacade("testnet")
+  fixture = Fixture(facade)
+  cases = list(fixture.descriptors().items())
+  cases += [
+    (f"aggregate_sweep_{count}", fixture.aggregate(count))
+    for count in AGGREGATE_SWEEP
+  ]
+
+  results = []
+  for name, descriptor in cases:
+    size = facade.transaction_factory.create(descriptor).size
+    for operation, func in operations(facade, fixture, descriptor):
+      key = f"{name}.{operation}"
+      if pattern and not re.search(pattern, key):
+        continue
+      seconds, loops = measure(func, min_time, repeat)
+      result = {
+        "name": name,
+        "operation": operation,
+        "size": size,
+        "ops_per_sec": 1 / seconds,
+        "mean_us": seconds * 1e6,
+        "loops": loops,
+      }
+      if allocations:
+        peak, retained = measure_allocations(func)
+        result["peak_bytes"] = peak
+        result["retained_blocks"] = retained
+      results.append(result)
+      print_result(result)
+  return results
+
+
+def print_result(result: dict) -> None:
+  line = (
+    f"{result['name'] + '.' + result['operation']:58}"
+    f"{result['size']:>7}B "
+    f"{result['ops_per_sec']:>12,.0f} ops/s "
+    f"{result['mean_us']:>10.2f} us"
+  )
+  if "peak_bytes" in result:
+    line += f" {result['peak_bytes']:>9,}B peak"
+  print(line)
+
+
+# 前回の結果と比較し、性能が低下したものの数を返す
+def compare(
+  results: list[dict], baseline_file: str, threshold: float
+) -> int:
+  with open(baseline_file) as file:
+    baseline = {
+      (result["name"], result["operation"]): result
+      for result in json.load(file)["results"]
+    }
+  regressions = 0
+  print(f"===== {baseline_file} との比較 =====")
+  for result in results:
+    previous = baseline.get((result["name"], result["operation"]))
+    if previous is None:
+      continue
+    ratio = result["ops_per_sec"] / previous["ops_per_sec"]
+    mark = ""
+    if ratio < 1 - threshold:
+      mark = " <- 低下"
+      regressions += 1
+    elif ratio > 1 + threshold:
+      mark = " <- 向上"
+    print(
+      f"{result['name'] + '.' + result['operation']:58}"
+      f"{previous['ops_per_sec']:>12,.0f} -> "
+      f"{result['ops_per_sec']:>12,.0f} ops/s ({ratio:.2f}x){mark}"
+    )
+  return regressions
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="トランザクション処理のベンチマーク"
+  )
+  parser.add_argument(
+    "--filter", help="計測する項目（種類.処理 に一致する正規表現）"
+  )
+  parser.add_argument(
+    "--min-time", type=float, default=0.2, help="1回の計測時間（秒）"
+  )
+  parser.add_argument("--repeat", type=int, default=3, help="計測回数")
+  parser.add_argument(
+    "--no-allocations",
+    action="store_true",
+    help="メモリ確保量を計測しない",
+  )
+  parser.add_argument("--output", help="結果を保存するJSONファイル")
+  parser.add_argument("--compare", help="比較する前回の結果（JSON）")
+  parser.add_argument(
+    "--threshold",
+    type=float,
+    default=DEFAULT_THRESHOLD,
+    help="性能の低下とみなす割合",
+  )
+  args = parser.parse_args()
+
+  results = run_benchmarks(
+    args.filter, args.min_time, args.repeat, not args.no_allocations
+  )
+
+  if args.output:
+    with open(args.output, "w") as file:
+      json.dump({
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "symbol_sdk": version("symbol-sdk-python"),
+        "results": results,
+      }, file, indent=2)
+    print("結果", args.output)
+
+  if args.compare and compare(results, args.compare, args.threshold):
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
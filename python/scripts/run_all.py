@@ -0,0 +1,346 @@
+# src直下のシナリオ（3_x）を、同時に実行しても問題ないものは並列に実行するスクリプト
+# 各シナリオのログと、実行時間（全体・ネットワーク待ち・CPU）のレポートをlogsに保存する
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import threading
+import subprocess
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "src")
+LOG_DIR = os.path.join(SCRIPT_DIR, "logs")
+
+# すべてのシナリオが共有するリソース（排他的に使うと他のシナリオと同時に実行されない）
+GLOBAL_RESOURCE = "*"
+
+
+@dataclass(frozen=True)
+class Scenario:
+  # 他のシナリオと同時に使ってよいリソース
+  shared: frozenset = frozenset()
+  # 実行中は他のシナリオに使わせないリソース
+  exclusive: frozenset = frozenset()
+  # 先に完了している必要があるシナリオ
+  after: frozenset = frozenset()
+
+
+# シナリオごとに使うリソース
+# account_a: 手数料を支払うアカウント。同時に使ってもトランザクション同士は干渉しない
+# partial_b: accountBが連署待ちのトランザクションを先頭の1件で判断する処理
+# 3_10_4はaccountAの最初の承認済みトランザクションを検知して終了するため、
+# accountAを使う他のシナリオと同時に実行すると別のトランザクションを検知してしまう
+SCENARIOS: dict[str, Scenario] = {
+  "3_3_transaction": Scenario(shared=frozenset({"account_a"})),
+  "3_4_mosaic": Scenario(shared=frozenset({"account_a"})),
+  "3_5_metadata": Scenario(shared=frozenset({"account_a"})),
+  "3_6_hash_lock": Scenario(
+    shared=frozenset({"account_a"}),
+    exclusive=frozenset({"partial_b"}),
+  ),
+  "3_7_secret_lock": Scenario(shared=frozenset({"account_a"})),
+  "3_8_multisig": Scenario(shared=frozenset({"account_a"})),
+  "3_9_offline_signature": Scenario(shared=frozenset({"account_a"})),
+  "3_10_1_namespace": Scenario(shared=frozenset({"account_a"})),
+  "3_10_2_account_restriction": Scenario(
+    shared=frozenset({"account_a"})
+  ),
+  "3_10_3_global_mosaic_restriction": Scenario(
+    shared=frozenset({"account_a"})
+  ),
+  "3_10_4_observer": Scenario(exclusive=frozenset({"account_a"})),
+}
+
+# 表に登録されていないシナリオは安全のため単独で実行する
+UNKNOWN_SCENARIO = Scenario(exclusive=frozenset({GLOBAL_RESOURCE}))
+
+
+@dataclass
+class Result:
+  name: str
+  returncode: Optional[int] = None
+  timed_out: bool = False
+  wall_time: float = 0
+  cpu_time: Optional[float] = None
+  started_at: float = 0
+  log_file: str = ""
+
+  # 実行時間のうちCPUを使っていない時間（ほぼノードの応答や承認の待ち時間）
+  @property
+  def wait_time(self) -> Optional[float]:
+    if self.cpu_time is None:
+      return None
+    return max(self.wall_time - self.cpu_time, 0)
+
+
+class ResourceLocks:
+  """共有・排他の2種類でリソースを管理する"""
+
+  def __init__(self) -> None:
+    self._shared: dict[str, int] = {}
+    self._exclusive: set[str] = set()
+
+  def _resources(self, scenario: Scenario) -> tuple[set, set]:
+    exclusive = set(scenario.exclusive)
+    shared = (set(scenario.shared) | {GLOBAL_RESOURCE}) - exclusive
+    return shared, exclusive
+
+  def can_acquire(self, scenario: Scenario) -> bool:
+    shared, exclusive = self._resources(scenario)
+    return not (
+      (shared | exclusive) & self._exclusive
+      or any(self._shared.get(resource) for resource in exclusive)
+    )
+
+  def acquire(self, scenario: Scenario) -> None:
+    shared, exclusive = self._resources(scenario)
+    for resource in shared:
+      self._shared[resource] = self._shared.get(resource, 0) + 1
+    self._exclusive |= exclusive
+
+  def release(self, scenario: Scenario) -> None:
+    shared, exclusive = self._resources(scenario)
+    for resource in shared:
+      self._shared[resource] -= 1
+    self._exclusive -= exclusive
+
+
+# 通信を記録・再生する場合に、シナリオの前に付ける引数（cassette.py）
+def _cassette_command(
+  name: str,
+  mode: Optional[str],
+  directory: str,
+  latency: Optional[float],
+) -> list[str]:
+  if mode is None:
+    return []
+  command = [
+    os.path.join(SRC_DIR, "cassette.py"),
+    mode,
+    os.path.join(directory, f"{name}.jsonl.gz"),
+  ]
+  if latency is not None:
+    command += ["--latency", str(latency)]
+  return command
+
+
+# シナリオを子プロセスで実行し、終了コードとCPU時間を計測する（スレッドで実行）
+def _run_process(
+  name: str, log_file: str, timeout: float, prefix: list[str]
+) -> Result:
+  result = Result(name, log_file=log_file, started_at=time.time())
+  started = time.monotonic()
+  with open(log_file, "wb") as log:
+    process = subprocess.Popen(
+      [sys.executable, *prefix, os.path.join(SRC_DIR, f"{name}.py")],
+      cwd=os.path.dirname(SRC_DIR),
+      stdout=log,
+      stderr=subprocess.STDOUT,
+    )
+
+    def kill() -> None:
+      result.timed_out = True
+      process.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+      if hasattr(os, "wait4"):
+        # 子プロセスのCPU時間（ユーザー + システム）を取得する
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        result.cpu_time = usage.ru_utime + usage.ru_stime
+      else:
+        process.wait()
+    finally:
+      timer.cancel()
+  result.returncode = process.returncode
+  result.wall_time = time.monotonic() - started
+  return result
+
+
+async def run_all(
+  names: list[str],
+  jobs: int,
+  timeout: float,
+  timestamp: str,
+  cassette: tuple = (None, "", None),
+) -> list[Result]:
+  locks = ResourceLocks()
+  pending = list(names)
+  finished: set[str] = set()
+  running: dict[asyncio.Task, str] = {}
+  results: list[Result] = []
+
+  while pending or running:
+    for name in list(pending):
+      scenario = SCENARIOS.get(name, UNKNOWN_SCENARIO)
+      # 依存先のうち今回実行しないものは完了済みとみなす
+      waiting_for = (set(scenario.after) & set(names)) - finished
+      if len(running) >= jobs or waiting_for:
+        continue
+      if not locks.can_acquire(scenario):
+        continue
+      locks.acquire(scenario)
+      pending.remove(name)
+      print(f"実行中: {name}")
+      log_file = os.path.join(LOG_DIR, f"{name}.py_{timestamp}.log")
+      prefix = _cassette_command(name, *cassette)
+      task = asyncio.create_task(asyncio.to_thread(
+        _run_process, name, log_file, timeout, prefix
+      ))
+      running[task] = name
+
+    if not running:
+      raise Exception(f"実行できないシナリオがあります: {pending}")
+
+    done, _ = await asyncio.wait(
+      running, return_when=asyncio.FIRST_COMPLETED
+    )
+    for task in done:
+      name = running.pop(task)
+      locks.release(SCENARIOS.get(name, UNKNOWN_SCENARIO))
+      finished.add(name)
+      result = task.result()
+      results.append(result)
+      status = "タイムアウト" if result.timed_out else result.returncode
+      print(f"完了: {name} ({status}, {result.wall_time:.1f}秒)")
+  return results
+
+
+def _format_seconds(value: Optional[float]) -> str:
+  return "-" if value is None else f"{value:8.1f}"
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="シナリオをまとめて実行する")
+  parser.add_argument(
+    "names", nargs="*", help="実行するシナリオ（省略時はsrc直下の3_xすべて）"
+  )
+  parser.add_argument("--jobs", type=int, default=4, help="同時実行数")
+  parser.add_argument(
+    "--timeout", type=float, default=600, help="シナリオごとのタイムアウト（秒）"
+  )
+  parser.add_argument(
+    "--show-logs", action="store_true", help="終了後に各ログを表示する"
+  )
+  parser.add_argument(
+    "--mock-node",
+    action="store_true",
+    help="テストネットの代わりにローカルノード（utils/mock_node.py）を使う",
+  )
+  parser.add_argument(
+    "--record",
+    metavar="DIR",
+    help="ノードとの通信をシナリオごとにDIRへ記録する（src/cassette.py）",
+  )
+  parser.add_argument(
+    "--replay",
+    metavar="DIR",
+    help="ノードに接続せず、DIRに記録した通信を再生して実行する",
+  )
+  parser.add_argument(
+    "--latency",
+    type=float,
+    help="再生時に記録時の応答時間に掛ける倍率（省略時は待たない）",
+  )
+  args = parser.parse_args()
+  if args.record and args.replay:
+    parser.error("--recordと--replayは同時に指定できません")
+  cassette = (
+    ("record", args.record, None)
+    if args.record
+    else ("replay", args.replay, args.latency)
+    if args.replay
+    else (None, "", None)
+  )
+
+  names = args.names or sorted(
+    file[:-3] for file in os.listdir(SRC_DIR)
+    if file.startswith("3_") and file.endswith(".py")
+  )
+  if not names:
+    print("エラー: src ディレクトリに Python ファイルが見つかりません")
+    sys.exit(1)
+
+  # もし logs ディレクトリが存在すれば削除して作り直す
+  shutil.rmtree(LOG_DIR, ignore_errors=True)
+  os.makedirs(LOG_DIR)
+  timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+  mock_node = None
+  if args.mock_node:
+    sys.path.append(os.path.join(SRC_DIR, "utils"))
+    from mock_node import MockNode
+
+    # 空いているポートで起動し、子プロセスのNODE_URLを差し替える
+    mock_node = MockNode(port=0)
+    mock_node.start_in_thread()
+    os.environ["NODE_URL"] = mock_node.url
+    print("ローカルノード", mock_node.url)
+
+  started = time.monotonic()
+  try:
+    results = asyncio.run(
+      run_all(names, args.jobs, args.timeout, timestamp, cassette)
+    )
+  finally:
+    if mock_node is not None:
+      mock_node.stop_thread()
+  total_wall_time = time.monotonic() - started
+
+  print("===== 実行結果 =====")
+  print(f"{'シナリオ':40} {'結果':>6} {'全体':>8} {'待ち':>8} {'CPU':>8}")
+  for result in sorted(results, key=lambda result: result.name):
+    status = "TIMEOUT" if result.timed_out else str(result.returncode)
+    print(
+      f"{result.name:40} {status:>6} "
+      f"{_format_seconds(result.wall_time)} "
+      f"{_format_seconds(result.wait_time)} "
+      f"{_format_seconds(result.cpu_time)}"
+    )
+  serial_wall_time = sum(result.wall_time for result in results)
+  print(
+    f"合計 {total_wall_time:.1f}秒"
+    f"（直列に実行した場合 {serial_wall_time:.1f}秒）"
+  )
+
+  report_file = os.path.join(LOG_DIR, f"timing_{timestamp}.json")
+  with open(report_file, "w") as report:
+    json.dump({
+      "wall_time": total_wall_time,
+      "serial_wall_time": serial_wall_time,
+      "scenarios": [
+        {
+          "name": result.name,
+          "returncode": result.returncode,
+          "timed_out": result.timed_out,
+          "started_at": result.started_at,
+          "wall_time": result.wall_time,
+          "wait_time": result.wait_time,
+          "cpu_time": result.cpu_time,
+          "log_file": os.path.basename(result.log_file),
+        }
+        for result in results
+      ],
+    }, report, indent=2, ensure_ascii=False)
+  print("レポート", report_file)
+
+  if args.show_logs:
+    for result in sorted(results, key=lambda result: result.name):
+      print(f"********** {os.path.basename(result.log_file)} **********")
+      with open(result.log_file, encoding="utf-8", errors="replace") as log:
+        print(log.read())
+
+  if any(result.returncode != 0 for result in results):
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,296 @@
+# シナリオ（src直下の3_x）をサブコマンドとして実行する1つのCLI（symbol-book）
+# 起動を速くするため、重いモジュール（symbolchain・requests・websockets・dotenv）は
+# 実行するサブコマンドの中でだけインポートする
+# 使い方: ./symbol-book list
+#        ./symbol-book 3_3（または transaction、3_3_transaction）
+#        ./symbol-book worker &（常駐させると、以降の実行はSDKを読み込み済みのプロセスから起動する）
+import os
+import sys
+import json
+import argparse
+from typing import Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(SCRIPT_DIR), "src")
+# 常駐プロセスのソケット（環境変数 SYMBOL_BOOK_SOCKET で変更できる）
+DEFAULT_SOCKET = os.path.join(
+  os.environ.get("TMPDIR", "/tmp"),
+  f"symbol-book-{os.getuid() if hasattr(os, 'getuid') else 0}.sock",
+)
+# 常駐プロセスで事前に読み込んでおくモジュール
+WARM_MODULES = (
+  "asyncio",
+  "requests",
+  "dotenv",
+  "websockets.legacy.client",
+  "symbolchain.CryptoTypes",
+  "symbolchain.facade.SymbolFacade",
+  "symbolchain.sc",
+)
+
+
+# シナリオ名の一覧（インポートせずにファイル名から求める）
+def scenarios() -> list[str]:
+  return sorted(
+    (
+      name[:-3]
+      for name in os.listdir(SRC_DIR)
+      if name.startswith("3_") and name.endswith(".py")
+    ),
+    key=lambda name: [
+      int(part) if part.isdigit() else 0 for part in name.split("_")
+    ],
+  )
+
+
+# 3_3_transaction => ["3_3", "transaction"]
+def aliases(name: str) -> list[str]:
+  parts = name.split("_")
+  numbers = [part for part in parts if part.isdigit()]
+  words = parts[len(numbers):]
+  return [alias for alias in ("_".join(numbers), "_".join(words)) if alias]
+
+
+def run_scenario(name: str) -> int:
+  import asyncio
+  import inspect
+  import importlib
+
+  if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+  # 環境変数 CASSETTE が指定されていれば通信を記録・再生する
+  # （websocketsのconnectを差し替えるため、シナリオをインポートする前に行う）
+  if os.getenv("CASSETTE"):
+    import cassette
+
+    cassette.install_from_env()
+  result = importlib.import_module(name).main()
+  if inspect.iscoroutine(result):
+    asyncio.run(result)
+  return 0
+
+
+# .envのアカウントのアドレスを表示する（起動時間の計測にも使う）
+def show_accounts() -> int:
+  from dotenv import load_dotenv
+  from symbolchain.CryptoTypes import PrivateKey
+  from symbolchain.facade.SymbolFacade import SymbolFacade
+
+  load_dotenv(os.path.join(os.path.dirname(SCRIPT_DIR), ".env"))
+  facade = SymbolFacade("testnet")
+  for name in ("PRIVATE_KEY_A", "PRIVATE_KEY_B"):
+    private_key = os.getenv(name)
+    if private_key:
+      account = facade.create_account(PrivateKey(private_key))
+      print(name, account.address)
+    else:
+      print(name, "未設定")
+  return 0
+
+
+# ---------- 常駐プロセス ----------
+
+
+# 常駐プロセスに実行を依頼し、終了コードを返す（常駐プロセスがなければNone）
+def run_via_worker(path: str, argv: list[str]) -> Optional[int]:
+  import socket
+
+  if not hasattr(socket, "send_fds"):
+    return None
+  client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    client.connect(path)
+  except OSError:
+    client.close()
+    return None
+  with client:
+    request = json.dumps({
+      "argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)
+    }).encode("utf-8")
+    # 標準入出力をそのまま渡し、出力は常駐プロセスから直接このターミナルに書かれる
+    # （接続は終了コードを受け取るまで閉じない。閉じると中断したものとして扱われる）
+    socket.send_fds(
+      client, [len(request).to_bytes(4, "big") + request], [0, 1, 2]
+    )
+    response = b""
+    try:
+      while chunk := client.recv(4096):
+        response += chunk
+    except KeyboardInterrupt:
+      # 接続を閉じると常駐プロセスが実行中の処理を中断する
+      return 130
+  return json.loads(response)["code"] if response else 1
+
+
+def _child(request: dict, fds: list[int]) -> None:
+  import atexit
+  import fcntl
+  import signal
+
+  # バックグラウンドで起動された常駐プロセスはSIGINTを無視する設定を引き継ぐため、中断できるよう戻す
+  signal.signal(signal.SIGINT, signal.default_int_handler)
+
+  # 常駐プロセスの標準入出力が閉じていると受け取ったfdが0〜2になるため、
+  # 一度3以上に移してから標準入出力に割り当てる
+  moved = [fcntl.fcntl(fd, fcntl.F_DUPFD, 3) for fd in fds]
+  for fd in fds:
+    if fd > 2:
+      os.close(fd)
+  for target, fd in enumerate(moved):
+    os.dup2(fd, target)
+    os.close(fd)
+  os.chdir(request["cwd"])
+  os.environ.clear()
+  os.environ.update(request["env"])
+  code = 1
+  try:
+    code = main(request["argv"], allow_worker=False)
+  except SystemExit as e:
+    code = e.code if isinstance(e.code, int) else (1 if e.code else 0)
+  except BaseException:
+    import traceback
+
+    traceback.print_exc()
+  finally:
+    # os._exitはatexitを実行しないため、実行中に登録されたもの（metricsの書き出しなど）をここで実行する
+    # （常駐プロセス自体は何も登録していない）
+    atexit._run_exitfuncs()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
+
+
+# 依頼ごとにforkして実行する（読み込み済みのモジュールを引き継ぎ、実行ごとの状態は残らない）
+def serve_worker(path: str) -> int:
+  import signal
+  import socket
+  import select
+  import importlib
+
+  if not hasattr(os, "fork") or not hasattr(socket, "recv_fds"):
+    print("このOSでは常駐プロセスを使えません", file=sys.stderr)
+    return 1
+  # 読み込むのは外部のモジュールだけにする。シナリオやsrcのモジュール（metricsなど）は
+  # インポート時に環境変数を読むため、依頼ごとの環境に入れ替えた後の子プロセスでインポートする
+  for module in WARM_MODULES:
+    importlib.import_module(module)
+  from symbolchain.facade.SymbolFacade import SymbolFacade
+
+  SymbolFacade("testnet")
+
+  if os.path.exists(path):
+    os.unlink(path)
+  server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  server.bind(path)
+  os.chmod(path, 0o600)
+  server.listen(16)
+  print("常駐プロセス開始", path, file=sys.stderr)
+
+  # 接続 => 実行中の子プロセスのPID
+  running: dict[socket.socket, int] = {}
+  # 子プロセスの終了を検知するパイプ（子プロセスが終了すると読み込み側がEOFになる）
+  exits: dict[int, socket.socket] = {}
+  interrupted: set[socket.socket] = set()
+  try:
+    while True:
+      watching = [
+        connection for connection in running
+        if connection not in interrupted
+      ]
+      readable, _, _ = select.select([server, *watching, *exits], [], [])
+      for item in readable:
+        if item is server:
+          connection, _ = server.accept()
+          message, fds, _, _ = socket.recv_fds(connection, 1 << 20, 3)
+          size = int.from_bytes(message[:4], "big")
+          while len(message) < size + 4:
+            message += connection.recv(size + 4 - len(message))
+          exit_reader, exit_writer = os.pipe()
+          sys.stdout.flush()
+          sys.stderr.flush()
+          pid = os.fork()
+          if pid == 0:
+            server.close()
+            connection.close()
+            os.close(exit_reader)
+            _child(json.loads(message[4:]), fds)
+          os.close(exit_writer)
+          for fd in fds:
+            os.close(fd)
+          running[connection] = pid
+          exits[exit_reader] = connection
+        elif isinstance(item, int):
+          connection = exits.pop(item)
+          os.close(item)
+          _, status = os.waitpid(running.pop(connection), 0)
+          interrupted.discard(connection)
+          try:
+            connection.sendall(json.dumps({
+              "code": os.waitstatus_to_exitcode(status)
+            }).encode("utf-8"))
+          except OSError:
+            pass
+          connection.close()
+        elif not item.recv(1):
+          # クライアントが中断した
+          os.kill(running[item], signal.SIGINT)
+          interrupted.add(item)
+  except KeyboardInterrupt:
+    return 0
+  finally:
+    server.close()
+    if os.path.exists(path):
+      os.unlink(path)
+
+
+def main(
+  argv: Optional[list[str]] = None, allow_worker: bool = True
+) -> int:
+  argv = sys.argv[1:] if argv is None else argv
+  names = scenarios()
+  parser = argparse.ArgumentParser(
+    prog="symbol-book", description="シナリオを実行する"
+  )
+  parser.add_argument(
+    "--socket",
+    default=os.environ.get("SYMBOL_BOOK_SOCKET", DEFAULT_SOCKET),
+    help="常駐プロセスのソケット",
+  )
+  parser.add_argument(
+    "--no-worker",
+    action="store_true",
+    help="常駐プロセスがあっても使わずに実行する",
+  )
+  subparsers = parser.add_subparsers(
+    dest="command", metavar="command", required=True
+  )
+  subparsers.add_parser("list", help="シナリオの一覧を表示する")
+  subparsers.add_parser("accounts", help=".envのアカウントを表示する")
+  subparsers.add_parser(
+    "worker", help="SDKを読み込んだ状態で常駐し、実行の依頼を待つ"
+  )
+  commands = {}
+  for name in names:
+    subparsers.add_parser(name, aliases=aliases(name), help=name)
+    commands[name] = name
+    commands.update(dict.fromkeys(aliases(name), name))
+  args = parser.parse_args(argv)
+
+  if args.command == "list":
+    for name in names:
+      print(f"{name:36}{' '.join(aliases(name))}")
+    return 0
+  if args.command == "worker":
+    return serve_worker(args.socket)
+
+  if allow_worker and not args.no_worker:
+    code = run_via_worker(args.socket, argv)
+    if code is not None:
+      return code
+  if args.command == "accounts":
+    return show_accounts()
+  return run_scenario(commands[args.command])
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -1,13 +1,10 @@
 # ネームスペースを登録しアカウントに紐づけるコード
 import os
 import json
-import requests
 import asyncio
 from dotenv import load_dotenv
-from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
-  SymbolAccount,
   Hash256,
 )
 from symbolchain.symbol.IdGenerator import generate_namespace_id
@@ -23,8 +20,14 @@ from symbolchain.sc import (
   TransferTransactionV1
 )
 
+import http_cache
 from convert_hex_values import convert_hex_values
 from wait_tx_status import wait_tx_status
+from wait_entity_ready import wait_namespace_ready, new_block_hint
+from mosaic_namespace_resolver import MosaicNamespaceResolver
+from send_tx import send_signed_tx
+from dry_run import is_dry_run
+from signing_service import signing_account
 
 async def main() -> None:
   load_dotenv()
@@ -32,12 +35,11 @@ async def main() -> None:
   NODE_URL: str = os.getenv("NODE_URL") or ""
   facade: SymbolFacade = SymbolFacade("testnet")
 
-  private_key_a: str = os.getenv("PRIVATE_KEY_A") or ""
-  account_a: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_a)
-  )
+  account_a = signing_account(facade, "PRIVATE_KEY_A")
 
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
+  network_time = (
+    await http_cache.get_async(f"{NODE_URL}/node/time")
+  ).json()
   receive_timestamp: int = int(
     network_time["communicationTimestamps"]["receiveTimestamp"]
   )
@@ -128,21 +130,14 @@ async def main() -> None:
 
   signature_agg: Signature = account_a.sign_transaction(tx_agg)
 
-  json_payload_agg = facade.transaction_factory.attach_signature(
-    tx_agg, signature_agg
-  )
+  facade.transaction_factory.attach_signature(tx_agg, signature_agg)
 
   print("===ネームスペース登録及びリンクトランザクション===")
-  print("アナウンス開始")  
-  response_agg = requests.put(
-    f"{NODE_URL}/transactions",
-    headers={"Content-Type": "application/json"},
-    data=json_payload_agg,
-  ).json()
-
-  print("アナウンス結果", response_agg)
-
-  hash_agg: Hash256 = facade.hash_transaction(tx_agg)
+  # （DRY_RUN=1の場合はアナウンスせずにローカルで検証する）
+  hash_agg: Hash256 = send_signed_tx(tx_agg, facade)
+  # ドライランではアナウンスしていないため、ノードでの確認は行わない
+  if is_dry_run():
+    return
 
   # トランザクションの状態を確認する処理を関数化
   await wait_tx_status(
@@ -150,13 +145,14 @@ async def main() -> None:
   )
 
   # ネームスペース情報を取得する（サブネームスペースの情報）
-  await asyncio.sleep(5) # ネームスペース情報が登録されるまでの時差があるため数秒程度待つ  
-  
-  namespace_id_hex = hex(sub_namespace_id)[2:]  # '0x'を除去
-  namespace_info = requests.get(
-    f"{NODE_URL}/namespaces/{namespace_id_hex}",
-    headers={"Content-Type": "application/json"},
-  ).json()
+  # ネームスペース情報が登録されるまでの時差があるため、参照可能になるまで待つ
+  # （新しいブロックを検知したら、再確認の間隔を待たずにすぐ確認する）
+  # （ネームスペース情報は有効期限のブロック高までキャッシュし、複数のIDはPOSTでまとめて取得する）
+  resolver = MosaicNamespaceResolver(NODE_URL)
+  async with new_block_hint(NODE_URL) as hint:
+    namespace_info = await wait_namespace_ready(
+      resolver, sub_namespace_id, hint=hint
+    )
 
   print(
     "ネームスペース情報JSON表示",
@@ -164,6 +160,8 @@ async def main() -> None:
       convert_hex_values(namespace_info), indent=2
     )
   )
+  # 親ネームスペースの名前と合わせてフルネームを表示する
+  print("ネームスペース名", await resolver.namespace_name(sub_namespace_id))
 
 
 if __name__ == "__main__":
@@ -1,12 +1,10 @@
 # アカウントに対する制限を設定するコード
 import os
-import requests
 import asyncio
 from dotenv import load_dotenv
 from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
-  SymbolAccount,
   Hash256,
 )
 from symbolchain.sc import (
@@ -19,9 +17,12 @@ from symbolchain.sc import (
   AccountOperationRestrictionTransactionV1,
 )
 
+import http_cache
 from wait_tx_status import wait_tx_status
 from send_tx import send_tx
 from send_transfer_fees import send_transfer_fees
+from preflight_validator import PreflightState, PreflightValidator
+from signing_service import signing_account
 
 async def main() -> None:
   load_dotenv()
@@ -29,12 +30,11 @@ async def main() -> None:
   NODE_URL: str = os.getenv("NODE_URL") or ""
   facade: SymbolFacade = SymbolFacade("testnet")
 
-  private_key_a: str = os.getenv("PRIVATE_KEY_A") or ""
-  account_a: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_a)
-  )
+  account_a = signing_account(facade, "PRIVATE_KEY_A")
 
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
+  network_time = (
+    await http_cache.get_async(f"{NODE_URL}/node/time")
+  ).json()
   receive_timestamp: int = int(
     network_time["communicationTimestamps"]["receiveTimestamp"]
   )
@@ -42,7 +42,13 @@ async def main() -> None:
     2 * 60 * 60 * 1000
   )  # 2時間後（ミリ秒単位）
 
+  # アナウンス前に拒否されるトランザクションを検出するための事前チェック
+  preflight_state = PreflightState(NODE_URL)
+  await preflight_state.load_network_time_async()
+  preflight_validator = PreflightValidator(facade, preflight_state)
+
   # 事前アカウント生成
+  # 実行ごとに作る使い捨ての鍵なので、署名サービスには置かずにこのプロセスで署名する
   restricted_account1 = facade.create_account(PrivateKey.random())
   restricted_account2 = facade.create_account(PrivateKey.random())
   restricted_account3 = facade.create_account(PrivateKey.random())
@@ -117,6 +123,11 @@ async def main() -> None:
 
   print("===確認用アカウント受信禁止トランザクション===")
   print("承認結果がSuccessではなくFailure_xxxになれば成功")
+  # アナウンスせずに拒否されることを確認できる
+  await preflight_state.load_accounts_async(
+    [account_a.address, restricted_account1.address]
+  )
+  print("事前チェック結果", preflight_validator.validate(tx_tf1))
   hash_tf1: Hash256 = send_tx(tx_tf1, account_a)
 
   await wait_tx_status(
@@ -171,6 +182,11 @@ async def main() -> None:
 
   print("===確認用モザイク受信禁止トランザクション===")
   print("承認結果がSuccessではなくFailure_xxxになれば成功")
+  # アナウンスせずに拒否されることを確認できる
+  await preflight_state.load_accounts_async(
+    [account_a.address, restricted_account2.address]
+  )
+  print("事前チェック結果", preflight_validator.validate(tx_tf2))
   hash_tf2: Hash256 = send_tx(tx_tf2, account_a)
 
   await wait_tx_status(
@@ -224,6 +240,11 @@ async def main() -> None:
 
   print("===確認用トランザクション送信禁止トランザクション===")
   print("承認結果がSuccessではなくFailure_xxxになれば成功")
+  # アナウンスせずに拒否されることを確認できる
+  await preflight_state.load_accounts_async(
+    [account_a.address, restricted_account3.address]
+  )
+  print("事前チェック結果", preflight_validator.validate(tx_tf3))
   hash_tf3: Hash256 = send_tx(tx_tf3, restricted_account3)
 
   await wait_tx_status(
@@ -1,13 +1,11 @@
 # モザイクに対する制限（グローバルモザイク制限）を設定するコード
 import os
 import random
-import requests
 import asyncio
 from dotenv import load_dotenv
 from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
-  SymbolAccount,
   Hash256,
 )
 from symbolchain.symbol.IdGenerator import generate_mosaic_id
@@ -26,9 +24,12 @@ from symbolchain.sc import (
   MosaicAddressRestrictionTransactionV1,
 )
 
+import http_cache
 from wait_tx_status import wait_tx_status
-from send_tx import send_tx
+from send_tx import send_tx, send_signed_tx
 from send_transfer_fees import send_transfer_fees
+from preflight_validator import PreflightState, PreflightValidator
+from signing_service import signing_account
 
 async def main() -> None:
   load_dotenv()
@@ -36,12 +37,11 @@ async def main() -> None:
   NODE_URL: str = os.getenv("NODE_URL") or ""
   facade: SymbolFacade = SymbolFacade("testnet")
 
-  private_key_a: str = os.getenv("PRIVATE_KEY_A") or ""
-  account_a: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_a)
-  )
+  account_a = signing_account(facade, "PRIVATE_KEY_A")
 
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
+  network_time = (
+    await http_cache.get_async(f"{NODE_URL}/node/time")
+  ).json()
   receive_timestamp: int = int(
     network_time["communicationTimestamps"]["receiveTimestamp"]
   )
@@ -49,7 +49,13 @@ async def main() -> None:
     2 * 60 * 60 * 1000
   )  # 2時間後（ミリ秒単位）
 
+  # アナウンス前に拒否されるトランザクションを検出するための事前チェック
+  preflight_state = PreflightState(NODE_URL)
+  await preflight_state.load_network_time_async()
+  preflight_validator = PreflightValidator(facade, preflight_state)
+
   # 事前アカウント生成
+  # 実行ごとに作る使い捨ての鍵なので、署名サービスには置かずにこのプロセスで署名する
   allowed_account1 = facade.create_account(PrivateKey.random())
   allowed_account2 = facade.create_account(PrivateKey.random())
   not_allowed_account1 = facade.create_account(PrivateKey.random())
@@ -150,22 +156,13 @@ async def main() -> None:
     tx_gmr
   )
 
-  json_payload_gmr = facade.transaction_factory.attach_signature(
+  facade.transaction_factory.attach_signature(
     tx_gmr, signature_gmr
   )
 
   print("===制限付きモザイク発行及び転送トランザクション===")
-  print("アナウンス開始")  
-  response_gmr = requests.put(
-    f"{NODE_URL}/transactions",
-    headers={"Content-Type": "application/json"},
-    data=json_payload_gmr,
-  ).json()
-
-  print("アナウンス結果", response_gmr)
-
-  hash_gmr: Hash256 = facade.hash_transaction(tx_gmr)
-
+  # （DRY_RUN=1の場合はアナウンスせずにローカルで検証する）
+  hash_gmr: Hash256 = send_signed_tx(tx_gmr, facade)
 
   await wait_tx_status(
     str(hash_gmr), NODE_URL, "confirmed"
@@ -226,22 +223,13 @@ async def main() -> None:
     tx_Mar
   )
 
-  json_payload_Mar = facade.transaction_factory.attach_signature(
+  facade.transaction_factory.attach_signature(
     tx_Mar, signature_Mar
   )
 
   print("===制限付きモザイクの送受信許可トランザクション===")
-  print("アナウンス開始")  
-  response_Mar = requests.put(
-    f"{NODE_URL}/transactions",
-    headers={"Content-Type": "application/json"},
-    data=json_payload_Mar,
-  ).json()
-
-  print("アナウンス結果", response_Mar)
-
-  hash_Mar: Hash256 = facade.hash_transaction(tx_Mar)
-
+  # （DRY_RUN=1の場合はアナウンスせずにローカルで検証する）
+  hash_Mar: Hash256 = send_signed_tx(tx_Mar, facade)
   await wait_tx_status(
     str(hash_Mar), NODE_URL, "confirmed"
   )
@@ -278,6 +266,9 @@ async def main() -> None:
 
   print("===制限付きモザイクが許可されてないアカウントへの転送トランザクション===")
   print("承認結果がSuccessではなくFailure_xxxになれば成功")  
+  # アナウンスせずに拒否されることを確認できる
+  await preflight_state.load_mosaics_async([mosaic_id])
+  print("事前チェック結果", preflight_validator.validate(tx_tf2))
   hash_tf2: Hash256 = send_tx(tx_tf2, allowed_account1)
 
   await wait_tx_status(
@@ -1,14 +1,16 @@
 import os
 import json
 import asyncio
-import requests
 from websockets.legacy.client import connect
 from dotenv import load_dotenv
-from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import SymbolFacade
 from symbolchain.sc import TransferTransactionV1
 
+import http_cache
+import metrics
 from send_tx import send_tx
+from records import parse_event
+from signing_service import signing_account
 
 async def initialize_websocket(NODE_URL, account_a) -> None:
   ws_endpoint = NODE_URL.replace("http", "ws") + "/ws"
@@ -49,14 +51,17 @@ async def initialize_websocket(NODE_URL, account_a) -> None:
     # WebSocketでメッセージを検知した時の処理
     try:
       while True:
-        response_json = json.loads(await websocket.recv())
-        topic = response_json["topic"]
-        tx = response_json["data"]
+        message = await websocket.recv()
+        with metrics.span("decode", endpoint="websocket"):
+          channel, tx = parse_event(json.loads(message))
+        metrics.increment(
+          "symbol_websocket_messages_total", channel=channel
+        )
 
         # 承認済みトランザクションを検知した時の処理
-        if topic.startswith("confirmedAdded"):
+        if channel == "confirmedAdded":
           print(f"承認トランザクション検知: {tx}")
-          hash = tx["meta"]["hash"]
+          hash = tx.meta.hash
           print(
             "結果 Success",
             "エクスプローラー ",
@@ -64,7 +69,7 @@ async def initialize_websocket(NODE_URL, account_a) -> None:
           )
           break
         # 未承認済みトランザクションを検知した時の処理
-        elif topic.startswith("unconfirmedAdded"):
+        elif channel == "unconfirmedAdded":
           print(f"未承認トランザクション検知: {tx}")
     except Exception as e:
       # 未承認済みトランザクションを検知した時の処理
@@ -78,14 +83,14 @@ async def initialize_websocket(NODE_URL, account_a) -> None:
 async def main() -> None:
   load_dotenv()
 
-  NODE_URL = "https://sym-test-03.opening-line.jp:3001"
+  NODE_URL: str = os.getenv("NODE_URL") or ""
   facade = SymbolFacade("testnet")
-  private_key_a = os.getenv("PRIVATE_KEY_A") or ""
-  account_a = facade.create_account(PrivateKey(private_key_a))
-  private_key_b = os.getenv("PRIVATE_KEY_B") or ""
-  account_b = facade.create_account(PrivateKey(private_key_b))
+  account_a = signing_account(facade, "PRIVATE_KEY_A")
+  account_b = signing_account(facade, "PRIVATE_KEY_B")
 
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
+  network_time = (
+    await http_cache.get_async(f"{NODE_URL}/node/time")
+  ).json()
   receive_timestamp: int = int(
     network_time["communicationTimestamps"]["receiveTimestamp"]
   )
@@ -4,14 +4,16 @@ import json
 import time
 import requests
 from dotenv import load_dotenv
-from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
-  SymbolAccount,
   Hash256,
 )
 from symbolchain.sc import Amount, Signature, TransferTransactionV1
+import http_cache
 from convert_hex_values import convert_hex_values
+from signing_service import signing_account
+from send_tx import send_signed_tx
+from dry_run import is_dry_run
 
 def main() -> None:
   # dotenvの設定
@@ -21,18 +23,12 @@ def main() -> None:
   NODE_URL: str = os.getenv("NODE_URL") or ""
   facade: SymbolFacade = SymbolFacade("testnet")
 
-  # 秘密鍵からのアカウント復元
-  private_key_a: str = os.getenv("PRIVATE_KEY_A") or ""
-  account_a: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_a)
-  )
-  private_key_b: str = os.getenv("PRIVATE_KEY_B") or ""
-  account_b: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_b)
-  )
+  # 秘密鍵からのアカウント復元（SIGNING_SOCKETを設定すると署名サービスを使う）
+  account_a = signing_account(facade, "PRIVATE_KEY_A")
+  account_b = signing_account(facade, "PRIVATE_KEY_B")
 
   # ネットワークの現在時刻を取得
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
+  network_time = http_cache.get(f"{NODE_URL}/node/time").json()
   receive_timestamp: int = int(
     network_time["communicationTimestamps"]["receiveTimestamp"]
   )
@@ -66,18 +62,12 @@ def main() -> None:
   )
 
   print("===転送トランザクション===")
-  # ノードにアナウンスを行う
-  print("アナウンス開始")
-  response = requests.put(  # 書き込み時はPUTを指定する
-    f"{NODE_URL}/transactions",
-    headers={"Content-Type": "application/json"},
-    data=json_payload,  # 整形されたペイロードを指定
-  ).json()
-
-  print("アナウンス結果", response)
-
-  # トランザクションハッシュの生成
-  hash: Hash256 = facade.hash_transaction(tx)
+  # ノードにアナウンスを行い、トランザクションハッシュを受け取る
+  # （DRY_RUN=1の場合はアナウンスせずにローカルで検証する）
+  hash: Hash256 = send_signed_tx(tx, facade)
+  # ドライランではアナウンスしていないため、ノードでの確認は行わない
+  if is_dry_run():
+    return
 
   # ノード上でのトランザクションの状態を一秒ごとに確認
   print("confirmed状態まで待機中..")
@@ -108,7 +98,7 @@ def main() -> None:
 
   # トランザクション情報を取得する
   print("トランザクション情報を取得中・・・")
-  tx_info = requests.get(
+  tx_info = http_cache.get(
     f"{NODE_URL}/transactions/confirmed/{str(hash)}",
     headers={"Content-Type": "application/json"},
   ).json()
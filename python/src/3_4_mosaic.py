@@ -2,13 +2,10 @@
 import os
 import json
 import random
-import requests
 import asyncio
 from dotenv import load_dotenv
-from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
-  SymbolAccount,
   Hash256,
 )
 from symbolchain.symbol.IdGenerator import generate_mosaic_id
@@ -23,8 +20,14 @@ from symbolchain.sc import (
   AggregateCompleteTransactionV2,
 )
 
+import http_cache
 from convert_hex_values import convert_hex_values
 from wait_tx_status import wait_tx_status
+from wait_entity_ready import wait_mosaic_ready, new_block_hint
+from mosaic_namespace_resolver import MosaicNamespaceResolver
+from send_tx import send_signed_tx
+from dry_run import is_dry_run
+from signing_service import signing_account
 
 async def main() -> None:
   load_dotenv()
@@ -32,16 +35,12 @@ async def main() -> None:
   NODE_URL: str = os.getenv("NODE_URL") or ""
   facade: SymbolFacade = SymbolFacade("testnet")
 
-  private_key_a: str = os.getenv("PRIVATE_KEY_A") or ""
-  account_a: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_a)
-  )
-  private_key_b: str = os.getenv("PRIVATE_KEY_B") or ""
-  account_b: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_b)
-  )
+  account_a = signing_account(facade, "PRIVATE_KEY_A")
+  account_b = signing_account(facade, "PRIVATE_KEY_B")
 
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
+  network_time = (
+    await http_cache.get_async(f"{NODE_URL}/node/time")
+  ).json()
   receive_timestamp: int = int(
     network_time["communicationTimestamps"]["receiveTimestamp"]
   )
@@ -124,18 +123,12 @@ async def main() -> None:
   )
 
   print("===モザイク発行及び転送トランザクション===")
-  # ノードにアナウンスを行う
-  print("アナウンス開始")  
-  response_agg = requests.put(
-    f"{NODE_URL}/transactions",
-    headers={"Content-Type": "application/json"},
-    data=json_payload_agg,
-  ).json()
-
-  print("アナウンス結果", response_agg)
-
-  # トランザクションハッシュの生成
-  hash_agg: Hash256 = facade.hash_transaction(tx_agg)
+  # ノードにアナウンスを行い、トランザクションハッシュを受け取る
+  # （DRY_RUN=1の場合はアナウンスせずにローカルで検証する）
+  hash_agg: Hash256 = send_signed_tx(tx_agg, facade)
+  # ドライランではアナウンスしていないため、ノードでの確認は行わない
+  if is_dry_run():
+    return
 
   # トランザクションの状態を確認する処理を関数化
   await wait_tx_status(
@@ -143,13 +136,14 @@ async def main() -> None:
   )
 
   # モザイク情報を取得する
-  await asyncio.sleep(5) # モザイクが生成されるまでの時差があるため数秒程度待つ
-
-  mosaic_id_hex = hex(mosaic_id)[2:]  # '0x'を除去
-  mosaic_info = requests.get(
-    f"{NODE_URL}/mosaics/{mosaic_id_hex}",
-    headers={"Content-Type": "application/json"},
-  ).json()
+  # モザイクが生成されるまでの時差があるため、参照可能になるまで待つ
+  # （新しいブロックを検知したら、再確認の間隔を待たずにすぐ確認する）
+  # （モザイク情報はブロック高の有効期限までキャッシュし、複数のIDはPOSTでまとめて取得する）
+  resolver = MosaicNamespaceResolver(NODE_URL)
+  async with new_block_hint(NODE_URL) as hint:
+    mosaic_info = await wait_mosaic_ready(
+      resolver, mosaic_id, hint=hint
+    )
 
   print(
     "モザイク情報JSON表示",    
@@ -157,6 +151,12 @@ async def main() -> None:
       convert_hex_values(mosaic_info), indent=2
     )
   )
+  # 供給量は発行・回収で変わるため、モザイク情報とは別に取得する
+  # 表示する数量は可分性（小数点以下の桁数）に合わせる
+  supply, divisibility = await asyncio.gather(
+    resolver.supply(mosaic_id), resolver.divisibility(mosaic_id)
+  )
+  print("供給量", f"{supply / 10 ** divisibility:.{divisibility}f}")
 
 
 if __name__ == "__main__":
@@ -2,27 +2,30 @@
 import os
 import json
 import dotenv
-import requests
 import asyncio
-from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
-  SymbolAccount,
   Hash256,
 )
-from symbolchain.symbol.Metadata import (
-  metadata_generate_key,
-  metadata_update_value,
-)
+from symbolchain.symbol.Metadata import metadata_generate_key
 from symbolchain.sc import (
-  Amount,
   Signature,
-  AccountMetadataTransactionV1,
   AggregateCompleteTransactionV2,
 )
 
+import http_cache
 from convert_hex_values import convert_hex_values
 from wait_tx_status import wait_tx_status
+from send_tx import send_signed_tx
+from dry_run import is_dry_run
+from metadata_cache import (
+  METADATA_TYPE_ACCOUNT,
+  MetadataKey,
+  MetadataCache,
+  MetadataBatchWriter,
+  address_to_hex,
+)
+from signing_service import signing_account
 
 async def main() -> None:
   dotenv.load_dotenv()
@@ -30,12 +33,11 @@ async def main() -> None:
   NODE_URL: str = os.getenv("NODE_URL") or ""
   facade: SymbolFacade = SymbolFacade("testnet")
 
-  private_key_a: str = os.getenv("PRIVATE_KEY_A") or ""
-  account_a: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_a)
-  )
+  account_a = signing_account(facade, "PRIVATE_KEY_A")
 
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
+  network_time = (
+    await http_cache.get_async(f"{NODE_URL}/node/time")
+  ).json()
   receive_timestamp: int = int(
     network_time["communicationTimestamps"]["receiveTimestamp"]
   )
@@ -48,70 +50,61 @@ async def main() -> None:
   value_text = "test"
   # bigIntに変換
   metadata_key = metadata_generate_key(key_text)
-  # 古い値を新しい値に更新するためのメタデータペイロードを作成
-  metadata_value = metadata_update_value(
-    "".encode("utf8"),  # 古い値を指定 （初回は空文字）
-    value_text.encode("utf-8"),  # 新しい値を指定
-  )
 
-  # メタデータのトランザクションを生成
-  metadata_tx: (
-    AccountMetadataTransactionV1
-  ) = facade.transaction_factory.create_embedded({
-      "type": "account_metadata_transaction_v1",
-      "target_address": account_a.address,  # 紐付ける対象のアカウントアドレス
-      "scoped_metadata_key": metadata_key,  # 紐づけるメタデータのキー
-      "value": metadata_value,  # 紐づけるメタデータの値
-      "value_size_delta": len(metadata_value),  # 紐づけるメタデータの長さ
-      "signer_public_key": account_a.public_key,  # 署名者の公開鍵
-    })
-
-  txs = [metadata_tx]
-
-  inner_transaction_hash: Hash256 = (
-    facade.hash_embedded_transactions(txs)
+  # 設定済みのメタデータを読み込み、古い値との差分をキャッシュから計算する
+  cache = MetadataCache(NODE_URL, facade)
+  await cache.load_async(
+    targetAddress=str(account_a.address),
+    sourceAddress=str(account_a.address),
   )
+  writer = MetadataBatchWriter(facade, cache, account_a)
+  writer.set(account_a.address, metadata_key, value_text)
 
-  tx_agg: (
-    AggregateCompleteTransactionV2
-  ) = facade.transaction_factory.create({
-      "type": "aggregate_complete_transaction_v2",
-      "transactions": txs,
-      "transactions_hash": inner_transaction_hash,
-      "signer_public_key": account_a.public_key,
-      "deadline": deadline_timestamp,
-    })
-  tx_agg.fee = Amount(100 * tx_agg.size)
+  # メタデータのトランザクションをアグリゲートにまとめる
+  tx_agg: AggregateCompleteTransactionV2
+  (tx_agg,) = writer.build(deadline_timestamp)
 
   signature_agg: Signature = account_a.sign_transaction(tx_agg)
 
-  json_payload_agg = facade.transaction_factory.attach_signature(
-    tx_agg, signature_agg
-  )
+  facade.transaction_factory.attach_signature(tx_agg, signature_agg)
 
   print("===アカウントメタデータトランザクション===")
-  print("アナウンス開始")  
-  response_agg = requests.put(
-    f"{NODE_URL}/transactions",
-    headers={"Content-Type": "application/json"},
-    data=json_payload_agg,
-  ).json()
-
-  print("アナウンス結果", response_agg)
-
-  hash_agg: Hash256 = facade.hash_transaction(tx_agg)
+  hash_agg: Hash256 = send_signed_tx(tx_agg, facade)
+  # ドライランではアナウンスしていないため、ノードでの確認は行わない
+  if is_dry_run():
+    return
 
   await wait_tx_status(
     str(hash_agg), NODE_URL, "confirmed"
   )
 
+  # 承認されたトランザクションをキャッシュに反映する
+  cache.apply_transaction(
+    (
+      await http_cache.get_async(
+        f"{NODE_URL}/transactions/confirmed/{hash_agg}"
+      )
+    ).json()
+  )
+  cache_key = MetadataKey(
+    address_to_hex(account_a.address),
+    address_to_hex(account_a.address),
+    metadata_key,
+    0,
+    METADATA_TYPE_ACCOUNT,
+  )
+  print(
+    "キャッシュのメタデータの値",
+    cache.get_confirmed(cache_key).decode("utf-8"),
+  )
+
   # メタデータ情報を取得する(アドレスに設定されているメタデータ一覧)
   query1 = {
     "targetAddress": str(account_a.address),  # 設定されたアカウントアドレス
   }
 
-  metadata_info1 = requests.get(
-    f"{NODE_URL}/metadata", params=query1
+  metadata_info1 = (
+    await http_cache.get_async(f"{NODE_URL}/metadata", params=query1)
   ).json()
 
   print(
@@ -128,8 +121,8 @@ async def main() -> None:
     "metadataType": "0",  # アカウントメタデータは0
   }
 
-  metadata_info2 = requests.get(
-    f"{NODE_URL}/metadata", params=query2
+  metadata_info2 = (
+    await http_cache.get_async(f"{NODE_URL}/metadata", params=query2)
   ).json()
 
   print(
@@ -4,10 +4,8 @@ import json
 import requests
 import asyncio
 from dotenv import load_dotenv
-from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
-  SymbolAccount,
   Hash256,
 )
 from symbolchain.sc import (
@@ -18,9 +16,13 @@ from symbolchain.sc import (
   HashLockTransactionV1,
 )
 
+import http_cache
 from convert_hex_values import convert_hex_values
 from wait_tx_status import wait_tx_status
-from send_tx import send_tx
+from send_tx import send_tx, send_signed_tx
+from dry_run import is_dry_run
+from wait_entity_ready import wait_hash_lock_ready
+from signing_service import signing_account
 
 async def main() -> None:
   load_dotenv()
@@ -28,16 +30,12 @@ async def main() -> None:
   NODE_URL: str = os.getenv("NODE_URL") or ""
   facade: SymbolFacade = SymbolFacade("testnet")
 
-  private_key_a: str = os.getenv("PRIVATE_KEY_A") or ""
-  account_a: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_a)
-  )
-  private_key_b: str = os.getenv("PRIVATE_KEY_B") or ""
-  account_b: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_b)
-  )
+  account_a = signing_account(facade, "PRIVATE_KEY_A")
+  account_b = signing_account(facade, "PRIVATE_KEY_B")
 
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
+  network_time = (
+    await http_cache.get_async(f"{NODE_URL}/node/time")
+  ).json()
   receive_timestamp: int = int(
     network_time["communicationTimestamps"]["receiveTimestamp"]
   )
@@ -121,12 +119,18 @@ async def main() -> None:
     hash_lock_tx, account_a
   )
 
+  # ドライランではハッシュロックをアナウンスしていないため、
+  # アグリゲートボンデッドもローカルで検証して終える
+  if is_dry_run():
+    send_signed_tx(tx_agg, facade)
+    return
+
   await wait_tx_status(
     str(hash_lock_hash), NODE_URL, "confirmed"
   )
 
-  # ハッシュロックトランザクションが全ノードに伝播されるまで一秒ほど時間を置く
-  await asyncio.sleep(1)
+  # ハッシュロックがノードで参照可能になるまで待つ
+  await wait_hash_lock_ready(NODE_URL, str(hash_agg))
 
   print("===アグリゲートボンデッドトランザクション===")
   # アグリゲートボンデッドトランザクションのアナウンス
@@ -150,8 +154,10 @@ async def main() -> None:
     "order":"desc" #新しい順に結果を返す    
   }
 
-  tx_search_info = requests.get(
-    f"{NODE_URL}/transactions/partial?", params=query
+  tx_search_info = (
+    await http_cache.get_async(
+      f"{NODE_URL}/transactions/partial?", params=query
+    )
   ).json()
 
   print(
@@ -162,11 +168,14 @@ async def main() -> None:
   )
   
   hash_agg_string = tx_search_info["data"][0]["meta"]["aggregateHash"]
-  hash_agg_restore: Hash256 = Hash256(hash_agg_string)
+  # 署名サービスはハッシュだけには連署しないため、検出したハッシュが
+  # 手元のアグリゲートのものであることを確かめてから、アグリゲートに連署する
+  if Hash256(hash_agg_string) != hash_agg:
+    raise Exception("連署待ちのトランザクションが見つかりません")
 
   # 連署者による署名
-  cosignature_request = account_b.cosign_transaction_hash(
-      hash_agg_restore, 
+  cosignature_request = account_b.cosign_transaction(
+      tx_agg,
       True
   ).to_json()
   cosignature_request_snake_case = {
@@ -1,13 +1,10 @@
 # シークレット（ロック用のキー）とプルーフ（解除用のキー）を使って特定のモザイクの送付をロックしておくコード
 import os
-import requests
 import asyncio
 import hashlib
 from dotenv import load_dotenv
-from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
-  SymbolAccount,
   Hash256,
 )
 from symbolchain.sc import (
@@ -15,8 +12,10 @@ from symbolchain.sc import (
   SecretProofTransactionV1,
 )
 
+import http_cache
 from wait_tx_status import wait_tx_status
 from send_tx import send_tx
+from signing_service import signing_account
 
 async def main() -> None:
   load_dotenv()
@@ -24,16 +23,12 @@ async def main() -> None:
   NODE_URL: str = os.getenv("NODE_URL") or ""
   facade: SymbolFacade = SymbolFacade("testnet")
 
-  private_key_a: str = os.getenv("PRIVATE_KEY_A") or ""
-  account_a: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_a)
-  )
-  private_key_b: str = os.getenv("PRIVATE_KEY_B") or ""
-  account_b: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_b)
-  )
+  account_a = signing_account(facade, "PRIVATE_KEY_A")
+  account_b = signing_account(facade, "PRIVATE_KEY_B")
 
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
+  network_time = (
+    await http_cache.get_async(f"{NODE_URL}/node/time")
+  ).json()
   receive_timestamp: int = int(
     network_time["communicationTimestamps"]["receiveTimestamp"]
   )
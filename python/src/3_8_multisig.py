@@ -1,13 +1,10 @@
 # マルチシグアカウントの構成及びマルチシグアカウントからのトランザクションを行うコード
 import os
-import json
-import requests
 import asyncio
 from dotenv import load_dotenv
 from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
-  SymbolAccount,
   Hash256,
 )
 from symbolchain.sc import (
@@ -19,8 +16,11 @@ from symbolchain.sc import (
   MultisigAccountModificationTransactionV1,
 )
 
+import http_cache
 from wait_tx_status import wait_tx_status
+from send_tx import send_signed_tx
 from send_transfer_fees import send_transfer_fees
+from signing_service import signing_account
 
 async def main() -> None:
   load_dotenv()
@@ -28,12 +28,11 @@ async def main() -> None:
   NODE_URL: str = os.getenv("NODE_URL") or ""
   facade: SymbolFacade = SymbolFacade("testnet")
 
-  private_key_a: str = os.getenv("PRIVATE_KEY_A") or ""
-  account_a: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_a)
-  )
+  account_a = signing_account(facade, "PRIVATE_KEY_A")
 
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
+  network_time = (
+    await http_cache.get_async(f"{NODE_URL}/node/time")
+  ).json()
   receive_timestamp: int = int(
     network_time["communicationTimestamps"]["receiveTimestamp"]
   )
@@ -42,6 +41,7 @@ async def main() -> None:
   )  # 2時間後（ミリ秒単位）
 
   # 事前アカウント生成
+  # 実行ごとに作る使い捨ての鍵なので、署名サービスには置かずにこのプロセスで署名する
   multisig_account = facade.create_account(PrivateKey.random())
   cosig_account1 = facade.create_account(PrivateKey.random())
   cosig_account2 = facade.create_account(PrivateKey.random())
@@ -121,22 +121,9 @@ async def main() -> None:
   cosig4: Cosignature = cosig_account4.cosign_transaction(tx_mod)
   tx_mod.cosignatures.append(cosig4)
 
-  # トランザクションをペイロード化 => 文字列に整形
-  json_payload_mod = json.dumps({
-      "payload": (tx_mod.serialize()).hex(),
-    })
-
   print("===マルチシグアカウント構成トランザクション===")
-  print("アナウンス開始")  
-  response_mod = requests.put(
-    f"{NODE_URL}/transactions",
-    headers={"Content-Type": "application/json"},
-    data=json_payload_mod,
-  ).json()
-
-  print("アナウンス結果", response_mod)
-
-  hash_mod: Hash256 = facade.hash_transaction(tx_mod)
+  # （DRY_RUN=1の場合はアナウンスせずにローカルで検証する）
+  hash_mod: Hash256 = send_signed_tx(tx_mod, facade)
 
   await wait_tx_status(
     str(hash_mod), NODE_URL, "confirmed"
@@ -183,21 +170,26 @@ async def main() -> None:
   cosig3_tf: Cosignature = cosig_account3.cosign_transaction(tx_tf)
   tx_tf.cosignatures.append(cosig3_tf)
 
-  json_payload_tf = json.dumps({
-      "payload": (tx_tf.serialize()).hex(),
-    })
-
   print("===転送トランザクション（マルチシグアカウントから）===")
-  print("アナウンス開始")  
-  response_tf = requests.put(
-    f"{NODE_URL}/transactions",
-    headers={"Content-Type": "application/json"},
-    data=json_payload_tf,
-  ).json()
-
-  print("アナウンス結果", response_tf)
-
-  hash_tf: Hash256 = facade.hash_transaction(tx_tf)
+  # ドライランでは、マルチシグアカウントの承認を連署者の署名で確認する
+  hash_tf: Hash256 = send_signed_tx(
+    tx_tf,
+    facade,
+    multisig={
+      str(multisig_account.public_key): (
+        3,
+        {
+          str(cosig_account.public_key)
+          for cosig_account in (
+            cosig_account1,
+            cosig_account2,
+            cosig_account3,
+            cosig_account4,
+          )
+        },
+      )
+    },
+  )
 
   await wait_tx_status(
     str(hash_tf), NODE_URL, "confirmed"
@@ -1,13 +1,10 @@
 # オフライン（オフチェーン）上で署名を集めるコード
 import os
 import json
-import requests
 import asyncio
 from dotenv import load_dotenv
-from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
-  SymbolAccount,
   Hash256,
 )
 from symbolchain.sc import (
@@ -18,8 +15,12 @@ from symbolchain.sc import (
   AggregateCompleteTransactionV2,
 )
 
+import http_cache
 from wait_tx_status import wait_tx_status
 from binascii import unhexlify
+from signing_service import signing_account
+from send_tx import send_signed_tx
+import crypto_backend
 
 async def main() -> None:
   load_dotenv()
@@ -27,16 +28,12 @@ async def main() -> None:
   NODE_URL: str = os.getenv("NODE_URL") or ""
   facade: SymbolFacade = SymbolFacade("testnet")
 
-  private_key_a: str = os.getenv("PRIVATE_KEY_A") or ""
-  account_a: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_a)
-  )
-  private_key_b: str = os.getenv("PRIVATE_KEY_B") or ""
-  account_b: SymbolAccount = facade.create_account(
-    PrivateKey(private_key_b)
-  )
+  account_a = signing_account(facade, "PRIVATE_KEY_A")
+  account_b = signing_account(facade, "PRIVATE_KEY_B")
 
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
+  network_time = (
+    await http_cache.get_async(f"{NODE_URL}/node/time")
+  ).json()
   receive_timestamp: int = int(
     network_time["communicationTimestamps"]["receiveTimestamp"]
   )
@@ -109,7 +106,8 @@ async def main() -> None:
 
   # 検証を行い、改ざんされていないことを確認する
   print("署名の検証実施…")
-  response_verify = facade.verify_transaction(
+  response_verify = crypto_backend.verify_transaction(
+    facade,
     restored_tx_agg,
     restored_tx_agg.signature,
   )
@@ -127,22 +125,10 @@ async def main() -> None:
   print("オフライン署名の実施…")  
   restored_tx_agg.cosignatures.append(cosignB)
 
-  json_payload_restored_tx_agg = json.dumps({
-      "payload": (restored_tx_agg.serialize()).hex(),
-    })
-
   print("===オフライン署名したトランザクションのアナウンス===")
-  print("アナウンス開始")  
-  response_restored_tx_agg = requests.put(
-    f"{NODE_URL}/transactions",
-    headers={"Content-Type": "application/json"},
-    data=json_payload_restored_tx_agg,
-  ).json()
-
-  print("アナウンス結果", response_restored_tx_agg)
-
-  hash__restored_tx_agg: Hash256 = facade.hash_transaction(
-    restored_tx_agg
+  # DRY_RUN=1の場合はアナウンスせずに、連署を含めてローカルで検証する
+  hash__restored_tx_agg: Hash256 = send_signed_tx(
+    restored_tx_agg, facade
   )
 
   await wait_tx_status(
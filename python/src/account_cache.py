@@ -0,0 +1,461 @@
+# アカウントの状態（残高・インポータンス・リンクされた鍵）をローカルに保持するコード
+# POST /accounts でまとめて取得し、WebSocketのconfirmedAddedで承認された送金を反映する
+# （反映できないトランザクションは関係するアカウントを無効化し、次に参照したときに取得し直す）
+# 自分の未承認の送金（アナウンスしたもの・unconfirmedAddedで検知したもの）を差し引いた、楽観的な残高も求められる
+# 使い方: python src/account_cache.py <アドレス>...（残高を表示し、承認・未承認の送金を監視する）
+import os
+import json
+import asyncio
+import argparse
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+import requests
+from dotenv import load_dotenv
+from websockets.legacy.client import connect
+from symbolchain.CryptoTypes import PublicKey
+from symbolchain.facade.SymbolFacade import SymbolFacade
+
+from metadata_cache import address_to_hex
+from records import (
+  TRANSFER_TRANSACTION_TYPE,
+  TransactionRecord,
+  TransactionStatus,
+  parse_event,
+)
+
+# POST /accounts で1回に問い合わせるアドレス数
+ACCOUNTS_BATCH_SIZE = 100
+# 反映済みとして覚えておくトランザクションハッシュの数
+# （同じトランザクションは関係するアドレスの購読ごとに通知されるため、2回目以降を無視する）
+APPLIED_HASHES = 10000
+# 手数料の支払いに使うモザイク（テストネットの基軸通貨）
+CURRENCY_MOSAIC_ID = 0x72C0212E67A08BCE
+
+
+@dataclass
+class AccountState:
+  """POST /accounts で取得したアカウントの状態"""
+
+  address: str  # 16進数
+  balances: dict[int, int]  # モザイクID => 残高
+  importance: int
+  public_key: str
+  # 種類（linked・node・vrf） => 公開鍵
+  linked_keys: dict[str, str] = field(default_factory=dict)
+  voting_keys: tuple[str, ...] = ()
+  # 取得前後のブロック高。この間に承認されたトランザクションは、取得結果に含まれているか分からない
+  height_before: int = 0
+  height_after: int = 0
+
+
+@dataclass
+class PendingTransfer:
+  """承認待ちの送金（署名者ごとの支出額）"""
+
+  debits: dict[str, dict[int, int]]  # アドレス => {モザイクID: 金額}
+  deadline: int
+
+
+def _is_alias(address_hex: str) -> bool:
+  return bool(int(address_hex[:2], 16) & 0x01)
+
+
+def parse_account(info: dict) -> AccountState:
+  account = info["account"]
+  keys = account.get("supplementalPublicKeys") or {}
+  return AccountState(
+    address_to_hex(account["address"]),
+    {
+      int(mosaic["id"], 16): int(mosaic["amount"])
+      for mosaic in account.get("mosaics", [])
+    },
+    int(account.get("importance") or 0),
+    account.get("publicKey", ""),
+    {
+      name: keys[name]["publicKey"]
+      for name in ("linked", "node", "vrf")
+      if name in keys
+    },
+    tuple(
+      key["publicKey"]
+      for key in keys.get("voting", {}).get("publicKeys", [])
+    ),
+  )
+
+
+class AccountCache:
+  """アカウントの状態をまとめて取得し、承認・未承認のトランザクションで更新する"""
+
+  def __init__(
+    self,
+    node_url: str,
+    facade: Optional[SymbolFacade] = None,
+    currency_mosaic_id: int = CURRENCY_MOSAIC_ID,
+  ) -> None:
+    self.node_url = node_url
+    self.facade = facade or SymbolFacade("testnet")
+    self.currency_mosaic_id = currency_mosaic_id
+    # アドレス（16進数） => 状態
+    self.accounts: dict[str, AccountState] = {}
+    # トランザクションハッシュ => 承認待ちの送金
+    self.pending: dict[str, PendingTransfer] = {}
+    # 監視するアドレス（16進数）
+    self.addresses: set[str] = set()
+    self._applied: OrderedDict[str, None] = OrderedDict()
+    self.watching = False
+    self._session = requests.Session()
+    self._addresses: dict[str, str] = {}
+    self._websocket: Any = None
+    self._websocket_uid: Optional[str] = None
+    # 無効化された監視中のアドレス（watchの中で取得し直す）
+    self._stale: set[str] = set()
+    self._refresh_task: Optional[asyncio.Task] = None
+    self.stats = {
+      "requests": 0,
+      "hits": 0,
+      "applied": 0,
+      "invalidated": 0,
+    }
+
+  def _chain_height(self) -> int:
+    response = self._session.get(f"{self.node_url}/chain/info")
+    response.raise_for_status()
+    return int(response.json()["height"])
+
+  def _public_key_address(self, public_key: str) -> str:
+    address_hex = self._addresses.get(public_key)
+    if address_hex is None:
+      address_hex = self._addresses[public_key] = address_to_hex(
+        self.facade.network.public_key_to_address(
+          PublicKey(public_key)
+        )
+      )
+    return address_hex
+
+  # ---------- 取得 ----------
+
+  # 状態を持っていないアドレス（refreshの場合はすべて）をまとめて取得する
+  def load(
+    self, addresses: Iterable[Any], refresh: bool = False
+  ) -> None:
+    address_hexes = [address_to_hex(address) for address in addresses]
+    missing = list(dict.fromkeys(
+      address_hex
+      for address_hex in address_hexes
+      if refresh or address_hex not in self.accounts
+    ))
+    self.stats["hits"] += len(address_hexes) - len(missing)
+    for offset in range(0, len(missing), ACCOUNTS_BATCH_SIZE):
+      batch = missing[offset:offset + ACCOUNTS_BATCH_SIZE]
+      height_before = self._chain_height()
+      self.stats["requests"] += 1
+      response = self._session.post(
+        f"{self.node_url}/accounts", json={"addresses": batch}
+      )
+      response.raise_for_status()
+      height_after = self._chain_height()
+      found = set()
+      for info in response.json():
+        state = parse_account(info)
+        state.height_before = height_before
+        state.height_after = height_after
+        self.accounts[state.address] = state
+        found.add(state.address)
+      # ノードが知らないアドレス（一度も取引していない）は残高0とする
+      for address_hex in set(batch) - found:
+        self.accounts[address_hex] = AccountState(
+          address_hex, {}, 0, "", height_before=height_before,
+          height_after=height_after,
+        )
+
+  # loadを別スレッドで実行する（非同期のコードからはこちらを使い、イベントループを止めない）
+  async def load_async(
+    self, addresses: Iterable[Any], refresh: bool = False
+  ) -> None:
+    await asyncio.to_thread(self.load, list(addresses), refresh)
+
+  def get(self, address: Any) -> AccountState:
+    address_hex = address_to_hex(address)
+    self.load([address_hex])
+    return self.accounts[address_hex]
+
+  def invalidate(self, address_hex: str) -> None:
+    if self.accounts.pop(address_hex, None) is not None:
+      self.stats["invalidated"] += 1
+      if address_hex in self.addresses:
+        self._stale.add(address_hex)
+
+  # 承認済みの残高
+  def balance(
+    self, address: Any, mosaic_id: Optional[int] = None
+  ) -> int:
+    if mosaic_id is None:
+      mosaic_id = self.currency_mosaic_id
+    return self.get(address).balances.get(mosaic_id, 0)
+
+  # 承認待ちの自分の送金を差し引いた残高（モザイクID => 残高）
+  def optimistic_balances(self, address: Any) -> dict[int, int]:
+    address_hex = address_to_hex(address)
+    balances = dict(self.get(address_hex).balances)
+    self._expire_pending()
+    for pending in self.pending.values():
+      debits = pending.debits.get(address_hex, {})
+      for mosaic_id, amount in debits.items():
+        balances[mosaic_id] = balances.get(mosaic_id, 0) - amount
+    return balances
+
+  def optimistic_balance(
+    self, address: Any, mosaic_id: Optional[int] = None
+  ) -> int:
+    if mosaic_id is None:
+      mosaic_id = self.currency_mosaic_id
+    return self.optimistic_balances(address).get(mosaic_id, 0)
+
+  # 非同期のコードから使う版（持っていない状態は別スレッドで取得する）
+  async def balance_async(
+    self, address: Any, mosaic_id: Optional[int] = None
+  ) -> int:
+    await self.load_async([address])
+    return self.balance(address, mosaic_id)
+
+  async def optimistic_balances_async(
+    self, address: Any
+  ) -> dict[int, int]:
+    await self.load_async([address])
+    return self.optimistic_balances(address)
+
+  async def optimistic_balance_async(
+    self, address: Any, mosaic_id: Optional[int] = None
+  ) -> int:
+    await self.load_async([address])
+    return self.optimistic_balance(address, mosaic_id)
+
+  # ---------- 承認待ちの送金 ----------
+
+  # アナウンスするトランザクションの支出額を登録する（承認・失敗・期限切れで消える）
+  def reserve(self, transaction: Any) -> str:
+    hash = str(self.facade.hash_transaction(transaction))
+    debits: dict[str, dict[int, int]] = {}
+    signer = self._public_key_address(
+      str(transaction.signer_public_key)
+    )
+    _add(
+      debits, signer, self.currency_mosaic_id, transaction.fee.value
+    )
+    for embedded in getattr(transaction, "transactions", None) or [
+      transaction
+    ]:
+      if embedded.type_.value != TRANSFER_TRANSACTION_TYPE:
+        continue
+      source = self._public_key_address(
+        str(embedded.signer_public_key)
+      )
+      for mosaic in embedded.mosaics:
+        _add(
+          debits, source, mosaic.mosaic_id.value, mosaic.amount.value
+        )
+    self.pending[hash] = PendingTransfer(
+      debits, transaction.deadline.value
+    )
+    return hash
+
+  def _reserve_record(self, record: TransactionRecord) -> None:
+    hash = record.meta.hash
+    if hash is None or hash in self.pending or hash in self._applied:
+      return
+    debits: dict[str, dict[int, int]] = {}
+    signer = self._public_key_address(record.signer_public_key)
+    _add(debits, signer, self.currency_mosaic_id, record.fee)
+    for embedded in record.transactions or (record,):
+      if embedded.transfer is None:
+        continue
+      source = self._public_key_address(embedded.signer_public_key)
+      for mosaic in embedded.transfer.mosaics:
+        _add(debits, source, mosaic.id, mosaic.amount)
+    # 監視しているアカウントの支出を含むものだけ保持する
+    if self.addresses & debits.keys():
+      self.pending[hash] = PendingTransfer(debits, record.deadline)
+
+  def _expire_pending(self) -> None:
+    now = self.facade.now().timestamp
+    for hash in [
+      hash
+      for hash, pending in self.pending.items()
+      if pending.deadline <= now
+    ]:
+      del self.pending[hash]
+
+  # ---------- 承認済みトランザクションの反映 ----------
+
+  # 取得した状態に、このブロック高のトランザクションが含まれているかどうか（Noneは不明）
+  @staticmethod
+  def _includes(state: AccountState, height: int) -> Optional[bool]:
+    if height <= state.height_before:
+      return True
+    if height > state.height_after:
+      return False
+    return None
+
+  def _move(
+    self, address_hex: str, mosaic_id: int, amount: int, height: int
+  ) -> None:
+    state = self.accounts.get(address_hex)
+    if state is None:
+      return
+    included = self._includes(state, height)
+    if included is None:
+      self.invalidate(address_hex)
+    elif not included:
+      state.balances[mosaic_id] = (
+        state.balances.get(mosaic_id, 0) + amount
+      )
+
+  # 承認済みのトランザクションを反映する
+  # 送金と手数料は残高に反映し、それ以外（モザイクの作成・鍵のリンクなど）は署名者を無効化する
+  def apply_transaction(self, record: TransactionRecord) -> None:
+    hash = record.meta.hash
+    if hash is not None:
+      if hash in self._applied:
+        return
+      self._applied[hash] = None
+      if len(self._applied) > APPLIED_HASHES:
+        self._applied.popitem(last=False)
+      self.pending.pop(hash, None)
+    height = record.meta.height
+    signer = self._public_key_address(record.signer_public_key)
+    if record.size and record.meta.fee_multiplier:
+      fee = min(record.fee, record.size * record.meta.fee_multiplier)
+      self._move(signer, self.currency_mosaic_id, -fee, height)
+    else:
+      self.invalidate(signer)
+
+    for embedded in record.transactions or (record,):
+      source = self._public_key_address(embedded.signer_public_key)
+      transfer = embedded.transfer
+      if transfer is None:
+        self.invalidate(source)
+        continue
+      recipient = address_to_hex(transfer.recipient_address)
+      # ネームスペースで指定された宛先・モザイクは解決できないため取得し直す
+      if _is_alias(recipient) or any(
+        mosaic.id >> 63 for mosaic in transfer.mosaics
+      ):
+        self.invalidate(source)
+        if not _is_alias(recipient):
+          self.invalidate(recipient)
+        continue
+      for mosaic in transfer.mosaics:
+        self._move(source, mosaic.id, -mosaic.amount, height)
+        self._move(recipient, mosaic.id, mosaic.amount, height)
+    self.stats["applied"] += 1
+
+  def _on_event(self, channel: str, value: Any) -> None:
+    if channel == "confirmedAdded":
+      self.apply_transaction(value)
+    elif channel == "unconfirmedAdded":
+      self._reserve_record(value)
+    elif channel == "status" and isinstance(value, TransactionStatus):
+      # 失敗したトランザクションの支出は発生しない
+      self.pending.pop(value.hash, None)
+
+  # ---------- WebSocketでの監視 ----------
+
+  # 監視するアドレスを追加する（監視中なら購読も追加する）
+  async def track(self, addresses: Iterable[Any]) -> None:
+    new_addresses = {
+      address_to_hex(address) for address in addresses
+    } - self.addresses
+    self.addresses |= new_addresses
+    await self.load_async(new_addresses)
+    for address_hex in new_addresses:
+      await self._subscribe(address_hex)
+
+  async def _subscribe(self, address_hex: str) -> None:
+    if self._websocket is None:
+      return
+    address = str(self.facade.Address(bytes.fromhex(address_hex)))
+    for channel in ("confirmedAdded", "unconfirmedAdded", "status"):
+      await self._websocket.send(json.dumps({
+        "uid": self._websocket_uid,
+        "subscribe": f"{channel}/{address}",
+      }))
+
+  # 無効化された監視中のアドレスを、なくなるまで別スレッドで取得し直す
+  async def _refresh_stale(self) -> None:
+    while self._stale:
+      stale, self._stale = self._stale, set()
+      await self.load_async(stale)
+
+  # 監視するアドレスの承認・未承認のトランザクションを反映し続ける
+  # 接続していない間の変化は分からないため、接続し直したときはすべて取得し直す
+  # 反映できずに無効化したアドレスはここで取得し直し、参照するときに待たないようにする
+  async def watch(
+    self, ready: Optional[asyncio.Event] = None
+  ) -> None:
+    ws_endpoint = self.node_url.replace("http", "ws", 1) + "/ws"
+    async with connect(ws_endpoint) as websocket:
+      self._websocket_uid = json.loads(await websocket.recv())["uid"]
+      self._websocket = websocket
+      try:
+        for address_hex in self.addresses:
+          await self._subscribe(address_hex)
+        await self.load_async(self.addresses, True)
+        self.watching = True
+        if ready is not None:
+          ready.set()
+        async for message in websocket:
+          self._on_event(*parse_event(json.loads(message)))
+          if self._stale and (
+            self._refresh_task is None or self._refresh_task.done()
+          ):
+            self._refresh_task = asyncio.create_task(
+              self._refresh_stale()
+            )
+      finally:
+        self.watching = False
+        self._websocket = None
+        if self._refresh_task is not None:
+          self._refresh_task.cancel()
+          self._refresh_task = None
+
+
+def _add(
+  debits: dict[str, dict[int, int]],
+  address_hex: str,
+  mosaic_id: int,
+  amount: int,
+) -> None:
+  amounts = debits.setdefault(address_hex, {})
+  amounts[mosaic_id] = amounts.get(mosaic_id, 0) + amount
+
+
+async def main() -> None:
+  load_dotenv()
+  parser = argparse.ArgumentParser(
+    description="アカウントの残高を取得し、承認・未承認の送金を監視する"
+  )
+  parser.add_argument("addresses", nargs="+", help="アドレス")
+  args = parser.parse_args()
+
+  cache = AccountCache(os.getenv("NODE_URL") or "")
+  await cache.track(args.addresses)
+  ready = asyncio.Event()
+  task = asyncio.create_task(cache.watch(ready))
+  await ready.wait()
+  try:
+    while True:
+      for address in args.addresses:
+        print(
+          address,
+          "残高", await cache.balance_async(address),
+          "楽観的な残高", await cache.optimistic_balance_async(address),
+          "承認待ち", len(cache.pending),
+        )
+      await asyncio.sleep(5)
+  finally:
+    task.cancel()
+
+
+if __name__ == "__main__":
+  asyncio.run(main())
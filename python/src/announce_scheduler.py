@@ -0,0 +1,636 @@
+# 署名者ごと・ノードごとの送信レートを制御しながらトランザクションをアナウンスするスケジューラー
+# ノードの未承認プールは1人の署名者から大量に届いたトランザクションを捨てるため、
+# 署名者ごとのトークンバケットとノード全体のトークンバケットで送信を抑え、署名者間は順番に送る
+# ノードがエラーを返したり、未承認プールが一杯（Failure_Chain_Unconfirmed_Cache_Too_Full）と
+# 通知したりした場合はレートを下げ（乗算で減少）、成功が続く間は少しずつ上げる（加算で増加）
+# アナウンスしたトランザクションは承認・失敗までハッシュで追跡し、未承認プールから捨てられたものは
+# 同じ署名者の送信待ちに戻して再送する（submitのFutureは承認で完了し、拒否・失敗では例外になる）
+# 使い方: python src/announce_scheduler.py --count 1000
+import os
+import json
+import time
+import asyncio
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Optional
+import requests
+from dotenv import load_dotenv
+from websockets.legacy.client import connect
+from symbolchain.CryptoTypes import PrivateKey
+from symbolchain.facade.SymbolFacade import SymbolFacade
+from symbolchain.sc import TransactionFactory
+
+import metrics
+import crypto_backend
+from finalization_tracker import fetch_statuses
+from records import TransactionRecord, TransactionStatus, parse_event
+from send_tx import announce_endpoint, prepare_tx
+from signing_service import signing_account
+
+# 未承認プールが一杯であることを表す失敗コード
+FAILURE_UNCONFIRMED_CACHE_TOO_FULL = (
+  "Failure_Chain_Unconfirmed_Cache_Too_Full"
+)
+# ノードが混雑しているとみなすHTTPステータス（再送する）
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# 署名者ごとのレート（件/秒）の初期値・上限
+DEFAULT_SIGNER_RATE = 10.0
+DEFAULT_MAX_SIGNER_RATE = 100.0
+# ノード全体のレート（件/秒）の初期値・上限
+DEFAULT_NODE_RATE = 50.0
+DEFAULT_MAX_NODE_RATE = 1000.0
+# レートの下限
+DEFAULT_MIN_RATE = 0.5
+# 成功1秒分ごとに上げるレート（件/秒）と、混雑時にレートに掛ける値
+DEFAULT_INCREASE = 1.0
+DEFAULT_DECREASE = 0.5
+# 連続して混雑が通知されても、この時間（秒）に1回だけレートを下げる
+DEFAULT_COOLDOWN = 1.0
+# 署名者ごとに待たせておけるトランザクション数（超えるとsubmitが待つ）
+DEFAULT_MAX_QUEUE = 100
+# 同時に送信中にできるリクエスト数
+DEFAULT_MAX_IN_FLIGHT = 16
+# HTTPエラー・接続エラーで再送する回数
+DEFAULT_MAX_RETRIES = 5
+# 未承認プールから捨てられたトランザクションを再送する回数
+DEFAULT_MAX_POOL_RETRIES = 20
+# 承認・失敗の通知がないトランザクションのステータスを問い合わせる間隔（秒）
+DEFAULT_STATUS_INTERVAL = 10.0
+
+
+class TokenBucket:
+  """一定のレートでトークンが溜まるバケット（レートは加算増加・乗算減少で変える）"""
+
+  def __init__(
+    self,
+    rate: float,
+    max_rate: float,
+    min_rate: float = DEFAULT_MIN_RATE,
+    burst: Optional[float] = None,
+  ) -> None:
+    self.rate = rate
+    self.max_rate = max_rate
+    self.min_rate = min_rate
+    # 溜められるトークンの上限（省略時は1秒分）
+    self.burst = burst
+    self.tokens = self.capacity
+    self.updated = time.monotonic()
+    self.decreased_at = float("-inf")
+
+  @property
+  def capacity(self) -> float:
+    return self.burst if self.burst is not None else max(self.rate, 1)
+
+  def _refill(self, now: float) -> None:
+    self.tokens = min(
+      self.capacity, self.tokens + (now - self.updated) * self.rate
+    )
+    self.updated = now
+
+  # 次のトークンが使えるまでの時間（秒）
+  def delay(self, now: float) -> float:
+    self._refill(now)
+    return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+  def take(self, now: float) -> None:
+    self._refill(now)
+    self.tokens -= 1
+
+  # 成功1件ごとに呼ぶ（1秒分成功するとincreaseだけ上がる）
+  def increase(self, step: float) -> None:
+    self.rate = min(self.max_rate, self.rate + step / self.rate)
+
+  def decrease(
+    self, factor: float, cooldown: float, now: float
+  ) -> bool:
+    if now - self.decreased_at < cooldown:
+      return False
+    self.rate = max(self.min_rate, self.rate * factor)
+    self.tokens = min(self.tokens, self.capacity)
+    self.decreased_at = now
+    return True
+
+
+@dataclass
+class _Announcement:
+  """送信待ち・承認待ちのトランザクション"""
+
+  json_payload: str
+  signer: str
+  hash: str
+  deadline: int
+  future: asyncio.Future
+  # アナウンス先のエンドポイント（send_tx.announce_endpoint）
+  endpoint: str
+  attempts: int = 0
+  pool_retries: int = 0
+  announced_at: float = 0.0
+
+
+@dataclass
+class _Signer:
+  """署名者ごとの送信待ちの列とバケット"""
+
+  bucket: TokenBucket
+  slots: asyncio.Semaphore
+  queue: deque = field(default_factory=deque)
+
+
+class AnnounceScheduler:
+  """署名者ごと・ノードごとのレートを守りながら、署名者の間で公平にアナウンスする"""
+
+  def __init__(
+    self,
+    node_url: Optional[str] = None,
+    signer_rate: float = DEFAULT_SIGNER_RATE,
+    max_signer_rate: float = DEFAULT_MAX_SIGNER_RATE,
+    node_rate: float = DEFAULT_NODE_RATE,
+    max_node_rate: float = DEFAULT_MAX_NODE_RATE,
+    min_rate: float = DEFAULT_MIN_RATE,
+    increase: float = DEFAULT_INCREASE,
+    decrease: float = DEFAULT_DECREASE,
+    cooldown: float = DEFAULT_COOLDOWN,
+    max_queue: int = DEFAULT_MAX_QUEUE,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    max_pool_retries: int = DEFAULT_MAX_POOL_RETRIES,
+    status_interval: float = DEFAULT_STATUS_INTERVAL,
+    watch_status: bool = True,
+    facade: Optional[SymbolFacade] = None,
+  ) -> None:
+    self.node_url = node_url or os.getenv("NODE_URL") or ""
+    self.signer_rate = signer_rate
+    self.max_signer_rate = max_signer_rate
+    self.min_rate = min_rate
+    self.increase = increase
+    self.decrease = decrease
+    self.cooldown = cooldown
+    self.max_queue = max_queue
+    self.max_retries = max_retries
+    self.max_pool_retries = max_pool_retries
+    self.status_interval = status_interval
+    # WebSocketで承認・失敗を追跡する（Falseの場合はノードが受け付けた時点で完了とする）
+    self.watch_status = watch_status
+    self.facade = facade or SymbolFacade("testnet")
+    self.node_bucket = TokenBucket(node_rate, max_node_rate, min_rate)
+    # 署名者のアドレス => 送信待ちの列とバケット
+    self.signers: dict[str, _Signer] = {}
+    # 送信待ちがある署名者（先頭から順番に送る）
+    self._active: deque[str] = deque()
+    # ハッシュ => ノードが受け付け、承認・失敗を待っているトランザクション
+    self._announced: dict[str, _Announcement] = {}
+    self._wakeup = asyncio.Event()
+    self._in_flight = asyncio.Semaphore(max_in_flight)
+    self._pending = 0
+    self._idle = asyncio.Event()
+    self._idle.set()
+    self._executor = ThreadPoolExecutor(max_in_flight)
+    self._local = threading.local()
+    self._tasks: list[asyncio.Task] = []
+    self._websocket: Any = None
+    self._websocket_uid: Optional[str] = None
+    self.stats = {
+      "submitted": 0,
+      "announced": 0,
+      "confirmed": 0,
+      "retried": 0,
+      "requeued": 0,
+      "rejected": 0,
+      "failed": 0,
+      "pool_full": 0,
+      "decreases": 0,
+    }
+
+  async def __aenter__(self) -> "AnnounceScheduler":
+    await self.start()
+    return self
+
+  async def __aexit__(self, *exc_info: Any) -> None:
+    await self.close()
+
+  async def start(self) -> None:
+    self._tasks.append(asyncio.create_task(self._dispatch()))
+    if self.watch_status:
+      ready = asyncio.get_running_loop().create_future()
+      self._tasks.append(asyncio.create_task(self._listen(ready)))
+      await ready
+      self._tasks.append(asyncio.create_task(self._poll_statuses()))
+
+  # 送信待ちがなくなるまで待ってから停止する
+  async def close(self) -> None:
+    await self.drain()
+    for task in self._tasks:
+      task.cancel()
+    await asyncio.gather(*self._tasks, return_exceptions=True)
+    self._executor.shutdown()
+
+  async def drain(self) -> None:
+    await self._idle.wait()
+
+  # 送信待ちに追加し、トランザクションハッシュを結果とするFutureを返す
+  # 署名者の送信待ち・承認待ちが一杯の場合は空くまで待つ（呼び出し側の生成を抑える）
+  async def submit(
+    self, json_payload: str, signer: str
+  ) -> asyncio.Future:
+    transaction = TransactionFactory.deserialize(
+      bytes.fromhex(json.loads(json_payload)["payload"])
+    )
+    state = await self._signer(signer)
+    await state.slots.acquire()
+    future = asyncio.get_running_loop().create_future()
+    state.queue.append(_Announcement(
+      json_payload,
+      signer,
+      str(self.facade.hash_transaction(transaction)),
+      transaction.deadline.value,
+      future,
+      announce_endpoint(transaction),
+    ))
+    self.stats["submitted"] += 1
+    self._pending += 1
+    self._idle.clear()
+    if signer not in self._active:
+      self._active.append(signer)
+    self._wakeup.set()
+    return future
+
+  # アナウンスし、承認されたらトランザクションハッシュを返す
+  async def announce(self, json_payload: str, signer: str) -> str:
+    return await (await self.submit(json_payload, signer))
+
+  async def _signer(self, signer: str) -> _Signer:
+    state = self.signers.get(signer)
+    if state is None:
+      state = self.signers[signer] = _Signer(
+        TokenBucket(
+          self.signer_rate, self.max_signer_rate, self.min_rate
+        ),
+        asyncio.Semaphore(self.max_queue),
+      )
+      await self._subscribe(signer)
+    return state
+
+  # ---------- 送信 ----------
+
+  async def _dispatch(self) -> None:
+    while True:
+      if not self._active:
+        self._wakeup.clear()
+        await self._wakeup.wait()
+        continue
+      await self._in_flight.acquire()
+      now = time.monotonic()
+      wait = self.node_bucket.delay(now)
+      chosen = None
+      if wait == 0:
+        # 前回送った署名者の次から順に、トークンのある署名者を探す
+        wait = float("inf")
+        for _ in range(len(self._active)):
+          signer = self._active[0]
+          self._active.rotate(-1)
+          signer_wait = self.signers[signer].bucket.delay(now)
+          if signer_wait == 0:
+            chosen = signer
+            break
+          wait = min(wait, signer_wait)
+      if chosen is None:
+        self._in_flight.release()
+        self._wakeup.clear()
+        try:
+          await asyncio.wait_for(self._wakeup.wait(), wait)
+        except asyncio.TimeoutError:
+          pass
+        continue
+
+      state = self.signers[chosen]
+      announcement = state.queue.popleft()
+      if not state.queue:
+        self._active.remove(chosen)
+      self.node_bucket.take(now)
+      state.bucket.take(now)
+      asyncio.create_task(self._send(announcement))
+
+  def _session(self) -> requests.Session:
+    session = getattr(self._local, "session", None)
+    if session is None:
+      session = self._local.session = requests.Session()
+    return session
+
+  def _put(self, json_payload: str, endpoint: str) -> tuple[int, Any]:
+    with metrics.span("announce"):
+      response = self._session().put(
+        f"{self.node_url}{endpoint}",
+        headers={"Content-Type": "application/json"},
+        data=json_payload,
+      )
+    metrics.increment(
+      "symbol_announce_total", status=response.status_code
+    )
+    try:
+      return response.status_code, response.json()
+    except ValueError:
+      return response.status_code, None
+
+  async def _send(self, announcement: _Announcement) -> None:
+    state = self.signers[announcement.signer]
+    announcement.attempts += 1
+    try:
+      status, body = await asyncio.get_running_loop().run_in_executor(
+        self._executor,
+        self._put,
+        announcement.json_payload,
+        announcement.endpoint,
+      )
+    except requests.RequestException as e:
+      status, body = None, e
+    finally:
+      self._in_flight.release()
+
+    if status is not None and status < 300:
+      self.stats["announced"] += 1
+      self.node_bucket.increase(self.increase)
+      state.bucket.increase(self.increase)
+      if self.watch_status:
+        announcement.announced_at = time.monotonic()
+        self._announced[announcement.hash] = announcement
+      else:
+        self._finish(announcement, state, result=announcement.hash)
+    elif status is None or status in RETRY_STATUS_CODES:
+      # ノードの混雑：レートを下げ、同じ署名者の先頭に戻して再送する
+      self._slow_down(self.node_bucket)
+      if announcement.attempts <= self.max_retries:
+        self.stats["retried"] += 1
+        self._requeue(announcement)
+      else:
+        self.stats["failed"] += 1
+        self._finish(
+          announcement,
+          state,
+          error=Exception(f"アナウンスに失敗しました: {status} {body}"),
+        )
+    else:
+      # ペイロードの誤りなど、再送しても受け付けられないもの
+      self.stats["rejected"] += 1
+      self._finish(
+        announcement,
+        state,
+        error=Exception(f"アナウンスが拒否されました: {status} {body}"),
+      )
+    self._wakeup.set()
+
+  # 同じ署名者の送信待ちの先頭に戻す
+  def _requeue(self, announcement: _Announcement) -> None:
+    self.signers[announcement.signer].queue.appendleft(announcement)
+    if announcement.signer not in self._active:
+      self._active.append(announcement.signer)
+    self._wakeup.set()
+
+  def _finish(
+    self,
+    announcement: _Announcement,
+    state: _Signer,
+    result: Any = None,
+    error: Optional[BaseException] = None,
+  ) -> None:
+    if not announcement.future.done():
+      if error is not None:
+        announcement.future.set_exception(error)
+      else:
+        announcement.future.set_result(result)
+    state.slots.release()
+    self._pending -= 1
+    if self._pending == 0:
+      self._idle.set()
+
+  def _slow_down(self, bucket: TokenBucket) -> None:
+    now = time.monotonic()
+    if bucket.decrease(self.decrease, self.cooldown, now):
+      self.stats["decreases"] += 1
+      metrics.increment("symbol_announce_rate_decrease_total")
+
+  # ---------- 未承認プールの混雑の検知 ----------
+
+  async def _listen(self, ready: asyncio.Future) -> None:
+    ws_endpoint = self.node_url.replace("http", "ws", 1) + "/ws"
+    try:
+      async with connect(ws_endpoint, max_queue=None) as websocket:
+        message = json.loads(await websocket.recv())
+        self._websocket_uid = message["uid"]
+        self._websocket = websocket
+        for signer in self.signers:
+          await self._subscribe(signer)
+        ready.set_result(None)
+        while True:
+          channel, value = parse_event(
+            json.loads(await websocket.recv())
+          )
+          if isinstance(value, TransactionStatus):
+            self._on_status(value)
+          elif channel == "confirmedAdded" and isinstance(
+            value, TransactionRecord
+          ):
+            self._on_confirmed(value.meta.hash or "")
+    except Exception as e:
+      if not ready.done():
+        ready.set_exception(e)
+      raise
+    finally:
+      self._websocket = None
+
+  async def _subscribe(self, signer: str) -> None:
+    if self._websocket is None:
+      return
+    for channel in ("status", "confirmedAdded"):
+      await self._websocket.send(json.dumps({
+        "uid": self._websocket_uid, "subscribe": f"{channel}/{signer}"
+      }))
+
+  def _on_confirmed(self, hash: str) -> None:
+    announcement = self._announced.pop(hash.upper(), None)
+    if announcement is None:
+      return
+    self.stats["confirmed"] += 1
+    self._finish(
+      announcement,
+      self.signers[announcement.signer],
+      result=announcement.hash,
+    )
+
+  def _on_status(self, status: TransactionStatus) -> None:
+    announcement = self._announced.pop(status.hash.upper(), None)
+    if status.code == FAILURE_UNCONFIRMED_CACHE_TOO_FULL:
+      # 署名者ごとの上限による破棄と区別できないため、署名者とノードの両方のレートを下げる
+      self.stats["pool_full"] += 1
+      if announcement is not None:
+        self._slow_down(self.signers[announcement.signer].bucket)
+      self._slow_down(self.node_bucket)
+    if announcement is not None:
+      self._on_failure(announcement, status.code)
+
+  # 未承認プールから捨てられたものは再送し、それ以外の失敗はFutureを例外にする
+  def _on_failure(
+    self, announcement: _Announcement, code: str
+  ) -> None:
+    if (
+      code == FAILURE_UNCONFIRMED_CACHE_TOO_FULL
+      and announcement.pool_retries < self.max_pool_retries
+      and announcement.deadline > self.facade.now().timestamp
+    ):
+      announcement.pool_retries += 1
+      self.stats["requeued"] += 1
+      self._requeue(announcement)
+      return
+    self.stats["failed"] += 1
+    self._finish(
+      announcement,
+      self.signers[announcement.signer],
+      error=Exception(f"トランザクションが失敗しました: {code}"),
+    )
+
+  # 通知を取りこぼした場合に備え、しばらく結果が分からないものはステータスを問い合わせる
+  async def _poll_statuses(self) -> None:
+    while True:
+      await asyncio.sleep(self.status_interval)
+      now = time.monotonic()
+      stale = [
+        announcement
+        for announcement in self._announced.values()
+        if now - announcement.announced_at >= self.status_interval
+      ]
+      if not stale:
+        continue
+      try:
+        statuses = await asyncio.to_thread(
+          fetch_statuses,
+          self.node_url,
+          [announcement.hash for announcement in stale],
+        )
+      except requests.RequestException as e:
+        print("ステータスの取得エラー:", e)
+        continue
+      for announcement in stale:
+        if self._announced.get(announcement.hash) is not announcement:
+          continue
+        status = statuses.get(announcement.hash)
+        if status is None:
+          # ノードが記録していない（未承認プールから捨てられた）ものは再送する
+          del self._announced[announcement.hash]
+          self._on_failure(
+            announcement, FAILURE_UNCONFIRMED_CACHE_TOO_FULL
+          )
+        elif status.group == "confirmed":
+          self._on_confirmed(announcement.hash)
+        elif status.group == "failed":
+          del self._announced[announcement.hash]
+          self._on_failure(announcement, status.code)
+
+  # 現在のレート（件/秒）
+  def rates(self) -> dict[str, float]:
+    return {
+      "node": self.node_bucket.rate,
+      **{
+        signer: state.bucket.rate
+        for signer, state in self.signers.items()
+      },
+    }
+
+
+async def run(args: argparse.Namespace) -> None:
+  load_dotenv()
+  facade = SymbolFacade("testnet")
+  if args.random_accounts:
+    accounts = [
+      crypto_backend.create_account(facade, PrivateKey.random())
+      for _ in range(args.random_accounts)
+    ]
+  else:
+    accounts = [
+      signing_account(facade, name)
+      for name in ("PRIVATE_KEY_A", "PRIVATE_KEY_B")
+    ]
+  deadline = facade.now().add_hours(2).timestamp
+
+  def build(sequence: int) -> tuple[str, str]:
+    signer = accounts[sequence % len(accounts)]
+    recipient = accounts[(sequence + 1) % len(accounts)]
+    tx = facade.transaction_factory.create({
+      "type": "transfer_transaction_v1",
+      "signer_public_key": signer.public_key,
+      "deadline": deadline,
+      "recipient_address": recipient.address,
+      "message": b"\0scheduler " + str(sequence).encode(),
+    })
+    json_payload, _ = prepare_tx(tx, signer, facade)
+    return json_payload, str(signer.address)
+
+  scheduler = AnnounceScheduler(
+    signer_rate=args.signer_rate,
+    node_rate=args.node_rate,
+    max_in_flight=args.concurrency,
+  )
+  started = time.perf_counter()
+  async with scheduler:
+    futures = [
+      await scheduler.submit(*build(sequence))
+      for sequence in range(args.count)
+    ]
+    results = await asyncio.gather(*futures, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+  errors = [
+    result for result in results if isinstance(result, Exception)
+  ]
+  print(
+    f"承認 {args.count - len(errors)}件 失敗 {len(errors)}件 "
+    f"{elapsed:.1f}秒 {(args.count - len(errors)) / elapsed:.1f} tx/s"
+  )
+  for error in errors[:5]:
+    print("失敗", error)
+  print("結果", scheduler.stats)
+  print(
+    "最終レート",
+    {
+      name: round(rate, 1)
+      for name, rate in scheduler.rates().items()
+    },
+  )
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="スケジューラーを使ってトランザクションをアナウンスする"
+  )
+  parser.add_argument(
+    "--count", type=int, default=1000, help="送信するトランザクション数"
+  )
+  parser.add_argument(
+    "--random-accounts",
+    type=int,
+    help="ランダムなアカウントを指定数作って送る（ローカルノード用）",
+  )
+  parser.add_argument(
+    "--signer-rate",
+    type=float,
+    default=DEFAULT_SIGNER_RATE,
+    help="署名者ごとのレートの初期値（件/秒）",
+  )
+  parser.add_argument(
+    "--node-rate",
+    type=float,
+    default=DEFAULT_NODE_RATE,
+    help="ノード全体のレートの初期値（件/秒）",
+  )
+  parser.add_argument(
+    "--concurrency",
+    type=int,
+    default=DEFAULT_MAX_IN_FLIGHT,
+    help="同時に送信中にできるリクエスト数",
+  )
+  asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+  main()
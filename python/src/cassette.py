@@ -0,0 +1,473 @@
+# ノードとのHTTP・WebSocketの通信を記録し、ノードなしで同じ通信を再生するコード
+# requests.Session.send（requests.get・put・postなどすべて）とwebsocketsのconnectを差し替える
+# 記録はgzipで圧縮したJSON Lines（1行1件）で、再生時は記録時の応答時間を倍率を掛けて再現できる
+# 使い方: python src/cassette.py record cassettes/3_3.jsonl.gz src/3_3_transaction.py
+#        python src/cassette.py replay cassettes/3_3.jsonl.gz src/3_3_transaction.py --latency 0
+#        CASSETTE=cassettes/3_3.jsonl.gz CASSETTE_MODE=record ./symbol-book 3_3（symbol-bookから使う場合）
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import atexit
+import base64
+import asyncio
+import hashlib
+import runpy
+import argparse
+import threading
+from collections import deque
+from typing import Any, Optional
+from urllib.parse import urlsplit
+import requests
+import websockets.legacy.client
+from websockets.exceptions import ConnectionClosedOK
+
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+# 再生時に、ハッシュ・アドレス・公開鍵などが記録と異なっても同じ種類のリクエストとみなすための置き換え
+_VARIABLE_PATTERN = re.compile(r"[0-9A-Fa-f]{16,}|T[A-Z2-7]{38}")
+# 記録する応答ヘッダー（展開後の本文を保存するため、圧縮・長さのヘッダーは捨てる）
+_KEPT_HEADERS = ("Content-Type",)
+
+# 元の実装（uninstallで戻す）
+_original_send = requests.Session.send
+_original_connect = websockets.legacy.client.connect
+
+
+class CassetteError(Exception):
+  """再生する記録が見つからない"""
+
+
+def _body_hash(body: Any) -> str:
+  if body is None:
+    return ""
+  if isinstance(body, str):
+    body = body.encode("utf-8")
+  return hashlib.sha256(body).hexdigest()[:16]
+
+
+# ノードのURLが記録時と異なっても再生できるよう、パスとクエリだけで照合する
+def _target(url: str) -> str:
+  parts = urlsplit(url)
+  return parts.path + (f"?{parts.query}" if parts.query else "")
+
+
+def _encode_content(content: bytes) -> dict:
+  try:
+    return {"text": content.decode("utf-8")}
+  except UnicodeDecodeError:
+    return {"base64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_content(entry: dict) -> bytes:
+  if "text" in entry:
+    return entry["text"].encode("utf-8")
+  return base64.b64decode(entry["base64"])
+
+
+class Cassette:
+  """HTTPのリクエストと応答、WebSocketのフレームを記録・再生する"""
+
+  def __init__(
+    self, path: str, mode: str, latency: Optional[float] = None
+  ) -> None:
+    if mode not in (MODE_RECORD, MODE_REPLAY):
+      raise ValueError(f"不明なモードです: {mode}")
+    self.path = path
+    self.mode = mode
+    # 再生時に記録時の応答時間に掛ける倍率（Noneまたは0なら待たない）
+    self.latency = latency
+    self._lock = threading.Lock()
+    self._sequence = 0
+    self._connections = 0
+    self._file: Any = None
+    # 再生用: 照合キー => 記録の列
+    self._http: dict[tuple, deque] = {}
+    # 再生用: 接続先 => 接続ごとの記録の列
+    self._websockets: dict[str, deque] = {}
+    # 再生用: 記録の通し番号 => それより前に記録されたHTTPの件数
+    self._http_before: dict[int, int] = {}
+    self._http_replayed = 0
+    self.stats = {"http": 0, "websocket_frames": 0, "misses": 0}
+
+  # ---------- 記録 ----------
+
+  def _write(self, entry: dict) -> None:
+    with self._lock:
+      entry["seq"] = self._sequence
+      self._sequence += 1
+      if self._file is None:
+        directory = os.path.dirname(self.path)
+        if directory:
+          os.makedirs(directory, exist_ok=True)
+        self._file = gzip.open(self.path, "wt", encoding="utf-8")
+      self._file.write(
+        json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+        + "\n"
+      )
+
+  def close(self) -> None:
+    with self._lock:
+      if self._file is not None:
+        self._file.close()
+        self._file = None
+
+  def _record_http(
+    self,
+    request: requests.PreparedRequest,
+    response: requests.Response,
+  ) -> None:
+    self.stats["http"] += 1
+    self._write({
+      "type": "http",
+      "method": request.method,
+      "url": _target(request.url or ""),
+      "body": _body_hash(request.body),
+      "status": response.status_code,
+      "reason": response.reason,
+      "headers": {
+        name: response.headers[name]
+        for name in _KEPT_HEADERS
+        if name in response.headers
+      },
+      "elapsed": response.elapsed.total_seconds(),
+      **_encode_content(response.content),
+    })
+
+  def _open_websocket(self, uri: str) -> int:
+    with self._lock:
+      connection = self._connections
+      self._connections += 1
+    self._write({
+      "type": "ws_open", "uri": _target(uri), "conn": connection
+    })
+    return connection
+
+  def _record_frame(
+    self, connection: int, direction: str, data: Any, offset: float
+  ) -> None:
+    self.stats["websocket_frames"] += 1
+    frame = (
+      {"text": data}
+      if isinstance(data, str)
+      else {"base64": base64.b64encode(data).decode("ascii")}
+    )
+    self._write({
+      "type": "ws",
+      "conn": connection,
+      "dir": direction,
+      "t": round(offset, 6),
+      **frame,
+    })
+
+  # ---------- 再生 ----------
+
+  @staticmethod
+  def _keys(method: str, url: str, body: str) -> list[tuple]:
+    return [
+      ("body", method, url, body),
+      ("url", method, url),
+      ("pattern", method, _VARIABLE_PATTERN.sub("*", url)),
+    ]
+
+  def load(self) -> None:
+    connections: dict[int, deque] = {}
+    http_count = 0
+    with gzip.open(self.path, "rt", encoding="utf-8") as file:
+      for line in file:
+        entry = json.loads(line)
+        self._http_before[entry["seq"]] = http_count
+        if entry["type"] == "http":
+          http_count += 1
+          for key in self._keys(
+            entry["method"], entry["url"], entry["body"]
+          ):
+            self._http.setdefault(key, deque()).append(entry)
+        elif entry["type"] == "ws_open":
+          connections[entry["conn"]] = deque()
+          self._websockets.setdefault(entry["uri"], deque()).append(
+            connections[entry["conn"]]
+          )
+        elif entry["dir"] == "recv":
+          connections[entry["conn"]].append(entry)
+
+  # 照合キーの優先順に、まだ返していない記録を探す
+  # すべて返し終えていれば最後の1件を返し続ける（ステータスのポーリングなど）
+  def _take(self, keys: list[tuple]) -> Optional[dict]:
+    last = None
+    for key in keys:
+      entries = self._http.get(key)
+      if not entries:
+        continue
+      while len(entries) > 1 and entries[0].get("used"):
+        entries.popleft()
+      if not entries[0].get("used"):
+        entry = entries.popleft() if len(entries) > 1 else entries[0]
+        entry["used"] = True
+        return entry
+      last = last or entries[0]
+    return last
+
+  def _replay_http(
+    self, request: requests.PreparedRequest
+  ) -> requests.Response:
+    method = request.method or "GET"
+    url = request.url or ""
+    keys = self._keys(method, _target(url), _body_hash(request.body))
+    with self._lock:
+      entry = self._take(keys)
+      if entry is None:
+        self.stats["misses"] += 1
+        raise CassetteError(f"記録がありません: {method} {url}")
+      self._http_replayed += 1
+      self.stats["http"] += 1
+    if self.latency:
+      time.sleep(entry["elapsed"] * self.latency)
+
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.reason = entry["reason"]
+    response.headers.update(entry["headers"])
+    response._content = _decode_content(entry)
+    response.encoding = "utf-8"
+    response.url = url
+    response.request = request
+    return response
+
+  def _next_connection(self, uri: str) -> deque:
+    with self._lock:
+      connections = self._websockets.get(_target(uri))
+      if not connections:
+        self.stats["misses"] += 1
+        raise CassetteError(f"記録がありません: WebSocket {uri}")
+      return connections.popleft()
+
+  # 記録時にこのフレームより前に行われたHTTPの通信が、再生でも終わるまで待つ
+  async def _wait_for_http(self, frame: dict) -> None:
+    while self._http_replayed < self._http_before[frame["seq"]]:
+      await asyncio.sleep(0.001)
+
+  # ---------- 差し替え ----------
+
+  def send(
+    self,
+    session: requests.Session,
+    request: requests.PreparedRequest,
+    **kwargs: Any,
+  ) -> requests.Response:
+    if self.mode == MODE_REPLAY:
+      return self._replay_http(request)
+    response = _original_send(session, request, **kwargs)
+    self._record_http(request, response)
+    return response
+
+  def connect(self, uri: str, **kwargs: Any) -> Any:
+    if self.mode == MODE_REPLAY:
+      return _ReplayConnect(self, uri)
+    return _RecordConnect(self, uri, **kwargs)
+
+
+class _RecordingWebSocket:
+  """実際のWebSocketを包み、送受信したフレームを記録する"""
+
+  def __init__(
+    self, cassette: Cassette, websocket: Any, connection: int
+  ) -> None:
+    self._cassette = cassette
+    self._websocket = websocket
+    self._connection = connection
+    self._opened = time.monotonic()
+
+  def _record(self, direction: str, data: Any) -> None:
+    offset = time.monotonic() - self._opened
+    self._cassette._record_frame(
+      self._connection, direction, data, offset
+    )
+
+  async def recv(self) -> Any:
+    data = await self._websocket.recv()
+    self._record("recv", data)
+    return data
+
+  async def send(self, data: Any) -> None:
+    self._record("send", data)
+    await self._websocket.send(data)
+
+  def __aiter__(self) -> "_RecordingWebSocket":
+    return self
+
+  async def __anext__(self) -> Any:
+    try:
+      return await self.recv()
+    except ConnectionClosedOK:
+      raise StopAsyncIteration
+
+  def __getattr__(self, name: str) -> Any:
+    return getattr(self._websocket, name)
+
+
+class _RecordConnect:
+  def __init__(
+    self, cassette: Cassette, uri: str, **kwargs: Any
+  ) -> None:
+    self._cassette = cassette
+    self._uri = uri
+    self._connect = _original_connect(uri, **kwargs)
+
+  async def __aenter__(self) -> _RecordingWebSocket:
+    websocket = await self._connect.__aenter__()
+    connection = self._cassette._open_websocket(self._uri)
+    return _RecordingWebSocket(self._cassette, websocket, connection)
+
+  async def __aexit__(self, *exc_info: Any) -> Any:
+    return await self._connect.__aexit__(*exc_info)
+
+
+class _ReplayWebSocket:
+  """記録したフレームを順番に返すWebSocket（送信したフレームは捨てる）"""
+
+  def __init__(self, cassette: Cassette, frames: deque) -> None:
+    self._cassette = cassette
+    self._frames = frames
+    self._opened = time.monotonic()
+    self.closed = False
+
+  async def recv(self) -> Any:
+    if not self._frames:
+      self.closed = True
+      raise ConnectionClosedOK(None, None)
+    frame = self._frames.popleft()
+    await self._cassette._wait_for_http(frame)
+    if self._cassette.latency:
+      delay = (
+        frame["t"] * self._cassette.latency
+        - (time.monotonic() - self._opened)
+      )
+      if delay > 0:
+        await asyncio.sleep(delay)
+    self._cassette.stats["websocket_frames"] += 1
+    if "text" in frame:
+      return frame["text"]
+    return base64.b64decode(frame["base64"])
+
+  async def send(self, data: Any) -> None:
+    if self.closed:
+      raise ConnectionClosedOK(None, None)
+
+  async def close(self) -> None:
+    self.closed = True
+
+  def __aiter__(self) -> "_ReplayWebSocket":
+    return self
+
+  async def __anext__(self) -> Any:
+    try:
+      return await self.recv()
+    except ConnectionClosedOK:
+      raise StopAsyncIteration
+
+
+class _ReplayConnect:
+  def __init__(self, cassette: Cassette, uri: str) -> None:
+    self._cassette = cassette
+    self._uri = uri
+
+  async def __aenter__(self) -> _ReplayWebSocket:
+    frames = self._cassette._next_connection(self._uri)
+    return _ReplayWebSocket(self._cassette, frames)
+
+  async def __aexit__(self, *exc_info: Any) -> None:
+    return None
+
+
+_installed: Optional[Cassette] = None
+
+
+# requestsとwebsocketsの通信を差し替える
+# websocketsのconnectは、差し替えた後にインポートしたモジュールにだけ効く
+def install(
+  path: str, mode: str, latency: Optional[float] = None
+) -> Cassette:
+  global _installed
+  uninstall()
+  cassette = Cassette(path, mode, latency)
+  if mode == MODE_REPLAY:
+    cassette.load()
+
+  def send(
+    session: requests.Session,
+    request: requests.PreparedRequest,
+    **kwargs: Any,
+  ) -> requests.Response:
+    return cassette.send(session, request, **kwargs)
+
+  requests.Session.send = send  # type: ignore
+  websockets.legacy.client.connect = cassette.connect  # type: ignore
+  atexit.register(cassette.close)
+  _installed = cassette
+  return cassette
+
+
+def uninstall() -> None:
+  global _installed
+  if _installed is None:
+    return
+  requests.Session.send = _original_send  # type: ignore
+  websockets.legacy.client.connect = _original_connect  # type: ignore
+  _installed.close()
+  _installed = None
+
+
+# 環境変数 CASSETTE・CASSETTE_MODE（record・replay）・CASSETTE_LATENCY が指定されていれば差し替える
+def install_from_env() -> Optional[Cassette]:
+  path = os.getenv("CASSETTE")
+  if not path:
+    return None
+  latency = os.getenv("CASSETTE_LATENCY")
+  return install(
+    path,
+    os.getenv("CASSETTE_MODE") or MODE_REPLAY,
+    float(latency) if latency else None,
+  )
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="スクリプトの通信を記録・再生しながら実行する"
+  )
+  parser.add_argument("mode", choices=(MODE_RECORD, MODE_REPLAY))
+  parser.add_argument("path", help="記録ファイル（.jsonl.gz）")
+  parser.add_argument("script", help="実行するスクリプト")
+  parser.add_argument(
+    "--latency",
+    type=float,
+    default=None,
+    help="再生時に記録時の応答時間に掛ける倍率（省略時は待たない）",
+  )
+  args, script_args = parser.parse_known_args()
+
+  cassette = install(args.path, args.mode, args.latency)
+  sys.argv = [args.script, *script_args]
+  sys.path.insert(0, os.path.dirname(os.path.abspath(args.script)))
+  wall_started = time.monotonic()
+  cpu_started = time.process_time()
+  try:
+    runpy.run_path(args.script, run_name="__main__")
+  finally:
+    cassette.close()
+    print(
+      f"cassette {args.mode}",
+      f"HTTP {cassette.stats['http']}",
+      f"WebSocket {cassette.stats['websocket_frames']}",
+      f"記録なし {cassette.stats['misses']}",
+      f"全体 {time.monotonic() - wall_started:.3f}秒",
+      f"CPU {time.process_time() - cpu_started:.3f}秒",
+      file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,404 @@
+# 承認済みトランザクションの履歴を列ごとの型付き配列に変換し、列指向のファイルに書き出すコード
+# ページごとに取得して一定行数ずつ書き出すため、件数が増えてもメモリ使用量は変わらない
+# 使い方: python src/columnar_export.py history.symcol --address <アドレス>
+#        python src/columnar_export.py history.symcol --read（書き出したファイルの集計を表示する）
+#
+# ファイル形式（数値はリトルエンディアン）
+#   先頭: MAGIC
+#   チャンク: 列ごとのデータ（arrayの生のバイト列、--compressの場合はzlibで圧縮）を順に並べる
+#   末尾: フッター（列の定義・チャンクごとの行数と各列の位置のJSON）、フッターの長さ（uint32）、MAGIC
+import os
+import sys
+import json
+import zlib
+import struct
+import argparse
+from array import array
+from typing import Any, BinaryIO, Iterable, Iterator, Optional
+import requests
+from dotenv import load_dotenv
+from symbolchain.CryptoTypes import PublicKey
+from symbolchain.facade.SymbolFacade import SymbolFacade
+from symbolchain.symbol.Network import Address
+
+from tx_index import normalize_address
+
+MAGIC = b"SYMCOL1\0"
+FORMAT_VERSION = 1
+# 1チャンクの行数
+DEFAULT_CHUNK_SIZE = 65536
+# RESTの1ページの最大件数
+PAGE_SIZE = 100
+ADDRESS_SIZE = 24
+HASH_SIZE = 32
+
+# 列名 => arrayの型コード（"bytes:N" は固定長のバイト列）
+COLUMNS: dict[str, str] = {
+  "height": "Q",
+  "timestamp": "Q",
+  "type": "H",
+  # アグリゲート内の位置（アグリゲートでないものは-1）
+  "inner_index": "h",
+  "mosaic_id": "Q",
+  "amount": "Q",
+  # 実際に支払った手数料（min(maxFee, size * feeMultiplier)）
+  "fee": "Q",
+  "signer": f"bytes:{ADDRESS_SIZE}",
+  "recipient": f"bytes:{ADDRESS_SIZE}",
+  # トランザクションハッシュ（インナートランザクションはアグリゲートのハッシュ）
+  "hash": f"bytes:{HASH_SIZE}",
+}
+
+_NO_ADDRESS = bytes(ADDRESS_SIZE)
+
+
+def _width(code: str) -> int:
+  return int(code.split(":")[1]) if code.startswith("bytes:") else 0
+
+
+class BinaryColumn:
+  """固定長のバイト列を並べた列"""
+
+  def __init__(self, width: int, data: bytes = b"") -> None:
+    self.width = width
+    self.data = bytearray(data)
+
+  def append(self, value: bytes) -> None:
+    self.data += value
+
+  def __len__(self) -> int:
+    return len(self.data) // self.width
+
+  def __getitem__(self, index: int) -> bytes:
+    if index < 0:
+      index += len(self)
+    return bytes(self.data[index * self.width:(index + 1) * self.width])
+
+  def __iter__(self) -> Iterator[bytes]:
+    for offset in range(0, len(self.data), self.width):
+      yield bytes(self.data[offset:offset + self.width])
+
+  def tobytes(self) -> bytes:
+    return bytes(self.data)
+
+  # アドレスの列をT...形式の文字列で返す（空の値は空文字列）
+  def addresses(self) -> Iterator[str]:
+    for value in self:
+      yield str(Address(value)) if value != _NO_ADDRESS else ""
+
+
+def _new_column(code: str) -> Any:
+  width = _width(code)
+  return BinaryColumn(width) if width else array(code)
+
+
+def _column_bytes(column: Any) -> bytes:
+  if isinstance(column, array) and sys.byteorder == "big":
+    column = array(column.typecode, column)
+    column.byteswap()
+  return column.tobytes()
+
+
+def _column_from_bytes(code: str, data: bytes) -> Any:
+  width = _width(code)
+  if width:
+    return BinaryColumn(width, data)
+  column = array(code)
+  column.frombytes(data)
+  if sys.byteorder == "big":
+    column.byteswap()
+  return column
+
+
+class ColumnarWriter:
+  """行を列ごとの配列に溜め、一定行数ごとにチャンクとして書き出す"""
+
+  def __init__(
+    self,
+    path: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    compress: bool = False,
+    columns: Optional[dict[str, str]] = None,
+  ) -> None:
+    self.columns = columns or COLUMNS
+    self.chunk_size = chunk_size
+    self.compress = compress
+    self.rows = 0
+    self._file: BinaryIO = open(path, "wb")
+    self._file.write(MAGIC)
+    self._chunks: list[dict] = []
+    self._buffer = self._new_buffer()
+
+  def _new_buffer(self) -> dict[str, Any]:
+    return {
+      name: _new_column(code) for name, code in self.columns.items()
+    }
+
+  def __enter__(self) -> "ColumnarWriter":
+    return self
+
+  def __exit__(self, *exc_info: Any) -> None:
+    self.close()
+
+  # 1行を追加する（列名 => 値）
+  def append(self, row: dict[str, Any]) -> None:
+    for name, column in self._buffer.items():
+      column.append(row[name])
+    if len(self._buffer["height"]) >= self.chunk_size:
+      self.flush()
+
+  def flush(self) -> None:
+    rows = len(next(iter(self._buffer.values())))
+    if not rows:
+      return
+    chunk: dict[str, Any] = {"rows": rows, "columns": {}}
+    for name, column in self._buffer.items():
+      data = _column_bytes(column)
+      if self.compress:
+        data = zlib.compress(data, 6)
+      chunk["columns"][name] = [self._file.tell(), len(data)]
+      self._file.write(data)
+    self._chunks.append(chunk)
+    self.rows += rows
+    self._buffer = self._new_buffer()
+
+  def close(self) -> None:
+    if self._file.closed:
+      return
+    self.flush()
+    footer = json.dumps({
+      "version": FORMAT_VERSION,
+      "columns": self.columns,
+      "compression": "zlib" if self.compress else None,
+      "rows": self.rows,
+      "chunks": self._chunks,
+    }).encode("utf-8")
+    self._file.write(footer)
+    self._file.write(struct.pack("<I", len(footer)))
+    self._file.write(MAGIC)
+    self._file.close()
+
+
+class ColumnarReader:
+  """ColumnarWriterで書き出したファイルを、必要な列だけチャンクごとに読み込む"""
+
+  def __init__(self, path: str) -> None:
+    self._file: BinaryIO = open(path, "rb")
+    if self._file.read(len(MAGIC)) != MAGIC:
+      raise ValueError(f"列指向のファイルではありません: {path}")
+    self._file.seek(-(len(MAGIC) + 4), os.SEEK_END)
+    (footer_size,) = struct.unpack("<I", self._file.read(4))
+    if self._file.read(len(MAGIC)) != MAGIC:
+      raise ValueError(f"ファイルが途中までしか書かれていません: {path}")
+    self._file.seek(-(len(MAGIC) + 4 + footer_size), os.SEEK_END)
+    self.footer = json.loads(self._file.read(footer_size))
+    self.columns: dict[str, str] = self.footer["columns"]
+    self.rows: int = self.footer["rows"]
+
+  def close(self) -> None:
+    self._file.close()
+
+  def __enter__(self) -> "ColumnarReader":
+    return self
+
+  def __exit__(self, *exc_info: Any) -> None:
+    self.close()
+
+  # チャンクごとに、指定した列（省略時はすべて）の配列を返す
+  def chunks(
+    self, columns: Optional[Iterable[str]] = None
+  ) -> Iterator[dict[str, Any]]:
+    names = list(columns or self.columns)
+    for chunk in self.footer["chunks"]:
+      result = {}
+      for name in names:
+        offset, size = chunk["columns"][name]
+        self._file.seek(offset)
+        data = self._file.read(size)
+        if self.footer["compression"] == "zlib":
+          data = zlib.decompress(data)
+        result[name] = _column_from_bytes(self.columns[name], data)
+      yield result
+
+  # 指定した列をすべて読み込む（数値の列はnumpy.frombufferなどでそのまま変換できる）
+  def read(
+    self, columns: Optional[Iterable[str]] = None
+  ) -> dict[str, Any]:
+    names = list(columns or self.columns)
+    result = {name: _new_column(self.columns[name]) for name in names}
+    for chunk in self.chunks(names):
+      for name, column in chunk.items():
+        if isinstance(column, BinaryColumn):
+          result[name].data += column.data
+        else:
+          result[name].extend(column)
+    return result
+
+
+class TransactionRows:
+  """RESTの検索結果をモザイクごとの行に変換する（モザイクを含まないものは1行）"""
+
+  def __init__(self, facade: Optional[SymbolFacade] = None) -> None:
+    self.facade = facade or SymbolFacade("testnet")
+    self._addresses: dict[str, bytes] = {}
+
+  def _signer(self, public_key: str) -> bytes:
+    address = self._addresses.get(public_key)
+    if address is None:
+      address = self._addresses[public_key] = bytes(
+        self.facade.network.public_key_to_address(
+          PublicKey(public_key)
+        ).bytes
+      )
+    return address
+
+  def rows(self, entry: dict) -> Iterator[dict[str, Any]]:
+    meta = entry["meta"]
+    transaction = entry["transaction"]
+    mosaics = [
+      (int(mosaic["id"], 16), int(mosaic["amount"]))
+      for mosaic in transaction.get("mosaics") or []
+    ]
+    if transaction.get("mosaicId") and "amount" in transaction:
+      mosaics.append(
+        (int(transaction["mosaicId"], 16), int(transaction["amount"]))
+      )
+    recipient = transaction.get("recipientAddress")
+    aggregate_hash = meta.get("aggregateHash")
+    row = {
+      "height": int(meta["height"]),
+      "timestamp": int(meta.get("timestamp") or 0),
+      "type": int(transaction["type"]),
+      "inner_index": int(meta["index"]) if aggregate_hash else -1,
+      "fee": _paid_fee(transaction, meta),
+      "signer": self._signer(transaction["signerPublicKey"]),
+      "recipient": (
+        bytes.fromhex(recipient) if recipient else _NO_ADDRESS
+      ),
+      "hash": bytes.fromhex(aggregate_hash or meta["hash"]),
+    }
+    for mosaic_id, amount in mosaics or [(0, 0)]:
+      yield {**row, "mosaic_id": mosaic_id, "amount": amount}
+
+
+# 実際に支払った手数料を求める（インナートランザクションは0）
+# ブロックの手数料乗数がない場合は上限（maxFee）を返す
+def _paid_fee(transaction: dict, meta: dict) -> int:
+  # RESTはmaxFee、SDKのto_json（モックノード）はfee
+  max_fee = int(
+    transaction.get("maxFee") or transaction.get("fee") or 0
+  )
+  size = int(transaction.get("size") or 0)
+  fee_multiplier = meta.get("feeMultiplier")
+  if not size or fee_multiplier is None:
+    return max_fee
+  return min(max_fee, size * int(fee_multiplier))
+
+
+# 承認済みトランザクション（インナートランザクションを含む）をページごとに取得する
+def iter_transactions(
+  node_url: str,
+  params: Optional[dict] = None,
+  session: Optional[requests.Session] = None,
+) -> Iterator[dict]:
+  session = session or requests.Session()
+  page_number = 1
+  while True:
+    response = session.get(
+      f"{node_url}/transactions/confirmed",
+      params={
+        **(params or {}),
+        "embedded": "true",
+        "order": "asc",
+        "pageSize": PAGE_SIZE,
+        "pageNumber": page_number,
+      },
+    )
+    response.raise_for_status()
+    data = response.json()["data"]
+    yield from data
+    if len(data) < PAGE_SIZE:
+      return
+    page_number += 1
+
+
+def export(
+  path: str,
+  entries: Iterable[dict],
+  chunk_size: int = DEFAULT_CHUNK_SIZE,
+  compress: bool = False,
+) -> int:
+  converter = TransactionRows()
+  with ColumnarWriter(path, chunk_size, compress) as writer:
+    for entry in entries:
+      # アグリゲート自体は手数料だけを持つ行になり、中身はインナートランザクションの行になる
+      for row in converter.rows(entry):
+        writer.append(row)
+  return writer.rows
+
+
+# モザイクごとの件数と合計数量を表示する
+def print_summary(path: str) -> None:
+  with ColumnarReader(path) as reader:
+    totals: dict[int, list[int]] = {}
+    for chunk in reader.chunks(["mosaic_id", "amount"]):
+      for mosaic_id, amount in zip(chunk["mosaic_id"], chunk["amount"]):
+        total = totals.setdefault(mosaic_id, [0, 0])
+        total[0] += 1
+        total[1] += amount
+    print(
+      f"{reader.rows}行 {len(reader.footer['chunks'])}チャンク "
+      f"圧縮: {reader.footer['compression']}"
+    )
+    for mosaic_id, (count, amount) in sorted(totals.items()):
+      print(f"{mosaic_id:016X} {count:>10}件 {amount:>24}")
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="承認済みトランザクションを列指向のファイルに書き出す"
+  )
+  parser.add_argument("path", help="書き出すファイル")
+  parser.add_argument(
+    "--address", help="このアドレスに関係するものだけを書き出す"
+  )
+  parser.add_argument("--from-height", type=int)
+  parser.add_argument("--to-height", type=int)
+  parser.add_argument(
+    "--chunk-size",
+    type=int,
+    default=DEFAULT_CHUNK_SIZE,
+    help="1チャンクの行数",
+  )
+  parser.add_argument(
+    "--compress", action="store_true", help="列をzlibで圧縮する"
+  )
+  parser.add_argument(
+    "--read", action="store_true", help="書き出したファイルの集計を表示する"
+  )
+  args = parser.parse_args()
+
+  if args.read:
+    print_summary(args.path)
+    return
+
+  load_dotenv()
+  NODE_URL: str = os.getenv("NODE_URL") or ""
+  params: dict[str, Any] = {}
+  if args.address:
+    params["address"] = normalize_address(args.address)
+  if args.from_height:
+    params["fromHeight"] = args.from_height
+  if args.to_height:
+    params["toHeight"] = args.to_height
+  rows = export(
+    args.path,
+    iter_transactions(NODE_URL, params),
+    args.chunk_size,
+    args.compress,
+  )
+  print("書き出し完了", args.path, f"{rows}行")
+
+
+if __name__ == "__main__":
+  main()
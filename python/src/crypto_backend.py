@@ -0,0 +1,124 @@
+# Ed25519の署名・検証の実装を切り替えるコード
+# pynacl（libsodium）が入っていれば自動で使い、なければSDKの実装（cryptography）を使う
+# 環境変数 CRYPTO_BACKEND（auto・nacl・sdk）で明示的に選べる
+import os
+from typing import Any, Optional
+from symbolchain.CryptoTypes import PrivateKey, PublicKey, Signature
+from symbolchain.facade.SymbolFacade import SymbolFacade, SymbolAccount
+from symbolchain.symbol.KeyPair import KeyPair, Verifier
+
+
+class SdkBackend:
+  """SDKの鍵ペア（cryptographyのEd25519）を使う実装"""
+
+  name = "sdk"
+
+  def key_pair(self, private_key: PrivateKey) -> Any:
+    return KeyPair(private_key)
+
+  def verify(
+    self, public_key: PublicKey, message: bytes, signature: Signature
+  ) -> bool:
+    return Verifier(public_key).verify(message, signature)
+
+
+class _NaclKeyPair:
+  """SDKのKeyPairと同じメソッドを持つ、libsodiumの鍵ペア"""
+
+  def __init__(self, private_key: PrivateKey) -> None:
+    import nacl.signing
+
+    self._sk = nacl.signing.SigningKey(private_key.bytes)
+    self._public_key = PublicKey(self._sk.verify_key.encode())
+
+  @property
+  def public_key(self) -> PublicKey:
+    return self._public_key
+
+  @property
+  def private_key(self) -> PrivateKey:
+    return PrivateKey(self._sk.encode())
+
+  def sign(self, message: bytes) -> Signature:
+    return Signature(self._sk.sign(message).signature)
+
+
+class NaclBackend:
+  """pynacl（libsodium）を使う実装"""
+
+  name = "nacl"
+
+  def __init__(self) -> None:
+    import nacl.bindings
+    import nacl.exceptions
+
+    self._open = nacl.bindings.crypto_sign_open
+    self._bad_signature = nacl.exceptions.BadSignatureError
+
+  def key_pair(self, private_key: PrivateKey) -> Any:
+    return _NaclKeyPair(private_key)
+
+  def verify(
+    self, public_key: PublicKey, message: bytes, signature: Signature
+  ) -> bool:
+    # SDKのVerifierと同じく、ゼロの公開鍵は受け付けない
+    if bytes(PublicKey.SIZE) == public_key.bytes:
+      raise ValueError("public key cannot be zero")
+    try:
+      self._open(signature.bytes + message, public_key.bytes)
+      return True
+    except (self._bad_signature, ValueError):
+      return False
+
+
+BACKENDS = {"nacl": NaclBackend, "sdk": SdkBackend}
+# autoのときに試す順番
+PREFERENCE = ("nacl", "sdk")
+
+_backend: Optional[Any] = None
+
+
+# 名前を指定して実装を作る（autoは使えるものの中で最も速いもの）
+def create_backend(name: str = "auto") -> Any:
+  if name != "auto":
+    if name not in BACKENDS:
+      raise ValueError(f"不明な実装です: {name}")
+    return BACKENDS[name]()
+  for candidate in PREFERENCE:
+    try:
+      return BACKENDS[candidate]()
+    except ImportError:
+      continue
+  return SdkBackend()
+
+
+def get_backend() -> Any:
+  global _backend
+  if _backend is None:
+    _backend = create_backend(os.getenv("CRYPTO_BACKEND") or "auto")
+  return _backend
+
+
+def set_backend(name: str) -> Any:
+  global _backend
+  _backend = create_backend(name)
+  return _backend
+
+
+# 選んだ実装の鍵ペアを持つアカウントを作る（facade.create_accountの代わりに使う）
+# sign_transaction・cosign_transactionはこの鍵ペアで署名する
+def create_account(
+  facade: SymbolFacade, private_key: PrivateKey
+) -> SymbolAccount:
+  return SymbolAccount(facade, get_backend().key_pair(private_key))
+
+
+# 選んだ実装で署名を検証する（facade.verify_transactionの代わりに使う）
+def verify_transaction(
+  facade: SymbolFacade, transaction: Any, signature: Signature
+) -> bool:
+  return get_backend().verify(
+    PublicKey(transaction.signer_public_key.bytes),
+    facade.extract_signing_payload(transaction),
+    Signature(signature.bytes),
+  )
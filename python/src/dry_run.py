@@ -0,0 +1,343 @@
+# アナウンスせずに、生成・署名・シリアライズ・検証までをローカルで行うコード
+# 環境変数 DRY_RUN=1 を指定すると、send_tx・send_signed_tx・send_transfer_feesはアナウンスの代わりにこれを実行する
+# 使い方: python src/dry_run.py --count 1000 --recipients 100（生成処理だけの負荷試験）
+import os
+import json
+import argparse
+import requests
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from symbolchain.CryptoTypes import PrivateKey, PublicKey, Signature
+from symbolchain.facade.SymbolFacade import (
+  SymbolFacade,
+  SymbolAccount,
+)
+from symbolchain.sc import TransactionFactory
+
+import metrics
+import http_cache
+import crypto_backend
+from histogram import Histogram
+from send_tx import prepare_tx
+from preflight_validator import (
+  SUCCESS,
+  FAILURE_PAST_DEADLINE,
+  FAILURE_FUTURE_DEADLINE,
+  MAX_TRANSACTION_LIFETIME,
+)
+
+# アグリゲートに含められるインナートランザクション数と連署数の上限（ネットワークの設定値）
+MAX_TRANSACTIONS_PER_AGGREGATE = 100
+MAX_COSIGNATURES_PER_AGGREGATE = 25
+# 連署がすべて揃っている必要があるアグリゲートのタイプ（ボンデッドは後から連署を集める）
+AGGREGATE_COMPLETE_TRANSACTION_TYPE = 0x4141
+
+# ノードが返すものと同じ失敗コード
+FAILURE_SIGNATURE_NOT_VERIFIABLE = "Failure_Signature_Not_Verifiable"
+FAILURE_AGGREGATE_NO_TRANSACTIONS = "Failure_Aggregate_No_Transactions"
+FAILURE_AGGREGATE_TOO_MANY_TRANSACTIONS = (
+  "Failure_Aggregate_Too_Many_Transactions"
+)
+FAILURE_AGGREGATE_TOO_MANY_COSIGNATURES = (
+  "Failure_Aggregate_Too_Many_Cosignatures"
+)
+FAILURE_AGGREGATE_REDUNDANT_COSIGNATURES = (
+  "Failure_Aggregate_Redundant_Cosignatures"
+)
+FAILURE_AGGREGATE_INVALID_TRANSACTIONS_HASH = (
+  "Failure_Aggregate_Invalid_Transactions_Hash"
+)
+FAILURE_AGGREGATE_MISSING_COSIGNATURES = (
+  "Failure_Aggregate_Missing_Cosignatures"
+)
+# ノードにはないローカルだけの失敗コード
+FAILURE_SIZE_MISMATCH = "Failure_DryRun_Size_Mismatch"
+FAILURE_FEE_TOO_LOW = "Failure_DryRun_Fee_Too_Low"
+FAILURE_FEE_TOO_HIGH = "Failure_DryRun_Fee_Too_High"
+
+
+# 環境変数 DRY_RUN が指定されているかどうか
+def is_dry_run() -> bool:
+  return os.getenv("DRY_RUN", "").lower() in ("1", "true", "yes")
+
+
+# 手数料の検証に使う、最低手数料乗数と手数料の上限を返す
+# 環境変数 DRY_RUN_MIN_FEE_MULTIPLIER・DRY_RUN_MAX_FEE で指定する。
+# 乗数を指定しない場合は、NODE_URLのノードの /network/fees/transaction から取得する
+def fee_bounds() -> tuple[Optional[int], Optional[int]]:
+  min_fee_multiplier = os.getenv("DRY_RUN_MIN_FEE_MULTIPLIER")
+  max_fee = os.getenv("DRY_RUN_MAX_FEE")
+  node_url = os.getenv("NODE_URL")
+  if not min_fee_multiplier and node_url:
+    try:
+      response = http_cache.get(
+        f"{node_url}/network/fees/transaction"
+      )
+      if response.status_code == 200:
+        min_fee_multiplier = response.json()["minFeeMultiplier"]
+    except (requests.RequestException, ValueError, KeyError):
+      # ノードに接続できない場合は、下限を検証しない
+      pass
+  return (
+    int(min_fee_multiplier) if min_fee_multiplier else None,
+    int(max_fee) if max_fee else None,
+  )
+
+
+@dataclass
+class DryRunResult:
+  """ドライランの結果（アナウンスしたはずのペイロードと、検証結果・処理時間）"""
+
+  hash: str
+  json_payload: str
+  size: int
+  fee: int
+  # 検出した失敗コード（空なら問題なし）
+  failures: list[str] = field(default_factory=list)
+  # 処理 => 時間（秒）
+  timings: dict[str, float] = field(default_factory=dict)
+
+  @property
+  def ok(self) -> bool:
+    return not self.failures
+
+
+# アナウンスする状態のトランザクションを検証し、失敗コードの一覧を返す
+# nowはネットワーク時刻（ミリ秒）。省略するとローカルの時計から求める
+# min_fee_multiplierはノードの最低手数料乗数（/network/fees/transactionのminFeeMultiplier）
+# multisigはマルチシグアカウントの公開鍵 => (最小承認数, 連署者の公開鍵)。
+# 指定しないアカウントは、インナートランザクションの署名者本人の署名が必要とみなす
+def check_transaction(
+  facade: SymbolFacade,
+  tx: Any,
+  now: Optional[int] = None,
+  max_fee: Optional[int] = None,
+  min_fee_multiplier: Optional[int] = None,
+  multisig: Optional[dict[str, tuple[int, set[str]]]] = None,
+) -> list[str]:
+  failures = []
+
+  # サイズ：ヘッダーのサイズとシリアライズ結果が一致し、復元しても同じになること
+  payload = bytes(tx.serialize())
+  if len(payload) != tx.size or bytes(
+    TransactionFactory.deserialize(payload).serialize()
+  ) != payload:
+    failures.append(FAILURE_SIZE_MISMATCH)
+
+  # 有効期限
+  now = now if now is not None else facade.now().timestamp
+  deadline = tx.deadline.value
+  if deadline <= now:
+    failures.append(FAILURE_PAST_DEADLINE)
+  elif deadline > now + MAX_TRANSACTION_LIFETIME:
+    failures.append(FAILURE_FUTURE_DEADLINE)
+
+  # 手数料
+  if (
+    min_fee_multiplier is not None
+    and tx.fee.value < tx.size * min_fee_multiplier
+  ):
+    failures.append(FAILURE_FEE_TOO_LOW)
+  if max_fee is not None and tx.fee.value > max_fee:
+    failures.append(FAILURE_FEE_TOO_HIGH)
+
+  # 署名
+  if not crypto_backend.verify_transaction(facade, tx, tx.signature):
+    failures.append(FAILURE_SIGNATURE_NOT_VERIFIABLE)
+
+  embedded_transactions = getattr(tx, "transactions", None)
+  if embedded_transactions is not None:
+    failures += _check_aggregate(
+      facade, tx, embedded_transactions, multisig or {}
+    )
+  return failures
+
+
+def _check_aggregate(
+  facade: SymbolFacade,
+  tx: Any,
+  embedded_transactions: list,
+  multisig: dict[str, tuple[int, set[str]]],
+) -> list[str]:
+  failures = []
+  if not embedded_transactions:
+    failures.append(FAILURE_AGGREGATE_NO_TRANSACTIONS)
+  elif len(embedded_transactions) > MAX_TRANSACTIONS_PER_AGGREGATE:
+    failures.append(FAILURE_AGGREGATE_TOO_MANY_TRANSACTIONS)
+  transactions_hash = facade.hash_embedded_transactions(
+    embedded_transactions
+  )
+  if transactions_hash.bytes != tx.transactions_hash.bytes:
+    failures.append(FAILURE_AGGREGATE_INVALID_TRANSACTIONS_HASH)
+
+  cosignatures = tx.cosignatures
+  if len(cosignatures) > MAX_COSIGNATURES_PER_AGGREGATE:
+    failures.append(FAILURE_AGGREGATE_TOO_MANY_COSIGNATURES)
+  cosigners = [bytes(tx.signer_public_key.bytes)] + [
+    bytes(cosignature.signer_public_key.bytes)
+    for cosignature in cosignatures
+  ]
+  if len(set(cosigners)) != len(cosigners):
+    failures.append(FAILURE_AGGREGATE_REDUNDANT_COSIGNATURES)
+  # インナートランザクションの署名者が、アグリゲートの署名者か連署者として署名していること
+  if tx.type_.value == AGGREGATE_COMPLETE_TRANSACTION_TYPE:
+    signers = {public_key.hex().upper() for public_key in cosigners}
+    if not all(
+      _is_approved(str(embedded.signer_public_key), signers, multisig)
+      for embedded in embedded_transactions
+    ):
+      failures.append(FAILURE_AGGREGATE_MISSING_COSIGNATURES)
+  if cosignatures:
+    transaction_hash = facade.hash_transaction(tx).bytes
+    backend = crypto_backend.get_backend()
+    for cosignature in cosignatures:
+      if not backend.verify(
+        PublicKey(cosignature.signer_public_key.bytes),
+        transaction_hash,
+        Signature(cosignature.signature.bytes),
+      ):
+        failures.append(FAILURE_SIGNATURE_NOT_VERIFIABLE)
+        break
+  return failures
+
+
+# マルチシグの連署者を含めて、署名者の承認が揃っているかどうか
+def _is_approved(
+  public_key: str,
+  signers: set[str],
+  multisig: dict[str, tuple[int, set[str]]],
+) -> bool:
+  if public_key not in multisig:
+    return public_key in signers
+  min_approval, cosignatories = multisig[public_key]
+  approvals = sum(
+    _is_approved(cosignatory, signers, multisig)
+    for cosignatory in cosignatories
+  )
+  return approvals >= max(min_approval, 1)
+
+
+# send_txと同じ手順で手数料の設定・署名・シリアライズを行い、アナウンスの代わりに検証する
+def dry_run_tx(
+  tx: Any,
+  signAccount: SymbolAccount,
+  facade: Optional[SymbolFacade] = None,
+  now: Optional[int] = None,
+  max_fee: Optional[int] = None,
+  min_fee_multiplier: Optional[int] = None,
+) -> DryRunResult:
+  facade = facade or SymbolFacade("testnet")
+  with metrics.collect_spans() as timings:
+    json_payload, hash = prepare_tx(tx, signAccount, facade)
+    with metrics.span("validate"):
+      failures = check_transaction(
+        facade, tx, now, max_fee, min_fee_multiplier
+      )
+  return DryRunResult(
+    str(hash), json_payload, tx.size, tx.fee.value, failures, timings
+  )
+
+
+# 署名（連署）済みのトランザクションを、アナウンスの代わりに検証する
+def dry_run_signed_tx(
+  tx: Any,
+  facade: Optional[SymbolFacade] = None,
+  now: Optional[int] = None,
+  multisig: Optional[dict[str, tuple[int, set[str]]]] = None,
+  max_fee: Optional[int] = None,
+  min_fee_multiplier: Optional[int] = None,
+) -> DryRunResult:
+  facade = facade or SymbolFacade("testnet")
+  with metrics.collect_spans() as timings:
+    with metrics.span("serialize"):
+      json_payload = json.dumps({"payload": tx.serialize().hex()})
+    with metrics.span("validate"):
+      failures = check_transaction(
+        facade, tx, now, max_fee, min_fee_multiplier, multisig
+      )
+  return DryRunResult(
+    str(facade.hash_transaction(tx)),
+    json_payload,
+    tx.size,
+    tx.fee.value,
+    failures,
+    timings,
+  )
+
+
+def print_result(result: DryRunResult) -> None:
+  print("ドライラン（アナウンスしません）")
+  print("トランザクションハッシュ", result.hash)
+  print("サイズ", result.size, "手数料", result.fee)
+  print("検証結果", ", ".join(result.failures) or SUCCESS)
+  print(
+    "処理時間",
+    ", ".join(
+      f"{name} {seconds * 1000:.3f}ms"
+      for name, seconds in result.timings.items()
+    ),
+  )
+
+
+# 送付先の数を指定して手数料送付用のアグリゲートを繰り返し生成・署名・検証し、処理ごとの時間を集計する
+def benchmark(count: int, recipients: int) -> dict[str, Histogram]:
+  # send_transfer_feesはこのモジュールを使うため、ここでインポートする
+  from send_transfer_fees import create_transfer_fees_tx
+
+  facade = SymbolFacade("testnet")
+  account = crypto_backend.create_account(facade, PrivateKey.random())
+  addresses = [
+    facade.create_account(PrivateKey.random()).address
+    for _ in range(recipients)
+  ]
+  deadline = facade.now().add_hours(2).timestamp
+  histograms: dict[str, Histogram] = {}
+  failures: dict[str, int] = {}
+  for _ in range(count):
+    with metrics.collect_spans() as timings:
+      with metrics.span("build", type="transfer_fees"):
+        tx = create_transfer_fees_tx(
+          facade, account, addresses, 1000000, deadline
+        )
+      result = dry_run_tx(tx, account, facade)
+    for name, seconds in {**timings, **result.timings}.items():
+      histograms.setdefault(name, Histogram()).record(seconds)
+    for failure in result.failures:
+      failures[failure] = failures.get(failure, 0) + 1
+  if failures:
+    print("検出した失敗", failures)
+  return histograms
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="アナウンスせずにトランザクションの生成・署名・検証の速度を計測する"
+  )
+  parser.add_argument(
+    "--count", type=int, default=1000, help="生成するトランザクション数"
+  )
+  parser.add_argument(
+    "--recipients",
+    type=int,
+    default=MAX_TRANSACTIONS_PER_AGGREGATE,
+    help="アグリゲートのインナートランザクション数",
+  )
+  args = parser.parse_args()
+
+  histograms = benchmark(args.count, args.recipients)
+  total = sum(
+    histogram.mean * histogram.count
+    for name, histogram in histograms.items()
+    if name != "validate"
+  )
+  print(f"{'処理':12}{'平均':>12}{'p99':>12}")
+  for name, histogram in histograms.items():
+    print(
+      f"{name:12}{histogram.mean * 1000:>10.3f}ms"
+      f"{histogram.percentile(99) * 1000:>10.3f}ms"
+    )
+  print(f"検証を除く生成・署名の速度 {args.count / total:,.0f} tx/s")
+
+
+if __name__ == "__main__":
+  main()
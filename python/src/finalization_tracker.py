@@ -0,0 +1,268 @@
+# 最新のファイナライズ済みブロック高を追跡し、指定した高さがファイナライズされるまで待機するコード
+# ノードごとに1つの追跡をすべての待機で共有するため、何千件待っていてもノードへの問い合わせは
+# finalizedBlockチャンネルのWebSocket接続1本（使えない場合は/chain/infoの定期的な取得）で済む
+# トランザクションの状態の待機も共有し、待っているハッシュをまとめて POST /transactionStatus で確認する
+# 使い方: python src/finalization_tracker.py <トランザクションハッシュ>...
+import os
+import json
+import time
+import heapq
+import asyncio
+import argparse
+import itertools
+from typing import Any, Optional
+import requests
+from dotenv import load_dotenv
+from websockets.legacy.client import connect
+
+import metrics
+from records import TransactionStatus, parse_status
+
+# POST /transactionStatus で1回に問い合わせるハッシュ数
+STATUS_BATCH_SIZE = 100
+# 状態を待っているトランザクションを確認する間隔（秒）
+STATUS_INTERVAL = 1.0
+
+
+class FinalizationTracker:
+  """ノードの最新のファイナライズ済みブロック高を、すべての待機で共有して追跡する"""
+
+  def __init__(
+    self,
+    node_url: str,
+    refresh_interval: float = 5,
+    use_websocket: bool = True,
+    status_interval: float = STATUS_INTERVAL,
+  ) -> None:
+    self.node_url = node_url
+    # /chain/infoの結果を使い回す時間（WebSocketが使えない場合はこの間隔で取得する）
+    self.refresh_interval = refresh_interval
+    self.use_websocket = use_websocket
+    self.finalized_height = 0
+    self._fetched_at = float("-inf")
+    self._fetch_task: Optional[asyncio.Task] = None
+    # (ブロック高, 登録順, Future) のヒープ
+    self._waiters: list[tuple[int, int, asyncio.Future]] = []
+    self._sequence = itertools.count()
+    self._task: Optional[asyncio.Task] = None
+    self.status_interval = status_interval
+    # ハッシュ => (待っている状態, Future) のリスト
+    self._status_waiters: dict[
+      str, list[tuple[str, asyncio.Future]]
+    ] = {}
+    self._status_task: Optional[asyncio.Task] = None
+    self._session = requests.Session()
+    self.stats = {
+      "requests": 0,
+      "notifications": 0,
+      "resolved": 0,
+      "status_requests": 0,
+    }
+
+  async def __aenter__(self) -> "FinalizationTracker":
+    return self
+
+  async def __aexit__(self, *exc_info: Any) -> None:
+    await self.close()
+
+  async def close(self) -> None:
+    for task in (self._task, self._status_task):
+      if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    self._task = self._status_task = None
+    for _, _, future in self._waiters:
+      future.cancel()
+    self._waiters.clear()
+    for waiters in self._status_waiters.values():
+      for _, future in waiters:
+        future.cancel()
+    self._status_waiters.clear()
+
+  def _update(self, height: int) -> None:
+    if height <= self.finalized_height:
+      return
+    self.finalized_height = height
+    while self._waiters and self._waiters[0][0] <= height:
+      _, _, future = heapq.heappop(self._waiters)
+      if not future.done():
+        future.set_result(height)
+        self.stats["resolved"] += 1
+
+  def _fetch_chain_info(self) -> dict:
+    response = self._session.get(f"{self.node_url}/chain/info")
+    response.raise_for_status()
+    return response.json()
+
+  # /chain/infoからファイナライズ済みの高さを取得する
+  # 同時に呼ばれても問い合わせは1回で、max_age秒以内に取得した結果は使い回す
+  async def refresh(self, max_age: Optional[float] = None) -> int:
+    max_age = self.refresh_interval if max_age is None else max_age
+    if time.monotonic() - self._fetched_at < max_age:
+      return self.finalized_height
+    if self._fetch_task is None:
+      self.stats["requests"] += 1
+      self._fetch_task = asyncio.create_task(
+        asyncio.to_thread(self._fetch_chain_info)
+      )
+    try:
+      chain_info = await asyncio.shield(self._fetch_task)
+    finally:
+      self._fetch_task = None
+    self._fetched_at = time.monotonic()
+    self._update(int(chain_info["latestFinalizedBlock"]["height"]))
+    return self.finalized_height
+
+  # 指定した高さがファイナライズされるまで待機し、その時点のファイナライズ済みの高さを返す
+  async def wait(
+    self, height: int, timeout: Optional[float] = None
+  ) -> int:
+    if height <= self.finalized_height:
+      return self.finalized_height
+    future = asyncio.get_running_loop().create_future()
+    heapq.heappush(
+      self._waiters, (height, next(self._sequence), future)
+    )
+    if self._task is None or self._task.done():
+      self._task = asyncio.create_task(self._run())
+    return await asyncio.wait_for(future, timeout)
+
+  async def _run(self) -> None:
+    while True:
+      if self.use_websocket:
+        try:
+          await self._watch()
+        except Exception as e:
+          # 接続できない・切断された場合は/chain/infoの取得に切り替え、次の周期で再接続する
+          print("finalizedBlockの購読エラー:", e)
+      try:
+        await self.refresh(max_age=0)
+      except requests.RequestException as e:
+        print("/chain/infoの取得エラー:", e)
+      await asyncio.sleep(self.refresh_interval)
+
+  async def _watch(self) -> None:
+    ws_endpoint = self.node_url.replace("http", "ws", 1) + "/ws"
+    async with connect(ws_endpoint) as websocket:
+      uid = json.loads(await websocket.recv())["uid"]
+      await websocket.send(
+        json.dumps({"uid": uid, "subscribe": "finalizedBlock"})
+      )
+      # 購読する前にファイナライズされた分は通知されないため、一度だけ取得する
+      await self.refresh(max_age=0)
+      async for message in websocket:
+        self.stats["notifications"] += 1
+        self._update(int(json.loads(message)["data"]["height"]))
+
+
+  # トランザクションが指定した状態（またはfailed）になるまで待機し、そのステータスを返す
+  async def wait_status(
+    self, hash: str, group: str, timeout: Optional[float] = None
+  ) -> TransactionStatus:
+    hash = hash.upper()
+    waiter = (group, asyncio.get_running_loop().create_future())
+    self._status_waiters.setdefault(hash, []).append(waiter)
+    if self._status_task is None or self._status_task.done():
+      self._status_task = asyncio.create_task(self._poll_statuses())
+    try:
+      return await asyncio.wait_for(waiter[1], timeout)
+    finally:
+      waiters = self._status_waiters.get(hash, [])
+      if waiter in waiters:
+        waiters.remove(waiter)
+      if not waiters:
+        self._status_waiters.pop(hash, None)
+
+  async def _poll_statuses(self) -> None:
+    while self._status_waiters:
+      await asyncio.sleep(self.status_interval)
+      hashes = list(self._status_waiters)
+      if not hashes:
+        continue
+      self.stats["status_requests"] += 1
+      try:
+        with metrics.span("status_poll"):
+          statuses = await asyncio.to_thread(
+            fetch_statuses, self.node_url, hashes
+          )
+      except requests.RequestException as e:
+        print("/transactionStatusの取得エラー:", e)
+        continue
+      for hash, status in statuses.items():
+        for group, future in self._status_waiters.get(hash, []):
+          if not future.done() and status.group in (group, "failed"):
+            future.set_result(status)
+
+
+# ノードごとに共有する追跡（イベントループが変わった場合は作り直す）
+_trackers: dict[str, tuple[Any, FinalizationTracker]] = {}
+
+
+def get_tracker(node_url: str) -> FinalizationTracker:
+  loop = asyncio.get_running_loop()
+  entry = _trackers.get(node_url)
+  if entry is None or entry[0] is not loop:
+    entry = (loop, FinalizationTracker(node_url))
+    _trackers[node_url] = entry
+  return entry[1]
+
+
+# 承認済みのトランザクションのブロック高がファイナライズされるまで待機する
+async def wait_finalized(
+  node_url: str, height: int, timeout: Optional[float] = None
+) -> int:
+  with metrics.span("finalization_wait"):
+    return await get_tracker(node_url).wait(height, timeout)
+
+
+def fetch_statuses(
+  node_url: str, hashes: list[str]
+) -> dict[str, TransactionStatus]:
+  statuses = {}
+  for offset in range(0, len(hashes), STATUS_BATCH_SIZE):
+    response = requests.post(
+      f"{node_url}/transactionStatus",
+      json={"hashes": hashes[offset:offset + STATUS_BATCH_SIZE]},
+    )
+    response.raise_for_status()
+    for data in response.json():
+      status = parse_status(data)
+      statuses[status.hash.upper()] = status
+  return statuses
+
+
+async def main() -> None:
+  load_dotenv()
+  parser = argparse.ArgumentParser(
+    description="承認済みのトランザクションがファイナライズされるまで待機する"
+  )
+  parser.add_argument("hashes", nargs="+", help="トランザクションハッシュ")
+  parser.add_argument(
+    "--timeout", type=float, default=600, help="待機する最大時間（秒）"
+  )
+  args = parser.parse_args()
+
+  node_url = os.getenv("NODE_URL") or ""
+  hashes = [hash.upper() for hash in args.hashes]
+  statuses = fetch_statuses(node_url, hashes)
+  tracker = get_tracker(node_url)
+
+  async def wait(hash: str, height: int) -> None:
+    await tracker.wait(height, args.timeout)
+    print("ファイナライズ完了", hash, "ブロック高", height)
+
+  waits = []
+  for hash in hashes:
+    status = statuses.get(hash)
+    if status is None or status.group != "confirmed":
+      print("承認されていません", hash, status.group if status else "")
+      continue
+    waits.append(wait(hash, status.height))
+  async with tracker:
+    await asyncio.gather(*waits)
+    print("ファイナライズ済みのブロック高", tracker.finalized_height)
+    print("ノードへの問い合わせ", tracker.stats)
+
+
+if __name__ == "__main__":
+  asyncio.run(main())
@@ -0,0 +1,133 @@
+# レイテンシを記録するヒストグラム（HDR Histogramと同じ対数・線形のバケット構成）
+# 値の大きさによらず有効桁数を保ったまま、一定のメモリでパーセンタイルを求められる
+import math
+from typing import Iterable, Iterator, Optional
+
+# summaryで表示するパーセンタイル
+DEFAULT_PERCENTILES = (50, 90, 99, 99.9)
+
+
+class Histogram:
+  """秒単位の値を整数（既定はマイクロ秒）に変換して記録するヒストグラム"""
+
+  def __init__(
+    self, significant_digits: int = 3, unit: float = 1e-6
+  ) -> None:
+    if not 1 <= significant_digits <= 5:
+      raise ValueError("significant_digitsは1から5の間で指定してください")
+    self.significant_digits = significant_digits
+    self.unit = unit
+    # 1つのバケットを分割する数（2のべき乗）。相対誤差は1 / (この値の半分) 以下になる
+    self._sub_bucket_bits = math.ceil(
+      math.log2(2 * 10**significant_digits)
+    )
+    self._sub_bucket_count = 1 << self._sub_bucket_bits
+    self._sub_bucket_half_count = self._sub_bucket_count >> 1
+    self._counts: list[int] = []
+    self.count = 0
+    self._total = 0
+    self._min: Optional[int] = None
+    self._max = 0
+
+  # 値（整数）を記録する位置
+  def _index(self, value: int) -> int:
+    bucket = value.bit_length() - self._sub_bucket_bits
+    if bucket <= 0:
+      return value
+    sub_bucket = value >> bucket
+    return (
+      self._sub_bucket_count
+      + (bucket - 1) * self._sub_bucket_half_count
+      + sub_bucket
+      - self._sub_bucket_half_count
+    )
+
+  # 位置に記録された値の範囲の最大値
+  def _highest_value(self, index: int) -> int:
+    if index < self._sub_bucket_count:
+      return index
+    bucket, offset = divmod(
+      index - self._sub_bucket_count, self._sub_bucket_half_count
+    )
+    shift = bucket + 1
+    return ((self._sub_bucket_half_count + offset + 1) << shift) - 1
+
+  def record_value(self, value: int, count: int = 1) -> None:
+    if value < 0:
+      raise ValueError("負の値は記録できません")
+    index = self._index(value)
+    if index >= len(self._counts):
+      self._counts.extend([0] * (index + 1 - len(self._counts)))
+    self._counts[index] += count
+    self.count += count
+    self._total += value * count
+    self._min = value if self._min is None else min(self._min, value)
+    self._max = max(self._max, value)
+
+  # 秒単位の値を記録する
+  def record(self, seconds: float) -> None:
+    self.record_value(max(round(seconds / self.unit), 0))
+
+  # 別のヒストグラム（同じ設定のもの）の記録を合算する
+  def merge(self, other: "Histogram") -> None:
+    if (other.significant_digits, other.unit) != (
+      self.significant_digits, self.unit
+    ):
+      raise ValueError("設定の異なるヒストグラムは合算できません")
+    if not other.count:
+      return
+    if len(other._counts) > len(self._counts):
+      self._counts.extend(
+        [0] * (len(other._counts) - len(self._counts))
+      )
+    for index, count in enumerate(other._counts):
+      self._counts[index] += count
+    self.count += other.count
+    self._total += other._total
+    self._min = (
+      other._min if self._min is None else min(self._min, other._min)
+    )
+    self._max = max(self._max, other._max)
+
+  def _iterate(self) -> Iterator[tuple[int, int]]:
+    for index, count in enumerate(self._counts):
+      if count:
+        yield self._highest_value(index), count
+
+  # 指定したパーセンタイルの値（秒）
+  def percentile(self, percentile: float) -> float:
+    if not self.count:
+      return 0
+    target = max(math.ceil(self.count * percentile / 100), 1)
+    total = 0
+    for value, count in self._iterate():
+      total += count
+      if total >= target:
+        return min(value, self._max) * self.unit
+    return self._max * self.unit
+
+  @property
+  def min(self) -> float:
+    return (self._min or 0) * self.unit
+
+  @property
+  def max(self) -> float:
+    return self._max * self.unit
+
+  @property
+  def mean(self) -> float:
+    return self._total / self.count * self.unit if self.count else 0
+
+  # 件数・平均・最大と各パーセンタイル（秒）をまとめた辞書
+  def summary(
+    self, percentiles: Iterable[float] = DEFAULT_PERCENTILES
+  ) -> dict[str, float]:
+    result: dict[str, float] = {
+      "count": self.count,
+      "min": self.min,
+      "mean": self.mean,
+      "max": self.max,
+    }
+    for percentile in percentiles:
+      result[f"p{percentile:g}"] = self.percentile(percentile)
+    return result
@@ -0,0 +1,275 @@
+# REST APIのGETの前に置くキャッシュ
+# 同じURLへの同時のリクエストは1回の通信にまとめ、結果はエンドポイントの種類ごとの有効期間（TTL）だけ使い回す
+# 応答はgzipで受け取り、キャッシュの利用・まとめた数・削減したバイト数を集計する
+# 使い方: requests.get(url).json() の代わりに http_cache.get(url).json() を使う
+#        コルーチンからは (await http_cache.get_async(url)).json() を使う
+#        （返す結果は共有されるため、json()の結果を書き換えないこと）
+import re
+import time
+import json
+import asyncio
+import weakref
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from urllib.parse import urlsplit
+import requests
+
+import metrics
+
+# パスの正規表現 => 有効期間（秒）。先に一致したものを使い、0はまとめるだけでキャッシュしない
+# ネットワーク時刻・ブロック高は期限の計算に使うだけなので、1秒のずれは問題にならない
+# 残高は承認直後の事前検証（preflight_validator）で使うため、古い値を返さないようキャッシュしない
+DEFAULT_TTLS: list[tuple[str, float]] = [
+  (r"^/node/time$", 1),
+  (r"^/chain/info$", 1),
+  (r"^/network/properties$", 3600),
+  (r"^/network/fees/transaction$", 30),
+  (r"^/accounts/[^/]+$", 0),
+  (r"^/mosaics/[^/]+$", 60),
+  (r"^/namespaces/[^/]+$", 60),
+  (r"^/transactionStatus/", 0),
+]
+
+
+@dataclass
+class CachedResponse:
+  """requests.Responseの代わりに返す、キャッシュ可能な応答"""
+
+  url: str
+  status_code: int
+  content: bytes
+  headers: dict[str, str] = field(default_factory=dict)
+  _json: Any = None
+
+  @property
+  def ok(self) -> bool:
+    return self.status_code < 400
+
+  # 一度だけデコードし、同じ応答を受け取ったすべての呼び出し元で結果を共有する
+  def json(self) -> Any:
+    if self._json is None:
+      self._json = json.loads(self.content)
+    return self._json
+
+  def raise_for_status(self) -> None:
+    if not self.ok:
+      raise requests.HTTPError(
+        f"{self.status_code} Error for url: {self.url}"
+      )
+
+
+class HttpCache:
+  """同時のリクエストをまとめ、エンドポイントの種類ごとのTTLでGETの結果をキャッシュする"""
+
+  def __init__(
+    self,
+    ttls: Optional[list[tuple[str, float]]] = None,
+    default_ttl: float = 0,
+    max_entries: int = 10000,
+  ) -> None:
+    self.ttls = [
+      (re.compile(pattern), ttl)
+      for pattern, ttl in (DEFAULT_TTLS if ttls is None else ttls)
+    ]
+    self.default_ttl = default_ttl
+    self.max_entries = max_entries
+    # キー => (有効期限, 応答)
+    self._entries: dict[str, tuple[float, CachedResponse]] = {}
+    # キー => 通信中のリクエストの結果
+    self._in_flight: dict[str, Future] = {}
+    # イベントループ => キー => 通信中のget_asyncのタスク
+    self._async_in_flight: weakref.WeakKeyDictionary[
+      asyncio.AbstractEventLoop, dict[str, asyncio.Task]
+    ] = weakref.WeakKeyDictionary()
+    self._lock = threading.Lock()
+    self._local = threading.local()
+    self.stats = {
+      "requests": 0,
+      "hits": 0,
+      "merged": 0,
+      "misses": 0,
+      # キャッシュ・まとめたことで受信しなかったバイト数（展開後）
+      "bytes_saved_cache": 0,
+      # gzipで圧縮されたことで受信しなかったバイト数
+      "bytes_saved_gzip": 0,
+      "bytes_received": 0,
+    }
+
+  def _session(self) -> requests.Session:
+    session = getattr(self._local, "session", None)
+    if session is None:
+      session = self._local.session = requests.Session()
+      session.headers["Accept-Encoding"] = "gzip"
+    return session
+
+  def ttl(self, url: str) -> float:
+    path = urlsplit(url).path
+    for pattern, ttl in self.ttls:
+      if pattern.search(path):
+        return ttl
+    return self.default_ttl
+
+  @staticmethod
+  def _key(url: str, params: Optional[dict]) -> str:
+    if not params:
+      return url
+    return url + "?" + json.dumps(params, sort_keys=True, default=str)
+
+  def get(
+    self,
+    url: str,
+    params: Optional[dict] = None,
+    ttl: Optional[float] = None,
+    **kwargs: Any,
+  ) -> CachedResponse:
+    key = self._key(url, params)
+    ttl = self.ttl(url) if ttl is None else ttl
+    with self._lock:
+      self.stats["requests"] += 1
+      entry = self._entries.get(key)
+      cached = entry is not None and entry[0] > time.monotonic()
+      future = self._in_flight.get(key)
+      owner = not cached and future is None
+      if owner:
+        future = self._in_flight[key] = Future()
+    if cached:
+      return self._count("hits", entry[1])
+    if not owner:
+      return self._count("merged", future.result())
+
+    try:
+      response = self._fetch(url, params, **kwargs)
+    except BaseException as e:
+      with self._lock:
+        del self._in_flight[key]
+      future.set_exception(e)
+      raise
+    with self._lock:
+      del self._in_flight[key]
+      self.stats["misses"] += 1
+      if ttl > 0 and response.status_code == 200:
+        if len(self._entries) >= self.max_entries:
+          self._evict()
+        self._entries[key] = (time.monotonic() + ttl, response)
+    future.set_result(response)
+    metrics.increment("symbol_http_cache_total", result="miss")
+    return response
+
+  # getの非同期版（イベントループを止めないよう、通信は別スレッドで行う）
+  # 同じループの同時の呼び出しは1つのタスクを待ち、他のスレッドとはgetでまとめる
+  async def get_async(
+    self,
+    url: str,
+    params: Optional[dict] = None,
+    ttl: Optional[float] = None,
+    **kwargs: Any,
+  ) -> CachedResponse:
+    key = self._key(url, params)
+    with self._lock:
+      entry = self._entries.get(key)
+      cached = entry is not None and entry[0] > time.monotonic()
+      if cached:
+        self.stats["requests"] += 1
+    if cached:
+      return self._count("hits", entry[1])
+
+    loop = asyncio.get_running_loop()
+    tasks = self._async_in_flight.setdefault(loop, {})
+    task = tasks.get(key)
+    if task is not None:
+      with self._lock:
+        self.stats["requests"] += 1
+      # 呼び出し元がキャンセルされても他の待機者の結果には影響させない
+      return self._count("merged", await asyncio.shield(task))
+
+    task = tasks[key] = loop.create_task(
+      asyncio.to_thread(self.get, url, params, ttl, **kwargs)
+    )
+    task.add_done_callback(lambda _: tasks.pop(key, None))
+    return await asyncio.shield(task)
+
+  def _count(
+    self, name: str, response: CachedResponse
+  ) -> CachedResponse:
+    with self._lock:
+      self.stats[name] += 1
+      self.stats["bytes_saved_cache"] += len(response.content)
+    metrics.increment("symbol_http_cache_total", result=name)
+    metrics.increment(
+      "symbol_http_cache_bytes_saved_total",
+      len(response.content),
+      reason="cache",
+    )
+    return response
+
+  def _fetch(
+    self, url: str, params: Optional[dict], **kwargs: Any
+  ) -> CachedResponse:
+    with metrics.span("http_get", endpoint=urlsplit(url).path):
+      response = self._session().get(url, params=params, **kwargs)
+    content = response.content
+    received = len(content)
+    headers = response.headers
+    if headers.get("Content-Encoding") == "gzip":
+      received = int(headers.get("Content-Length") or received)
+    with self._lock:
+      self.stats["bytes_received"] += received
+      self.stats["bytes_saved_gzip"] += len(content) - received
+    metrics.increment(
+      "symbol_http_cache_bytes_saved_total",
+      len(content) - received,
+      reason="gzip",
+    )
+    return CachedResponse(
+      response.url, response.status_code, content, dict(headers)
+    )
+
+  # 期限切れのものを捨て、それでも多ければ古いものから捨てる
+  def _evict(self) -> None:
+    now = time.monotonic()
+    for key in [k for k, (t, _) in self._entries.items() if t <= now]:
+      del self._entries[key]
+    while len(self._entries) >= self.max_entries:
+      del self._entries[next(iter(self._entries))]
+
+  # prefixで始まるURLのキャッシュを捨てる（省略するとすべて）
+  def invalidate(self, prefix: str = "") -> None:
+    with self._lock:
+      for key in [k for k in self._entries if k.startswith(prefix)]:
+        del self._entries[key]
+
+  def print_stats(self) -> None:
+    stats = self.stats
+    print(
+      "HTTPキャッシュ",
+      f"リクエスト {stats['requests']}",
+      f"キャッシュ {stats['hits']}",
+      f"まとめた数 {stats['merged']}",
+      f"通信 {stats['misses']}",
+      f"受信 {stats['bytes_received']:,}B",
+      f"削減（キャッシュ） {stats['bytes_saved_cache']:,}B",
+      f"削減（gzip） {stats['bytes_saved_gzip']:,}B",
+    )
+
+
+_default = HttpCache()
+
+
+def default_cache() -> HttpCache:
+  return _default
+
+
+# requests.getの代わりに使う、共有のキャッシュを通したGET
+def get(
+  url: str, params: Optional[dict] = None, **kwargs: Any
+) -> CachedResponse:
+  return _default.get(url, params, **kwargs)
+
+
+# http_cache.getの非同期版
+async def get_async(
+  url: str, params: Optional[dict] = None, **kwargs: Any
+) -> CachedResponse:
+  return await _default.get_async(url, params, **kwargs)
@@ -0,0 +1,391 @@
+# メタデータの状態をローカルに保持し、複数キーの更新をまとめて書き込むためのコード
+import json
+from typing import Any, Iterable, NamedTuple, Optional
+from binascii import unhexlify
+from websockets.legacy.client import connect
+from symbolchain.CryptoTypes import PublicKey
+from symbolchain.facade.SymbolFacade import (
+  SymbolFacade,
+  SymbolAccount,
+  Hash256,
+)
+from symbolchain.symbol.Metadata import (
+  metadata_generate_key,
+  metadata_update_value,
+)
+from symbolchain.symbol.Network import Address
+from symbolchain.sc import Amount, AggregateCompleteTransactionV2
+
+import http_cache
+
+# メタデータの種類（RESTのmetadataTypeと同じ値）
+METADATA_TYPE_ACCOUNT = 0
+METADATA_TYPE_MOSAIC = 1
+METADATA_TYPE_NAMESPACE = 2
+
+# メタデータトランザクションのタイプとメタデータの種類の対応
+METADATA_TRANSACTION_TYPES = {
+  0x4144: METADATA_TYPE_ACCOUNT,  # account_metadata_transaction_v1
+  0x4244: METADATA_TYPE_MOSAIC,  # mosaic_metadata_transaction_v1
+  0x4344: METADATA_TYPE_NAMESPACE,  # namespace_metadata_transaction_v1
+}
+
+# アグリゲートトランザクションのヘッダー部分のサイズ（インナートランザクションを除く）
+AGGREGATE_HEADER_SIZE = 168
+# 1アグリゲートに含められるインナートランザクション数の上限
+MAX_TRANSACTIONS_PER_AGGREGATE = 100
+# 連署1件あたりのサイズ
+COSIGNATURE_SIZE = 104
+
+
+# メタデータを一意に特定するキー
+# 同じ対象・同じキーでも設定したアカウント（source）が異なれば別のメタデータになる
+class MetadataKey(NamedTuple):
+  source_address: str  # 設定したアカウントのアドレス（16進数）
+  target_address: str  # 紐付ける対象のアカウントアドレス（16進数）
+  scoped_metadata_key: int  # メタデータのキー
+  target_id: int  # モザイクID、ネームスペースID（アカウントの場合は0）
+  metadata_type: int  # メタデータの種類
+
+
+# アドレスを16進数文字列（大文字）に揃える関数
+def address_to_hex(address: Any) -> str:
+  if isinstance(address, str):
+    if len(address) == 48:
+      return address.upper()
+    return Address(address).bytes.hex().upper()
+  return bytes(address.bytes).hex().upper()
+
+
+# 16進数文字列またはintの64bit値をintに揃える関数
+def _to_int(value: Any) -> int:
+  return value if isinstance(value, int) else int(value, 16)
+
+
+# 検索APIの1ページ分の問い合わせ条件を作る関数
+def _page_params(
+  query: dict, page_size: int, page_number: int
+) -> dict:
+  return {
+    **query,
+    "pageSize": str(page_size),
+    "pageNumber": str(page_number),
+  }
+
+
+class MetadataCache:
+  """メタデータの値をローカルに保持し、承認済みトランザクションで更新するキャッシュ"""
+
+  def __init__(self, node_url: str, facade: SymbolFacade) -> None:
+    self.node_url = node_url
+    self.facade = facade
+    # 承認済みの値
+    self._values: dict[MetadataKey, bytes] = {}
+    # 書き込み中（アグリゲートを作成済みで未承認）の値
+    self._optimistic: dict[MetadataKey, bytes] = {}
+    self._applied_hashes: set[str] = set()
+
+  def __len__(self) -> int:
+    return len(self._values)
+
+  def __contains__(self, key: MetadataKey) -> bool:
+    return key in self._values
+
+  # 現在の値を取得する（書き込み中の値があればそれを、未設定の場合は空のバイト列）
+  # 次の書き込みの差分はこの値から計算する
+  def get(self, key: MetadataKey) -> bytes:
+    if key in self._optimistic:
+      return self._optimistic[key]
+    return self.get_confirmed(key)
+
+  # 承認済みの値を取得する
+  def get_confirmed(self, key: MetadataKey) -> bytes:
+    return self._values.get(key, b"")
+
+  # 書き込み中の値として記録する（承認済みの値が同じになったら取り除く）
+  def set_optimistic(self, key: MetadataKey, value: bytes) -> None:
+    self._optimistic[key] = value
+
+  # 失敗した書き込みの値を捨て、承認済みの値に戻す（keysを省略するとすべて）
+  def discard_optimistic(
+    self, keys: Optional[Iterable[MetadataKey]] = None
+  ) -> None:
+    if keys is None:
+      self._optimistic.clear()
+      return
+    for key in keys:
+      self._optimistic.pop(key, None)
+
+  # /metadataの検索結果をすべてのページについて取り込む
+  def load(self, page_size: int = 100, **query: str) -> int:
+    loaded = 0
+    page_number = 1
+    while True:
+      response = http_cache.get(
+        f"{self.node_url}/metadata",
+        params=_page_params(query, page_size, page_number),
+      ).json()
+      entries = self._store_entries(response)
+      loaded += entries
+      if entries < page_size:
+        return loaded
+      page_number += 1
+
+  # loadの非同期版（問い合わせは別スレッドで行い、イベントループを止めない）
+  async def load_async(
+    self, page_size: int = 100, **query: str
+  ) -> int:
+    loaded = 0
+    page_number = 1
+    while True:
+      response = (
+        await http_cache.get_async(
+          f"{self.node_url}/metadata",
+          params=_page_params(query, page_size, page_number),
+        )
+      ).json()
+      entries = self._store_entries(response)
+      loaded += entries
+      if entries < page_size:
+        return loaded
+      page_number += 1
+
+  # 検索結果の1ページ分を取り込み、件数を返す
+  def _store_entries(self, response: dict) -> int:
+    entries = response.get("data", [])
+    for entry in entries:
+      self._store_entry(entry["metadataEntry"])
+    return len(entries)
+
+  def _store_entry(self, entry: dict) -> None:
+    key = MetadataKey(
+      address_to_hex(entry["sourceAddress"]),
+      address_to_hex(entry["targetAddress"]),
+      _to_int(entry["scopedMetadataKey"]),
+      _to_int(entry["targetId"]),
+      int(entry["metadataType"]),
+    )
+    self._values[key] = unhexlify(entry["value"])
+
+  # 承認済みトランザクション（WebSocketのconfirmedAddedやRESTの検索結果）を反映する
+  # XORの差分は二重に適用すると値が壊れるため、適用済みのハッシュは記録しておく
+  def apply_transaction(self, tx_info: dict) -> int:
+    meta = tx_info.get("meta", {})
+    tx_hash = meta.get("hash") or meta.get("aggregateHash")
+    if tx_hash is not None:
+      applied_key = f"{tx_hash}:{meta.get('index', '')}"
+      if applied_key in self._applied_hashes:
+        return 0
+      self._applied_hashes.add(applied_key)
+
+    transaction = tx_info["transaction"]
+    # アグリゲートトランザクションはインナートランザクションを順に反映する
+    if "transactions" in transaction:
+      return sum(
+        self._apply_embedded(inner["transaction"])
+        for inner in transaction["transactions"]
+      )
+    return self._apply_embedded(transaction)
+
+  def _apply_embedded(self, transaction: dict) -> int:
+    metadata_type = METADATA_TRANSACTION_TYPES.get(
+      int(transaction["type"])
+    )
+    if metadata_type is None:
+      return 0
+
+    source_address = self.facade.network.public_key_to_address(
+      PublicKey(transaction["signerPublicKey"])
+    )
+    key = MetadataKey(
+      address_to_hex(source_address),
+      address_to_hex(transaction["targetAddress"]),
+      _to_int(transaction["scopedMetadataKey"]),
+      _to_int(transaction.get("targetMosaicId")
+              or transaction.get("targetNamespaceId")
+              or 0),
+      metadata_type,
+    )
+    # 差分は承認済みの値に対するもの
+    self._values[key] = apply_metadata_delta(
+      self.get_confirmed(key),
+      unhexlify(transaction["value"]),
+      int(transaction["valueSizeDelta"]),
+    )
+    if self._optimistic.get(key) == self._values[key]:
+      del self._optimistic[key]
+    if not self._values[key]:
+      del self._values[key]
+    return 1
+
+  # 指定したアドレスの承認済みトランザクションを監視し、キャッシュに反映し続ける
+  async def watch(self, addresses: Iterable[Any]) -> None:
+    ws_endpoint = self.node_url.replace("http", "ws") + "/ws"
+    async with connect(ws_endpoint) as websocket:
+      uid = json.loads(await websocket.recv())["uid"]
+      for address in addresses:
+        await websocket.send(
+          json.dumps({
+            "uid": uid,
+            "subscribe": f"confirmedAdded/{address}",
+          })
+        )
+      async for message in websocket:
+        response_json = json.loads(message)
+        if response_json["topic"].startswith("confirmedAdded"):
+          self.apply_transaction(response_json["data"])
+
+
+# 古い値にXORの差分を適用し、新しい値を求める関数（metadata_update_valueの逆）
+def apply_metadata_delta(
+  old_value: bytes, delta: bytes, value_size_delta: int
+) -> bytes:
+  new_size = len(old_value) + value_size_delta
+  padded_old_value = old_value.ljust(len(delta), b"\0")
+  return bytes(
+    old ^ diff for old, diff in zip(padded_old_value, delta)
+  )[:new_size]
+
+
+# 8バイト境界に揃えたサイズを求める関数（インナートランザクションのパディング）
+def _aligned_size(size: int) -> int:
+  return (size + 7) & ~7
+
+
+class MetadataBatchWriter:
+  """多数のメタデータの更新をキャッシュの値から差分計算し、サイズ上限付きのアグリゲートにまとめる"""
+
+  def __init__(
+    self,
+    facade: SymbolFacade,
+    cache: MetadataCache,
+    signer: SymbolAccount,
+    max_aggregate_size: int = 64 * 1024,
+    max_transactions: int = MAX_TRANSACTIONS_PER_AGGREGATE,
+  ) -> None:
+    self.facade = facade
+    self.cache = cache
+    self.signer = signer
+    self.max_aggregate_size = max_aggregate_size
+    self.max_transactions = max_transactions
+    self._pending: dict[MetadataKey, tuple[bytes, Any, Any]] = {}
+
+  def __len__(self) -> int:
+    return len(self._pending)
+
+  # 書き込むメタデータを追加する（同じキーは後から追加した値で上書き）
+  def set(
+    self,
+    target_address: Any,
+    key: Any,
+    value: Any,
+    metadata_type: int = METADATA_TYPE_ACCOUNT,
+    target_id: int = 0,
+  ) -> None:
+    scoped_metadata_key = (
+      metadata_generate_key(key) if isinstance(key, str) else key
+    )
+    metadata_key = MetadataKey(
+      address_to_hex(self.signer.address),
+      address_to_hex(target_address),
+      scoped_metadata_key,
+      target_id,
+      metadata_type,
+    )
+    new_value = value.encode("utf-8") if isinstance(value, str) else value
+    self._pending[metadata_key] = (
+      new_value, target_address, scoped_metadata_key
+    )
+
+  def _create_embedded(
+    self, metadata_key: MetadataKey, new_value: bytes,
+    target_address: Any, scoped_metadata_key: int,
+  ) -> Optional[Any]:
+    old_value = self.cache.get(metadata_key)
+    if old_value == new_value:
+      return None
+
+    descriptor = {
+      "target_address": target_address,
+      "scoped_metadata_key": scoped_metadata_key,
+      "value": metadata_update_value(old_value, new_value),
+      "value_size_delta": len(new_value) - len(old_value),
+      "signer_public_key": self.signer.public_key,
+    }
+    if metadata_key.metadata_type == METADATA_TYPE_ACCOUNT:
+      descriptor["type"] = "account_metadata_transaction_v1"
+    elif metadata_key.metadata_type == METADATA_TYPE_MOSAIC:
+      descriptor["type"] = "mosaic_metadata_transaction_v1"
+      descriptor["target_mosaic_id"] = metadata_key.target_id
+    else:
+      descriptor["type"] = "namespace_metadata_transaction_v1"
+      descriptor["target_namespace_id"] = metadata_key.target_id
+    return self.facade.transaction_factory.create_embedded(
+      descriptor
+    )
+
+  # 追加されたメタデータをアグリゲートトランザクションにまとめる
+  # 値が変わらないキーは含めない。対象が署名者以外の場合は連署が必要になる
+  # まとめた値はキャッシュに書き込み中の値として記録し、承認前に次のbuildを呼んでも
+  # その値からの差分を計算する（アナウンスに失敗した場合はdiscard_optimisticで戻す）
+  def build(
+    self, deadline_timestamp: int
+  ) -> list[AggregateCompleteTransactionV2]:
+    signer_address = address_to_hex(self.signer.address)
+    aggregates = []
+    txs: list = []
+    cosigners: set[str] = set()
+    size = AGGREGATE_HEADER_SIZE
+
+    for metadata_key, pending in self._pending.items():
+      embedded_tx = self._create_embedded(metadata_key, *pending)
+      if embedded_tx is None:
+        continue
+
+      embedded_size = _aligned_size(embedded_tx.size)
+      new_cosigners = cosigners | (
+        {metadata_key.target_address} - {signer_address}
+      )
+      if txs and (
+        len(txs) >= self.max_transactions
+        or size + embedded_size + len(new_cosigners) * COSIGNATURE_SIZE
+        > self.max_aggregate_size
+      ):
+        aggregates.append(
+          self._create_aggregate(txs, len(cosigners), deadline_timestamp)
+        )
+        txs, size = [], AGGREGATE_HEADER_SIZE
+        new_cosigners = {metadata_key.target_address} - {signer_address}
+
+      txs.append(embedded_tx)
+      size += embedded_size
+      cosigners = new_cosigners
+      self.cache.set_optimistic(metadata_key, pending[0])
+
+    if txs:
+      aggregates.append(
+        self._create_aggregate(txs, len(cosigners), deadline_timestamp)
+      )
+    self._pending.clear()
+    return aggregates
+
+  def _create_aggregate(
+    self, txs: list, cosigner_count: int, deadline_timestamp: int
+  ) -> AggregateCompleteTransactionV2:
+    inner_transaction_hash: Hash256 = (
+      self.facade.hash_embedded_transactions(txs)
+    )
+    tx_agg: (
+      AggregateCompleteTransactionV2
+    ) = self.facade.transaction_factory.create({
+        "type": "aggregate_complete_transaction_v2",
+        "transactions": txs,
+        "transactions_hash": inner_transaction_hash,
+        "signer_public_key": self.signer.public_key,
+        "deadline": deadline_timestamp,
+      })
+    # 連署者の署名分のサイズ（連署者 ＊ 104）を手数料に含める
+    tx_agg.fee = Amount(
+      100 * (tx_agg.size + cosigner_count * COSIGNATURE_SIZE)
+    )
+    return tx_agg
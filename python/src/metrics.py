@@ -0,0 +1,269 @@
+# アナウンスまでの各処理（生成・署名・シリアライズ・アナウンス・状態確認・デコード）の時間と回数を集計するコード
+# 環境変数 METRICS_OUTPUT を指定すると終了時にファイルへ書き出す（.jsonはJSON、それ以外はPrometheus形式）
+# 環境変数 METRICS_PORT を指定すると http://localhost:<port>/metrics でPrometheus形式を返す
+# どちらも指定しない場合は無効で、計測の呼び出しはほぼ何もしない
+import os
+import json
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Iterator, Optional
+
+from histogram import Histogram
+
+if TYPE_CHECKING:
+  from http.server import ThreadingHTTPServer
+
+# 処理時間のヒストグラムの名前
+SPAN_METRIC = "symbol_span_seconds"
+# 処理中に例外が発生した回数の名前
+SPAN_ERROR_METRIC = "symbol_span_errors_total"
+# Prometheus形式で出力するパーセンタイル
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+_LabelKey = tuple[tuple[str, str], ...]
+
+_enabled = False
+_lock = threading.Lock()
+_counters: dict[str, dict[_LabelKey, float]] = {}
+_histograms: dict[str, dict[_LabelKey, Histogram]] = {}
+# collect_spansで集計中のspan名 => 合計時間（スレッドごと）
+_local = threading.local()
+
+
+class _NoopSpan:
+  """無効時に返す何もしないspan"""
+
+  def __enter__(self) -> "_NoopSpan":
+    return self
+
+  def __exit__(self, *exc_info: Any) -> None:
+    return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+  """withで囲んだ処理の時間を計測する"""
+
+  __slots__ = ("_name", "_key", "_timings", "_started")
+
+  def __init__(
+    self,
+    name: str,
+    key: _LabelKey,
+    timings: Optional[dict[str, float]],
+  ) -> None:
+    self._name = name
+    self._key = key
+    self._timings = timings
+
+  def __enter__(self) -> "_Span":
+    self._started = time.perf_counter()
+    return self
+
+  def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+    elapsed = time.perf_counter() - self._started
+    if self._timings is not None:
+      self._timings[self._name] = (
+        self._timings.get(self._name, 0) + elapsed
+      )
+    if not _enabled:
+      return
+    with _lock:
+      _histogram(SPAN_METRIC, self._key).record(elapsed)
+      if exc_type is not None:
+        counters = _counters.setdefault(SPAN_ERROR_METRIC, {})
+        counters[self._key] = counters.get(self._key, 0) + 1
+
+
+def _label_key(labels: dict[str, Any]) -> _LabelKey:
+  return tuple(
+    sorted((name, str(value)) for name, value in labels.items())
+  )
+
+
+def _histogram(name: str, key: _LabelKey) -> Histogram:
+  histograms = _histograms.setdefault(name, {})
+  histogram = histograms.get(key)
+  if histogram is None:
+    histogram = histograms[key] = Histogram()
+  return histogram
+
+
+def enable() -> None:
+  global _enabled
+  _enabled = True
+
+
+def disable() -> None:
+  global _enabled
+  _enabled = False
+
+
+def is_enabled() -> bool:
+  return _enabled
+
+
+# 集計した値をすべて消去する
+def reset() -> None:
+  with _lock:
+    _counters.clear()
+    _histograms.clear()
+
+
+# 処理時間を計測する（with metrics.span("sign"): ...）
+def span(name: str, **labels: Any) -> Any:
+  timings = getattr(_local, "timings", None)
+  if not _enabled and timings is None:
+    return _NOOP_SPAN
+  return _Span(name, _label_key({"span": name, **labels}), timings)
+
+
+# withの中でこのスレッドが実行したspanの合計時間を、span名ごとに集める
+# 計測が無効でも集める（with metrics.collect_spans() as timings: ...）
+@contextmanager
+def collect_spans() -> Iterator[dict[str, float]]:
+  previous = getattr(_local, "timings", None)
+  timings: dict[str, float] = {}
+  _local.timings = timings
+  try:
+    yield timings
+  finally:
+    _local.timings = previous
+
+
+# カウンターを加算する
+def increment(name: str, value: float = 1, **labels: Any) -> None:
+  if not _enabled:
+    return
+  key = _label_key(labels)
+  with _lock:
+    counters = _counters.setdefault(name, {})
+    counters[key] = counters.get(key, 0) + value
+
+
+# 計測済みの時間（秒）をヒストグラムに記録する
+def observe(name: str, seconds: float, **labels: Any) -> None:
+  if not _enabled:
+    return
+  key = _label_key(labels)
+  with _lock:
+    _histogram(name, key).record(seconds)
+
+
+def _escape(value: str) -> str:
+  return (
+    value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+  )
+
+
+def _format_labels(key: _LabelKey, extra: str = "") -> str:
+  items = [f'{name}="{_escape(value)}"' for name, value in key]
+  if extra:
+    items.append(extra)
+  return "{" + ",".join(items) + "}" if items else ""
+
+
+# Prometheusのテキスト形式（ヒストグラムはパーセンタイルを持つsummaryとして出力する）
+def to_prometheus() -> str:
+  lines = []
+  with _lock:
+    for name, counters in sorted(_counters.items()):
+      lines.append(f"# TYPE {name} counter")
+      for key, value in counters.items():
+        lines.append(f"{name}{_format_labels(key)} {value:g}")
+    for name, histograms in sorted(_histograms.items()):
+      lines.append(f"# TYPE {name} summary")
+      for key, histogram in histograms.items():
+        for quantile in QUANTILES:
+          labels = _format_labels(key, f'quantile="{quantile:g}"')
+          value = histogram.percentile(quantile * 100)
+          lines.append(f"{name}{labels} {value:.6f}")
+        total = histogram.mean * histogram.count
+        lines.append(f"{name}_sum{_format_labels(key)} {total:.6f}")
+        lines.append(
+          f"{name}_count{_format_labels(key)} {histogram.count}"
+        )
+  return "\n".join(lines) + "\n"
+
+
+# JSONに変換できる辞書
+def to_dict() -> dict:
+  with _lock:
+    return {
+      "counters": {
+        name: [
+          {"labels": dict(key), "value": value}
+          for key, value in counters.items()
+        ]
+        for name, counters in _counters.items()
+      },
+      "histograms": {
+        name: [
+          {"labels": dict(key), **histogram.summary()}
+          for key, histogram in histograms.items()
+        ]
+        for name, histograms in _histograms.items()
+      },
+    }
+
+
+# ファイルに書き出す（.jsonはJSON、それ以外はPrometheus形式）
+def dump(path: str) -> None:
+  with open(path, "w") as file:
+    if path.endswith(".json"):
+      json.dump(to_dict(), file, indent=2, ensure_ascii=False)
+    else:
+      file.write(to_prometheus())
+
+
+# /metrics を返すHTTPサーバーをバックグラウンドで起動する
+# http.serverは起動するときだけ読み込む（METRICS_PORTを使わないスクリプトでは読み込まない）
+def serve(
+  port: int, host: str = "127.0.0.1"
+) -> "ThreadingHTTPServer":
+  from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+  class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+      if self.path.split("?")[0] == "/metrics":
+        body = to_prometheus().encode("utf-8")
+        content_type = "text/plain; version=0.0.4; charset=utf-8"
+      elif self.path.split("?")[0] == "/metrics.json":
+        body = json.dumps(to_dict(), ensure_ascii=False).encode(
+          "utf-8"
+        )
+        content_type = "application/json"
+      else:
+        self.send_error(404)
+        return
+      self.send_response(200)
+      self.send_header("Content-Type", content_type)
+      self.send_header("Content-Length", str(len(body)))
+      self.end_headers()
+      self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+      return None
+
+  enable()
+  server = ThreadingHTTPServer((host, port), MetricsHandler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+
+# 環境変数に従って有効にする（インポート時に1回だけ実行する）
+def _configure_from_env() -> None:
+  output: Optional[str] = os.getenv("METRICS_OUTPUT")
+  port: Optional[str] = os.getenv("METRICS_PORT")
+  if output:
+    enable()
+    atexit.register(dump, output)
+  if port:
+    serve(int(port))
+
+
+_configure_from_env()
@@ -0,0 +1,278 @@
+# モザイク情報・ネームスペース情報をまとめて取得し、キャッシュするコード
+import time
+import asyncio
+import requests
+from typing import Any, Awaitable, Callable, Optional
+
+import http_cache
+
+# 1回のPOSTでまとめて問い合わせるIDの上限
+MAX_IDS_PER_REQUEST = 100
+# 有効期限なし（duration 0のモザイクや、有効期限のないネームスペース）
+ETERNAL_HEIGHT = 0xFFFFFFFF_FFFFFFFF
+# モザイク情報のうち、発行・回収で変わるため有効期限までキャッシュしないフィールド
+MUTABLE_MOSAIC_FIELDS = ("supply",)
+
+
+# IDを16進数文字列（大文字、16桁）に揃える関数
+def id_to_hex(id: Any) -> str:
+  return f"{id:016X}" if isinstance(id, int) else id.upper().zfill(16)
+
+
+class _BatchLoader:
+  """同時に発生した問い合わせを短い時間待ってまとめ、一度のリクエストで取得する"""
+
+  def __init__(
+    self,
+    fetch: Callable[[list[str]], dict[str, Any]],
+    batch_window: float,
+    max_batch_size: int,
+  ) -> None:
+    self._fetch = fetch
+    self._batch_window = batch_window
+    self._max_batch_size = max_batch_size
+    self._queue: list[str] = []
+    self._in_flight: dict[str, asyncio.Future] = {}
+    self._flush_handle: Optional[asyncio.TimerHandle] = None
+    # 実行中の取得タスク（参照を持たないとタスクが途中で回収されることがある）
+    self._tasks: set[asyncio.Task] = set()
+    self.merged = 0  # 実行中のリクエストに合流した問い合わせ数
+    self.batches = 0  # 実際に送ったリクエスト数
+
+  async def load(self, key: str) -> Any:
+    future = self._in_flight.get(key)
+    if future is not None:
+      self.merged += 1
+    else:
+      future = asyncio.get_running_loop().create_future()
+      self._in_flight[key] = future
+      self._queue.append(key)
+      if len(self._queue) >= self._max_batch_size:
+        self._flush()
+      elif self._flush_handle is None:
+        self._flush_handle = asyncio.get_running_loop().call_later(
+          self._batch_window, self._flush
+        )
+    # 呼び出し元がキャンセルされても他の待機者の結果には影響させない
+    return await asyncio.shield(future)
+
+  def _flush(self) -> None:
+    if self._flush_handle is not None:
+      self._flush_handle.cancel()
+      self._flush_handle = None
+    keys, self._queue = self._queue, []
+    if keys:
+      self.batches += 1
+      task = asyncio.get_running_loop().create_task(self._run(keys))
+      self._tasks.add(task)
+      task.add_done_callback(self._tasks.discard)
+
+  async def _run(self, keys: list[str]) -> None:
+    try:
+      results = await asyncio.to_thread(self._fetch, keys)
+    except Exception as e:
+      for key in keys:
+        self._in_flight.pop(key).set_exception(e)
+      return
+    for key in keys:
+      self._in_flight.pop(key).set_result(results.get(key))
+
+
+class MosaicNamespaceResolver:
+  """モザイク・ネームスペースの情報をPOSTでまとめて取得し、有効期限のブロック高までキャッシュする"""
+
+  def __init__(
+    self,
+    node_url: str,
+    batch_window: float = 0.005,
+    height_refresh_interval: float = 15,
+    supply_ttl: float = 1,
+  ) -> None:
+    self.node_url = node_url
+    self.height_refresh_interval = height_refresh_interval
+    self.supply_ttl = supply_ttl
+    # キャッシュ（ID => (有効期限のブロック高, 情報)）
+    # モザイク情報はMUTABLE_MOSAIC_FIELDSを除いたものを保持する
+    self._mosaics: dict[str, tuple[int, dict]] = {}
+    # モザイクの供給量（ID => (取得した時刻, 供給量)）
+    self._supplies: dict[str, tuple[float, int]] = {}
+    self._namespaces: dict[str, tuple[int, dict]] = {}
+    self._names: dict[str, tuple[int, dict]] = {}
+    self._mosaic_loader = _BatchLoader(
+      self._fetch_mosaics, batch_window, MAX_IDS_PER_REQUEST
+    )
+    self._namespace_loader = _BatchLoader(
+      self._fetch_namespaces, batch_window, MAX_IDS_PER_REQUEST
+    )
+    self._name_loader = _BatchLoader(
+      self._fetch_names, batch_window, MAX_IDS_PER_REQUEST
+    )
+    self._height = 0
+    self._height_fetched_at = float("-inf")
+    self._height_task: Optional[asyncio.Task] = None
+    self.hits = 0
+
+  def _post(self, path: str, body: dict) -> list:
+    response = requests.post(
+      f"{self.node_url}{path}",
+      headers={"Content-Type": "application/json"},
+      json=body,
+    )
+    response.raise_for_status()
+    return response.json()
+
+  def _fetch_mosaics(self, ids: list[str]) -> dict[str, Any]:
+    return {
+      info["mosaic"]["id"]: info
+      for info in self._post("/mosaics", {"mosaicIds": ids})
+    }
+
+  def _fetch_namespaces(self, ids: list[str]) -> dict[str, Any]:
+    results = {}
+    for info in self._post("/namespaces", {"namespaceIds": ids}):
+      namespace = info["namespace"]
+      # ネームスペースIDは階層の深さに対応するlevelに入っている
+      results[namespace[f"level{namespace['depth'] - 1}"]] = info
+    return results
+
+  def _fetch_names(self, ids: list[str]) -> dict[str, Any]:
+    return {
+      info["id"]: info
+      for info in self._post("/namespaces/names", {"namespaceIds": ids})
+    }
+
+  # 現在のブロック高を取得する（同時に呼ばれても/chain/infoへの問い合わせは1回）
+  async def chain_height(self) -> int:
+    if (
+      time.monotonic() - self._height_fetched_at
+      < self.height_refresh_interval
+    ):
+      return self._height
+    if self._height_task is None:
+      self._height_task = asyncio.create_task(
+        http_cache.get_async(f"{self.node_url}/chain/info")
+      )
+    try:
+      response = await asyncio.shield(self._height_task)
+    finally:
+      self._height_task = None
+    self._height = int(response.json()["height"])
+    self._height_fetched_at = time.monotonic()
+    return self._height
+
+  async def _resolve(
+    self,
+    cache: dict[str, tuple[int, dict]],
+    load: Callable[[str], Awaitable[Optional[dict]]],
+    id: Any,
+    expiry: Callable[[dict], int],
+  ) -> Optional[dict]:
+    key = id_to_hex(id)
+    cached = cache.get(key)
+    if cached is not None and cached[0] > await self.chain_height():
+      self.hits += 1
+      return cached[1]
+    info = await load(key)
+    if info is not None:
+      cache[key] = (expiry(info), info)
+    return info
+
+  # モザイク情報を取得し、供給量とそれ以外のフィールドに分けて記録する
+  async def _load_mosaic(self, key: str) -> Optional[dict]:
+    info = await self._mosaic_loader.load(key)
+    if info is None:
+      return None
+    mosaic = info["mosaic"]
+    self._supplies[key] = (time.monotonic(), int(mosaic["supply"]))
+    return {
+      **info,
+      "mosaic": {
+        name: value
+        for name, value in mosaic.items()
+        if name not in MUTABLE_MOSAIC_FIELDS
+      },
+    }
+
+  # モザイク情報を取得する（存在しない場合はNone）
+  # 供給量（supply）は含まない。supplyで取得する
+  async def mosaic(self, mosaic_id: Any) -> Optional[dict]:
+    return await self._resolve(
+      self._mosaics, self._load_mosaic, mosaic_id, _mosaic_expiry
+    )
+
+  # モザイクの供給量を取得する（supply_ttl秒より古ければ取得し直す）
+  async def supply(self, mosaic_id: Any) -> int:
+    key = id_to_hex(mosaic_id)
+    cached = self._supplies.get(key)
+    if cached is not None and (
+      time.monotonic() - cached[0] < self.supply_ttl
+    ):
+      self.hits += 1
+      return cached[1]
+    info = await self._load_mosaic(key)
+    if info is None:
+      raise KeyError(f"モザイクが見つかりません: {key}")
+    self._mosaics[key] = (_mosaic_expiry(info), info)
+    return self._supplies[key][1]
+
+  # モザイクの可分性を取得する
+  async def divisibility(self, mosaic_id: Any) -> int:
+    info = await self.mosaic(mosaic_id)
+    if info is None:
+      raise KeyError(f"モザイクが見つかりません: {id_to_hex(mosaic_id)}")
+    return int(info["mosaic"]["divisibility"])
+
+  # ネームスペース情報を取得する（存在しない場合はNone）
+  async def namespace(self, namespace_id: Any) -> Optional[dict]:
+    return await self._resolve(
+      self._namespaces,
+      self._namespace_loader.load,
+      namespace_id,
+      _namespace_expiry,
+    )
+
+  # ネームスペースのフルネーム（例: root.sub）を取得する
+  # 名前の有効期限はネームスペース自体の有効期限に合わせる
+  async def namespace_name(self, namespace_id: Any) -> Optional[str]:
+    key = id_to_hex(namespace_id)
+    cached = self._names.get(key)
+    if cached is None or cached[0] <= await self.chain_height():
+      name_info, namespace_info = await asyncio.gather(
+        self._name_loader.load(key), self.namespace(key)
+      )
+      if name_info is None or namespace_info is None:
+        return None
+      cached = (_namespace_expiry(namespace_info), name_info)
+      self._names[key] = cached
+    else:
+      self.hits += 1
+
+    name_info = cached[1]
+    if "parentId" not in name_info:
+      return name_info["name"]
+    parent_name = await self.namespace_name(name_info["parentId"])
+    return f"{parent_name}.{name_info['name']}"
+
+  # キャッシュとまとめ取得の統計情報
+  def stats(self) -> dict[str, int]:
+    loaders = [
+      self._mosaic_loader, self._namespace_loader, self._name_loader
+    ]
+    return {
+      "hits": self.hits,
+      "merged": sum(loader.merged for loader in loaders),
+      "requests": sum(loader.batches for loader in loaders),
+    }
+
+
+# モザイクの有効期限のブロック高（duration 0は無期限）
+def _mosaic_expiry(info: dict) -> int:
+  duration = int(info["mosaic"]["duration"])
+  if duration == 0:
+    return ETERNAL_HEIGHT
+  return int(info["mosaic"]["startHeight"]) + duration
+
+
+# ネームスペースの有効期限のブロック高
+def _namespace_expiry(info: dict) -> int:
+  return int(info["namespace"]["endHeight"])
@@ -0,0 +1,396 @@
+# アナウンス前に、ノードで拒否されるトランザクションをローカルで検出するコード
+import time
+import asyncio
+from typing import Any, Iterable, Optional
+from symbolchain.facade.SymbolFacade import SymbolFacade
+
+import http_cache
+from account_cache import AccountCache
+from restriction_cache import (
+  RESTRICTION_ADDRESS,
+  RESTRICTION_MOSAIC_ID,
+  RESTRICTION_TRANSACTION_TYPE,
+  RESTRICTION_OUTGOING,
+  MOSAIC_RESTRICTION_NONE,
+  MOSAIC_RESTRICTION_EQ,
+  MOSAIC_RESTRICTION_NE,
+  MOSAIC_RESTRICTION_LT,
+  MOSAIC_RESTRICTION_LE,
+  MOSAIC_RESTRICTION_GT,
+  MOSAIC_RESTRICTION_GE,
+  MOSAIC_RESTRICTION_UNSET,
+  RestrictionIndex,
+  address_to_hex,
+)
+
+# テストネットの基軸通貨のモザイクID（手数料の支払いに使われる）
+CURRENCY_MOSAIC_ID = 0x72C0212E67A08BCE
+# トランザクションの有効期限として指定できる最大の時間（ミリ秒）
+MAX_TRANSACTION_LIFETIME = 6 * 60 * 60 * 1000
+# モザイク供給量変更トランザクションのタイプと、増加を表すaction
+MOSAIC_SUPPLY_CHANGE_TRANSACTION_TYPE = 0x424D
+MOSAIC_SUPPLY_INCREASE = 1
+# 受取人にモザイクが届く（残高を加える）転送トランザクションのタイプ
+TRANSFER_TRANSACTION_TYPE = 0x4154
+
+# ノードが返すものと同じ失敗コード
+SUCCESS = "Success"
+FAILURE_PAST_DEADLINE = "Failure_Core_Past_Deadline"
+FAILURE_FUTURE_DEADLINE = "Failure_Core_Future_Deadline"
+FAILURE_INSUFFICIENT_BALANCE = "Failure_Core_Insufficient_Balance"
+FAILURE_ADDRESS_INTERACTION_PROHIBITED = (
+  "Failure_RestrictionAccount_Address_Interaction_Prohibited"
+)
+FAILURE_MOSAIC_TRANSFER_PROHIBITED = (
+  "Failure_RestrictionAccount_Mosaic_Transfer_Prohibited"
+)
+FAILURE_OPERATION_TYPE_PROHIBITED = (
+  "Failure_RestrictionAccount_Operation_Type_Prohibited"
+)
+FAILURE_MOSAIC_ACCOUNT_UNAUTHORIZED = (
+  "Failure_RestrictionMosaic_Account_Unauthorized"
+)
+
+_COMPARATORS = {
+  MOSAIC_RESTRICTION_EQ: lambda value, rule: value == rule,
+  MOSAIC_RESTRICTION_NE: lambda value, rule: value != rule,
+  MOSAIC_RESTRICTION_LT: lambda value, rule: value < rule,
+  MOSAIC_RESTRICTION_LE: lambda value, rule: value <= rule,
+  MOSAIC_RESTRICTION_GT: lambda value, rule: value > rule,
+  MOSAIC_RESTRICTION_GE: lambda value, rule: value >= rule,
+}
+
+
+# ネームスペース（エイリアス）で指定されたアドレスかどうか
+def _is_alias_address(address_hex: str) -> bool:
+  return bool(int(address_hex[:2], 16) & 0x01)
+
+
+class PreflightState:
+  """事前チェックに使う制限・残高・ネットワーク時刻をRESTから取得して保持する"""
+
+  def __init__(
+    self,
+    node_url: str,
+    restrictions: Optional[RestrictionIndex] = None,
+    accounts: Optional[AccountCache] = None,
+  ) -> None:
+    self.node_url = node_url
+    # 制限はRestrictionIndexで保持する（一括読み込み済みのものを共有できる）
+    self.restrictions = restrictions or RestrictionIndex(
+      node_url, SymbolFacade("testnet")
+    )
+    # 残高はAccountCacheを指定した場合はそこから取得する（監視中なら問い合わせない）
+    self.accounts = accounts
+    # アドレス => {モザイクID: 残高}
+    self.balances: dict[str, dict[int, int]] = {}
+    self._time_offset: Optional[float] = None
+
+  def _get(self, path: str, params: Optional[dict] = None) -> Any:
+    response = http_cache.get(f"{self.node_url}{path}", params=params)
+    return response.json() if response.status_code == 200 else None
+
+  # アカウントの制限と残高を取得する
+  def load_accounts(self, addresses: Iterable[Any]) -> None:
+    address_hexes = [address_to_hex(address) for address in addresses]
+    if self.accounts is not None:
+      self.accounts.load(
+        address_hexes, refresh=not self.accounts.watching
+      )
+      self._store_cached_balances(address_hexes)
+    self._fetch_accounts(address_hexes)
+
+  # load_accountsの非同期版（問い合わせは別スレッドで行い、イベントループを止めない）
+  async def load_accounts_async(
+    self, addresses: Iterable[Any]
+  ) -> None:
+    address_hexes = [address_to_hex(address) for address in addresses]
+    if self.accounts is not None:
+      await self.accounts.load_async(
+        address_hexes, refresh=not self.accounts.watching
+      )
+      self._store_cached_balances(address_hexes)
+    await asyncio.to_thread(self._fetch_accounts, address_hexes)
+
+  # 承認待ちの自分の送金を差し引いた残高で判定する
+  def _store_cached_balances(self, address_hexes: list[str]) -> None:
+    for address_hex in address_hexes:
+      self.balances[address_hex] = (
+        self.accounts.optimistic_balances(address_hex)
+      )
+
+  # アカウントの制限と、AccountCacheを使わない場合は残高をRESTから取得する
+  def _fetch_accounts(self, address_hexes: list[str]) -> None:
+    for address_hex in address_hexes:
+      info = self._get(f"/restrictions/account/{address_hex}")
+      self.restrictions.set_account_restrictions(
+        address_hex,
+        info["restrictions"]["restrictions"] if info else [],
+      )
+      if self.accounts is not None:
+        continue
+      account_info = self._get(f"/accounts/{address_hex}")
+      self.balances[address_hex] = {
+        int(mosaic["id"], 16): int(mosaic["amount"])
+        for mosaic in (
+          account_info["account"]["mosaics"] if account_info else []
+        )
+      }
+
+  # モザイクのグローバル制限とアドレス制限を取得する
+  def load_mosaics(self, mosaic_ids: Iterable[int]) -> None:
+    for mosaic_id in mosaic_ids:
+      self.restrictions.mosaic_global_restrictions.pop(mosaic_id, None)
+      self.restrictions.load_mosaic_restrictions(
+        mosaicId=f"{mosaic_id:016X}"
+      )
+
+  # load_mosaicsの非同期版
+  async def load_mosaics_async(
+    self, mosaic_ids: Iterable[int]
+  ) -> None:
+    for mosaic_id in mosaic_ids:
+      self.restrictions.mosaic_global_restrictions.pop(mosaic_id, None)
+      await self.restrictions.load_mosaic_restrictions_async(
+        mosaicId=f"{mosaic_id:016X}"
+      )
+
+  # ノードの時刻を取得し、ローカル時刻との差を保持する
+  def load_network_time(self) -> None:
+    self._store_network_time(self._get("/node/time"))
+
+  # load_network_timeの非同期版
+  async def load_network_time_async(self) -> None:
+    response = await http_cache.get_async(
+      f"{self.node_url}/node/time"
+    )
+    self._store_network_time(response.json())
+
+  def _store_network_time(self, network_time: dict) -> None:
+    receive_timestamp = int(
+      network_time["communicationTimestamps"]["receiveTimestamp"]
+    )
+    self._time_offset = receive_timestamp - time.time() * 1000
+
+  # 現在のネットワーク時刻（ミリ秒）。未取得の場合はNone
+  def network_time(self) -> Optional[int]:
+    if self._time_offset is None:
+      return None
+    return int(time.time() * 1000 + self._time_offset)
+
+
+# 制限リストで値が許可されているかどうか（未設定の場合は許可）
+def _is_allowed(
+  restriction: Optional[tuple[bool, set]], value: Any
+) -> bool:
+  if restriction is None or not restriction[1]:
+    return True
+  is_block, values = restriction
+  return (value in values) != is_block
+
+
+class PreflightValidator:
+  """保持している状態を使い、ノードと同じ失敗コードで拒否されるトランザクションを予測する"""
+
+  def __init__(
+    self,
+    facade: SymbolFacade,
+    state: PreflightState,
+    currency_mosaic_id: int = CURRENCY_MOSAIC_ID,
+    max_transaction_lifetime: int = MAX_TRANSACTION_LIFETIME,
+  ) -> None:
+    self.facade = facade
+    self.state = state
+    self.currency_mosaic_id = currency_mosaic_id
+    self.max_transaction_lifetime = max_transaction_lifetime
+    self._addresses: dict[bytes, str] = {}
+
+  def _signer_address(self, transaction: Any) -> str:
+    public_key = transaction.signer_public_key.bytes
+    address_hex = self._addresses.get(public_key)
+    if address_hex is None:
+      address_hex = address_to_hex(
+        self.facade.network.public_key_to_address(
+          transaction.signer_public_key
+        )
+      )
+      self._addresses[public_key] = address_hex
+    return address_hex
+
+  # トランザクションを検証し、予測される結果コードを返す（問題なければSuccess）
+  # 取得していない制限・残高はチェックしない（ノードの判断に任せる）
+  def validate(self, transaction: Any) -> str:
+    now = self.state.network_time()
+    if now is not None:
+      deadline = transaction.deadline.value
+      if deadline <= now:
+        return FAILURE_PAST_DEADLINE
+      if deadline > now + self.max_transaction_lifetime:
+        return FAILURE_FUTURE_DEADLINE
+
+    signer_address = self._signer_address(transaction)
+    # 残高の増減（アドレス => {モザイクID: 金額}）
+    # ノードと同じく手数料・インナートランザクションの順に反映し、その都度残高を確認する
+    changes: dict[str, dict[int, int]] = {}
+    if not self._move(
+      changes,
+      signer_address,
+      self.currency_mosaic_id,
+      -transaction.fee.value,
+    ):
+      return FAILURE_INSUFFICIENT_BALANCE
+
+    embedded_transactions = getattr(transaction, "transactions", None)
+    for embedded in [transaction, *(embedded_transactions or [])]:
+      if embedded is transaction and embedded_transactions is not None:
+        result = self._validate_operation(
+          signer_address, embedded.type_.value
+        )
+      else:
+        result = self._validate_embedded(embedded, changes)
+      if result != SUCCESS:
+        return result
+    return SUCCESS
+
+  # 残高を増減し、取得済みの残高が負になる場合はFalseを返す
+  def _move(
+    self,
+    changes: dict[str, dict[int, int]],
+    address_hex: str,
+    mosaic_id: int,
+    amount: int,
+  ) -> bool:
+    # ネームスペースで指定されたモザイクはローカルでは解決できないためチェックしない
+    if mosaic_id >> 63:
+      return True
+    account_changes = changes.setdefault(address_hex, {})
+    change = account_changes.get(mosaic_id, 0) + amount
+    account_changes[mosaic_id] = change
+    balances = self.state.balances.get(address_hex)
+    if balances is None:
+      return True
+    return balances.get(mosaic_id, 0) + change >= 0
+
+  def _validate_operation(
+    self, signer_address: str, transaction_type: int
+  ) -> str:
+    if not _is_allowed(
+      self.state.restrictions.account_restriction(
+        signer_address,
+        RESTRICTION_TRANSACTION_TYPE | RESTRICTION_OUTGOING,
+      ),
+      transaction_type,
+    ):
+      return FAILURE_OPERATION_TYPE_PROHIBITED
+    return SUCCESS
+
+  def _validate_embedded(
+    self, transaction: Any, changes: dict[str, dict[int, int]]
+  ) -> str:
+    signer_address = self._signer_address(transaction)
+    result = self._validate_operation(
+      signer_address, transaction.type_.value
+    )
+    if result != SUCCESS:
+      return result
+
+    # 送付するモザイク（転送・シークレットロック・ハッシュロック）
+    mosaics = list(getattr(transaction, "mosaics", None) or [])
+    if getattr(transaction, "mosaic", None) is not None:
+      mosaics.append(transaction.mosaic)
+    # 同じアグリゲートで発行したモザイクは、その後のインナートランザクションで送付できる
+    if (
+      transaction.type_.value == MOSAIC_SUPPLY_CHANGE_TRANSACTION_TYPE
+      and transaction.action.value == MOSAIC_SUPPLY_INCREASE
+    ):
+      self._move(
+        changes,
+        signer_address,
+        transaction.mosaic_id.value,
+        transaction.delta.value,
+      )
+
+    recipient = getattr(transaction, "recipient_address", None)
+    recipient_address = (
+      address_to_hex(recipient) if recipient is not None else None
+    )
+    # ネームスペースで指定された送信先はローカルでは解決できないためチェックしない
+    if recipient_address is None or _is_alias_address(
+      recipient_address
+    ):
+      return self._debit(changes, signer_address, mosaics)
+
+    if not _is_allowed(
+      self.state.restrictions.account_restriction(
+        recipient_address, RESTRICTION_ADDRESS
+      ),
+      signer_address,
+    ) or not _is_allowed(
+      self.state.restrictions.account_restriction(
+        signer_address, RESTRICTION_ADDRESS | RESTRICTION_OUTGOING
+      ),
+      recipient_address,
+    ):
+      return FAILURE_ADDRESS_INTERACTION_PROHIBITED
+
+    recipient_mosaic_restriction = self.state.restrictions.account_restriction(
+      recipient_address, RESTRICTION_MOSAIC_ID
+    )
+    for mosaic in mosaics:
+      mosaic_id = mosaic.mosaic_id.value
+      if not _is_allowed(recipient_mosaic_restriction, mosaic_id):
+        return FAILURE_MOSAIC_TRANSFER_PROHIBITED
+      for address_hex in (signer_address, recipient_address):
+        if not self._is_mosaic_authorized(mosaic_id, address_hex):
+          return FAILURE_MOSAIC_ACCOUNT_UNAUTHORIZED
+
+    result = self._debit(changes, signer_address, mosaics)
+    # 転送したモザイクは、同じアグリゲートの後のインナートランザクションで受取人が使える
+    # （シークレットロックの受取人に届くのは証明の後なので加えない）
+    if (
+      result == SUCCESS
+      and transaction.type_.value == TRANSFER_TRANSACTION_TYPE
+    ):
+      for mosaic in mosaics:
+        self._move(
+          changes,
+          recipient_address,
+          mosaic.mosaic_id.value,
+          mosaic.amount.value,
+        )
+    return result
+
+  def _debit(
+    self,
+    changes: dict[str, dict[int, int]],
+    signer_address: str,
+    mosaics: list[Any],
+  ) -> str:
+    for mosaic in mosaics:
+      if not self._move(
+        changes,
+        signer_address,
+        mosaic.mosaic_id.value,
+        -mosaic.amount.value,
+      ):
+        return FAILURE_INSUFFICIENT_BALANCE
+    return SUCCESS
+
+  # グローバルモザイク制限の条件をアカウントが満たしているかどうか
+  def _is_mosaic_authorized(
+    self, mosaic_id: int, address_hex: str
+  ) -> bool:
+    rules = self.state.restrictions.mosaic_global_restrictions.get(mosaic_id)
+    if not rules:
+      return True
+    for key, (reference_id, rule_value, rule_type) in rules.items():
+      if rule_type == MOSAIC_RESTRICTION_NONE:
+        continue
+      value = self.state.restrictions.mosaic_address_value(
+        reference_id or mosaic_id, address_hex, key
+      )
+      if value == MOSAIC_RESTRICTION_UNSET or not _COMPARATORS[
+        rule_type
+      ](value, rule_value):
+        return False
+    return True
@@ -0,0 +1,171 @@
+# トランザクションのステータス・メタ情報・転送内容を、RESTやWebSocketのJSONから直接作る小さなレコード
+# .json()やconvert_hex_valuesの入れ子のdictの代わりに使い、大量に保持してもメモリを抑える
+# （__slots__で属性の辞書を持たず、変更できない。よく出る文字列は共有する）
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Optional
+from symbolchain.symbol.Network import Address
+
+# 転送トランザクションのタイプ
+TRANSFER_TRANSACTION_TYPE = 0x4154
+# アグリゲートトランザクションのタイプ
+AGGREGATE_TRANSACTION_TYPES = (0x4141, 0x4241)
+# WebSocketのstatusチャンネルで通知されるステータスのグループ
+FAILED_GROUP = "failed"
+
+
+@dataclass(frozen=True, slots=True)
+class TransactionStatus:
+  """GET/POST /transactionStatus、WebSocketのstatusチャンネルの結果"""
+
+  hash: str
+  group: str
+  code: str
+  deadline: int
+  height: Optional[int] = None
+
+
+@dataclass(frozen=True, slots=True)
+class TransactionMeta:
+  """トランザクションのメタ情報（インナートランザクションはaggregate_hash・aggregate_idを持つ）"""
+
+  height: int
+  index: int
+  timestamp: int
+  fee_multiplier: int
+  hash: Optional[str] = None
+  merkle_component_hash: Optional[str] = None
+  aggregate_hash: Optional[str] = None
+  aggregate_id: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class MosaicAmount:
+  """モザイクIDと数量"""
+
+  id: int
+  amount: int
+
+
+@dataclass(frozen=True, slots=True)
+class TransferPayload:
+  """転送トランザクションの内容"""
+
+  recipient_address: str
+  mosaics: tuple[MosaicAmount, ...]
+  # メッセージ（先頭1バイトはメッセージの種類、0は平文）
+  message: bytes = b""
+
+  # 平文のメッセージ（デコードできない場合はNone）
+  @property
+  def text(self) -> Optional[str]:
+    if not self.message or self.message[0] != 0:
+      return None
+    try:
+      return self.message[1:].decode("utf-8")
+    except UnicodeDecodeError:
+      return None
+
+
+@dataclass(frozen=True, slots=True)
+class TransactionRecord:
+  """承認済み（または未承認）のトランザクション"""
+
+  id: Optional[str]
+  meta: TransactionMeta
+  type: int
+  signer_public_key: str
+  # インナートランザクションは手数料・期限を持たない
+  fee: int = 0
+  deadline: int = 0
+  # 転送トランザクションの場合のみ
+  transfer: Optional[TransferPayload] = None
+  # アグリゲートの場合のインナートランザクション
+  transactions: tuple["TransactionRecord", ...] = ()
+  # シリアライズ後のサイズ（インナートランザクションは0）
+  size: int = 0
+
+
+def _int(value: Any, default: int = 0) -> int:
+  return int(value) if value is not None else default
+
+
+# RESTの16進数のアドレスを、エクスプローラーなどで使う文字列のアドレスにする（同じアドレスは同じ文字列を返す）
+@lru_cache(maxsize=65536)
+def decode_address(address_hex: str) -> str:
+  return sys.intern(str(Address(bytes.fromhex(address_hex))))
+
+
+def parse_status(data: dict) -> TransactionStatus:
+  height = data.get("height")
+  return TransactionStatus(
+    data["hash"],
+    sys.intern(data.get("group", FAILED_GROUP)),
+    sys.intern(data["code"]),
+    _int(data.get("deadline")),
+    int(height) if height is not None else None,
+  )
+
+
+def parse_meta(data: dict) -> TransactionMeta:
+  return TransactionMeta(
+    _int(data.get("height")),
+    data.get("index", 0),
+    _int(data.get("timestamp")),
+    data.get("feeMultiplier", 0),
+    data.get("hash"),
+    data.get("merkleComponentHash"),
+    data.get("aggregateHash"),
+    data.get("aggregateId"),
+  )
+
+
+def parse_transfer(transaction: dict) -> TransferPayload:
+  message = transaction.get("message")
+  return TransferPayload(
+    decode_address(transaction["recipientAddress"]),
+    tuple(
+      MosaicAmount(int(mosaic["id"], 16), int(mosaic["amount"]))
+      for mosaic in transaction.get("mosaics", ())
+    ),
+    bytes.fromhex(message) if message else b"",
+  )
+
+
+# {"id", "meta", "transaction"} の形式（RESTの検索結果の1件、WebSocketのdata）から作る
+def parse_transaction(data: dict) -> TransactionRecord:
+  transaction = data["transaction"]
+  type = transaction["type"]
+  return TransactionRecord(
+    data.get("id"),
+    parse_meta(data.get("meta", {})),
+    type,
+    sys.intern(transaction["signerPublicKey"]),
+    _int(transaction.get("fee")),
+    _int(transaction.get("deadline")),
+    parse_transfer(transaction)
+    if type == TRANSFER_TRANSACTION_TYPE
+    else None,
+    tuple(
+      parse_transaction(embedded)
+      for embedded in transaction.get("transactions", ())
+    )
+    if type in AGGREGATE_TRANSACTION_TYPES
+    else (),
+    transaction.get("size", 0),
+  )
+
+
+# WebSocketのメッセージから (チャンネル名, レコード) を作る
+# statusはTransactionStatus、〜Addedはトランザクション、〜Removedはハッシュ、それ以外はdataのまま
+def parse_event(message: dict) -> tuple[str, Any]:
+  channel = message["topic"].partition("/")[0]
+  data = message["data"]
+  if channel == "status":
+    return channel, parse_status(data)
+  if channel.endswith("Added") and "transaction" in data:
+    return channel, parse_transaction(data)
+  if channel.endswith("Removed"):
+    return channel, data["meta"]["hash"]
+  return channel, data
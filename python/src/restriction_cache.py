@@ -0,0 +1,307 @@
+# アカウント制限・モザイク制限の状態をローカルに保持し、承認済みトランザクションで更新するコード
+import json
+import asyncio
+from typing import Any, AsyncIterator, Iterable, Optional
+from websockets.legacy.client import connect
+from symbolchain.CryptoTypes import PublicKey
+from symbolchain.facade.SymbolFacade import SymbolFacade
+
+import http_cache
+
+# アカウント制限フラグ（AccountRestrictionFlagsと同じ値）
+RESTRICTION_ADDRESS = 0x0001
+RESTRICTION_MOSAIC_ID = 0x0002
+RESTRICTION_TRANSACTION_TYPE = 0x0004
+RESTRICTION_OUTGOING = 0x4000
+RESTRICTION_BLOCK = 0x8000
+
+# モザイク制限の比較タイプ（MosaicRestrictionTypeと同じ値）
+MOSAIC_RESTRICTION_NONE = 0
+MOSAIC_RESTRICTION_EQ = 1
+MOSAIC_RESTRICTION_NE = 2
+MOSAIC_RESTRICTION_LT = 3
+MOSAIC_RESTRICTION_LE = 4
+MOSAIC_RESTRICTION_GT = 5
+MOSAIC_RESTRICTION_GE = 6
+
+# モザイクアドレス制限が未設定の場合の値
+MOSAIC_RESTRICTION_UNSET = 0xFFFFFFFF_FFFFFFFF
+
+# 制限に関するトランザクションのタイプ
+ACCOUNT_RESTRICTION_TRANSACTION_TYPES = (
+  0x4150,  # account_address_restriction_transaction_v1
+  0x4250,  # account_mosaic_restriction_transaction_v1
+  0x4350,  # account_operation_restriction_transaction_v1
+)
+MOSAIC_GLOBAL_RESTRICTION_TRANSACTION_TYPE = 0x4151
+MOSAIC_ADDRESS_RESTRICTION_TRANSACTION_TYPE = 0x4251
+RESTRICTION_TRANSACTION_TYPES = (
+  *ACCOUNT_RESTRICTION_TRANSACTION_TYPES,
+  MOSAIC_GLOBAL_RESTRICTION_TRANSACTION_TYPE,
+  MOSAIC_ADDRESS_RESTRICTION_TRANSACTION_TYPE,
+)
+
+# 検索APIの1ページあたりの件数
+PAGE_SIZE = 100
+
+
+# アドレスを16進数文字列（大文字）に揃える関数
+def address_to_hex(address: Any) -> str:
+  return address.upper() if isinstance(address, str) else (
+    bytes(address.bytes).hex().upper()
+  )
+
+
+# アカウント制限の値をフラグの種類に応じて揃える関数
+def _restriction_value(flags: int, value: Any) -> Any:
+  if flags & RESTRICTION_ADDRESS:
+    return address_to_hex(value)
+  if isinstance(value, str):
+    return int(value, 16)
+  return value
+
+
+class RestrictionIndex:
+  """アカウント制限・モザイク制限を一括で読み込み、定数時間で判定できる形で保持する"""
+
+  def __init__(self, node_url: str, facade: SymbolFacade) -> None:
+    self.node_url = node_url
+    self.facade = facade
+    # アドレス => {方向・種類のフラグ: (拒否リストかどうか, 値の集合)}
+    self.account_restrictions: dict[
+      str, dict[int, tuple[bool, set]]
+    ] = {}
+    # モザイクID => {キー: (参照モザイクID, 値, 比較タイプ)}
+    self.mosaic_global_restrictions: dict[
+      int, dict[int, tuple[int, int, int]]
+    ] = {}
+    # (モザイクID, アドレス) => {キー: 値}
+    self.mosaic_address_restrictions: dict[
+      tuple[int, str], dict[int, int]
+    ] = {}
+    # 反映済みのブロック高
+    self.height = 0
+
+  def _search(self, path: str, query: dict) -> Iterable[dict]:
+    page_number = 1
+    while True:
+      response = http_cache.get(f"{self.node_url}{path}", params={
+        **query,
+        "pageSize": str(PAGE_SIZE),
+        "pageNumber": str(page_number),
+      }).json()
+      entries = response.get("data", [])
+      yield from entries
+      if len(entries) < PAGE_SIZE:
+        return
+      page_number += 1
+
+  # _searchの非同期版（1ページずつ別スレッドで取得する）
+  async def _search_async(
+    self, path: str, query: dict
+  ) -> AsyncIterator[dict]:
+    page_number = 1
+    while True:
+      response = await http_cache.get_async(
+        f"{self.node_url}{path}",
+        params={
+          **query,
+          "pageSize": str(PAGE_SIZE),
+          "pageNumber": str(page_number),
+        },
+      )
+      entries = response.json().get("data", [])
+      for entry in entries:
+        yield entry
+      if len(entries) < PAGE_SIZE:
+        return
+      page_number += 1
+
+  # 制限を検索APIからすべてのページについて読み込む（queryで絞り込み可能）
+  def load_account_restrictions(self, **query: str) -> int:
+    loaded = 0
+    for entry in self._search("/restrictions/account", query):
+      restrictions = entry["restrictions"]
+      self.set_account_restrictions(
+        restrictions["address"], restrictions["restrictions"]
+      )
+      loaded += 1
+    return loaded
+
+  def load_mosaic_restrictions(self, **query: str) -> int:
+    loaded = 0
+    for entry in self._search("/restrictions/mosaic", query):
+      self.add_mosaic_restriction_entry(entry["mosaicRestrictionEntry"])
+      loaded += 1
+    return loaded
+
+  # load_mosaic_restrictionsの非同期版
+  async def load_mosaic_restrictions_async(self, **query: str) -> int:
+    loaded = 0
+    entries = self._search_async("/restrictions/mosaic", query)
+    async for entry in entries:
+      self.add_mosaic_restriction_entry(entry["mosaicRestrictionEntry"])
+      loaded += 1
+    return loaded
+
+  # 読み込み時点のブロック高を記録し、以降はupdateで差分のみ反映する
+  def load_all(self) -> None:
+    self.height = int(
+      http_cache.get(f"{self.node_url}/chain/info").json()["height"]
+    )
+    self.load_account_restrictions()
+    self.load_mosaic_restrictions()
+
+  def set_account_restrictions(
+    self, address: Any, restrictions: list[dict]
+  ) -> None:
+    self.account_restrictions[address_to_hex(address)] = {
+      restriction["restrictionFlags"] & ~RESTRICTION_BLOCK: (
+        bool(restriction["restrictionFlags"] & RESTRICTION_BLOCK),
+        {
+          _restriction_value(restriction["restrictionFlags"], value)
+          for value in restriction["values"]
+        },
+      )
+      for restriction in restrictions
+    }
+
+  def add_mosaic_restriction_entry(self, entry: dict) -> None:
+    mosaic_id = int(entry["mosaicId"], 16)
+    if entry["entryType"] == 1:
+      # グローバル制限
+      self.mosaic_global_restrictions[mosaic_id] = {
+        int(restriction["key"]): (
+          int(restriction["restriction"]["referenceMosaicId"], 16),
+          int(restriction["restriction"]["restrictionValue"]),
+          int(restriction["restriction"]["restrictionType"]),
+        )
+        for restriction in entry["restrictions"]
+      }
+    else:
+      # アドレス制限
+      self.mosaic_address_restrictions[
+        (mosaic_id, address_to_hex(entry["targetAddress"]))
+      ] = {
+        int(restriction["key"]): int(restriction["value"])
+        for restriction in entry["restrictions"]
+      }
+
+  # 承認済みトランザクション（WebSocketのconfirmedAddedやRESTの検索結果）を反映する
+  def apply_transaction(self, tx_info: dict) -> None:
+    transaction = tx_info["transaction"]
+    if "transactions" in transaction:
+      for inner in transaction["transactions"]:
+        self._apply_embedded(inner["transaction"])
+    else:
+      self._apply_embedded(transaction)
+    height = tx_info.get("meta", {}).get("height")
+    if height is not None:
+      self.height = max(self.height, int(height))
+
+  def _apply_embedded(self, transaction: dict) -> None:
+    transaction_type = int(transaction["type"])
+    if transaction_type in ACCOUNT_RESTRICTION_TRANSACTION_TYPES:
+      signer_address = address_to_hex(
+        self.facade.network.public_key_to_address(
+          PublicKey(transaction["signerPublicKey"])
+        )
+      )
+      flags = int(transaction["restrictionFlags"])
+      restrictions = self.account_restrictions.setdefault(
+        signer_address, {}
+      )
+      key = flags & ~RESTRICTION_BLOCK
+      is_block, values = restrictions.get(key, (False, set()))
+      if not values:
+        is_block = bool(flags & RESTRICTION_BLOCK)
+      values.difference_update(
+        _restriction_value(flags, value)
+        for value in transaction["restrictionDeletions"]
+      )
+      values.update(
+        _restriction_value(flags, value)
+        for value in transaction["restrictionAdditions"]
+      )
+      if values:
+        restrictions[key] = (is_block, values)
+      else:
+        restrictions.pop(key, None)
+    elif transaction_type == MOSAIC_GLOBAL_RESTRICTION_TRANSACTION_TYPE:
+      rules = self.mosaic_global_restrictions.setdefault(
+        int(transaction["mosaicId"], 16), {}
+      )
+      key = int(transaction["restrictionKey"], 16)
+      restriction_type = int(transaction["newRestrictionType"])
+      if restriction_type == MOSAIC_RESTRICTION_NONE:
+        rules.pop(key, None)
+      else:
+        rules[key] = (
+          int(transaction["referenceMosaicId"], 16),
+          int(transaction["newRestrictionValue"]),
+          restriction_type,
+        )
+    elif transaction_type == MOSAIC_ADDRESS_RESTRICTION_TRANSACTION_TYPE:
+      values = self.mosaic_address_restrictions.setdefault(
+        (
+          int(transaction["mosaicId"], 16),
+          address_to_hex(transaction["targetAddress"]),
+        ),
+        {},
+      )
+      key = int(transaction["restrictionKey"], 16)
+      value = int(transaction["newRestrictionValue"])
+      if value == MOSAIC_RESTRICTION_UNSET:
+        values.pop(key, None)
+      else:
+        values[key] = value
+
+  # 前回反映したブロック高以降の制限トランザクションを取得して反映する
+  def update(self) -> int:
+    applied = 0
+    for tx_info in self._search("/transactions/confirmed", {
+      "type": [str(t) for t in RESTRICTION_TRANSACTION_TYPES],
+      "fromHeight": str(self.height + 1),
+      "embedded": "true",
+      "order": "asc",
+    }):
+      self.apply_transaction(tx_info)
+      applied += 1
+    return applied
+
+  # 新しいブロックを検知するたびに差分を反映し続ける
+  async def watch(self) -> None:
+    ws_endpoint = self.node_url.replace("http", "ws") + "/ws"
+    async with connect(ws_endpoint) as websocket:
+      uid = json.loads(await websocket.recv())["uid"]
+      await websocket.send(
+        json.dumps({"uid": uid, "subscribe": "block"})
+      )
+      async for _ in websocket:
+        await asyncio.to_thread(self.update)
+
+  def account_restriction(
+    self, address_hex: str, flags: int
+  ) -> Optional[tuple[bool, set]]:
+    restrictions = self.account_restrictions.get(address_hex)
+    return restrictions.get(flags) if restrictions else None
+
+  # アカウント制限で値が許可されているかどうか（制限が未設定の場合は許可）
+  def is_allowed(self, address: Any, flags: int, value: Any) -> bool:
+    restriction = self.account_restriction(
+      address_to_hex(address), flags
+    )
+    if restriction is None:
+      return True
+    is_block, values = restriction
+    return (_restriction_value(flags, value) in values) != is_block
+
+  def mosaic_address_value(
+    self, mosaic_id: int, address_hex: str, key: int
+  ) -> int:
+    values = self.mosaic_address_restrictions.get(
+      (mosaic_id, address_hex)
+    )
+    if values is None:
+      return MOSAIC_RESTRICTION_UNSET
+    return values.get(key, MOSAIC_RESTRICTION_UNSET)
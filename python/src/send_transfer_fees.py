@@ -1,25 +1,27 @@
 import os
-import requests
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
   SymbolAccount,
   Hash256,
 )
-from symbolchain.sc import Amount, Signature
+from typing import Any, Optional
 
-#  事前に手数料を送付するトランザクションの生成、署名、アナウンスを行う関数
-def send_transfer_fees(signAccount: SymbolAccount, recipientAddresses: list, feeAmount: int) -> Hash256:
-  NODE_URL: str = os.getenv("NODE_URL") or ""
-  facade: SymbolFacade = SymbolFacade("testnet")
+import http_cache
+import metrics
+from send_tx import prepare_tx, announce_with_outbox
+
+# 1つのアグリゲートに含められる送付先の上限（インナートランザクション数の上限）
+MAX_RECIPIENTS = 100
 
-  network_time = requests.get(f"{NODE_URL}/node/time").json()
-  receive_timestamp: int = int(
-    network_time["communicationTimestamps"]["receiveTimestamp"]
-  )
-  deadline_timestamp: int = receive_timestamp + (
-    2 * 60 * 60 * 1000
-  )  # 2時間後（ミリ秒単位）
 
+#  事前に手数料を送付するアグリゲートトランザクションを生成する関数
+def create_transfer_fees_tx(
+  facade: SymbolFacade,
+  signAccount: SymbolAccount,
+  recipientAddresses: list,
+  feeAmount: int,
+  deadline_timestamp: int,
+) -> Any:
   transfer_descriptors = [
     {
       "recipient_address": address,
@@ -37,26 +39,66 @@ def send_transfer_fees(signAccount: SymbolAccount, recipientAddresses: list, fee
 
   inner_transaction_hash_pre = facade.hash_embedded_transactions(txs_pre)
 
-  tx_pre = facade.transaction_factory.create({
+  return facade.transaction_factory.create({
     "type": "aggregate_complete_transaction_v2",
     "transactions": txs_pre,
     "transactions_hash": inner_transaction_hash_pre,
     "signer_public_key": signAccount.public_key,
     "deadline": deadline_timestamp
   })
-  tx_pre.fee = Amount(100 * tx_pre.size)
 
-  signature_pre: Signature = signAccount.sign_transaction(tx_pre)
 
-  json_payload_pre = facade.transaction_factory.attach_signature(tx_pre, signature_pre)
+#  事前に手数料を送付するトランザクションの生成、署名、アナウンスを行う関数
+#  dry_run（省略時は環境変数 DRY_RUN）が有効ならアナウンスせず、ローカルで検証する
+def send_transfer_fees(
+  signAccount: SymbolAccount,
+  recipientAddresses: list,
+  feeAmount: int,
+  dry_run: Optional[bool] = None,
+) -> Hash256:
+  # dry_runはこのモジュールを使うため、循環インポートにならないようここでインポートする
+  from dry_run import is_dry_run, dry_run_tx, fee_bounds, print_result
+
+  dry_run = is_dry_run() if dry_run is None else dry_run
+  NODE_URL: str = os.getenv("NODE_URL") or ""
+  facade: SymbolFacade = SymbolFacade("testnet")
+
+  if dry_run:
+    # ノードの時刻の代わりにローカルの時計を使う
+    receive_timestamp: int = facade.now().timestamp
+  else:
+    with metrics.span("node_time"):
+      network_time = http_cache.get(f"{NODE_URL}/node/time").json()
+    receive_timestamp = int(
+      network_time["communicationTimestamps"]["receiveTimestamp"]
+    )
+  deadline_timestamp: int = receive_timestamp + (
+    2 * 60 * 60 * 1000
+  )  # 2時間後（ミリ秒単位）
+
+  with metrics.span("build", type="transfer_fees"):
+    tx_pre = create_transfer_fees_tx(
+      facade, signAccount, recipientAddresses, feeAmount, deadline_timestamp
+    )
+  if dry_run:
+    min_fee_multiplier, max_fee = fee_bounds()
+    result = dry_run_tx(
+      tx_pre,
+      signAccount,
+      facade,
+      max_fee=max_fee,
+      min_fee_multiplier=min_fee_multiplier,
+    )
+    print_result(result)
+    return Hash256(result.hash)
+
+  json_payload_pre, hash_pre = prepare_tx(tx_pre, signAccount, facade)
 
   print("アナウンス開始")
-  response = requests.put(
-    f"{NODE_URL}/transactions",
-    headers={"Content-Type": "application/json"},
-    data=json_payload_pre,
-  ).json()
+  response = announce_with_outbox(
+    json_payload_pre, hash_pre, signAccount, deadline_timestamp, NODE_URL
+  )
 
   print("アナウンス結果", response)
 
-  return facade.hash_transaction(tx_pre)
+  return hash_pre
@@ -1,35 +1,165 @@
 import os
+import json
 import requests
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
   SymbolAccount,
   Hash256,
 )
-from typing import Any
+from typing import Any, Optional
 from symbolchain.sc import Amount, Signature
 
+import metrics
+
+# アナウンス先のエンドポイント（アグリゲートボンデッドは連署を集めるためpartialに送る）
+TRANSACTIONS_ENDPOINT = "/transactions"
+PARTIAL_ENDPOINT = "/transactions/partial"
+AGGREGATE_BONDED_TRANSACTION_TYPE = 0x4241
+
+
+# トランザクションのアナウンス先のエンドポイントを返す関数
+def announce_endpoint(tx: Any) -> str:
+  if tx.type_.value == AGGREGATE_BONDED_TRANSACTION_TYPE:
+    return PARTIAL_ENDPOINT
+  return TRANSACTIONS_ENDPOINT
 
-# トランザクションを受け取り、署名し、トランザクションハッシュを返す関数
-def send_tx(tx: Any, signAccount: SymbolAccount) -> Hash256:
-  NODE_URL: str = os.getenv("NODE_URL") or ""
-  facade: SymbolFacade = SymbolFacade("testnet")
+
+# トランザクションに手数料を設定して署名し、アナウンス用のJSONとトランザクションハッシュを返す関数
+def prepare_tx(
+  tx: Any,
+  signAccount: SymbolAccount,
+  facade: Optional[SymbolFacade] = None,
+) -> tuple[str, Hash256]:
+  facade = facade or SymbolFacade("testnet")
 
   tx.fee = Amount(100 * tx.size)
 
-  signature: Signature = signAccount.sign_transaction(tx)
+  with metrics.span("sign"):
+    signature: Signature = signAccount.sign_transaction(tx)
+
+  with metrics.span("serialize"):
+    json_payload: str = facade.transaction_factory.attach_signature(
+      tx, signature
+    )
+  with metrics.span("hash"):
+    hash = facade.hash_transaction(tx)
+  return json_payload, hash
+
 
-  json_payload: str = facade.transaction_factory.attach_signature(
-    tx, signature
+# 署名済みのJSONをノードにアナウンスし、レスポンスを返す関数
+# 大量にアナウンスする場合はsessionを渡すと接続を使い回せる
+def announce_tx(
+  json_payload: str,
+  node_url: Optional[str] = None,
+  session: Optional[requests.Session] = None,
+  endpoint: str = TRANSACTIONS_ENDPOINT,
+) -> Any:
+  node_url = node_url or os.getenv("NODE_URL") or ""
+  with metrics.span("announce"):
+    response = (session or requests).put(
+      f"{node_url}{endpoint}",
+      headers={"Content-Type": "application/json"},
+      data=json_payload,
+    )
+  metrics.increment(
+    "symbol_announce_total", status=response.status_code
   )
+  with metrics.span("decode", endpoint=endpoint.lstrip("/")):
+    return response.json()
+
+
+# 環境変数 OUTBOX_DB が指定されていれば、アウトボックスに保存してからアナウンスする関数
+# アウトボックスはスレッドごとに1つ開いたものを使い回す
+def announce_with_outbox(
+  json_payload: str,
+  hash: Hash256,
+  signAccount: SymbolAccount,
+  deadline: int,
+  node_url: Optional[str] = None,
+  endpoint: str = TRANSACTIONS_ENDPOINT,
+) -> Any:
+  # tx_outboxはこのモジュールを使うため、循環インポートにならないようここでインポートする
+  from tx_outbox import default_outbox
+
+  outbox = default_outbox(node_url)
+  if outbox is None:
+    return announce_tx(json_payload, node_url, endpoint=endpoint)
+  outbox.record(
+    json_payload, hash, signAccount, deadline, endpoint=endpoint
+  )
+  return outbox.announce(str(hash))
+
+
+# トランザクションを受け取り、署名し、トランザクションハッシュを返す関数
+# dry_run（省略時は環境変数 DRY_RUN）が有効ならアナウンスせずにローカルで検証する
+def send_tx(
+  tx: Any, signAccount: SymbolAccount, dry_run: Optional[bool] = None
+) -> Hash256:
+  # dry_runはこのモジュールを使うため、循環インポートにならないようここでインポートする
+  from dry_run import is_dry_run, dry_run_tx, fee_bounds, print_result
+
+  if is_dry_run() if dry_run is None else dry_run:
+    min_fee_multiplier, max_fee = fee_bounds()
+    result = dry_run_tx(
+      tx,
+      signAccount,
+      max_fee=max_fee,
+      min_fee_multiplier=min_fee_multiplier,
+    )
+    print_result(result)
+    return Hash256(result.hash)
+
+  json_payload, hash = prepare_tx(tx, signAccount)
+
   print("アナウンス開始")
-  response = requests.put(
-    f"{NODE_URL}/transactions",
-    headers={"Content-Type": "application/json"},
-    data=json_payload,
-  ).json()
+  response = announce_with_outbox(
+    json_payload,
+    hash,
+    signAccount,
+    tx.deadline.value,
+    endpoint=announce_endpoint(tx),
+  )
 
   print("アナウンス結果", response)
 
-  hash: Hash256 = facade.hash_transaction(tx)
-
   return hash
+
+
+# 署名（連署）済みのトランザクションをアナウンスし、トランザクションハッシュを返す関数
+# dry_run（省略時は環境変数 DRY_RUN）が有効ならアナウンスせずにローカルで検証する
+# multisigはドライランの連署の検証に使う（dry_run.check_transactionを参照）
+def send_signed_tx(
+  tx: Any,
+  facade: Optional[SymbolFacade] = None,
+  dry_run: Optional[bool] = None,
+  multisig: Optional[dict[str, tuple[int, set[str]]]] = None,
+) -> Hash256:
+  # dry_runはこのモジュールを使うため、循環インポートにならないようここでインポートする
+  from dry_run import (
+    is_dry_run,
+    dry_run_signed_tx,
+    fee_bounds,
+    print_result,
+  )
+
+  facade = facade or SymbolFacade("testnet")
+  if is_dry_run() if dry_run is None else dry_run:
+    min_fee_multiplier, max_fee = fee_bounds()
+    result = dry_run_signed_tx(
+      tx,
+      facade,
+      multisig=multisig,
+      max_fee=max_fee,
+      min_fee_multiplier=min_fee_multiplier,
+    )
+    print_result(result)
+    return Hash256(result.hash)
+
+  print("アナウンス開始")
+  response = announce_tx(
+    json.dumps({"payload": tx.serialize().hex()}),
+    endpoint=announce_endpoint(tx),
+  )
+  print("アナウンス結果", response)
+
+  return facade.hash_transaction(tx)
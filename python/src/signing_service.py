@@ -0,0 +1,472 @@
+# 秘密鍵を1つのプロセスにまとめ、Unixソケット経由で署名を行うサービスと、そのクライアント
+# 同時に届いた署名依頼はまとめてプロセスプールに渡し、複数のコアで並列に署名する
+# 使い方: python src/signing_service.py &（.envのPRIVATE_KEY_A/Bを読み込んで待ち受ける）
+#        SIGNING_SOCKETを設定すると、signing_account()が秘密鍵の代わりにサービスを使うアカウントを返す
+import os
+import json
+import socket
+import asyncio
+import argparse
+import threading
+import requests
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+from dotenv import load_dotenv
+from symbolchain.CryptoTypes import PrivateKey, PublicKey, Signature
+from symbolchain.facade.SymbolFacade import (
+  SymbolFacade,
+  SymbolAccount,
+  SymbolPublicAccount,
+)
+from symbolchain.sc import TransactionFactory
+
+import metrics
+import crypto_backend
+
+# ソケットのパス（環境変数 SIGNING_SOCKET で変更できる）
+DEFAULT_SOCKET = os.path.join(
+  os.environ.get("TMPDIR", "/tmp"),
+  f"symbol-signer-{os.getuid() if hasattr(os, 'getuid') else 0}.sock",
+)
+# 読み込む秘密鍵の環境変数
+DEFAULT_KEY_NAMES = ("PRIVATE_KEY_A", "PRIVATE_KEY_B")
+# 1回にまとめる依頼数の上限
+MAX_BATCH_SIZE = 256
+# 最初の依頼が届いてから、後続の依頼を待つ時間（秒）
+# 既定では待たない（プロセスが使用中の間に溜まった依頼が自然にまとまる）
+BATCH_WINDOW = 0.0
+# これより少ない依頼は分割せず1つのプロセスで署名する（プロセス間の受け渡しの方が重くなるため）
+MIN_CHUNK_SIZE = 16
+# 連署者を確認するときにたどるマルチシグの階層数の上限（ネットワークの設定値）
+MAX_MULTISIG_DEPTH = 3
+
+# ---------- 署名を行うプロセス ----------
+
+# 公開鍵 => 鍵ペア（プロセスプールの各プロセスで初期化する）
+_KEY_PAIRS: dict[str, Any] = {}
+_FACADE: Optional[SymbolFacade] = None
+# マルチシグの構成を問い合わせるノード（なければ連署者の確認にマルチシグを含めない）
+_NODE_URL = ""
+
+
+def _init_worker(
+  network: str, private_keys: list[str], node_url: str = ""
+) -> None:
+  global _FACADE, _NODE_URL
+  _FACADE = SymbolFacade(network)
+  _NODE_URL = node_url
+  for private_key in private_keys:
+    account = crypto_backend.create_account(
+      _FACADE, PrivateKey(private_key)
+    )
+    _KEY_PAIRS[str(account.public_key)] = account.key_pair
+
+
+def _sign_one(op: str, public_key: str, data: str) -> str:
+  key_pair = _KEY_PAIRS.get(public_key)
+  if key_pair is None:
+    raise ValueError(f"鍵がありません: {public_key}")
+  if op == "sign":
+    tx = TransactionFactory.deserialize(bytes.fromhex(data))
+    # 依頼された鍵と異なる署名者のトランザクションには署名しない
+    if str(tx.signer_public_key) != public_key:
+      raise ValueError("署名者の公開鍵が一致しません")
+    return str(_FACADE.sign_transaction(key_pair, tx))
+  if op == "cosign":
+    # 任意の値に署名しないよう、アグリゲートのペイロードからハッシュを求めて連署する
+    tx = TransactionFactory.deserialize(bytes.fromhex(data))
+    if getattr(tx, "transactions", None) is None:
+      raise ValueError("アグリゲートトランザクションではありません")
+    if str(tx.signer_public_key) == public_key:
+      raise ValueError("アグリゲートの署名者は連署できません")
+    if not _is_required_cosigner(tx, public_key):
+      raise ValueError("連署が必要なアカウントではありません")
+    return str(key_pair.sign(_FACADE.hash_transaction(tx).bytes))
+  raise ValueError(f"不明な操作です: {op}")
+
+
+# インナートランザクションの承認にその鍵の連署が必要かどうか
+# （インナートランザクションの署名者、マルチシグに追加される連署者、署名者のマルチシグの連署者）
+def _is_required_cosigner(tx: Any, public_key: str) -> bool:
+  network = _FACADE.network
+  address = network.public_key_to_address(PublicKey(public_key))
+  for embedded in tx.transactions:
+    if str(embedded.signer_public_key) == public_key:
+      return True
+    if any(
+      bytes(addition.bytes) == address.bytes
+      for addition in getattr(embedded, "address_additions", [])
+    ):
+      return True
+    signer_address = network.public_key_to_address(
+      PublicKey(embedded.signer_public_key.bytes)
+    )
+    if _is_cosignatory(
+      address.bytes.hex().upper(),
+      signer_address.bytes.hex().upper(),
+      MAX_MULTISIG_DEPTH,
+    ):
+      return True
+  return False
+
+
+# addressがmultisig_addressの連署者（下位のマルチシグを含む）かどうかをノードに問い合わせる
+def _is_cosignatory(
+  address: str, multisig_address: str, depth: int
+) -> bool:
+  if not _NODE_URL or depth <= 0:
+    return False
+  response = requests.get(
+    f"{_NODE_URL}/account/{multisig_address}/multisig", timeout=10
+  )
+  if response.status_code == 404:
+    return False
+  response.raise_for_status()
+  cosignatories = response.json()["multisig"]["cosignatoryAddresses"]
+  return address in cosignatories or any(
+    _is_cosignatory(address, cosignatory, depth - 1)
+    for cosignatory in cosignatories
+  )
+
+
+# まとめて署名する（結果は (成功したか, 署名または理由) のリスト）
+def _sign_batch(
+  items: list[tuple[str, str, str]],
+) -> list[tuple[bool, str]]:
+  results = []
+  for op, public_key, data in items:
+    try:
+      results.append((True, _sign_one(op, public_key, data)))
+    except Exception as e:
+      results.append((False, str(e) or type(e).__name__))
+  return results
+
+
+# ---------- サービス ----------
+
+
+class SigningService:
+  """署名依頼を受け付け、まとめてプロセスプールで署名する"""
+
+  def __init__(
+    self,
+    keys: dict[str, str],
+    network: str = "testnet",
+    workers: Optional[int] = None,
+    max_batch_size: int = MAX_BATCH_SIZE,
+    batch_window: float = BATCH_WINDOW,
+    node_url: Optional[str] = None,
+  ) -> None:
+    facade = SymbolFacade(network)
+    # 名前 => 公開鍵（秘密鍵はプロセスプールにだけ渡す）
+    self.public_keys = {
+      name: str(
+        facade.create_account(PrivateKey(private_key)).public_key
+      )
+      for name, private_key in keys.items()
+    }
+    self.workers = workers or os.cpu_count() or 1
+    self.max_batch_size = max_batch_size
+    self.batch_window = batch_window
+    self._pool = ProcessPoolExecutor(
+      self.workers,
+      initializer=_init_worker,
+      initargs=(
+        network,
+        list(keys.values()),
+        os.getenv("NODE_URL", "") if node_url is None else node_url,
+      ),
+    )
+    self._queue: Optional[asyncio.Queue] = None
+    self._slots: Optional[asyncio.Semaphore] = None
+    self.batches = 0
+    self.signed = 0
+
+  def close(self) -> None:
+    self._pool.shutdown(cancel_futures=True)
+
+  async def sign(self, op: str, public_key: str, data: str) -> str:
+    future = asyncio.get_running_loop().create_future()
+    await self._queue.put(((op, public_key, data), future))
+    return await future
+
+  # 依頼をまとめて取り出し、プロセスプールに渡し続ける
+  # プロセスが空いていればすぐに渡し、すべて使用中の間に届いた依頼を次のまとまりにする
+  async def _dispatch(self) -> None:
+    while True:
+      batch = [await self._queue.get()]
+      if self.batch_window > 0:
+        await asyncio.sleep(self.batch_window)
+      while (
+        len(batch) < self.max_batch_size and not self._queue.empty()
+      ):
+        batch.append(self._queue.get_nowait())
+      chunks = max(1, min(self.workers, len(batch) // MIN_CHUNK_SIZE))
+      size = -(-len(batch) // chunks)
+      for offset in range(0, len(batch), size):
+        await self._slots.acquire()
+        asyncio.create_task(self._run(batch[offset:offset + size]))
+
+  async def _run(
+    self, chunk: list[tuple[tuple, asyncio.Future]]
+  ) -> None:
+    try:
+      with metrics.span("sign_batch"):
+        results = await asyncio.get_running_loop().run_in_executor(
+          self._pool, _sign_batch, [item for item, _ in chunk]
+        )
+      metrics.increment("symbol_sign_batches_total")
+      metrics.increment("symbol_sign_requests_total", len(chunk))
+      self.batches += 1
+      self.signed += len(chunk)
+      for (_, future), (ok, value) in zip(chunk, results):
+        if future.done():
+          continue
+        if ok:
+          future.set_result(value)
+        else:
+          future.set_exception(ValueError(value))
+    except Exception as e:
+      for _, future in chunk:
+        if not future.done():
+          future.set_exception(e)
+    finally:
+      self._slots.release()
+
+  async def _respond(
+    self,
+    request: dict,
+    writer: asyncio.StreamWriter,
+  ) -> None:
+    response: dict[str, Any] = {"id": request.get("id")}
+    try:
+      if request.get("op") == "keys":
+        response["keys"] = self.public_keys
+      else:
+        response["signature"] = await self.sign(
+          request.get("op"),
+          str(request.get("public_key", "")).upper(),
+          request.get("data", ""),
+        )
+    except Exception as e:
+      response["error"] = str(e)
+    writer.write(json.dumps(response).encode("utf-8") + b"\n")
+
+  # 1行1件のJSONで依頼を受け取る（応答を待たずに続けて送ってもよい）
+  async def _handle(
+    self,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+  ) -> None:
+    tasks = set()
+    try:
+      while line := await reader.readline():
+        task = asyncio.create_task(
+          self._respond(json.loads(line), writer)
+        )
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+      if tasks:
+        await asyncio.wait(tasks)
+      await writer.drain()
+    except (ConnectionError, ValueError):
+      pass
+    finally:
+      writer.close()
+
+  async def serve(self, path: str) -> None:
+    self._queue = asyncio.Queue()
+    self._slots = asyncio.Semaphore(self.workers)
+    dispatcher = asyncio.create_task(self._dispatch())
+    if os.path.exists(path):
+      os.unlink(path)
+    server = await asyncio.start_unix_server(self._handle, path)
+    # 秘密鍵を使えるのは同じユーザーだけにする
+    os.chmod(path, 0o600)
+    print("署名サービス開始", path, self.public_keys)
+    try:
+      async with server:
+        await server.serve_forever()
+    finally:
+      dispatcher.cancel()
+      if os.path.exists(path):
+        os.unlink(path)
+
+
+# ---------- クライアント ----------
+
+
+class SigningClient:
+  """署名サービスのクライアント（スレッドごとに接続を持つ）"""
+
+  def __init__(self, path: Optional[str] = None) -> None:
+    self.path = path or os.getenv("SIGNING_SOCKET") or DEFAULT_SOCKET
+    self._local = threading.local()
+
+  def _connection(self) -> Any:
+    connection = getattr(self._local, "connection", None)
+    if connection is None:
+      sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      sock.connect(self.path)
+      connection = sock.makefile("rwb")
+      self._local.connection = connection
+      self._local.next_id = 0
+    return connection
+
+  def request(self, op: str, **fields: Any) -> dict:
+    connection = self._connection()
+    self._local.next_id += 1
+    request_id = self._local.next_id
+    try:
+      request = {"id": request_id, "op": op, **fields}
+      connection.write(json.dumps(request).encode("utf-8") + b"\n")
+      connection.flush()
+      line = connection.readline()
+    except OSError:
+      self._local.connection = None
+      raise
+    if not line:
+      self._local.connection = None
+      raise ConnectionError("署名サービスとの接続が切れました")
+    response = json.loads(line)
+    if response.get("id") != request_id:
+      raise Exception("署名サービスの応答が依頼と一致しません")
+    if "error" in response:
+      raise Exception(f"署名に失敗しました: {response['error']}")
+    return response
+
+  # 名前 => 公開鍵
+  def keys(self) -> dict[str, str]:
+    return self.request("keys")["keys"]
+
+  def sign(
+    self, public_key: PublicKey, data: bytes, op: str
+  ) -> Signature:
+    with metrics.span("remote_sign", op=op):
+      response = self.request(
+        op, public_key=str(public_key), data=data.hex()
+      )
+    return Signature(response["signature"])
+
+
+class RemoteSymbolAccount(SymbolPublicAccount):
+  """秘密鍵を持たず、署名サービスで署名するアカウント（SymbolAccountと同じ署名メソッドを持つ）"""
+
+  def __init__(
+    self,
+    facade: SymbolFacade,
+    public_key: PublicKey,
+    client: SigningClient,
+  ) -> None:
+    super().__init__(facade, public_key)
+    self.client = client
+
+  def sign_transaction(self, transaction: Any) -> Signature:
+    return self.client.sign(
+      self.public_key, transaction.serialize(), "sign"
+    )
+
+  # ハッシュだけを渡す連署（cosign_transaction_hash）は、サービスが内容を確認できないため持たない
+  def cosign_transaction(
+    self, transaction: Any, detached: bool = False
+  ) -> Any:
+    # SymbolFacade.cosign_transactionと同じ形の連署を、署名だけサービスで作る
+    signature = self.client.sign(
+      self.public_key, transaction.serialize(), "cosign"
+    )
+    transaction_hash = self._facade.hash_transaction(transaction)
+    return SymbolFacade.cosign_transaction_hash(
+      _SignedKeyPair(self.public_key, signature),
+      transaction_hash,
+      detached,
+    )
+
+
+class _SignedKeyPair:
+  """作成済みの署名を返すだけの鍵ペア（SymbolFacade.cosign_transaction_hashに渡す）"""
+
+  def __init__(
+    self, public_key: PublicKey, signature: Signature
+  ) -> None:
+    self.public_key = public_key
+    self._signature = signature
+
+  def sign(self, message: bytes) -> Signature:
+    return self._signature
+
+
+_default_client: Optional[SigningClient] = None
+
+
+# 環境変数 SIGNING_SOCKET が設定されていれば署名サービスのアカウントを、なければ秘密鍵のアカウントを返す
+def signing_account(
+  facade: SymbolFacade, name: str
+) -> SymbolAccount | RemoteSymbolAccount:
+  global _default_client
+  if not os.getenv("SIGNING_SOCKET"):
+    return crypto_backend.create_account(
+      facade, PrivateKey(os.getenv(name) or "")
+    )
+  if _default_client is None:
+    _default_client = SigningClient()
+  public_key = _default_client.keys().get(name)
+  if public_key is None:
+    raise Exception(f"署名サービスに{name}の鍵がありません")
+  return RemoteSymbolAccount(
+    facade, PublicKey(public_key), _default_client
+  )
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(description="署名サービスを起動する")
+  parser.add_argument(
+    "--socket",
+    default=os.getenv("SIGNING_SOCKET") or DEFAULT_SOCKET,
+    help="待ち受けるソケット",
+  )
+  parser.add_argument(
+    "--keys",
+    nargs="+",
+    default=list(DEFAULT_KEY_NAMES),
+    help="秘密鍵を読み込む環境変数の名前",
+  )
+  parser.add_argument(
+    "--workers", type=int, help="署名を行うプロセス数（既定はCPU数）"
+  )
+  parser.add_argument(
+    "--batch-size",
+    type=int,
+    default=MAX_BATCH_SIZE,
+    help="まとめる依頼数の上限",
+  )
+  parser.add_argument(
+    "--batch-window",
+    type=float,
+    default=BATCH_WINDOW * 1000,
+    help="後続の依頼を待つ時間（ミリ秒）",
+  )
+  args = parser.parse_args()
+
+  load_dotenv()
+  keys = {
+    name: os.getenv(name) for name in args.keys if os.getenv(name)
+  }
+  if not keys:
+    raise Exception("秘密鍵が設定されていません")
+  service = SigningService(
+    keys,
+    workers=args.workers,
+    max_batch_size=args.batch_size,
+    batch_window=args.batch_window / 1000,
+  )
+  try:
+    asyncio.run(service.serve(args.socket))
+  except KeyboardInterrupt:
+    pass
+  finally:
+    print("署名数", service.signed, "まとめた回数", service.batches)
+    service.close()
+
+
+if __name__ == "__main__":
+  main()
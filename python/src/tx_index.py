@@ -0,0 +1,466 @@
+# 承認済みトランザクションをブロック範囲ごとに並行して取得し、ローカルのSQLiteに索引を作るコード
+# アドレス・モザイク・ブロック高で検索でき、2回目以降は前回の続き（新しいブロック）だけを取得する
+# 使い方: python src/tx_index.py index.db --address <アドレス>（省略時はすべてのトランザクション）
+#        python src/tx_index.py index.db --query <アドレス>（同期せずに検索する）
+import os
+import json
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import (
+  FIRST_COMPLETED,
+  Future,
+  ThreadPoolExecutor,
+  wait,
+)
+from typing import Any, Iterable, Iterator, Optional
+import requests
+from dotenv import load_dotenv
+from symbolchain.CryptoTypes import PublicKey
+from symbolchain.facade.SymbolFacade import SymbolFacade
+from symbolchain.symbol.Network import Address
+
+from restriction_cache import address_to_hex
+
+# 1回の取得で扱うブロック数
+DEFAULT_RANGE_SIZE = 100
+# RESTの1ページの最大件数
+PAGE_SIZE = 100
+# モザイク定義トランザクションのタイプ（モザイクIDをidフィールドに持つ）
+MOSAIC_DEFINITION_TRANSACTION_TYPE = 0x414D
+# アドレスを含むトランザクションのフィールド
+ADDRESS_FIELDS = ("recipientAddress", "targetAddress")
+ADDRESS_LIST_FIELDS = (
+  "addressAdditions",
+  "addressDeletions",
+  "restrictionAdditions",
+  "restrictionDeletions",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+  id TEXT PRIMARY KEY,
+  hash TEXT,
+  aggregate_hash TEXT,
+  height INTEGER NOT NULL,
+  position INTEGER NOT NULL,
+  type INTEGER NOT NULL,
+  signer TEXT NOT NULL,
+  timestamp INTEGER,
+  json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_hash ON transactions (hash);
+CREATE INDEX IF NOT EXISTS transactions_aggregate_hash
+  ON transactions (aggregate_hash);
+CREATE INDEX IF NOT EXISTS transactions_height ON transactions (height);
+CREATE TABLE IF NOT EXISTS transaction_addresses (
+  transaction_id TEXT NOT NULL,
+  address TEXT NOT NULL,
+  height INTEGER NOT NULL,
+  PRIMARY KEY (address, height, transaction_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS transaction_mosaics (
+  transaction_id TEXT NOT NULL,
+  mosaic_id TEXT NOT NULL,
+  amount INTEGER,
+  height INTEGER NOT NULL,
+  PRIMARY KEY (mosaic_id, height, transaction_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync_ranges (
+  filter TEXT NOT NULL,
+  from_height INTEGER NOT NULL,
+  to_height INTEGER NOT NULL,
+  PRIMARY KEY (filter, from_height)
+);
+CREATE TABLE IF NOT EXISTS sync_checkpoints (
+  filter TEXT PRIMARY KEY,
+  height INTEGER NOT NULL
+);
+"""
+
+
+# アドレス（Address、16進数、T...形式の文字列）を16進数に揃える
+def normalize_address(address: Any) -> str:
+  if isinstance(address, str) and len(address) != 48:
+    return address_to_hex(Address(address.replace("-", "")))
+  return address_to_hex(address)
+
+
+class TransactionIndex:
+  """取得したトランザクションをアドレス・モザイク・ブロック高で検索できるよう保存する"""
+
+  def __init__(
+    self, path: str, facade: Optional[SymbolFacade] = None
+  ) -> None:
+    self.facade = facade or SymbolFacade("testnet")
+    self._db = sqlite3.connect(path)
+    self._db.execute("PRAGMA journal_mode=WAL")
+    self._db.executescript(_SCHEMA)
+    self._addresses: dict[str, str] = {}
+
+  def close(self) -> None:
+    self._db.close()
+
+  def __enter__(self) -> "TransactionIndex":
+    return self
+
+  def __exit__(self, *exc_info: Any) -> None:
+    self.close()
+
+  def _signer_address(self, public_key: str) -> str:
+    address = self._addresses.get(public_key)
+    if address is None:
+      address = address_to_hex(
+        self.facade.network.public_key_to_address(PublicKey(public_key))
+      )
+      self._addresses[public_key] = address
+    return address
+
+  # トランザクションに関係するアドレス（署名者・送信先など）
+  def addresses(self, transaction: dict) -> set[str]:
+    addresses = {self._signer_address(transaction["signerPublicKey"])}
+    for field in ADDRESS_FIELDS:
+      if transaction.get(field):
+        addresses.add(address_to_hex(transaction[field]))
+    for field in ADDRESS_LIST_FIELDS:
+      for value in transaction.get(field) or []:
+        # 制限の値はアドレス以外（モザイクID・トランザクションタイプ）の場合もある
+        if isinstance(value, str) and len(value) == 48:
+          addresses.add(address_to_hex(value))
+    return addresses
+
+  # トランザクションで扱うモザイク（モザイクID => 数量）
+  @staticmethod
+  def mosaics(transaction: dict) -> dict[str, Optional[int]]:
+    mosaics: dict[str, Optional[int]] = {}
+    for mosaic in transaction.get("mosaics") or []:
+      mosaics[mosaic["id"]] = int(mosaic["amount"])
+    if int(transaction["type"]) == MOSAIC_DEFINITION_TRANSACTION_TYPE:
+      mosaics[transaction["id"]] = None
+    if transaction.get("mosaicId"):
+      amount = transaction.get("amount", transaction.get("delta"))
+      mosaics[transaction["mosaicId"]] = (
+        int(amount) if amount is not None else None
+      )
+    return mosaics
+
+  # RESTの検索結果の1件を保存する（コミットはしない）
+  def _insert(self, entry: dict) -> None:
+    meta = entry["meta"]
+    transaction = dict(entry["transaction"])
+    # インナートランザクションは別の行として保存する
+    transaction.pop("transactions", None)
+    height = int(meta["height"])
+    cursor = self._db.execute(
+      "INSERT OR IGNORE INTO transactions (id, hash, aggregate_hash, "
+      "height, position, type, signer, timestamp, json) "
+      "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+      (
+        entry["id"],
+        meta.get("hash"),
+        meta.get("aggregateHash"),
+        height,
+        int(meta.get("index", 0)),
+        int(transaction["type"]),
+        transaction["signerPublicKey"],
+        int(meta["timestamp"]) if meta.get("timestamp") else None,
+        json.dumps({"meta": meta, "transaction": transaction}),
+      ),
+    )
+    if not cursor.rowcount:
+      return
+    # インナートランザクションのアドレス・モザイクはアグリゲートでも検索できるようにする
+    ids = [entry["id"]]
+    if meta.get("aggregateId"):
+      ids.append(meta["aggregateId"])
+    self._db.executemany(
+      "INSERT OR IGNORE INTO transaction_addresses VALUES (?, ?, ?)",
+      [
+        (id, address, height)
+        for address in self.addresses(transaction)
+        for id in ids
+      ],
+    )
+    self._db.executemany(
+      "INSERT OR IGNORE INTO transaction_mosaics VALUES (?, ?, ?, ?)",
+      [
+        (id, mosaic_id, amount, height)
+        for mosaic_id, amount in self.mosaics(transaction).items()
+        for id in ids
+      ],
+    )
+
+  # 取得したブロック範囲を1つのトランザクションで保存し、続きから再開できる位置を更新する
+  def store_range(
+    self,
+    filter: str,
+    from_height: int,
+    to_height: int,
+    entries: Iterable[dict],
+  ) -> int:
+    with self._db:
+      for entry in entries:
+        self._insert(entry)
+      self._db.execute(
+        "INSERT OR REPLACE INTO sync_ranges VALUES (?, ?, ?)",
+        (filter, from_height, to_height),
+      )
+      return self._advance_checkpoint(filter)
+
+  # 途切れずに取得済みの範囲の末尾まで位置を進める（並行取得では範囲の完了順が前後する）
+  def _advance_checkpoint(self, filter: str) -> int:
+    height = self.checkpoint(filter)
+    while True:
+      row = self._db.execute(
+        "SELECT to_height FROM sync_ranges "
+        "WHERE filter = ? AND from_height = ?",
+        (filter, height + 1),
+      ).fetchone()
+      if row is None:
+        break
+      height = row[0]
+    self._db.execute(
+      "INSERT OR REPLACE INTO sync_checkpoints VALUES (?, ?)",
+      (filter, height),
+    )
+    self._db.execute(
+      "DELETE FROM sync_ranges WHERE filter = ? AND to_height <= ?",
+      (filter, height),
+    )
+    return height
+
+  # 途切れずに取得済みの最後のブロック高（未取得の場合は0）
+  def checkpoint(self, filter: str) -> int:
+    row = self._db.execute(
+      "SELECT height FROM sync_checkpoints WHERE filter = ?", (filter,)
+    ).fetchone()
+    return row[0] if row else 0
+
+  # 位置より先で取得済みの範囲（開始高 => 終了高）
+  def completed_ranges(self, filter: str) -> dict[int, int]:
+    return dict(self._db.execute(
+      "SELECT from_height, to_height FROM sync_ranges WHERE filter = ?",
+      (filter,),
+    ).fetchall())
+
+  # ---------- 検索 ----------
+
+  def _select(self, where: str, params: tuple) -> list[dict]:
+    return [
+      json.loads(row[0])
+      for row in self._db.execute(
+        f"SELECT json FROM transactions WHERE {where} "
+        "ORDER BY height, aggregate_hash IS NOT NULL, position",
+        params,
+      )
+    ]
+
+  def by_hash(self, hash: str) -> list[dict]:
+    return self._select(
+      "hash = ? OR aggregate_hash = ?", (hash.upper(), hash.upper())
+    )
+
+  def by_height(self, height: int) -> list[dict]:
+    return self._select("height = ?", (height,))
+
+  def by_address(
+    self,
+    address: Any,
+    from_height: int = 0,
+    to_height: Optional[int] = None,
+  ) -> list[dict]:
+    return self._select(
+      "id IN (SELECT transaction_id FROM transaction_addresses "
+      "WHERE address = ? AND height BETWEEN ? AND ?)",
+      (normalize_address(address), from_height, to_height or 2**63 - 1),
+    )
+
+  def by_mosaic(
+    self,
+    mosaic_id: int,
+    from_height: int = 0,
+    to_height: Optional[int] = None,
+  ) -> list[dict]:
+    return self._select(
+      "id IN (SELECT transaction_id FROM transaction_mosaics "
+      "WHERE mosaic_id = ? AND height BETWEEN ? AND ?)",
+      (f"{mosaic_id:016X}", from_height, to_height or 2**63 - 1),
+    )
+
+
+class BlockRangeSyncer:
+  """ブロック範囲ごとの取得を一定数のワーカーで並行して行い、完了した順に索引に保存する"""
+
+  def __init__(
+    self,
+    index: TransactionIndex,
+    node_url: Optional[str] = None,
+    addresses: Iterable[Any] = (),
+    workers: int = 4,
+    range_size: int = DEFAULT_RANGE_SIZE,
+  ) -> None:
+    self.index = index
+    self.node_url = node_url or os.getenv("NODE_URL") or ""
+    self.addresses = sorted({normalize_address(a) for a in addresses})
+    self.workers = workers
+    self.range_size = range_size
+    # 絞り込み条件ごとに取得位置を分けて保持する
+    self.filter = ",".join(self.addresses) or "all"
+    self._local = threading.local()
+
+  def _session(self) -> requests.Session:
+    session = getattr(self._local, "session", None)
+    if session is None:
+      session = self._local.session = requests.Session()
+    return session
+
+  # 同期する最後のブロック高（ロールバックされないよう、既定ではファイナライズ済みの高さまで）
+  def target_height(self, finalized: bool = True) -> int:
+    info = self._session().get(f"{self.node_url}/chain/info").json()
+    if finalized:
+      return int(info["latestFinalizedBlock"]["height"])
+    return int(info["height"])
+
+  def _pages(self, params: dict) -> Iterator[dict]:
+    page_number = 1
+    while True:
+      response = self._session().get(
+        f"{self.node_url}/transactions/confirmed",
+        params={
+          **params,
+          "embedded": "true",
+          "order": "asc",
+          "pageSize": PAGE_SIZE,
+          "pageNumber": page_number,
+        },
+      )
+      response.raise_for_status()
+      data = response.json()["data"]
+      yield from data
+      if len(data) < PAGE_SIZE:
+        return
+      page_number += 1
+
+  # ブロック範囲のトランザクション（インナートランザクションを含む）を取得する
+  def fetch_range(self, from_height: int, to_height: int) -> list[dict]:
+    params = {"fromHeight": from_height, "toHeight": to_height}
+    if not self.addresses:
+      return list(self._pages(params))
+    entries = {}
+    for address in self.addresses:
+      for entry in self._pages({**params, "address": address}):
+        entries[entry["id"]] = entry
+    return list(entries.values())
+
+  def _ranges(
+    self, start: int, end: int, completed: dict[int, int]
+  ) -> Iterator[tuple[int, int]]:
+    height = start
+    while height <= end:
+      if height in completed:
+        height = completed[height] + 1
+        continue
+      to_height = min(height + self.range_size - 1, end)
+      yield height, to_height
+      height = to_height + 1
+
+  # 前回の続きからto_heightまで取得し、取得済みの位置を返す
+  def sync(
+    self,
+    to_height: Optional[int] = None,
+    from_height: int = 1,
+    progress: bool = False,
+  ) -> int:
+    end = to_height if to_height is not None else self.target_height()
+    start = max(self.index.checkpoint(self.filter) + 1, from_height)
+    if start > 1 and not self.index.checkpoint(self.filter):
+      # 途中から同期する場合は、それより前を取得済みとして扱う
+      self.index.store_range(self.filter, 1, start - 1, [])
+    ranges = self._ranges(
+      start, end, self.index.completed_ranges(self.filter)
+    )
+    checkpoint = self.index.checkpoint(self.filter)
+    with ThreadPoolExecutor(self.workers) as executor:
+      pending: dict[Future, tuple[int, int]] = {}
+      # 取得結果がメモリに溜まり続けないよう、実行中の範囲の数を制限する
+      for block_range in ranges:
+        pending[executor.submit(self.fetch_range, *block_range)] = (
+          block_range
+        )
+        while len(pending) >= self.workers * 2:
+          checkpoint = self._store_completed(pending, progress, end)
+      while pending:
+        checkpoint = self._store_completed(pending, progress, end)
+    return checkpoint
+
+  def _store_completed(
+    self,
+    pending: dict[Future, tuple[int, int]],
+    progress: bool,
+    end: int,
+  ) -> int:
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    checkpoint = 0
+    for future in done:
+      from_height, to_height = pending.pop(future)
+      checkpoint = self.index.store_range(
+        self.filter, from_height, to_height, future.result()
+      )
+      if progress:
+        print(f"同期済み {checkpoint}/{end}（{from_height}-{to_height}）")
+    return checkpoint
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="承認済みトランザクションを取得してローカルで検索できるようにする"
+  )
+  parser.add_argument("path", help="索引のファイル")
+  parser.add_argument(
+    "--address",
+    action="append",
+    default=[],
+    help="このアドレスに関係するものだけを取得する（複数指定可）",
+  )
+  parser.add_argument(
+    "--from-height", type=int, default=1, help="初回の同期を始めるブロック高"
+  )
+  parser.add_argument("--to-height", type=int, help="同期する最後のブロック高")
+  parser.add_argument(
+    "--unfinalized",
+    action="store_true",
+    help="ファイナライズされていないブロックも同期する",
+  )
+  parser.add_argument("--workers", type=int, default=4, help="並行取得数")
+  parser.add_argument(
+    "--range-size",
+    type=int,
+    default=DEFAULT_RANGE_SIZE,
+    help="1回に取得するブロック数",
+  )
+  parser.add_argument(
+    "--query", help="同期せずに、このアドレスのトランザクションを表示する"
+  )
+  args = parser.parse_args()
+
+  load_dotenv()
+  with TransactionIndex(args.path) as index:
+    if args.query:
+      for entry in index.by_address(args.query):
+        print(json.dumps(entry, ensure_ascii=False))
+      return
+    syncer = BlockRangeSyncer(
+      index,
+      addresses=args.address,
+      workers=args.workers,
+      range_size=args.range_size,
+    )
+    to_height = args.to_height or syncer.target_height(
+      not args.unfinalized
+    )
+    checkpoint = syncer.sync(to_height, args.from_height, progress=True)
+    print("同期完了", checkpoint)
+
+
+if __name__ == "__main__":
+  main()
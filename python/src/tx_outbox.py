@@ -0,0 +1,400 @@
+# 署名済みトランザクションをアナウンス前にSQLiteへ保存し、再起動後にノードと突き合わせて再送するコード
+# アナウンスの直後にプロセスが終了しても、送ったかどうかを後から確認できる
+# 使い方: python src/tx_outbox.py outbox.db（PRIVATE_KEY_A/Bのアカウントで再署名できる。SIGNING_SOCKETがあれば署名サービスを使う）
+import os
+import json
+import time
+import atexit
+import sqlite3
+import argparse
+import threading
+import requests
+from typing import Any, Iterable, Optional
+from dotenv import load_dotenv
+from symbolchain.facade.SymbolFacade import (
+  SymbolFacade,
+  SymbolAccount,
+  Hash256,
+)
+from symbolchain.sc import Timestamp, TransactionFactory
+
+from send_tx import (
+  TRANSACTIONS_ENDPOINT,
+  PARTIAL_ENDPOINT,
+  prepare_tx,
+  announce_tx,
+  announce_endpoint,
+)
+from records import TransactionStatus, parse_status
+from signing_service import DEFAULT_KEY_NAMES, signing_account
+
+# 保存した行の状態
+STATE_SIGNED = "signed"  # 保存済み（アナウンスしたかどうかは不明）
+STATE_ANNOUNCED = "announced"  # ノードがアナウンスを受け付けた
+STATE_UNCONFIRMED = "unconfirmed"
+STATE_CONFIRMED = "confirmed"
+STATE_FAILED = "failed"
+STATE_SUPERSEDED = "superseded"  # 期限切れになり、再署名したものに置き換えた
+STATE_EXPIRED = "expired"  # 期限切れになったが、再署名できない
+# 結果がまだ決まっていない状態
+ACTIVE_STATES = (STATE_SIGNED, STATE_ANNOUNCED, STATE_UNCONFIRMED)
+
+FAILURE_PAST_DEADLINE = "Failure_Core_Past_Deadline"
+# 再署名後の有効期限（ミリ秒）
+DEFAULT_LIFETIME = 2 * 60 * 60 * 1000
+# 期限を過ぎてから再署名するまでの余裕（ミリ秒）。ノードの同期の遅れで承認を見落とさないため
+DEFAULT_EXPIRY_MARGIN = 2 * 60 * 1000
+# POST /transactionStatus で1回に問い合わせるハッシュ数
+STATUS_BATCH_SIZE = 100
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+  hash TEXT PRIMARY KEY,
+  key TEXT,
+  payload TEXT NOT NULL,
+  endpoint TEXT NOT NULL DEFAULT '/transactions',
+  signer TEXT NOT NULL,
+  deadline INTEGER NOT NULL,
+  state TEXT NOT NULL,
+  code TEXT,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  replaced_by TEXT,
+  created_at REAL NOT NULL,
+  updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_state ON outbox (state);
+CREATE INDEX IF NOT EXISTS outbox_key ON outbox (key);
+"""
+
+
+class TxOutbox:
+  """署名済みトランザクションを保存してからアナウンスし、結果が決まるまで追跡する"""
+
+  def __init__(
+    self,
+    path: str,
+    node_url: Optional[str] = None,
+    signers: Iterable[SymbolAccount] = (),
+    facade: Optional[SymbolFacade] = None,
+    lifetime: int = DEFAULT_LIFETIME,
+    expiry_margin: int = DEFAULT_EXPIRY_MARGIN,
+  ) -> None:
+    self.node_url = node_url or os.getenv("NODE_URL") or ""
+    self.facade = facade or SymbolFacade("testnet")
+    self.lifetime = lifetime
+    self.expiry_margin = expiry_margin
+    # 再署名に使うアカウント（公開鍵 => アカウント）
+    self.signers: dict[str, SymbolAccount] = {}
+    for account in signers:
+      self.add_signer(account)
+    self._session = requests.Session()
+    self._db = sqlite3.connect(path)
+    self._db.row_factory = sqlite3.Row
+    # アナウンス前の保存が確実にディスクに書かれるようにする
+    self._db.execute("PRAGMA journal_mode=WAL")
+    self._db.execute("PRAGMA synchronous=FULL")
+    self._db.executescript(_SCHEMA)
+    # endpoint列がない古いファイルには列を追加する
+    columns = {
+      row["name"]
+      for row in self._db.execute("PRAGMA table_info(outbox)")
+    }
+    if "endpoint" not in columns:
+      with self._db:
+        self._db.execute(
+          "ALTER TABLE outbox ADD COLUMN endpoint TEXT NOT NULL "
+          f"DEFAULT '{TRANSACTIONS_ENDPOINT}'"
+        )
+
+  def close(self) -> None:
+    self._session.close()
+    self._db.close()
+
+  def __enter__(self) -> "TxOutbox":
+    return self
+
+  def __exit__(self, *exc_info: Any) -> None:
+    self.close()
+
+  def add_signer(self, account: SymbolAccount) -> None:
+    self.signers[str(account.public_key)] = account
+
+  # ---------- 保存とアナウンス ----------
+
+  # 署名済みのJSONを保存する（アナウンスより前に呼ぶ）
+  # endpointを省略するとペイロードのトランザクションの種類から決める
+  def record(
+    self,
+    json_payload: str,
+    hash: Hash256,
+    signAccount: SymbolAccount,
+    deadline: int,
+    key: Optional[str] = None,
+    endpoint: Optional[str] = None,
+  ) -> None:
+    if endpoint is None:
+      endpoint = announce_endpoint(_deserialize(json_payload))
+    now = time.time()
+    with self._db:
+      self._db.execute(
+        "INSERT OR IGNORE INTO outbox (hash, key, payload, endpoint, "
+        "signer, deadline, state, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+          str(hash), key, json_payload, endpoint,
+          str(signAccount.public_key), deadline, STATE_SIGNED,
+          now, now,
+        ),
+      )
+
+  # 保存済みのトランザクションをアナウンスする
+  def announce(self, hash: str) -> Any:
+    row = self.get(hash)
+    if row is None:
+      raise KeyError(hash)
+    response = announce_tx(
+      row["payload"], self.node_url, self._session, row["endpoint"]
+    )
+    if "code" in response:
+      self._update(hash, attempts=row["attempts"] + 1)
+    else:
+      self._update(
+        hash,
+        state=(
+          STATE_ANNOUNCED if row["state"] == STATE_SIGNED else row["state"]
+        ),
+        attempts=row["attempts"] + 1,
+      )
+    return response
+
+  # 署名・保存・アナウンスを行う。同じkeyのものが送信済み（または送信中）ならそのハッシュを返す
+  def send(
+    self,
+    tx: Any,
+    signAccount: SymbolAccount,
+    key: Optional[str] = None,
+  ) -> Hash256:
+    if key is not None:
+      existing = self._db.execute(
+        "SELECT hash FROM outbox WHERE key = ? AND state IN (?, ?, ?, ?) "
+        "ORDER BY created_at DESC LIMIT 1",
+        (key, *ACTIVE_STATES, STATE_CONFIRMED),
+      ).fetchone()
+      if existing is not None:
+        return Hash256(existing["hash"])
+    self.add_signer(signAccount)
+    json_payload, hash = prepare_tx(tx, signAccount, self.facade)
+    self.record(
+      json_payload,
+      hash,
+      signAccount,
+      tx.deadline.value,
+      key,
+      announce_endpoint(tx),
+    )
+    self.announce(str(hash))
+    return hash
+
+  # ---------- 参照 ----------
+
+  def get(self, hash: str) -> Optional[sqlite3.Row]:
+    return self._db.execute(
+      "SELECT * FROM outbox WHERE hash = ?", (str(hash),)
+    ).fetchone()
+
+  # 再署名で置き換えた場合も含め、最新のハッシュの行を返す
+  def latest(self, hash: str) -> Optional[sqlite3.Row]:
+    row = self.get(hash)
+    while row is not None and row["replaced_by"]:
+      row = self.get(row["replaced_by"])
+    return row
+
+  def active(self) -> list[sqlite3.Row]:
+    return self._db.execute(
+      "SELECT * FROM outbox WHERE state IN (?, ?, ?) ORDER BY created_at",
+      ACTIVE_STATES,
+    ).fetchall()
+
+  def counts(self) -> dict[str, int]:
+    return {
+      row["state"]: row["count"]
+      for row in self._db.execute(
+        "SELECT state, COUNT(*) AS count FROM outbox GROUP BY state"
+      )
+    }
+
+  def _update(self, hash: str, **values: Any) -> None:
+    values["updated_at"] = time.time()
+    columns = ", ".join(f"{name} = ?" for name in values)
+    with self._db:
+      self._db.execute(
+        f"UPDATE outbox SET {columns} WHERE hash = ?",
+        (*values.values(), hash),
+      )
+
+  # ---------- ノードとの突き合わせ ----------
+
+  def _network_time(self) -> int:
+    network_time = self._session.get(
+      f"{self.node_url}/node/time"
+    ).json()
+    return int(
+      network_time["communicationTimestamps"]["receiveTimestamp"]
+    )
+
+  # ハッシュ => ステータス（ノードが知らないものは含まれない）
+  def _fetch_statuses(
+    self, hashes: list[str]
+  ) -> dict[str, TransactionStatus]:
+    statuses = {}
+    for offset in range(0, len(hashes), STATUS_BATCH_SIZE):
+      response = self._session.post(
+        f"{self.node_url}/transactionStatus",
+        json={"hashes": hashes[offset:offset + STATUS_BATCH_SIZE]},
+      )
+      response.raise_for_status()
+      for data in response.json():
+        status = parse_status(data)
+        statuses[status.hash.upper()] = status
+    return statuses
+
+  # 結果が決まっていないトランザクションの状態をノードに問い合わせて更新する
+  # 期限内でノードが知らないものは同じペイロードを再アナウンスし（ハッシュが同じなので二重送信にならない）、
+  # 期限を過ぎても承認されなかったものは新しい期限で再署名してアナウンスする（アグリゲートボンデッドは期限切れとする）
+  def reconcile(self) -> dict[str, int]:
+    rows = self.active()
+    if not rows:
+      return self.counts()
+    now = self._network_time()
+    statuses = self._fetch_statuses([row["hash"] for row in rows])
+    for row in rows:
+      hash = row["hash"]
+      status = statuses.get(hash)
+      group = status.group if status else None
+      if group == STATE_CONFIRMED:
+        self._update(hash, state=STATE_CONFIRMED, code=status.code)
+      elif group in ("unconfirmed", "partial"):
+        self._update(hash, state=STATE_UNCONFIRMED, code=status.code)
+      elif group == "failed" and status.code != FAILURE_PAST_DEADLINE:
+        self._update(hash, state=STATE_FAILED, code=status.code)
+      elif now > row["deadline"] + self.expiry_margin:
+        # 期限を過ぎたトランザクションはもう承認されないため、再署名しても二重送信にならない
+        self._resign(row, now)
+      elif group is None and now < row["deadline"]:
+        # ノードが受け取っていない（アナウンス前に終了した、またはプールから消えた）
+        self.announce(hash)
+    return self.counts()
+
+  def _resign(self, row: sqlite3.Row, now: int) -> Optional[str]:
+    tx = _deserialize(row["payload"])
+    account = self.signers.get(row["signer"])
+    # 連署が必要なものは連署者がいないと再署名できない
+    # アグリゲートボンデッドは、再署名するとハッシュが変わりハッシュロックが使えなくなる
+    if (
+      account is None
+      or getattr(tx, "cosignatures", None)
+      or row["endpoint"] == PARTIAL_ENDPOINT
+      or announce_endpoint(tx) == PARTIAL_ENDPOINT
+    ):
+      self._update(
+        row["hash"], state=STATE_EXPIRED, code=FAILURE_PAST_DEADLINE
+      )
+      return None
+    tx.deadline = Timestamp(now + self.lifetime)
+    json_payload, hash = prepare_tx(tx, account, self.facade)
+    self.record(
+      json_payload,
+      hash,
+      account,
+      tx.deadline.value,
+      row["key"],
+      row["endpoint"],
+    )
+    self._update(
+      row["hash"],
+      state=STATE_SUPERSEDED,
+      code=FAILURE_PAST_DEADLINE,
+      replaced_by=str(hash),
+    )
+    self.announce(str(hash))
+    return str(hash)
+
+  # すべての結果が決まるまで（またはtimeoutまで）一定間隔で突き合わせる
+  def run(
+    self, interval: float = 5, timeout: Optional[float] = None
+  ) -> dict[str, int]:
+    started = time.monotonic()
+    while True:
+      counts = self.reconcile()
+      if not any(counts.get(state) for state in ACTIVE_STATES):
+        return counts
+      if timeout is not None and time.monotonic() - started > timeout:
+        return counts
+      time.sleep(interval)
+
+
+# アナウンス用のJSONからトランザクションを復元する
+def _deserialize(json_payload: str) -> Any:
+  return TransactionFactory.deserialize(
+    bytes.fromhex(json.loads(json_payload)["payload"])
+  )
+
+
+# 環境変数 OUTBOX_DB が指定されていればそのアウトボックスを開く
+def open_default_outbox(
+  node_url: Optional[str] = None,
+) -> Optional[TxOutbox]:
+  path = os.getenv("OUTBOX_DB")
+  return TxOutbox(path, node_url) if path else None
+
+
+# スレッドごとに開いたアウトボックス（(パス, ノード), アウトボックス）
+_default_outboxes = threading.local()
+
+
+# 環境変数 OUTBOX_DB のアウトボックスを、スレッドごとに1つ開いて使い回す
+# （SQLiteの接続は作成したスレッドでしか使えないため、スレッドごとに持つ）
+def default_outbox(
+  node_url: Optional[str] = None,
+) -> Optional[TxOutbox]:
+  node_url = node_url or os.getenv("NODE_URL") or ""
+  key = (os.getenv("OUTBOX_DB"), node_url)
+  cached = getattr(_default_outboxes, "cached", None)
+  if cached is not None and cached[0] == key:
+    return cached[1]
+  if cached is not None and cached[1] is not None:
+    cached[1].close()
+  outbox = open_default_outbox(node_url)
+  if outbox is not None:
+    atexit.register(outbox.close)
+  _default_outboxes.cached = (key, outbox)
+  return outbox
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="アウトボックスに残っているトランザクションをノードと突き合わせる"
+  )
+  parser.add_argument("path", help="アウトボックスのファイル")
+  parser.add_argument(
+    "--interval", type=float, default=5, help="突き合わせの間隔（秒）"
+  )
+  parser.add_argument(
+    "--timeout", type=float, help="結果が決まるまで待つ時間の上限（秒）"
+  )
+  args = parser.parse_args()
+
+  load_dotenv()
+  facade = SymbolFacade("testnet")
+  signers = [
+    signing_account(facade, name)
+    for name in DEFAULT_KEY_NAMES
+    if os.getenv("SIGNING_SOCKET") or os.getenv(name)
+  ]
+  with TxOutbox(args.path, signers=signers, facade=facade) as outbox:
+    print("突き合わせ前", outbox.counts())
+    print("突き合わせ後", outbox.run(args.interval, args.timeout))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,137 @@
+# 1つのシード（ニーモニック）から決定的にアカウントを導出するコード
+# 顧客ごとのアカウントを何度でも同じ内容で再現できる
+import os
+import argparse
+from collections import OrderedDict
+from typing import Iterator, Optional
+from symbolchain.Bip32 import Bip32, Bip32Node
+from symbolchain.facade.SymbolFacade import (
+  SymbolFacade,
+  SymbolAccount,
+)
+
+from generate_account import AccountWriter, RateReporter
+
+
+class HdAccountDeriver:
+  """BIP32（ed25519）でアカウントを導出する。途中のノードをキャッシュし、隣接するアカウントの導出で再利用する"""
+
+  def __init__(
+    self,
+    facade: SymbolFacade,
+    root: Bip32Node,
+    cache_size: int = 1024,
+  ) -> None:
+    self.facade = facade
+    self.root = root
+    self.cache_size = cache_size
+    self._nodes: OrderedDict[tuple[int, ...], Bip32Node] = OrderedDict()
+
+  @staticmethod
+  def from_mnemonic(
+    facade: SymbolFacade, mnemonic: str, password: str = ""
+  ) -> "HdAccountDeriver":
+    bip32 = Bip32(SymbolFacade.BIP32_CURVE_NAME)
+    return HdAccountDeriver(
+      facade, bip32.from_mnemonic(mnemonic, password)
+    )
+
+  @staticmethod
+  def from_seed(facade: SymbolFacade, seed: bytes) -> "HdAccountDeriver":
+    bip32 = Bip32(SymbolFacade.BIP32_CURVE_NAME)
+    return HdAccountDeriver(facade, bip32.from_seed(seed))
+
+  # パスのノードを導出する（キャッシュにある最も深い親ノードから続きを導出）
+  def derive_node(self, path: tuple[int, ...]) -> Bip32Node:
+    depth = len(path)
+    while depth > 0 and path[:depth] not in self._nodes:
+      depth -= 1
+
+    node = self._nodes[path[:depth]] if depth else self.root
+    if depth:
+      self._nodes.move_to_end(path[:depth])
+    for index in range(depth, len(path)):
+      node = node.derive_one(path[index])
+      # 葉のノードは再利用されないため、親ノードのみキャッシュする
+      if index < len(path) - 1:
+        self._nodes[path[:index + 1]] = node
+        if len(self._nodes) > self.cache_size:
+          self._nodes.popitem(last=False)
+    return node
+
+  # ウォレットと互換のあるパス（44'/コイン'/アカウント'/0'/0'）でアカウントを導出する
+  def derive_account(self, account_id: int) -> SymbolAccount:
+    node = self.derive_node(tuple(self.facade.bip32_path(account_id)))
+    return self.facade.create_account(node.private_key)
+
+  # 連続したアカウントをまとめて導出する
+  def derive_range(
+    self, start: int, count: int
+  ) -> Iterator[SymbolAccount]:
+    for account_id in range(start, start + count):
+      yield self.derive_account(account_id)
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="環境変数HD_MNEMONICのニーモニックからアカウントを導出する"
+  )
+  parser.add_argument("--start", type=int, default=0, help="開始番号")
+  parser.add_argument("--count", type=int, default=1, help="導出する件数")
+  parser.add_argument("--output", help="出力先のファイル（省略時は表示のみ）")
+  parser.add_argument(
+    "--format", choices=["csv", "binary"], default="csv"
+  )
+  parser.add_argument(
+    "--encrypt",
+    action="store_true",
+    help="環境変数ACCOUNT_FILE_PASSPHRASEのパスフレーズで暗号化する",
+  )
+  args = parser.parse_args()
+
+  mnemonic: Optional[str] = os.getenv("HD_MNEMONIC")
+  if not mnemonic:
+    parser.error("HD_MNEMONICが設定されていません")
+  if args.encrypt and not args.output:
+    parser.error("--encryptを指定する場合は--outputが必要です")
+  passphrase = None
+  if args.encrypt:
+    passphrase = os.getenv("ACCOUNT_FILE_PASSPHRASE")
+    if not passphrase:
+      parser.error("ACCOUNT_FILE_PASSPHRASEが設定されていません")
+
+  facade: SymbolFacade = SymbolFacade("testnet")
+  deriver = HdAccountDeriver.from_mnemonic(
+    facade, mnemonic, os.getenv("HD_PASSWORD") or ""
+  )
+  accounts = deriver.derive_range(args.start, args.count)
+
+  if not args.output:
+    for account_id, account in enumerate(accounts, args.start):
+      print(account_id, account.address)
+    return
+
+  writer = AccountWriter(args.output, args.format, passphrase)
+  reporter = RateReporter()
+  chunk = []
+  try:
+    for account in accounts:
+      chunk.append((
+        account.key_pair.private_key.bytes,
+        account.public_key.bytes,
+        account.address.bytes,
+      ))
+      if len(chunk) == 1000:
+        writer.write(chunk)
+        reporter.add(len(chunk), "導出済み ")
+        chunk = []
+    if chunk:
+      writer.write(chunk)
+      reporter.add(len(chunk))
+  finally:
+    writer.close()
+  reporter.report("完了 ")
+
+
+if __name__ == "__main__":
+  main()
@@ -1,17 +1,330 @@
 # アカウントを生成するコード
+# 引数なしで実行すると1件生成して表示する
+# --countで大量生成（ファイル出力）、--vanityで指定した文字列から始まるアドレスを探索する
+import os
+import sys
+import time
+import struct
+import hashlib
+import argparse
+import multiprocessing
+from collections import deque
+from typing import Any, Callable, Iterable, Iterator, Optional
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from symbolchain.CryptoTypes import PrivateKey
 from symbolchain.facade.SymbolFacade import (
   SymbolFacade,
   SymbolAccount,
 )
 
-def main() -> None:
-  facade: SymbolFacade = SymbolFacade(
-    "testnet"
-  )  # SymbolSDKの機能を呼び出す窓口
-  account: SymbolAccount = facade.create_account(
-    PrivateKey.random()
-  )  # 新規アカウントの生成
+# 暗号化ファイルの先頭に書き込む識別子
+# （02からチャンクの番号と最後のチャンクかどうかを認証対象に含める）
+ENCRYPTED_FILE_MAGIC = b"SBKACC02"
+# バイナリ形式の1件あたりのサイズ（秘密鍵32 + 公開鍵32 + アドレス24）
+BINARY_RECORD_SIZE = 32 + 32 + 24
+# アドレスに使われる文字（Base32、値の順）
+ADDRESS_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+ADDRESS_ALPHABET = set(ADDRESS_CHARS)
+# アドレスの文字数（24バイトをBase32にしたもの）
+ADDRESS_LENGTH = 39
+
+# ワーカープロセスごとに1つだけ生成するSDKの窓口
+_facade: Optional[SymbolFacade] = None
+
+
+def _init_worker() -> None:
+  global _facade
+  _facade = SymbolFacade("testnet")
+
+
+def _create_account() -> SymbolAccount:
+  return _facade.create_account(PrivateKey.random())
+
+
+# 指定件数のアカウントを生成する（ワーカープロセスで実行）
+def _generate_chunk(size: int) -> list[tuple[bytes, bytes, bytes]]:
+  accounts = []
+  for _ in range(size):
+    account = _create_account()
+    accounts.append((
+      account.key_pair.private_key.bytes,
+      account.public_key.bytes,
+      account.address.bytes,
+    ))
+  return accounts
+
+
+# 指定した文字列から始まるアドレスを探索する（ワーカープロセスで実行）
+def _search_vanity(
+  args: tuple[str, int]
+) -> tuple[int, list[tuple[bytes, bytes, bytes]]]:
+  prefix, attempts = args
+  found = []
+  for _ in range(attempts):
+    account = _create_account()
+    if str(account.address).startswith(prefix):
+      found.append((
+        account.key_pair.private_key.bytes,
+        account.public_key.bytes,
+        account.address.bytes,
+      ))
+  return attempts, found
+
+
+# パスフレーズから暗号化キーを導出する
+def _derive_key(passphrase: str, salt: bytes) -> bytes:
+  return hashlib.scrypt(
+    passphrase.encode("utf-8"), salt=salt, n=2**14, r=8, p=1, dklen=32
+  )
+
+
+# チャンクの認証対象に含めるデータ（番号と最後のチャンクかどうか）
+# 入れ替え・途中での切り捨てがあると復号に失敗する
+def _chunk_aad(index: int, final: bool) -> bytes:
+  return struct.pack("<Q?", index, final)
+
+
+class AccountWriter:
+  """生成したアカウントをCSVまたはバイナリで書き出す（パスフレーズ指定時はチャンクごとに暗号化）"""
+
+  def __init__(
+    self, path: str, format: str, passphrase: Optional[str]
+  ) -> None:
+    self.format = format
+    # 秘密鍵を含むため、所有者だけが読み書きできるファイルとして作る
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    if hasattr(os, "fchmod"):
+      # 既存のファイルに上書きする場合もパーミッションを揃える
+      os.fchmod(fd, 0o600)
+    self._file = os.fdopen(fd, "wb")
+    self._aes: Optional[AESGCM] = None
+    self._chunks = 0
+    if passphrase:
+      salt = os.urandom(16)
+      self._aes = AESGCM(_derive_key(passphrase, salt))
+      self._file.write(ENCRYPTED_FILE_MAGIC + salt)
+    if format == "csv":
+      self._write(b"private_key,public_key,address\n")
+
+  def _write(self, data: bytes, final: bool = False) -> None:
+    if self._aes is None:
+      self._file.write(data)
+      return
+    nonce = os.urandom(12)
+    encrypted = self._aes.encrypt(
+      nonce, data, _chunk_aad(self._chunks, final)
+    )
+    self._chunks += 1
+    self._file.write(nonce + struct.pack("<I", len(encrypted)))
+    self._file.write(encrypted)
+
+  def write(self, accounts: list[tuple[bytes, bytes, bytes]]) -> None:
+    if self.format == "csv":
+      facade_address = SymbolFacade.Address
+      data = "".join(
+        f"{private_key.hex().upper()},{public_key.hex().upper()},"
+        f"{facade_address(address)}\n"
+        for private_key, public_key, address in accounts
+      ).encode("utf-8")
+    else:
+      data = b"".join(
+        private_key + public_key + address
+        for private_key, public_key, address in accounts
+      )
+    self._write(data)
+
+  def close(self) -> None:
+    # 最後のチャンクとして空のチャンクを書き込み、切り捨てを検出できるようにする
+    if self._aes is not None:
+      self._write(b"", final=True)
+    self._file.close()
+
+
+# AccountWriterで書き出したファイルを読み込み、(秘密鍵, 公開鍵, アドレス)を順に返す
+def read_accounts(
+  path: str, format: str = "csv", passphrase: Optional[str] = None
+) -> Iterator[tuple[str, str, str]]:
+  with open(path, "rb") as file:
+    if passphrase:
+      header = file.read(len(ENCRYPTED_FILE_MAGIC) + 16)
+      if not header.startswith(ENCRYPTED_FILE_MAGIC):
+        raise ValueError("暗号化されたアカウントファイルではありません")
+      aes = AESGCM(_derive_key(passphrase, header[-16:]))
+
+      def chunks() -> Iterator[bytes]:
+        index = 0
+        while prefix := file.read(16):
+          (size,) = struct.unpack("<I", prefix[12:])
+          encrypted = file.read(size)
+          try:
+            yield aes.decrypt(
+              prefix[:12], encrypted, _chunk_aad(index, False)
+            )
+          except InvalidTag:
+            # 最後のチャンクなら以降にデータがないことを確認して終わる
+            aes.decrypt(prefix[:12], encrypted, _chunk_aad(index, True))
+            if file.read(1):
+              raise ValueError("最後のチャンクの後にデータがあります")
+            return
+          index += 1
+        raise ValueError(
+          "アカウントファイルが途中で切れています（最後のチャンクがありません）"
+        )
+    else:
+      def chunks() -> Iterator[bytes]:
+        while data := file.read(BINARY_RECORD_SIZE * 4096):
+          yield data
+
+    pending = b""
+    for data in chunks():
+      pending += data
+      if format == "csv":
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+          if line and not line.startswith(b"private_key,"):
+            private_key, public_key, address = line.decode().split(",")
+            yield private_key, public_key, address
+      else:
+        usable = len(pending) - len(pending) % BINARY_RECORD_SIZE
+        for offset in range(0, usable, BINARY_RECORD_SIZE):
+          record = pending[offset:offset + BINARY_RECORD_SIZE]
+          yield (
+            record[:32].hex().upper(),
+            record[32:64].hex().upper(),
+            str(SymbolFacade.Address(record[64:])),
+          )
+        pending = pending[usable:]
+
+
+class RateReporter:
+  """生成速度（keys/sec）を一定間隔で標準エラー出力に表示する"""
+
+  def __init__(self, interval: float = 2) -> None:
+    self.interval = interval
+    self.started_at = time.monotonic()
+    self._reported_at = self.started_at
+    self.total = 0
+
+  def add(self, count: int, label: str = "") -> None:
+    self.total += count
+    now = time.monotonic()
+    if now - self._reported_at >= self.interval:
+      self._reported_at = now
+      self.report(label)
+
+  def report(self, label: str = "") -> None:
+    elapsed = time.monotonic() - self.started_at
+    print(
+      f"{label}{self.total}件 {elapsed:.1f}秒 "
+      f"{self.total / elapsed if elapsed else 0:.0f} keys/sec",
+      file=sys.stderr,
+    )
+
+
+# 実行中のタスク数を一定に保ちながらワーカーで処理する
+# （Pool.imapは入力をすべて先読みするため、無限の入力や大量の結果でメモリが増え続ける）
+def _bounded_map(
+  pool: Any, func: Callable, args: Iterable, max_pending: int
+) -> Iterator[Any]:
+  args = iter(args)
+  pending = deque(
+    pool.apply_async(func, (arg,))
+    for _, arg in zip(range(max_pending), args)
+  )
+  while pending:
+    result = pending.popleft().get()
+    for arg in args:
+      pending.append(pool.apply_async(func, (arg,)))
+      break
+    yield result
+
+
+# アカウントを大量に生成し、ファイルに書き出す
+def generate_bulk(
+  count: int,
+  output: str,
+  format: str = "csv",
+  passphrase: Optional[str] = None,
+  workers: Optional[int] = None,
+  chunk_size: int = 1000,
+) -> None:
+  workers = workers or os.cpu_count() or 1
+  writer = AccountWriter(output, format, passphrase)
+  reporter = RateReporter()
+  chunks = (
+    min(chunk_size, count - offset)
+    for offset in range(0, count, chunk_size)
+  )
+  try:
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+      # チャンク単位で受け取ってすぐ書き出すため、メモリ使用量は件数によらない
+      for accounts in _bounded_map(
+        pool, _generate_chunk, chunks, workers * 2
+      ):
+        writer.write(accounts)
+        reporter.add(len(accounts), "生成済み ")
+  finally:
+    writer.close()
+  reporter.report("完了 ")
+
+
+# アドレスの先頭2文字になりうる文字列
+# 1バイト目はネットワークの識別子で固定なので、1文字目（5bit）は1通り、2文字目は
+# 残りの3bitが固定で下位2bitだけが変わる4通りになる
+def possible_prefixes(network: str = "testnet") -> list[str]:
+  identifier = SymbolFacade(network).network.identifier
+  return [
+    ADDRESS_CHARS[identifier >> 3]
+    + ADDRESS_CHARS[((identifier & 0x07) << 2) | low]
+    for low in range(4)
+  ]
+
+
+# そのネットワークのアドレスがprefixから始まることがあるかどうか
+def is_possible_prefix(prefix: str, network: str = "testnet") -> bool:
+  if len(prefix) > ADDRESS_LENGTH:
+    return False
+  return any(
+    candidate.startswith(prefix) or prefix.startswith(candidate)
+    for candidate in possible_prefixes(network)
+  )
+
+
+# 指定した文字列から始まるアドレスを全コアで探索する
+def search_vanity(
+  prefix: str,
+  count: int = 1,
+  workers: Optional[int] = None,
+  attempts_per_task: int = 2000,
+) -> list[tuple[bytes, bytes, bytes]]:
+  prefix = prefix.upper()
+  if not set(prefix) <= ADDRESS_ALPHABET:
+    raise ValueError(f"アドレスに使えない文字が含まれています: {prefix}")
+  if not is_possible_prefix(prefix):
+    raise ValueError(
+      f"テストネットのアドレスはこの文字列から始まりません: {prefix}"
+      f"（{'、'.join(possible_prefixes())}のいずれかから始まります）"
+    )
+
+  workers = workers or os.cpu_count() or 1
+  reporter = RateReporter()
+  found: list[tuple[bytes, bytes, bytes]] = []
+  tasks = iter(lambda: (prefix, attempts_per_task), None)
+  with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+    for attempts, accounts in _bounded_map(
+      pool, _search_vanity, tasks, workers * 2
+    ):
+      found.extend(accounts)
+      reporter.add(attempts, "探索済み ")
+      if len(found) >= count:
+        pool.terminate()
+        break
+  reporter.report("完了 ")
+  return found[:count]
+
+
+def print_account(account: SymbolAccount) -> None:
   address = account.address
 
   print("秘密鍵", str(account.key_pair.private_key))  # 秘密鍵の導出
@@ -27,5 +340,51 @@ def main() -> None:
   )
 
 
+def main() -> None:
+  parser = argparse.ArgumentParser(description="アカウントを生成する")
+  parser.add_argument("--count", type=int, help="生成する件数")
+  parser.add_argument("--output", help="出力先のファイル")
+  parser.add_argument(
+    "--format", choices=["csv", "binary"], default="csv"
+  )
+  parser.add_argument(
+    "--encrypt",
+    action="store_true",
+    help="環境変数ACCOUNT_FILE_PASSPHRASEのパスフレーズで暗号化する",
+  )
+  parser.add_argument("--workers", type=int, help="プロセス数")
+  parser.add_argument("--vanity", help="アドレスの先頭の文字列（例: TABC）")
+  args = parser.parse_args()
+
+  facade: SymbolFacade = SymbolFacade(
+    "testnet"
+  )  # SymbolSDKの機能を呼び出す窓口
+
+  if args.vanity:
+    for private_key, _, _ in search_vanity(
+      args.vanity, args.count or 1, args.workers
+    ):
+      print_account(facade.create_account(PrivateKey(private_key)))
+    return
+
+  if args.count:
+    if not args.output:
+      parser.error("--countを指定する場合は--outputが必要です")
+    passphrase = None
+    if args.encrypt:
+      passphrase = os.getenv("ACCOUNT_FILE_PASSPHRASE")
+      if not passphrase:
+        parser.error("ACCOUNT_FILE_PASSPHRASEが設定されていません")
+    generate_bulk(
+      args.count, args.output, args.format, passphrase, args.workers
+    )
+    return
+
+  account: SymbolAccount = facade.create_account(
+    PrivateKey.random()
+  )  # 新規アカウントの生成
+  print_account(account)
+
+
 if __name__ == "__main__":
   main()
@@ -0,0 +1,478 @@
+# 目標のレートでトランザクションをアナウンスし続け、アナウンス・未承認・承認までの時間を計測する負荷ツール
+# 使い方: python src/utils/load_generator.py --rate 50 --duration 60 --accounts 100
+#        --mix transfer=8,aggregate=2 のように種類ごとの割合を指定できる
+# 送信は前の応答を待たない（オープンループ）。時間は予定した送信時刻から計測するため、
+# ノードや送信側が詰まって送信が遅れた分もレイテンシに含まれる
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+import requests
+from dotenv import load_dotenv
+from websockets.legacy.client import connect
+from symbolchain.CryptoTypes import PrivateKey
+from symbolchain.facade.SymbolFacade import (
+  SymbolFacade,
+  SymbolAccount,
+)
+
+sys.path.append(
+  os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from histogram import Histogram
+import http_cache
+from send_tx import prepare_tx, announce_tx
+from send_transfer_fees import MAX_RECIPIENTS, send_transfer_fees
+from wait_tx_status import wait_tx_status
+import crypto_backend
+
+# 計測するトランザクションの種類
+TRANSACTION_TYPES = ("transfer", "aggregate")
+# 計測する区間
+STAGES = ("announce", "unconfirmed", "confirmed")
+# 表示するパーセンタイル
+PERCENTILES = (50, 99, 99.9)
+
+
+@dataclass
+class _Pending:
+  """送信予定のトランザクションと計測結果"""
+
+  type: str
+  payload: str
+  hash: str
+  scheduled_at: float = 0
+  announced_at: Optional[float] = None
+  unconfirmed_at: Optional[float] = None
+  confirmed_at: Optional[float] = None
+  error: Optional[str] = None
+
+
+# 1つの秘密鍵から、番号ごとに決まった負荷用アカウントを導出する
+def derive_accounts(
+  facade: SymbolFacade, seed_key: PrivateKey, count: int
+) -> list[SymbolAccount]:
+  return [
+    crypto_backend.create_account(
+      facade,
+      PrivateKey(hashlib.sha3_256(
+        seed_key.bytes + index.to_bytes(4, "little")
+      ).digest()),
+    )
+    for index in range(count)
+  ]
+
+
+# "transfer=8,aggregate=2" の形式の割合を解析する
+def parse_mix(mix: str) -> dict[str, int]:
+  weights = {}
+  for item in mix.split(","):
+    name, _, weight = item.partition("=")
+    name = name.strip()
+    if name not in TRANSACTION_TYPES:
+      raise ValueError(f"不明なトランザクションの種類です: {name}")
+    weights[name] = int(weight or 1)
+  if not sum(weights.values()):
+    raise ValueError("割合の合計が0です")
+  return weights
+
+
+# 割合に従って種類を均等に並べた列（1周期分）
+def _type_cycle(weights: dict[str, int]) -> list[str]:
+  total = sum(weights.values())
+  cycle = []
+  credits = dict.fromkeys(weights, 0)
+  for _ in range(total):
+    for name, weight in weights.items():
+      credits[name] += weight
+    name = max(credits, key=lambda key: credits[key])
+    credits[name] -= total
+    cycle.append(name)
+  return cycle
+
+
+class TransactionBuilder:
+  """負荷用アカウントの間で送り合うトランザクションを生成・署名する"""
+
+  def __init__(
+    self,
+    facade: SymbolFacade,
+    accounts: list[SymbolAccount],
+    deadline_timestamp: int,
+    aggregate_size: int,
+  ) -> None:
+    self.facade = facade
+    self.accounts = accounts
+    self.deadline_timestamp = deadline_timestamp
+    self.aggregate_size = aggregate_size
+
+  def _transfer(
+    self, signer: SymbolAccount, index: int, sequence: int
+  ) -> dict:
+    recipient = self.accounts[(index + 1) % len(self.accounts)]
+    return {
+      "type": "transfer_transaction_v1",
+      "signer_public_key": signer.public_key,
+      "recipient_address": recipient.address,
+      "mosaics": [{"mosaic_id": 0x72C0212E67A08BCE, "amount": 1}],
+      # 同じ内容のトランザクションにならないよう連番を入れる
+      "message": b"\0load " + str(sequence).encode(),
+    }
+
+  # sequence番目のトランザクションを生成・署名する
+  def build(self, type: str, sequence: int) -> _Pending:
+    index = sequence % len(self.accounts)
+    signer = self.accounts[index]
+    factory = self.facade.transaction_factory
+    if type == "transfer":
+      tx = factory.create({
+        **self._transfer(signer, index, sequence),
+        "deadline": self.deadline_timestamp,
+      })
+    else:
+      txs = [
+        factory.create_embedded(
+          self._transfer(signer, index + offset, sequence)
+        )
+        for offset in range(self.aggregate_size)
+      ]
+      tx = factory.create({
+        "type": "aggregate_complete_transaction_v2",
+        "signer_public_key": signer.public_key,
+        "deadline": self.deadline_timestamp,
+        "transactions_hash": self.facade.hash_embedded_transactions(txs),
+        "transactions": txs,
+      })
+    payload, hash = prepare_tx(tx, signer, self.facade)
+    return _Pending(type, payload, str(hash))
+
+
+class StatusTracker:
+  """WebSocketで負荷用アカウントを購読し、未承認・承認・失敗を検知した時刻を記録する"""
+
+  def __init__(
+    self, node_url: str, addresses: list[str]
+  ) -> None:
+    self.ws_endpoint = node_url.replace("http", "ws", 1) + "/ws"
+    self.addresses = addresses
+    self.pending: dict[str, _Pending] = {}
+    self._ready = threading.Event()
+    self._loop: Optional[asyncio.AbstractEventLoop] = None
+    self._task: Optional[asyncio.Task] = None
+    self._thread: Optional[threading.Thread] = None
+    self._error: Optional[BaseException] = None
+
+  def start(self, timeout: float = 30) -> None:
+    self._thread = threading.Thread(target=self._run, daemon=True)
+    self._thread.start()
+    if not self._ready.wait(timeout) or self._error is not None:
+      raise Exception(f"WebSocketの購読に失敗しました: {self._error}")
+
+  def stop(self) -> None:
+    if self._loop is not None and self._task is not None:
+      self._loop.call_soon_threadsafe(self._task.cancel)
+    if self._thread is not None:
+      self._thread.join(5)
+
+  def _run(self) -> None:
+    self._loop = asyncio.new_event_loop()
+    self._task = self._loop.create_task(self._listen())
+    try:
+      self._loop.run_until_complete(self._task)
+    except asyncio.CancelledError:
+      pass
+    except Exception as e:
+      self._error = e
+      print("WebSocketエラー:", e, file=sys.stderr)
+    finally:
+      self._ready.set()
+      self._loop.close()
+
+  async def _listen(self) -> None:
+    async with connect(self.ws_endpoint, max_queue=None) as websocket:
+      uid = json.loads(await websocket.recv())["uid"]
+      for address in self.addresses:
+        for channel in ("unconfirmedAdded", "confirmedAdded", "status"):
+          await websocket.send(json.dumps({
+            "uid": uid, "subscribe": f"{channel}/{address}"
+          }))
+      self._ready.set()
+      while True:
+        message = json.loads(await websocket.recv())
+        self._on_message(message["topic"], message["data"])
+
+  def _on_message(self, topic: str, data: dict) -> None:
+    now = time.perf_counter()
+    if topic.startswith("status"):
+      pending = self.pending.get(data["hash"])
+      if pending is not None and pending.error is None:
+        pending.error = data["code"]
+      return
+    pending = self.pending.get(data["meta"]["hash"])
+    if pending is None:
+      return
+    if topic.startswith("unconfirmedAdded"):
+      pending.unconfirmed_at = pending.unconfirmed_at or now
+    elif topic.startswith("confirmedAdded"):
+      pending.confirmed_at = pending.confirmed_at or now
+      # ブロックに先に含まれた場合も未承認を経たものとして扱う
+      pending.unconfirmed_at = pending.unconfirmed_at or now
+
+
+class LoadGenerator:
+  """予定した時刻にトランザクションをアナウンスし、結果を種類ごとのヒストグラムに集計する"""
+
+  def __init__(
+    self, node_url: str, rate: float, concurrency: int
+  ) -> None:
+    self.node_url = node_url
+    self.rate = rate
+    self.concurrency = concurrency
+    self._local = threading.local()
+    # 送信予定時刻に対する実際の送信時刻の遅れの最大値
+    self.max_lag = 0.0
+
+  def _session(self) -> requests.Session:
+    session = getattr(self._local, "session", None)
+    if session is None:
+      session = self._local.session = requests.Session()
+    return session
+
+  def _announce(self, pending: _Pending) -> None:
+    try:
+      response = announce_tx(
+        pending.payload, self.node_url, self._session()
+      )
+      if "code" in response:
+        pending.error = pending.error or response["code"]
+    except Exception as e:
+      pending.error = pending.error or type(e).__name__
+    pending.announced_at = time.perf_counter()
+
+  # 一定間隔で送信する。送信側が遅れても間隔を詰めて予定どおりの件数を送る
+  def run(self, transactions: list[_Pending]) -> float:
+    interval = 1 / self.rate
+    with ThreadPoolExecutor(self.concurrency) as executor:
+      started = time.perf_counter()
+      for sequence, pending in enumerate(transactions):
+        pending.scheduled_at = started + sequence * interval
+        delay = pending.scheduled_at - time.perf_counter()
+        if delay > 0:
+          time.sleep(delay)
+        else:
+          self.max_lag = max(self.max_lag, -delay)
+        executor.submit(self._announce, pending)
+      sent = time.perf_counter() - started
+    return sent
+
+  # アナウンスに成功したトランザクションが承認または失敗するまで待つ
+  @staticmethod
+  def drain(transactions: list[_Pending], timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+      if all(
+        pending.confirmed_at is not None or pending.error is not None
+        for pending in transactions
+      ):
+        return
+      time.sleep(0.2)
+
+
+# 種類ごと（と全体）の件数と区間ごとのヒストグラム
+def summarize(transactions: list[_Pending]) -> dict[str, dict]:
+  results: dict[str, dict] = {}
+  for pending in transactions:
+    for name in (pending.type, "all"):
+      result = results.setdefault(name, {
+        "count": 0,
+        "failed": 0,
+        "errors": {},
+        "histograms": {stage: Histogram() for stage in STAGES},
+      })
+      result["count"] += 1
+      if pending.error is not None:
+        result["failed"] += 1
+        result["errors"][pending.error] = (
+          result["errors"].get(pending.error, 0) + 1
+        )
+        continue
+      times = {
+        "announce": pending.announced_at,
+        "unconfirmed": pending.unconfirmed_at,
+        "confirmed": pending.confirmed_at,
+      }
+      for stage, at in times.items():
+        if at is not None:
+          result["histograms"][stage].record(at - pending.scheduled_at)
+  # 全体の集計は最後に表示する
+  results["all"] = results.pop("all")
+  return results
+
+
+def print_report(
+  results: dict[str, dict], sent: int, elapsed: float, max_lag: float
+) -> None:
+  print(
+    f"送信 {sent}件 {elapsed:.1f}秒 {sent / elapsed:.1f} tx/s "
+    f"（送信の最大遅れ {max_lag * 1000:.1f}ms）"
+  )
+  header = "".join(f"{'p' + format(p, 'g'):>10}" for p in PERCENTILES)
+  print(f"{'種類':12}{'区間':14}{'件数':>8}{header}{'最大':>10}")
+  for name, result in results.items():
+    print(
+      f"{name:12}件数 {result['count']} 失敗 {result['failed']} "
+      + " ".join(f"{code}={n}" for code, n in result["errors"].items())
+    )
+    for stage, histogram in result["histograms"].items():
+      values = "".join(
+        f"{histogram.percentile(p) * 1000:>8.1f}ms" for p in PERCENTILES
+      )
+      print(
+        f"{'':12}{stage:14}{histogram.count:>8}{values}"
+        f"{histogram.max * 1000:>8.1f}ms"
+      )
+
+
+# 負荷用アカウントに手数料を送付し、承認されるまで待つ
+def fund_accounts(
+  node_url: str,
+  funder: SymbolAccount,
+  accounts: list[SymbolAccount],
+  amount: int,
+) -> None:
+  for offset in range(0, len(accounts), MAX_RECIPIENTS):
+    chunk = accounts[offset:offset + MAX_RECIPIENTS]
+    hash = send_transfer_fees(
+      funder, [account.address for account in chunk], amount
+    )
+    asyncio.run(wait_tx_status(str(hash), node_url, "confirmed"))
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="目標のレートでトランザクションをアナウンスし、レイテンシを計測する"
+  )
+  parser.add_argument(
+    "--rate", type=float, default=10, help="1秒あたりのアナウンス数"
+  )
+  parser.add_argument(
+    "--duration", type=float, default=30, help="アナウンスを続ける時間（秒）"
+  )
+  parser.add_argument(
+    "--accounts", type=int, default=100, help="署名に使うアカウント数"
+  )
+  parser.add_argument(
+    "--mix",
+    default="transfer=1",
+    help="種類ごとの割合（例: transfer=8,aggregate=2）",
+  )
+  parser.add_argument(
+    "--aggregate-size",
+    type=int,
+    default=10,
+    help="アグリゲートに含めるインナートランザクション数",
+  )
+  parser.add_argument(
+    "--concurrency", type=int, default=32, help="同時に行うアナウンスの上限"
+  )
+  parser.add_argument(
+    "--drain",
+    type=float,
+    default=60,
+    help="送信後に承認を待つ時間の上限（秒）",
+  )
+  parser.add_argument(
+    "--fund",
+    type=int,
+    help="負荷用アカウントに事前に送付する金額（PRIVATE_KEY_Aのアカウントから）",
+  )
+  parser.add_argument("--output", help="結果を保存するJSONファイル")
+  args = parser.parse_args()
+
+  load_dotenv()
+  NODE_URL: str = os.getenv("NODE_URL") or ""
+  facade = SymbolFacade("testnet")
+  seed_key = PrivateKey(os.getenv("PRIVATE_KEY_A") or "")
+  accounts = derive_accounts(facade, seed_key, args.accounts)
+  cycle = _type_cycle(parse_mix(args.mix))
+
+  if args.fund:
+    fund_accounts(
+      NODE_URL, facade.create_account(seed_key), accounts, args.fund
+    )
+
+  network_time = http_cache.get(f"{NODE_URL}/node/time").json()
+  receive_timestamp = int(
+    network_time["communicationTimestamps"]["receiveTimestamp"]
+  )
+  # 送信に時間がかかっても期限切れにならないよう、送信時間の分だけ期限を延ばす
+  deadline_timestamp = receive_timestamp + int(
+    (2 * 60 * 60 + args.duration) * 1000
+  )
+
+  # 署名の時間が計測に影響しないよう、すべて事前に署名しておく
+  builder = TransactionBuilder(
+    facade, accounts, deadline_timestamp, args.aggregate_size
+  )
+  count = int(args.rate * args.duration)
+  started = time.perf_counter()
+  transactions = [
+    builder.build(cycle[sequence % len(cycle)], sequence)
+    for sequence in range(count)
+  ]
+  print(
+    f"署名 {count}件 {time.perf_counter() - started:.1f}秒",
+    file=sys.stderr,
+  )
+
+  tracker = StatusTracker(
+    NODE_URL, [str(account.address) for account in accounts]
+  )
+  tracker.pending = {pending.hash: pending for pending in transactions}
+  tracker.start()
+  generator = LoadGenerator(NODE_URL, args.rate, args.concurrency)
+  try:
+    elapsed = generator.run(transactions)
+    LoadGenerator.drain(transactions, args.drain)
+  finally:
+    tracker.stop()
+
+  results = summarize(transactions)
+  print_report(results, count, elapsed, generator.max_lag)
+
+  if args.output:
+    with open(args.output, "w") as file:
+      json.dump({
+        "rate": args.rate,
+        "duration": args.duration,
+        "accounts": args.accounts,
+        "mix": args.mix,
+        "sent": count,
+        "elapsed": elapsed,
+        "max_lag": generator.max_lag,
+        "results": {
+          name: {
+            "count": result["count"],
+            "failed": result["failed"],
+            "errors": result["errors"],
+            **{
+              stage: histogram.summary(PERCENTILES)
+              for stage, histogram in result["histograms"].items()
+            },
+          }
+          for name, result in results.items()
+        },
+      }, file, indent=2)
+    print("結果", args.output)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,1783 @@
+# テストネットの代わりにローカルで動作するSymbolノード（REST・WebSocket）
+# 実際のペイロードをデコードし、ブロック生成・承認までの遅延・失敗の注入を再現する
+# 使い方: python utils/mock_node.py --port 3000 を起動し、
+# NODE_URL=http://localhost:3000 を設定してシナリオや負荷テストを実行する
+import os
+import re
+import sys
+import gzip
+import json
+import uuid
+import base64
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+import traceback
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Optional
+from urllib.parse import urlsplit, parse_qs
+from symbolchain.CryptoTypes import PublicKey, Signature
+from symbolchain.facade.SymbolFacade import SymbolFacade
+from symbolchain.symbol.KeyPair import Verifier
+from symbolchain.symbol.Network import Address
+from symbolchain.sc import TransactionFactory
+
+sys.path.append(
+  os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+from metadata_cache import (
+  METADATA_TRANSACTION_TYPES,
+  METADATA_TYPE_MOSAIC,
+  METADATA_TYPE_NAMESPACE,
+  MetadataKey,
+  address_to_hex,
+  apply_metadata_delta,
+)
+from restriction_cache import (
+  RESTRICTION_BLOCK,
+  RESTRICTION_MOSAIC_ID,
+  MOSAIC_RESTRICTION_NONE,
+  MOSAIC_RESTRICTION_UNSET,
+  RestrictionIndex,
+)
+from preflight_validator import (
+  CURRENCY_MOSAIC_ID,
+  MAX_TRANSACTION_LIFETIME,
+  SUCCESS,
+  FAILURE_PAST_DEADLINE,
+  FAILURE_FUTURE_DEADLINE,
+  FAILURE_INSUFFICIENT_BALANCE,
+  PreflightState,
+  PreflightValidator,
+)
+
+# ノードが返すものと同じ失敗コード（preflight_validatorで扱わないもの）
+FAILURE_SIGNATURE_NOT_VERIFIABLE = "Failure_Signature_Not_Verifiable"
+FAILURE_MISSING_COSIGNATURES = "Failure_Aggregate_Missing_Cosignatures"
+FAILURE_LOCK_HASH_UNKNOWN = "Failure_LockHash_Unknown_Hash"
+FAILURE_UNCONFIRMED_CACHE_TOO_FULL = (
+  "Failure_Chain_Unconfirmed_Cache_Too_Full"
+)
+
+# ブロックの手数料乗数（承認されたトランザクションは サイズ × 乗数 の手数料を支払う）
+FEE_MULTIPLIER = 100
+# この大きさ（バイト）以上の応答は、クライアントが対応していればgzipで圧縮する
+GZIP_MIN_SIZE = 1024
+
+# トランザクションのタイプ
+AGGREGATE_COMPLETE = 0x4141
+AGGREGATE_BONDED = 0x4241
+TRANSFER = 0x4154
+MOSAIC_DEFINITION = 0x414D
+MOSAIC_SUPPLY_CHANGE = 0x424D
+MOSAIC_SUPPLY_REVOCATION = 0x434D
+NAMESPACE_REGISTRATION = 0x414E
+ADDRESS_ALIAS = 0x424E
+MOSAIC_ALIAS = 0x434E
+HASH_LOCK = 0x4148
+SECRET_LOCK = 0x4152
+SECRET_PROOF = 0x4252
+MULTISIG_ACCOUNT_MODIFICATION = 0x4155
+ACCOUNT_MOSAIC_RESTRICTION = 0x4250
+
+# ネームスペースのエイリアスの種類（RESTのalias.typeと同じ値）
+ALIAS_NONE = 0
+ALIAS_MOSAIC = 1
+ALIAS_ADDRESS = 2
+
+# 期限のないモザイク・ネームスペースの終了高
+ETERNAL_HEIGHT = 0xFFFFFFFF_FFFFFFFF
+# WebSocketのハンドシェイクで使う固定値（RFC 6455）
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# RESTでは16進数で表される64bitのフィールド（SDKのto_jsonでは10進数）
+_HEX_ID_FIELDS = {
+  "id",
+  "mosaic_id",
+  "parent_id",
+  "namespace_id",
+  "reference_mosaic_id",
+  "restriction_key",
+  "scoped_metadata_key",
+  "target_mosaic_id",
+  "target_namespace_id",
+}
+
+_HTTP_REASONS = {
+  200: "OK",
+  202: "Accepted",
+  400: "Bad Request",
+  404: "Not Found",
+  409: "Conflict",
+  500: "Internal Server Error",
+}
+
+
+def _camel_case(name: str) -> str:
+  head, *rest = name.split("_")
+  return head + "".join(word.capitalize() for word in rest)
+
+
+def _hex_id(value: Any) -> str:
+  return f"{int(value):016X}"
+
+
+# SDKのto_json（snake_case・IDは10進数）をRESTと同じ形式（camelCase・IDは16進数）に変換する
+def to_rest_json(transaction: dict) -> dict:
+  result: dict[str, Any] = {}
+  for key, value in transaction.items():
+    if key in _HEX_ID_FIELDS and isinstance(value, str):
+      value = _hex_id(value)
+    elif key == "mosaic":
+      # ロック系のトランザクションはモザイクがmosaicId・amountに展開される
+      result["mosaicId"] = _hex_id(value["mosaic_id"])
+      result["amount"] = value["amount"]
+      continue
+    elif key == "mosaics":
+      value = [
+        {"id": _hex_id(mosaic["mosaic_id"]), "amount": mosaic["amount"]}
+        for mosaic in value
+      ]
+    elif key in ("transactions", "cosignatures"):
+      value = [to_rest_json(item) for item in value]
+    elif (
+      key in ("restriction_additions", "restriction_deletions")
+      and transaction["type"] == ACCOUNT_MOSAIC_RESTRICTION
+    ):
+      value = [_hex_id(item) for item in value]
+    result[_camel_case(key)] = value
+  return result
+
+
+# 16進数のアドレスを表示用の文字列（Base32）に変換する
+def _address_string(address_hex: str) -> str:
+  return str(Address(bytes.fromhex(address_hex)))
+
+
+@dataclass
+class _Record:
+  """ノードが受け付けたトランザクションと、その状態"""
+
+  hash: str
+  transaction: Any  # デコードしたSDKのトランザクション
+  json: dict  # RESTと同じ形式のトランザクション
+  addresses: set[str]  # 関係するアドレス（16進数）
+  id: str
+  group: Optional[str] = None
+  code: str = SUCCESS
+  height: int = 0
+  index: int = 0
+  timestamp: int = 0
+  # 連署済みの公開鍵（16進数）
+  cosigners: set[str] = field(default_factory=set)
+
+  @property
+  def type(self) -> int:
+    return self.transaction.type_.value
+
+  @property
+  def deadline(self) -> int:
+    return self.transaction.deadline.value
+
+
+class MockNode:
+  """REST・WebSocketのエンドポイントを1つのポートで提供するローカルノード"""
+
+  def __init__(
+    self,
+    host: str = "127.0.0.1",
+    port: int = 3000,
+    block_interval: float = 1,
+    confirmation_latency: float = 0.05,
+    response_delay: float = 0,
+    block_capacity: Optional[int] = None,
+    unconfirmed_capacity: Optional[int] = None,
+    signer_unconfirmed_limit: Optional[int] = None,
+    finalization_lag: int = 2,
+    failure_rate: float = 0,
+    failure_code: str = "Failure_Core_Insufficient_Balance",
+    drop_rate: float = 0,
+    http_error_rate: float = 0,
+    initial_balance: int = 1_000_000_000_000,
+    verify_signatures: bool = True,
+    seed: Optional[int] = None,
+  ) -> None:
+    self.host = host
+    self.port = port
+    # ブロックの生成間隔（秒）
+    self.block_interval = block_interval
+    # アナウンスから未承認状態になるまでの時間（秒）
+    self.confirmation_latency = confirmation_latency
+    # RESTの各リクエストに加える応答の遅延（秒）
+    self.response_delay = response_delay
+    # 1ブロックに含めるトランザクション数の上限（Noneは無制限）
+    self.block_capacity = block_capacity
+    # 未承認のトランザクションを保持できる数の上限（全体と署名者ごと、Noneは無制限）
+    # 超えたものはスパム対策と同じくFailure_Chain_Unconfirmed_Cache_Too_Fullで失敗させる
+    self.unconfirmed_capacity = unconfirmed_capacity
+    self.signer_unconfirmed_limit = signer_unconfirmed_limit
+    # ファイナライズが現在のブロック高から遅れるブロック数
+    self.finalization_lag = finalization_lag
+    # 検証に成功したトランザクションをfailure_codeで失敗させる確率
+    self.failure_rate = failure_rate
+    self.failure_code = failure_code
+    # アナウンスを受け付けたが、どこにも反映されずに消える確率
+    self.drop_rate = drop_rate
+    # RESTのリクエストが500エラーになる確率
+    self.http_error_rate = http_error_rate
+    # 初めて参照されたアカウントが持っている基軸通貨の残高
+    self.initial_balance = initial_balance
+    self.verify_signatures = verify_signatures
+
+    self.facade = SymbolFacade("testnet")
+    self._random = random.Random(seed)
+    self._failures: deque[str] = deque()
+    self._routes: list[tuple[str, re.Pattern, Callable]] = [
+      (method, re.compile(f"^{pattern}$"), handler)
+      for method, pattern, handler in [
+        ("GET", "/node/time", self._get_node_time),
+        ("GET", "/node/health", self._get_node_health),
+        ("GET", "/chain/info", self._get_chain_info),
+        ("GET", r"/blocks/(\d+)", self._get_block),
+        ("PUT", "/transactions", self._put_transactions),
+        ("PUT", "/transactions/partial", self._put_partial),
+        ("PUT", "/transactions/cosignature", self._put_cosignature),
+        (
+          "GET",
+          "/transactions/(confirmed|unconfirmed|partial)",
+          self._search_transactions,
+        ),
+        (
+          "GET",
+          "/transactions/(confirmed|unconfirmed|partial)/(\\w+)",
+          self._get_transaction,
+        ),
+        ("GET", r"/transactionStatus/(\w+)", self._get_status),
+        ("POST", "/transactionStatus", self._post_statuses),
+        ("GET", r"/accounts/(\w+)", self._get_account),
+        ("POST", "/accounts", self._post_accounts),
+        ("GET", r"/account/(\w+)/multisig", self._get_multisig),
+        ("GET", r"/mosaics/(\w+)", self._get_mosaic),
+        ("POST", "/mosaics", self._post_mosaics),
+        ("GET", r"/namespaces/(\w+)", self._get_namespace),
+        ("POST", "/namespaces", self._post_namespaces),
+        ("POST", "/namespaces/names", self._post_namespace_names),
+        ("GET", "/metadata", self._search_metadata),
+        ("GET", r"/lock/hash/(\w+)", self._get_hash_lock),
+        ("GET", "/lock/secret", self._search_secret_locks),
+        (
+          "GET",
+          r"/restrictions/account/(\w+)",
+          self._get_account_restriction,
+        ),
+        (
+          "GET",
+          "/restrictions/account",
+          self._search_account_restrictions,
+        ),
+        (
+          "GET",
+          "/restrictions/mosaic",
+          self._search_mosaic_restrictions,
+        ),
+      ]
+    ]
+
+    # チェーンの状態
+    self.height = 1
+    self.finalized_height = 1
+    self.blocks: dict[int, dict] = {}
+    self._records: dict[str, _Record] = {}
+    self._confirmed: list[_Record] = []
+    self._unconfirmed: dict[str, _Record] = {}
+    self._partial: dict[str, _Record] = {}
+    self._next_id = 1
+    # アドレス => {モザイクID: 残高}
+    self.balances: dict[str, dict[int, int]] = {}
+    self.mosaics: dict[int, dict] = {}
+    self.namespaces: dict[int, dict] = {}
+    self.metadata: dict[MetadataKey, bytes] = {}
+    self.hash_locks: dict[str, dict] = {}
+    # (シークレット, 受取人のアドレス) => ロックの情報
+    self.secret_locks: dict[tuple[str, str], dict] = {}
+    # マルチシグアカウントのアドレス => (最小承認数, 最小削除数, 連署者のアドレス)
+    self.multisig: dict[str, tuple[int, int, set[str]]] = {}
+    self.restrictions = RestrictionIndex("", self.facade)
+    # 制限による検証は事前チェックと同じものを使う（残高は_check_balancesで独自に検証する）
+    state = PreflightState("", self.restrictions)
+    self._validator = PreflightValidator(self.facade, state)
+    self._addresses: dict[bytes, str] = {}
+
+    # 接続中のクライアント（停止時にすべて切断する）
+    self._connections: set[asyncio.StreamWriter] = set()
+    # WebSocketの接続ごとの購読チャンネル（チャンネル名, アドレス）
+    self._subscribers: dict[
+      asyncio.StreamWriter, set[tuple[str, str]]
+    ] = {}
+    self._server: Optional[asyncio.AbstractServer] = None
+    self._block_task: Optional[asyncio.Task] = None
+    self._loop: Optional[asyncio.AbstractEventLoop] = None
+    self._thread: Optional[threading.Thread] = None
+    self._add_block([])
+
+  @property
+  def url(self) -> str:
+    return f"http://{self.host}:{self.port}"
+
+  # 次にアナウンスされたトランザクションを指定したコードで失敗させる
+  def fail_next(self, code: str, count: int = 1) -> None:
+    self._failures.extend([code] * count)
+
+  async def start(self) -> None:
+    self._server = await asyncio.start_server(
+      self._handle_connection, self.host, self.port
+    )
+    # port=0の場合は空いているポートが割り当てられる
+    self.port = self._server.sockets[0].getsockname()[1]
+    self._block_task = asyncio.create_task(self._produce_blocks())
+
+  async def stop(self) -> None:
+    if self._block_task is not None:
+      self._block_task.cancel()
+    if self._server is not None:
+      self._server.close()
+      for writer in list(self._connections):
+        writer.close()
+      await self._server.wait_closed()
+
+  async def __aenter__(self) -> "MockNode":
+    await self.start()
+    return self
+
+  async def __aexit__(self, *_: Any) -> None:
+    await self.stop()
+
+  # 同期的なコード（requestsで通信するシナリオなど）から使うため、別スレッドで起動する
+  def start_in_thread(self) -> None:
+    started = threading.Event()
+
+    def run() -> None:
+      self._loop = asyncio.new_event_loop()
+      self._loop.run_until_complete(self.start())
+      started.set()
+      self._loop.run_forever()
+      self._loop.run_until_complete(self.stop())
+      self._loop.close()
+
+    self._thread = threading.Thread(target=run, daemon=True)
+    self._thread.start()
+    started.wait()
+
+  def stop_thread(self) -> None:
+    if self._loop is not None and self._thread is not None:
+      self._loop.call_soon_threadsafe(self._loop.stop)
+      self._thread.join()
+
+  def __enter__(self) -> "MockNode":
+    self.start_in_thread()
+    return self
+
+  def __exit__(self, *_: Any) -> None:
+    self.stop_thread()
+
+  # ---------- HTTP・WebSocket ----------
+
+  async def _handle_connection(
+    self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+  ) -> None:
+    self._connections.add(writer)
+    try:
+      while request_line := await reader.readline():
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers: dict[str, str] = {}
+        while (line := await reader.readline()).strip():
+          name, _, value = line.decode("latin-1").partition(":")
+          headers[name.strip().lower()] = value.strip()
+        if headers.get("upgrade", "").lower() == "websocket":
+          await self._handle_websocket(reader, writer, headers)
+          return
+        body = await reader.readexactly(
+          int(headers.get("content-length") or 0)
+        )
+        status, response = await self._dispatch(method, target, body)
+        data = json.dumps(response).encode("utf-8")
+        encoding = ""
+        # 実際のノードと同じく、一定以上の大きさの応答はgzipで圧縮する
+        if (
+          len(data) >= GZIP_MIN_SIZE
+          and "gzip" in headers.get("accept-encoding", "")
+        ):
+          data = gzip.compress(data, compresslevel=6)
+          encoding = "Content-Encoding: gzip\r\n"
+        writer.write(
+          f"HTTP/1.1 {status} {_HTTP_REASONS.get(status, '')}\r\n"
+          "Content-Type: application/json; charset=utf-8\r\n"
+          f"{encoding}"
+          f"Content-Length: {len(data)}\r\n\r\n".encode("latin-1")
+          + data
+        )
+        await writer.drain()
+        if headers.get("connection", "").lower() == "close":
+          return
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+      pass
+    finally:
+      self._connections.discard(writer)
+      writer.close()
+
+  async def _dispatch(
+    self, method: str, target: str, body: bytes
+  ) -> tuple[int, Any]:
+    if self.response_delay:
+      await asyncio.sleep(self.response_delay)
+    if self._random.random() < self.http_error_rate:
+      return 500, {"code": "Internal", "message": "injected error"}
+
+    url = urlsplit(target)
+    query = parse_qs(url.query)
+    for route_method, pattern, handler in self._routes:
+      match = pattern.match(url.path)
+      if route_method == method and match:
+        try:
+          request = json.loads(body) if body else {}
+        except ValueError:
+          return 400, {
+            "code": "InvalidContent", "message": "invalid json"
+          }
+        try:
+          return handler(*match.groups(), query=query, body=request)
+        except Exception:
+          traceback.print_exc()
+          return 500, {"code": "Internal", "message": "handler error"}
+    return 404, {
+      "code": "ResourceNotFound",
+      "message": f"{method} {url.path} does not exist",
+    }
+
+  async def _handle_websocket(
+    self,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    headers: dict[str, str],
+  ) -> None:
+    accept = base64.b64encode(hashlib.sha1(
+      (headers["sec-websocket-key"] + WEBSOCKET_GUID).encode("latin-1")
+    ).digest()).decode("latin-1")
+    writer.write(
+      "HTTP/1.1 101 Switching Protocols\r\n"
+      "Upgrade: websocket\r\n"
+      "Connection: Upgrade\r\n"
+      f"Sec-WebSocket-Accept: {accept}\r\n\r\n".encode("latin-1")
+    )
+    uid = uuid.uuid4().hex
+    subscriptions: set[tuple[str, str]] = set()
+    self._subscribers[writer] = subscriptions
+    _send_frame(writer, 0x1, json.dumps({"uid": uid}).encode("utf-8"))
+    try:
+      while True:
+        opcode, payload = await _read_frame(reader)
+        if opcode == 0x8:
+          _send_frame(writer, 0x8, payload[:2])
+          return
+        if opcode == 0x9:
+          _send_frame(writer, 0xA, payload)
+          continue
+        if opcode != 0x1:
+          continue
+        message = json.loads(payload)
+        for action in ("subscribe", "unsubscribe"):
+          if action in message:
+            channel, _, address = message[action].partition("/")
+            subscription = (
+              channel, address_to_hex(address) if address else ""
+            )
+            if action == "subscribe":
+              subscriptions.add(subscription)
+            else:
+              subscriptions.discard(subscription)
+    finally:
+      self._subscribers.pop(writer, None)
+
+  # 購読しているクライアントにメッセージを送る（addressesがNoneの場合はアドレスなしのチャンネル）
+  def _publish(
+    self, channel: str, addresses: Optional[Iterable[str]], data: Any
+  ) -> None:
+    if not self._subscribers:
+      return
+    topics = (
+      [(channel, "")]
+      if addresses is None
+      else [(channel, address) for address in addresses]
+    )
+    for writer, subscriptions in list(self._subscribers.items()):
+      for topic in topics:
+        if topic not in subscriptions:
+          continue
+        name = (
+          f"{channel}/{_address_string(topic[1])}" if topic[1] else channel
+        )
+        _send_frame(writer, 0x1, json.dumps({
+          "topic": name, "data": data
+        }).encode("utf-8"))
+
+  # ---------- トランザクションの受付 ----------
+
+  def _announce(self, body: dict, partial: bool) -> tuple[int, Any]:
+    try:
+      transaction = TransactionFactory.deserialize(
+        bytes.fromhex(body["payload"])
+      )
+    except Exception:
+      return 409, {
+        "code": "InvalidArgument",
+        "message": "payload is not a valid transaction",
+      }
+    if (transaction.type_.value == AGGREGATE_BONDED) != partial:
+      return 409, {
+        "code": "InvalidArgument",
+        "message": (
+          "aggregate bonded must be announced to "
+          "/transactions/partial"
+        ),
+      }
+
+    tx_hash = str(self.facade.hash_transaction(transaction))
+    # 失敗したもの（未承認プールから捨てられたものなど）は、再送されれば検証し直す
+    known = self._records.get(tx_hash)
+    if known is None or known.group == "failed":
+      record = _Record(
+        tx_hash,
+        transaction,
+        {
+          "size": transaction.size,
+          **to_rest_json(transaction.to_json()),
+        },
+        self._transaction_addresses(transaction),
+        self._new_id(),
+      )
+      record.cosigners = {
+        str(cosignature.signer_public_key)
+        for cosignature in getattr(transaction, "cosignatures", [])
+      }
+      self._records[tx_hash] = record
+      asyncio.get_running_loop().call_later(
+        self.confirmation_latency, self._admit, record
+      )
+    endpoint = "/transactions/partial" if partial else "/transactions"
+    return 202, {
+      "message": f"packet 9 was pushed to the network via {endpoint}"
+    }
+
+  def _put_transactions(self, query: dict, body: dict) -> tuple[int, Any]:
+    return self._announce(body, False)
+
+  def _put_partial(self, query: dict, body: dict) -> tuple[int, Any]:
+    return self._announce(body, True)
+
+  def _put_cosignature(self, query: dict, body: dict) -> tuple[int, Any]:
+    record = self._partial.get(body.get("parentHash", "").upper())
+    if record is not None:
+      public_key = body["signerPublicKey"].upper()
+      signature = Signature(body["signature"])
+      if public_key not in record.cosigners and (
+        not self.verify_signatures
+        or Verifier(PublicKey(public_key)).verify(
+          bytes.fromhex(record.hash), signature
+        )
+      ):
+        record.cosigners.add(public_key)
+        cosignature = {
+          "version": str(body.get("version", "0")),
+          "signerPublicKey": public_key,
+          "signature": body["signature"].upper(),
+        }
+        record.json["cosignatures"].append(cosignature)
+        self._publish(
+          "cosignature",
+          record.addresses,
+          {**cosignature, "parentHash": record.hash},
+        )
+        if self._is_complete(record):
+          del self._partial[record.hash]
+          self._publish(
+            "partialRemoved", record.addresses, _removed(record)
+          )
+          self._add_unconfirmed(record)
+    return 202, {
+      "message": (
+        "packet 501 was pushed to the network via "
+        "/transactions/cosignature"
+      )
+    }
+
+  # 遅延の後にトランザクションを検証し、未承認（または連署待ち）状態にする
+  def _admit(self, record: _Record) -> None:
+    if self._random.random() < self.drop_rate:
+      del self._records[record.hash]
+      return
+    code = self._validate(record)
+    if code == SUCCESS and self._is_pool_full(record):
+      code = FAILURE_UNCONFIRMED_CACHE_TOO_FULL
+    if code == SUCCESS and self._failures:
+      code = self._failures.popleft()
+    elif code == SUCCESS and self._random.random() < self.failure_rate:
+      code = self.failure_code
+    if code != SUCCESS:
+      self._fail(record, code)
+    elif record.type == AGGREGATE_BONDED and not self._is_complete(record):
+      record.group = "partial"
+      self._partial[record.hash] = record
+      self._publish("partialAdded", record.addresses, self._info(record))
+    else:
+      self._add_unconfirmed(record)
+
+  def _is_pool_full(self, record: _Record) -> bool:
+    if (
+      self.unconfirmed_capacity is not None
+      and len(self._unconfirmed) >= self.unconfirmed_capacity
+    ):
+      return True
+    if self.signer_unconfirmed_limit is None:
+      return False
+    signer = self._signer_address(record.transaction)
+    count = sum(
+      self._signer_address(pending.transaction) == signer
+      for pending in self._unconfirmed.values()
+    )
+    return count >= self.signer_unconfirmed_limit
+
+  def _add_unconfirmed(self, record: _Record) -> None:
+    record.group = "unconfirmed"
+    self._unconfirmed[record.hash] = record
+    self._publish("unconfirmedAdded", record.addresses, self._info(record))
+
+  def _fail(self, record: _Record, code: str) -> None:
+    record.group = "failed"
+    record.code = code
+    self._publish(
+      "status",
+      [self._signer_address(record.transaction)],
+      {
+        "hash": record.hash,
+        "code": code,
+        "deadline": str(record.deadline),
+      },
+    )
+
+  def _validate(self, record: _Record) -> str:
+    transaction = record.transaction
+    now = self.facade.now().timestamp
+    if record.deadline <= now:
+      return FAILURE_PAST_DEADLINE
+    if record.deadline > now + MAX_TRANSACTION_LIFETIME:
+      return FAILURE_FUTURE_DEADLINE
+
+    if self.verify_signatures:
+      if not self.facade.verify_transaction(
+        transaction, transaction.signature
+      ):
+        return FAILURE_SIGNATURE_NOT_VERIFIABLE
+      hash_bytes = bytes.fromhex(record.hash)
+      for cosignature in getattr(transaction, "cosignatures", []):
+        if not Verifier(cosignature.signer_public_key).verify(
+          hash_bytes, cosignature.signature
+        ):
+          return FAILURE_SIGNATURE_NOT_VERIFIABLE
+
+    if record.type == AGGREGATE_COMPLETE and not self._is_complete(record):
+      return FAILURE_MISSING_COSIGNATURES
+    if (
+      record.type == AGGREGATE_BONDED
+      and record.hash not in self.hash_locks
+    ):
+      return FAILURE_LOCK_HASH_UNKNOWN
+
+    # 初めて使われるアカウントに初期残高を持たせてから検証する
+    embedded_transactions = getattr(transaction, "transactions", [])
+    for embedded in [transaction, *embedded_transactions]:
+      self._balance(self._signer_address(embedded))
+    code = self._validator.validate(transaction)
+    if code != SUCCESS:
+      return code
+    return self._check_balances(transaction)
+
+  # 手数料とインナートランザクションによるモザイクの移動を順に試し、途中で残高が負になれば失敗にする
+  # （事前チェックとは独立に、承認時の_apply_embeddedと同じ解決・移動の規則を使う）
+  def _check_balances(self, transaction: Any) -> str:
+    changes: dict[tuple[str, int], int] = {}
+
+    def move(
+      source: Optional[str],
+      target: Optional[str],
+      mosaic_id: int,
+      amount: int,
+    ) -> bool:
+      if target is not None:
+        changes[(target, mosaic_id)] = (
+          changes.get((target, mosaic_id), 0) + amount
+        )
+      if source is None:
+        return True
+      change = changes.get((source, mosaic_id), 0) - amount
+      changes[(source, mosaic_id)] = change
+      return self._balance(source).get(mosaic_id, 0) + change >= 0
+
+    if not move(
+      self._signer_address(transaction),
+      None,
+      CURRENCY_MOSAIC_ID,
+      transaction.fee.value,
+    ):
+      return FAILURE_INSUFFICIENT_BALANCE
+    for embedded in getattr(transaction, "transactions", None) or [
+      transaction
+    ]:
+      transaction_type = embedded.type_.value
+      signer = self._signer_address(embedded)
+      moves: list[tuple[Optional[str], Optional[str], int, int]] = []
+      if transaction_type == TRANSFER:
+        recipient = self._resolve_address(embedded.recipient_address)
+        moves = [
+          (
+            signer,
+            recipient,
+            self._resolve_mosaic_id(mosaic.mosaic_id.value),
+            mosaic.amount.value,
+          )
+          for mosaic in embedded.mosaics
+        ]
+      elif transaction_type == MOSAIC_SUPPLY_CHANGE:
+        mosaic_id = self._resolve_mosaic_id(embedded.mosaic_id.value)
+        mosaic = self.mosaics.get(mosaic_id)
+        # 同じアグリゲートで定義したモザイクは署名者が所有者になる
+        owner = mosaic["ownerAddress"] if mosaic else signer
+        delta = embedded.delta.value
+        moves = [
+          (None, owner, mosaic_id, delta)
+          if embedded.action.value
+          else (owner, None, mosaic_id, delta)
+        ]
+      elif transaction_type == MOSAIC_SUPPLY_REVOCATION:
+        moves = [(
+          address_to_hex(embedded.source_address),
+          signer,
+          self._resolve_mosaic_id(embedded.mosaic.mosaic_id.value),
+          embedded.mosaic.amount.value,
+        )]
+      elif transaction_type in (HASH_LOCK, SECRET_LOCK):
+        moves = [(
+          signer,
+          None,
+          self._resolve_mosaic_id(embedded.mosaic.mosaic_id.value),
+          embedded.mosaic.amount.value,
+        )]
+      for source, target, mosaic_id, amount in moves:
+        if not move(source, target, mosaic_id, amount):
+          return FAILURE_INSUFFICIENT_BALANCE
+    return SUCCESS
+
+  # アグリゲートのインナートランザクションの署名者がすべて連署しているかどうか
+  def _is_complete(self, record: _Record) -> bool:
+    signers = {self._signer_address(record.transaction)} | {
+      self._public_key_address(public_key)
+      for public_key in record.cosigners
+    }
+    for embedded in record.transaction.transactions:
+      if not self._is_approved(self._signer_address(embedded), signers):
+        return False
+      # マルチシグに追加される連署者の同意も必要
+      if embedded.type_.value == MULTISIG_ACCOUNT_MODIFICATION:
+        if not {
+          address_to_hex(address) for address in embedded.address_additions
+        } <= signers:
+          return False
+    return True
+
+  def _is_approved(self, address: str, signers: set[str]) -> bool:
+    multisig = self.multisig.get(address)
+    if multisig is None:
+      return address in signers
+    min_approval, _, cosignatories = multisig
+    approvals = sum(
+      self._is_approved(cosignatory, signers)
+      for cosignatory in cosignatories
+    )
+    return approvals >= max(min_approval, 1)
+
+  # ---------- ブロックの生成 ----------
+
+  async def _produce_blocks(self) -> None:
+    while True:
+      await asyncio.sleep(self.block_interval)
+      try:
+        self.produce_block()
+      except Exception:
+        # 反映処理の不具合でブロック生成が止まらないよう、表示して続ける
+        traceback.print_exc()
+
+  # 未承認のトランザクションをブロックに含めて承認する（テストから直接呼ぶこともできる）
+  def produce_block(self) -> None:
+    now = self.facade.now().timestamp
+    confirmed: list[_Record] = []
+    for record in list(self._unconfirmed.values()):
+      if (
+        self.block_capacity is not None
+        and len(confirmed) >= self.block_capacity
+      ):
+        break
+      del self._unconfirmed[record.hash]
+      self._publish(
+        "unconfirmedRemoved", record.addresses, _removed(record)
+      )
+      if record.deadline <= now:
+        self._fail(record, FAILURE_PAST_DEADLINE)
+        continue
+      confirmed.append(record)
+
+    for record in list(self._partial.values()):
+      if record.deadline <= now:
+        del self._partial[record.hash]
+        self._publish(
+          "partialRemoved", record.addresses, _removed(record)
+        )
+        self._fail(record, FAILURE_PAST_DEADLINE)
+
+    self.height += 1
+    for index, record in enumerate(confirmed):
+      record.group = "confirmed"
+      record.height = self.height
+      record.index = index
+      record.timestamp = now
+      self._confirmed.append(record)
+      self._apply(record)
+    block = self._add_block(confirmed)
+    for record in confirmed:
+      self._publish("confirmedAdded", record.addresses, self._info(record))
+    self._publish("block", None, block)
+
+    finalized_height = max(self.height - self.finalization_lag, 1)
+    if finalized_height > self.finalized_height:
+      self.finalized_height = finalized_height
+      self._publish("finalizedBlock", None, self._finalized_block())
+
+  def _add_block(self, records: list[_Record]) -> dict:
+    previous = self.blocks.get(self.height - 1)
+    previous_hash = previous["meta"]["hash"] if previous else "0" * 64
+    block_hash = hashlib.sha3_256(
+      bytes.fromhex(previous_hash) + self.height.to_bytes(8, "little")
+    ).hexdigest().upper()
+    block = {
+      "meta": {
+        "hash": block_hash,
+        "generationHash": hashlib.sha3_256(
+          bytes.fromhex(block_hash)
+        ).hexdigest().upper(),
+        "totalFee": str(sum(
+          record.transaction.fee.value for record in records
+        )),
+        "totalTransactionsCount": len(records),
+        "transactionsCount": len(records),
+        "statementsCount": 0,
+      },
+      "block": {
+        "version": 1,
+        "network": 152,
+        "type": 0x8143,
+        "height": str(self.height),
+        "timestamp": str(self.facade.now().timestamp),
+        "difficulty": "100000000000000",
+        "feeMultiplier": FEE_MULTIPLIER,
+        "previousBlockHash": previous_hash,
+      },
+    }
+    self.blocks[self.height] = block
+    return block
+
+  def _finalized_block(self) -> dict:
+    return {
+      "finalizationEpoch": self.finalized_height,
+      "finalizationPoint": 1,
+      "height": str(self.finalized_height),
+      "hash": self.blocks[self.finalized_height]["meta"]["hash"],
+    }
+
+  # ---------- 承認されたトランザクションの反映 ----------
+
+  def _apply(self, record: _Record) -> None:
+    transaction = record.transaction
+    signer = self._signer_address(transaction)
+    balance = self._balance(signer)
+    # 実際のノードと同じく、最大手数料ではなく サイズ × 手数料乗数 を支払う
+    balance[CURRENCY_MOSAIC_ID] -= min(
+      transaction.fee.value, transaction.size * FEE_MULTIPLIER
+    )
+    if record.type in (AGGREGATE_COMPLETE, AGGREGATE_BONDED):
+      for embedded in transaction.transactions:
+        self._apply_embedded(embedded, record)
+      lock = self.hash_locks.get(record.hash)
+      if lock is not None and lock["status"] == 0:
+        # ロックしていたモザイクを返却する
+        lock["status"] = 1
+        self._move(
+          None, lock["ownerAddress"],
+          int(lock["mosaicId"], 16), int(lock["amount"]),
+        )
+    else:
+      self._apply_embedded(transaction, record)
+    self.restrictions.apply_transaction(self._info(record))
+
+  def _apply_embedded(self, transaction: Any, record: _Record) -> None:
+    transaction_type = transaction.type_.value
+    signer = self._signer_address(transaction)
+    height = record.height
+
+    if transaction_type == TRANSFER:
+      recipient = self._resolve_address(transaction.recipient_address)
+      for mosaic in transaction.mosaics:
+        self._move(
+          signer, recipient,
+          self._resolve_mosaic_id(mosaic.mosaic_id.value),
+          mosaic.amount.value,
+        )
+    elif transaction_type == MOSAIC_DEFINITION:
+      mosaic_id = transaction.id.value
+      previous = self.mosaics.get(mosaic_id)
+      self.mosaics[mosaic_id] = {
+        "version": 1,
+        "id": f"{mosaic_id:016X}",
+        "supply": previous["supply"] if previous else "0",
+        "startHeight": str(height),
+        "ownerAddress": signer,
+        "revision": previous["revision"] + 1 if previous else 1,
+        "flags": transaction.flags.value,
+        "divisibility": transaction.divisibility,
+        "duration": str(transaction.duration.value),
+      }
+    elif transaction_type == MOSAIC_SUPPLY_CHANGE:
+      mosaic_id = self._resolve_mosaic_id(transaction.mosaic_id.value)
+      mosaic = self.mosaics.get(mosaic_id)
+      if mosaic is not None:
+        delta = transaction.delta.value
+        if transaction.action.value == 0:
+          delta = -delta
+        mosaic["supply"] = str(int(mosaic["supply"]) + delta)
+        self._move(None, mosaic["ownerAddress"], mosaic_id, delta)
+    elif transaction_type == MOSAIC_SUPPLY_REVOCATION:
+      self._move(
+        address_to_hex(transaction.source_address), signer,
+        self._resolve_mosaic_id(transaction.mosaic.mosaic_id.value),
+        transaction.mosaic.amount.value,
+      )
+    elif transaction_type == NAMESPACE_REGISTRATION:
+      self._register_namespace(transaction, signer, height)
+    elif transaction_type in (ADDRESS_ALIAS, MOSAIC_ALIAS):
+      namespace = self.namespaces.get(transaction.namespace_id.value)
+      if namespace is not None:
+        if transaction.alias_action.value == 0:
+          namespace["alias"] = {"type": ALIAS_NONE}
+        elif transaction_type == ADDRESS_ALIAS:
+          namespace["alias"] = {
+            "type": ALIAS_ADDRESS,
+            "address": address_to_hex(transaction.address),
+          }
+        else:
+          namespace["alias"] = {
+            "type": ALIAS_MOSAIC,
+            "mosaicId": f"{transaction.mosaic_id.value:016X}",
+          }
+    elif transaction_type in METADATA_TRANSACTION_TYPES:
+      metadata_type = METADATA_TRANSACTION_TYPES[transaction_type]
+      target_id = 0
+      if metadata_type == METADATA_TYPE_MOSAIC:
+        target_id = self._resolve_mosaic_id(
+          transaction.target_mosaic_id.value
+        )
+      elif metadata_type == METADATA_TYPE_NAMESPACE:
+        target_id = transaction.target_namespace_id.value
+      key = MetadataKey(
+        signer,
+        address_to_hex(transaction.target_address),
+        transaction.scoped_metadata_key,
+        target_id,
+        metadata_type,
+      )
+      value = apply_metadata_delta(
+        self.metadata.get(key, b""),
+        bytes(transaction.value),
+        transaction.value_size_delta,
+      )
+      if value:
+        self.metadata[key] = value
+      else:
+        self.metadata.pop(key, None)
+    elif transaction_type == HASH_LOCK:
+      mosaic_id = self._resolve_mosaic_id(
+        transaction.mosaic.mosaic_id.value
+      )
+      amount = transaction.mosaic.amount.value
+      self._move(signer, None, mosaic_id, amount)
+      self.hash_locks[str(transaction.hash)] = {
+        "version": 1,
+        "ownerAddress": signer,
+        "mosaicId": f"{mosaic_id:016X}",
+        "amount": str(amount),
+        "endHeight": str(height + transaction.duration.value),
+        "status": 0,
+        "hash": str(transaction.hash),
+      }
+    elif transaction_type == SECRET_LOCK:
+      recipient = self._resolve_address(transaction.recipient_address)
+      mosaic_id = self._resolve_mosaic_id(
+        transaction.mosaic.mosaic_id.value
+      )
+      amount = transaction.mosaic.amount.value
+      self._move(signer, None, mosaic_id, amount)
+      secret = str(transaction.secret)
+      self.secret_locks[(secret, recipient or "")] = {
+        "version": 1,
+        "ownerAddress": signer,
+        "recipientAddress": recipient,
+        "mosaicId": f"{mosaic_id:016X}",
+        "amount": str(amount),
+        "endHeight": str(height + transaction.duration.value),
+        "status": 0,
+        "hashAlgorithm": transaction.hash_algorithm.value,
+        "secret": secret,
+        "compositeHash": hashlib.sha3_256(
+          bytes.fromhex(secret) + bytes.fromhex(recipient or "")
+        ).hexdigest().upper(),
+      }
+    elif transaction_type == SECRET_PROOF:
+      recipient = self._resolve_address(transaction.recipient_address)
+      lock = self.secret_locks.get(
+        (str(transaction.secret), recipient or "")
+      )
+      if lock is not None and lock["status"] == 0:
+        lock["status"] = 1
+        self._move(
+          None, recipient, int(lock["mosaicId"], 16), int(lock["amount"])
+        )
+    elif transaction_type == MULTISIG_ACCOUNT_MODIFICATION:
+      min_approval, min_removal, cosignatories = self.multisig.get(
+        signer, (0, 0, set())
+      )
+      cosignatories = (cosignatories | {
+        address_to_hex(address) for address in transaction.address_additions
+      }) - {
+        address_to_hex(address) for address in transaction.address_deletions
+      }
+      if cosignatories:
+        self.multisig[signer] = (
+          min_approval + transaction.min_approval_delta,
+          min_removal + transaction.min_removal_delta,
+          cosignatories,
+        )
+      else:
+        self.multisig.pop(signer, None)
+
+  def _register_namespace(
+    self, transaction: Any, signer: str, height: int
+  ) -> None:
+    namespace_id = transaction.id.value
+    if transaction.registration_type.value == 0:
+      previous = self.namespaces.get(namespace_id)
+      duration = transaction.duration.value
+      start = (
+        max(int(previous["endHeight"]), height) if previous else height
+      )
+      end_height = start + duration if duration else ETERNAL_HEIGHT
+      levels = [namespace_id]
+      parent_id = 0
+    else:
+      parent_id = transaction.parent_id.value
+      parent = self.namespaces.get(parent_id)
+      if parent is None:
+        return
+      end_height = int(parent["endHeight"])
+      levels = [*parent["levels"], namespace_id]
+    self.namespaces[namespace_id] = {
+      "levels": levels,
+      "parentId": parent_id,
+      "name": bytes(transaction.name).decode("utf-8"),
+      "registrationType": transaction.registration_type.value,
+      "ownerAddress": signer,
+      "startHeight": str(height),
+      "endHeight": str(end_height),
+      "alias": self.namespaces.get(namespace_id, {}).get(
+        "alias", {"type": ALIAS_NONE}
+      ),
+    }
+    # ルートの期限が延長された場合は子のネームスペースにも反映する
+    for namespace in self.namespaces.values():
+      if namespace["levels"][0] == levels[0]:
+        namespace["endHeight"] = str(end_height)
+
+  # ---------- 状態の参照に使う補助関数 ----------
+
+  def _new_id(self) -> str:
+    self._next_id += 1
+    return f"{self._next_id:024X}"
+
+  def _public_key_address(self, public_key: str) -> str:
+    key = bytes.fromhex(public_key)
+    address = self._addresses.get(key)
+    if address is None:
+      address = address_to_hex(
+        self.facade.network.public_key_to_address(PublicKey(key))
+      )
+      self._addresses[key] = address
+    return address
+
+  def _signer_address(self, transaction: Any) -> str:
+    return self._public_key_address(str(transaction.signer_public_key))
+
+  def _transaction_addresses(self, transaction: Any) -> set[str]:
+    addresses = {self._signer_address(transaction)}
+    for name in (
+      "recipient_address", "target_address", "source_address", "address"
+    ):
+      address = getattr(transaction, name, None)
+      if address is not None:
+        addresses.add(address_to_hex(address))
+    for name in ("address_additions", "address_deletions"):
+      addresses.update(
+        address_to_hex(address)
+        for address in getattr(transaction, name, None) or []
+      )
+    for embedded in getattr(transaction, "transactions", None) or []:
+      addresses |= self._transaction_addresses(embedded)
+    for cosignature in getattr(transaction, "cosignatures", None) or []:
+      addresses.add(
+        self._public_key_address(str(cosignature.signer_public_key))
+      )
+    return addresses
+
+  def _balance(self, address: str) -> dict[int, int]:
+    balance = self.balances.get(address)
+    if balance is None:
+      balance = self.balances[address] = {
+        CURRENCY_MOSAIC_ID: self.initial_balance
+      }
+    return balance
+
+  # モザイクを移動する（sourceまたはtargetがNoneの場合は発行・ロックなど）
+  def _move(
+    self,
+    source: Optional[str],
+    target: Optional[str],
+    mosaic_id: int,
+    amount: int,
+  ) -> None:
+    if source is not None:
+      balance = self._balance(source)
+      balance[mosaic_id] = balance.get(mosaic_id, 0) - amount
+    if target is not None:
+      balance = self._balance(target)
+      balance[mosaic_id] = balance.get(mosaic_id, 0) + amount
+
+  def _resolve_alias(self, namespace_id: int, alias_type: int) -> Any:
+    namespace = self.namespaces.get(namespace_id)
+    if namespace is None or namespace["alias"]["type"] != alias_type:
+      return None
+    alias = namespace["alias"]
+    return alias.get("address") or int(alias["mosaicId"], 16)
+
+  # ネームスペースで指定されたモザイクIDを解決する（解決できない場合はそのまま）
+  def _resolve_mosaic_id(self, mosaic_id: int) -> int:
+    if mosaic_id >> 63:
+      return self._resolve_alias(mosaic_id, ALIAS_MOSAIC) or mosaic_id
+    return mosaic_id
+
+  # ネームスペースで指定されたアドレスを解決する（解決できない場合はNone）
+  def _resolve_address(self, address: Any) -> Optional[str]:
+    address_hex = address_to_hex(address)
+    if not int(address_hex[:2], 16) & 0x01:
+      return address_hex
+    namespace_id = int.from_bytes(
+      bytes.fromhex(address_hex)[1:9], "little"
+    )
+    return self._resolve_alias(namespace_id, ALIAS_ADDRESS)
+
+  def _meta(self, record: _Record) -> dict:
+    meta = {
+      "height": str(record.height),
+      "hash": record.hash,
+      "merkleComponentHash": record.hash,
+      "index": record.index,
+    }
+    if record.group == "confirmed":
+      meta["timestamp"] = str(record.timestamp)
+      meta["feeMultiplier"] = FEE_MULTIPLIER
+    return meta
+
+  def _embedded_meta(self, record: _Record, index: int) -> dict:
+    meta = {
+      "height": str(record.height),
+      "aggregateHash": record.hash,
+      "aggregateId": record.id,
+      "index": index,
+    }
+    if record.group == "confirmed":
+      meta["timestamp"] = str(record.timestamp)
+      meta["feeMultiplier"] = FEE_MULTIPLIER
+    return meta
+
+  # RESTやWebSocketで返すトランザクション情報
+  def _info(self, record: _Record) -> dict:
+    transaction = record.json
+    if "transactions" in transaction:
+      transaction = {**transaction, "transactions": [
+        {
+          "meta": self._embedded_meta(record, index),
+          "id": f"{record.id}{index:04X}",
+          "transaction": inner,
+        }
+        for index, inner in enumerate(record.json["transactions"])
+      ]}
+    return {
+      "id": record.id,
+      "meta": self._meta(record),
+      "transaction": transaction,
+    }
+
+  def _status(self, record: _Record) -> dict:
+    return {
+      "group": record.group,
+      "code": record.code,
+      "hash": record.hash,
+      "deadline": str(record.deadline),
+      "height": str(record.height),
+    }
+
+  # ---------- REST ----------
+
+  def _get_node_time(self, query: dict, body: dict) -> tuple[int, Any]:
+    now = str(self.facade.now().timestamp)
+    return 200, {"communicationTimestamps": {
+      "sendTimestamp": now, "receiveTimestamp": now
+    }}
+
+  def _get_node_health(self, query: dict, body: dict) -> tuple[int, Any]:
+    return 200, {"status": {"apiNode": "up", "db": "up"}}
+
+  def _get_chain_info(self, query: dict, body: dict) -> tuple[int, Any]:
+    return 200, {
+      "height": str(self.height),
+      "scoreHigh": "0",
+      "scoreLow": str(self.height),
+      "latestFinalizedBlock": self._finalized_block(),
+    }
+
+  def _get_block(
+    self, height: str, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    block = self.blocks.get(int(height))
+    if block is None:
+      return _not_found(height)
+    return 200, block
+
+  def _search_transactions(
+    self, group: str, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    records: Iterable[_Record] = {
+      "confirmed": self._confirmed,
+      "unconfirmed": self._unconfirmed.values(),
+      "partial": self._partial.values(),
+    }[group]
+    embedded = _param(query, "embedded") == "true"
+    types = {int(value) for value in query.get("type", [])}
+    address = _param(query, "address")
+    address = address_to_hex(address) if address else None
+    recipient = _param(query, "recipientAddress")
+    recipient = address_to_hex(recipient) if recipient else None
+    signer = (_param(query, "signerPublicKey") or "").upper()
+    from_height = int(_param(query, "fromHeight") or 0)
+    to_height = int(_param(query, "toHeight") or ETERNAL_HEIGHT)
+
+    def matches(transaction: Any) -> bool:
+      if types and transaction.type_.value not in types:
+        return False
+      if signer and str(transaction.signer_public_key) != signer:
+        return False
+      if recipient and address_to_hex(
+        getattr(transaction, "recipient_address", None) or "0" * 48
+      ) != recipient:
+        return False
+      return not address or address in self._transaction_addresses(
+        transaction
+      )
+
+    entries = []
+    for record in records:
+      if group == "confirmed" and not (
+        from_height <= record.height <= to_height
+      ):
+        continue
+      if matches(record.transaction):
+        entries.append(self._info(record))
+      if embedded and record.type in (AGGREGATE_COMPLETE, AGGREGATE_BONDED):
+        for index, inner in enumerate(record.transaction.transactions):
+          if matches(inner):
+            entries.append({
+              "id": f"{record.id}{index:04X}",
+              "meta": self._embedded_meta(record, index),
+              "transaction": record.json["transactions"][index],
+            })
+    if _param(query, "order") != "asc":
+      entries.reverse()
+    return _page(entries, query)
+
+  def _get_transaction(
+    self, group: str, tx_hash: str, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    record = self._records.get(tx_hash.upper())
+    if record is None or record.group != group:
+      return _not_found(tx_hash)
+    return 200, self._info(record)
+
+  def _get_status(
+    self, tx_hash: str, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    record = self._records.get(tx_hash.upper())
+    if record is None or record.group is None:
+      return _not_found(tx_hash)
+    return 200, self._status(record)
+
+  def _post_statuses(self, query: dict, body: dict) -> tuple[int, Any]:
+    statuses = []
+    for tx_hash in body.get("hashes", []):
+      record = self._records.get(tx_hash.upper())
+      if record is not None and record.group is not None:
+        statuses.append(self._status(record))
+    return 200, statuses
+
+  def _account_info(self, address: str) -> dict:
+    return {
+      "id": address[:24],
+      "account": {
+        "version": 1,
+        "address": address,
+        "addressHeight": "1",
+        "publicKey": "0" * 64,
+        "publicKeyHeight": "0",
+        "accountType": 0,
+        "supplementalPublicKeys": {},
+        "activityBuckets": [],
+        "importance": "0",
+        "importanceHeight": "0",
+        "mosaics": [
+          {"id": f"{mosaic_id:016X}", "amount": str(amount)}
+          for mosaic_id, amount in self._balance(address).items()
+          if amount
+        ],
+      },
+    }
+
+  def _get_account(
+    self, address: str, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    return 200, self._account_info(address_to_hex(address))
+
+  def _post_accounts(self, query: dict, body: dict) -> tuple[int, Any]:
+    return 200, [
+      self._account_info(address_to_hex(address))
+      for address in body.get("addresses", [])
+    ]
+
+  def _get_multisig(
+    self, address: str, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    address = address_to_hex(address)
+    multisig = self.multisig.get(address)
+    multisig_addresses = [
+      multisig_address
+      for multisig_address, (_, _, cosignatories) in self.multisig.items()
+      if address in cosignatories
+    ]
+    if multisig is None and not multisig_addresses:
+      return _not_found(address)
+    min_approval, min_removal, cosignatories = multisig or (0, 0, set())
+    return 200, {
+      "multisig": {
+        "version": 1,
+        "accountAddress": address,
+        "minApproval": min_approval,
+        "minRemoval": min_removal,
+        "cosignatoryAddresses": sorted(cosignatories),
+        "multisigAddresses": multisig_addresses,
+      },
+    }
+
+  def _mosaic_info(self, mosaic_id: int) -> Optional[dict]:
+    mosaic = self.mosaics.get(mosaic_id)
+    return {"id": mosaic["id"], "mosaic": mosaic} if mosaic else None
+
+  def _get_mosaic(
+    self, mosaic_id: str, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    info = self._mosaic_info(int(mosaic_id, 16))
+    return (200, info) if info else _not_found(mosaic_id)
+
+  def _post_mosaics(self, query: dict, body: dict) -> tuple[int, Any]:
+    infos = [
+      self._mosaic_info(int(mosaic_id, 16))
+      for mosaic_id in body.get("mosaicIds", [])
+    ]
+    return 200, [info for info in infos if info]
+
+  def _namespace_info(self, namespace_id: int) -> Optional[dict]:
+    namespace = self.namespaces.get(namespace_id)
+    if namespace is None:
+      return None
+    return {
+      "id": f"{namespace_id:024X}",
+      "meta": {"active": True, "index": 0},
+      "namespace": {
+        "version": 1,
+        "registrationType": namespace["registrationType"],
+        "depth": len(namespace["levels"]),
+        **{
+          f"level{index}": f"{level:016X}"
+          for index, level in enumerate(namespace["levels"])
+        },
+        "alias": namespace["alias"],
+        "parentId": f"{namespace['parentId']:016X}",
+        "ownerAddress": namespace["ownerAddress"],
+        "startHeight": namespace["startHeight"],
+        "endHeight": namespace["endHeight"],
+      },
+    }
+
+  def _get_namespace(
+    self, namespace_id: str, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    info = self._namespace_info(int(namespace_id, 16))
+    return (200, info) if info else _not_found(namespace_id)
+
+  def _post_namespaces(self, query: dict, body: dict) -> tuple[int, Any]:
+    infos = [
+      self._namespace_info(int(namespace_id, 16))
+      for namespace_id in body.get("namespaceIds", [])
+    ]
+    return 200, [info for info in infos if info]
+
+  def _post_namespace_names(
+    self, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    names = []
+    for namespace_id in body.get("namespaceIds", []):
+      namespace = self.namespaces.get(int(namespace_id, 16))
+      if namespace is None:
+        continue
+      name = {"id": namespace_id.upper(), "name": namespace["name"]}
+      if namespace["parentId"]:
+        name["parentId"] = f"{namespace['parentId']:016X}"
+      names.append(name)
+    return 200, names
+
+  def _search_metadata(self, query: dict, body: dict) -> tuple[int, Any]:
+    source = _param(query, "sourceAddress")
+    target = _param(query, "targetAddress")
+    scoped_key = _param(query, "scopedMetadataKey")
+    target_id = _param(query, "targetId")
+    metadata_type = _param(query, "metadataType")
+    entries = []
+    for key, value in self.metadata.items():
+      if (
+        (source and key.source_address != address_to_hex(source))
+        or (target and key.target_address != address_to_hex(target))
+        or (scoped_key and key.scoped_metadata_key != int(scoped_key, 16))
+        or (target_id and key.target_id != int(target_id, 16))
+        or (metadata_type and key.metadata_type != int(metadata_type))
+      ):
+        continue
+      composite_hash = hashlib.sha3_256(repr(key).encode()).hexdigest()
+      entries.append({
+        "id": composite_hash[:24].upper(),
+        "metadataEntry": {
+          "version": 1,
+          "compositeHash": composite_hash.upper(),
+          "sourceAddress": key.source_address,
+          "targetAddress": key.target_address,
+          "scopedMetadataKey": f"{key.scoped_metadata_key:016X}",
+          "targetId": f"{key.target_id:016X}",
+          "metadataType": key.metadata_type,
+          "valueSize": len(value),
+          "value": value.hex().upper(),
+        },
+      })
+    return _page(entries, query)
+
+  def _get_hash_lock(
+    self, tx_hash: str, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    lock = self.hash_locks.get(tx_hash.upper())
+    if lock is None:
+      return _not_found(tx_hash)
+    return 200, {"id": lock["hash"][:24], "lock": lock}
+
+  def _search_secret_locks(
+    self, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    secret = (_param(query, "secret") or "").upper()
+    address = _param(query, "address")
+    address = address_to_hex(address) if address else None
+    entries = [
+      {"id": lock["compositeHash"][:24], "lock": lock}
+      for lock in self.secret_locks.values()
+      if (not secret or lock["secret"] == secret)
+      and (
+        not address
+        or address in (lock["ownerAddress"], lock["recipientAddress"])
+      )
+    ]
+    return _page(entries, query)
+
+  def _account_restriction_info(self, address: str) -> Optional[dict]:
+    restrictions = self.restrictions.account_restrictions.get(address)
+    if not restrictions:
+      return None
+    return {"restrictions": {
+      "version": 1,
+      "address": address,
+      "restrictions": [
+        {
+          "restrictionFlags": (
+            flags | RESTRICTION_BLOCK if is_block else flags
+          ),
+          "values": [
+            f"{value:016X}" if flags & RESTRICTION_MOSAIC_ID else value
+            for value in values
+          ],
+        }
+        for flags, (is_block, values) in restrictions.items()
+      ],
+    }}
+
+  def _get_account_restriction(
+    self, address: str, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    info = self._account_restriction_info(address_to_hex(address))
+    return (200, info) if info else _not_found(address)
+
+  def _search_account_restrictions(
+    self, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    address = _param(query, "address")
+    addresses = (
+      [address_to_hex(address)] if address
+      else list(self.restrictions.account_restrictions)
+    )
+    infos = [self._account_restriction_info(item) for item in addresses]
+    return _page([info for info in infos if info], query)
+
+  def _search_mosaic_restrictions(
+    self, query: dict, body: dict
+  ) -> tuple[int, Any]:
+    mosaic_id = _param(query, "mosaicId")
+    mosaic_id = int(mosaic_id, 16) if mosaic_id else None
+    entry_type = _param(query, "entryType")
+    target = _param(query, "targetAddress")
+    target = address_to_hex(target) if target else None
+    entries = []
+    if entry_type in (None, "1") and not target:
+      for restricted_id, rules in (
+        self.restrictions.mosaic_global_restrictions.items()
+      ):
+        if mosaic_id is not None and restricted_id != mosaic_id:
+          continue
+        restrictions = [
+          {
+            "key": str(key),
+            "restriction": {
+              "referenceMosaicId": f"{reference_id:016X}",
+              "restrictionValue": str(value),
+              "restrictionType": restriction_type,
+            },
+          }
+          for key, (reference_id, value, restriction_type) in (
+            rules.items()
+          )
+          if restriction_type != MOSAIC_RESTRICTION_NONE
+        ]
+        entries.append(_mosaic_restriction_entry(
+          1, restricted_id, None, restrictions
+        ))
+    if entry_type in (None, "0"):
+      for (restricted_id, address), values in (
+        self.restrictions.mosaic_address_restrictions.items()
+      ):
+        if (mosaic_id is not None and restricted_id != mosaic_id) or (
+          target is not None and address != target
+        ):
+          continue
+        restrictions = [
+          {"key": str(key), "value": str(value)}
+          for key, value in values.items()
+          if value != MOSAIC_RESTRICTION_UNSET
+        ]
+        entries.append(_mosaic_restriction_entry(
+          0, restricted_id, address, restrictions
+        ))
+    return _page(entries, query)
+
+
+def _mosaic_restriction_entry(
+  entry_type: int,
+  mosaic_id: int,
+  address: Optional[str],
+  restrictions: list[dict],
+) -> dict:
+  composite_hash = hashlib.sha3_256(
+    f"{entry_type}:{mosaic_id}:{address}".encode()
+  ).hexdigest().upper()
+  return {
+    "id": composite_hash[:24],
+    "mosaicRestrictionEntry": {
+      "version": 1,
+      "compositeHash": composite_hash,
+      "entryType": entry_type,
+      "mosaicId": f"{mosaic_id:016X}",
+      "targetAddress": address or "0" * 48,
+      "restrictions": restrictions,
+    },
+  }
+
+
+def _removed(record: _Record) -> dict:
+  return {"meta": {"hash": record.hash}}
+
+
+def _param(query: dict, name: str) -> Optional[str]:
+  values = query.get(name)
+  return values[0] if values else None
+
+
+def _not_found(id: str) -> tuple[int, Any]:
+  return 404, {
+    "code": "ResourceNotFound",
+    "message": f"no resource exists with id '{id}'",
+  }
+
+
+# 検索結果をpageSize・pageNumberで区切って返す
+def _page(entries: list, query: dict) -> tuple[int, Any]:
+  page_size = min(max(int(_param(query, "pageSize") or 10), 10), 100)
+  page_number = max(int(_param(query, "pageNumber") or 1), 1)
+  start = (page_number - 1) * page_size
+  return 200, {
+    "data": entries[start:start + page_size],
+    "pagination": {"pageNumber": page_number, "pageSize": page_size},
+  }
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> tuple[int, bytes]:
+  head = await reader.readexactly(2)
+  opcode = head[0] & 0x0F
+  length = head[1] & 0x7F
+  if length == 126:
+    length = int.from_bytes(await reader.readexactly(2), "big")
+  elif length == 127:
+    length = int.from_bytes(await reader.readexactly(8), "big")
+  # クライアントからのフレームは必ずマスクされている
+  mask = await reader.readexactly(4) if head[1] & 0x80 else b"\0" * 4
+  payload = await reader.readexactly(length)
+  return opcode, bytes(
+    byte ^ mask[index % 4] for index, byte in enumerate(payload)
+  )
+
+
+def _send_frame(
+  writer: asyncio.StreamWriter, opcode: int, payload: bytes
+) -> None:
+  if writer.is_closing():
+    return
+  length = len(payload)
+  if length < 126:
+    header = bytes([0x80 | opcode, length])
+  elif length < 0x10000:
+    header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, "big")
+  else:
+    header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, "big")
+  writer.write(header + payload)
+
+
+def main() -> None:
+  parser = argparse.ArgumentParser(
+    description="テスト用のローカルノードを起動する"
+  )
+  parser.add_argument("--host", default="127.0.0.1")
+  parser.add_argument("--port", type=int, default=3000)
+  parser.add_argument(
+    "--block-interval", type=float, default=1, help="ブロック生成間隔（秒）"
+  )
+  parser.add_argument(
+    "--latency",
+    type=float,
+    default=0.05,
+    help="アナウンスから未承認状態になるまでの時間（秒）",
+  )
+  parser.add_argument(
+    "--response-delay", type=float, default=0, help="RESTの応答の遅延（秒）"
+  )
+  parser.add_argument(
+    "--block-capacity", type=int, help="1ブロックに含めるトランザクション数の上限"
+  )
+  parser.add_argument(
+    "--unconfirmed-capacity",
+    type=int,
+    help="未承認のトランザクションを保持できる数の上限",
+  )
+  parser.add_argument(
+    "--signer-unconfirmed-limit",
+    type=int,
+    help="署名者ごとに未承認のトランザクションを保持できる数の上限",
+  )
+  parser.add_argument(
+    "--failure-rate", type=float, default=0, help="トランザクションを失敗させる確率"
+  )
+  parser.add_argument(
+    "--failure-code", default="Failure_Core_Insufficient_Balance"
+  )
+  parser.add_argument(
+    "--drop-rate", type=float, default=0, help="トランザクションが消える確率"
+  )
+  parser.add_argument(
+    "--http-error-rate", type=float, default=0, help="RESTが500を返す確率"
+  )
+  parser.add_argument("--seed", type=int, help="乱数のシード")
+  args = parser.parse_args()
+
+  node = MockNode(
+    host=args.host,
+    port=args.port,
+    block_interval=args.block_interval,
+    confirmation_latency=args.latency,
+    response_delay=args.response_delay,
+    block_capacity=args.block_capacity,
+    unconfirmed_capacity=args.unconfirmed_capacity,
+    signer_unconfirmed_limit=args.signer_unconfirmed_limit,
+    failure_rate=args.failure_rate,
+    failure_code=args.failure_code,
+    drop_rate=args.drop_rate,
+    http_error_rate=args.http_error_rate,
+    seed=args.seed,
+  )
+
+  async def run() -> None:
+    async with node:
+      print(f"ローカルノード起動 NODE_URL={node.url}")
+      await asyncio.Event().wait()
+
+  try:
+    asyncio.run(run())
+  except KeyboardInterrupt:
+    pass
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,146 @@
+# ネームスペース・ロック・モザイク・メタデータなどがノードで参照可能になるまで待機する関数
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+from websockets.legacy.client import connect
+
+import http_cache
+from mosaic_namespace_resolver import MosaicNamespaceResolver
+
+
+# resolveが結果（None以外）を返すまで待機する関数
+# 固定の待ち時間ではなく、短い間隔から徐々に間隔を伸ばして再確認する
+# hintがセットされた場合（新しいブロックの検知など）は待たずにすぐ再確認する
+async def wait_resolved(
+  resolve: Callable[[], Awaitable[Any]],
+  name: str,
+  hint: Optional[asyncio.Event] = None,
+  timeout: float = 60,
+  initial_delay: float = 0.05,
+  max_delay: float = 2,
+) -> Any:
+  deadline = time.monotonic() + timeout
+  delay = initial_delay
+  while True:
+    result = await resolve()
+    if result is not None:
+      return result
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+      raise Exception(f"{name}が参照可能になりませんでした。")
+
+    wait = min(delay, remaining)
+    if hint is None:
+      await asyncio.sleep(wait)
+    else:
+      try:
+        await asyncio.wait_for(hint.wait(), wait)
+        hint.clear()
+        delay = initial_delay
+        continue
+      except asyncio.TimeoutError:
+        pass
+    delay = min(delay * 2, max_delay)
+
+
+# 指定したパスのGETが結果を返すまで待機する関数
+async def wait_entity_ready(
+  node_url: str,
+  path: str,
+  params: Optional[dict] = None,
+  **kwargs: Any,
+) -> Any:
+  async def resolve() -> Any:
+    response = await http_cache.get_async(
+      f"{node_url}{path}",
+      params=params,
+      headers={"Content-Type": "application/json"},
+    )
+    if response.status_code != 200:
+      return None
+    result = response.json()
+    # 検索系のエンドポイントは空のdataが返るため、1件以上あれば参照可能とする
+    if isinstance(result, dict) and not result.get("data", [None]):
+      return None
+    return result
+
+  return await wait_resolved(resolve, path, **kwargs)
+
+
+# 新しいブロックを検知するたびにeventをセットし続ける関数（wait_resolvedのhint用）
+async def watch_new_blocks(node_url: str, event: asyncio.Event) -> None:
+  ws_endpoint = node_url.replace("http", "ws") + "/ws"
+  async with connect(ws_endpoint) as websocket:
+    uid = json.loads(await websocket.recv())["uid"]
+    await websocket.send(json.dumps({"uid": uid, "subscribe": "block"}))
+    async for _ in websocket:
+      event.set()
+
+
+# 新しいブロックを検知するeventを返し、抜けるときに監視を止める（wait_resolvedのhint用）
+# 監視に失敗してもhintがセットされないだけで、待機は間隔を伸ばしながらの再確認で続く
+@asynccontextmanager
+async def new_block_hint(
+  node_url: str,
+) -> AsyncIterator[asyncio.Event]:
+  event = asyncio.Event()
+  task = asyncio.create_task(watch_new_blocks(node_url, event))
+  try:
+    yield event
+  finally:
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+# ネームスペースが参照可能になるまで待機する
+# 同時に待っている他のIDとまとめて、resolverのPOST /namespacesで確認する
+async def wait_namespace_ready(
+  resolver: MosaicNamespaceResolver, namespace_id: int, **kwargs: Any
+) -> Any:
+  return await wait_resolved(
+    lambda: resolver.namespace(namespace_id),
+    f"/namespaces/{namespace_id:016X}",
+    **kwargs,
+  )
+
+
+# モザイクが参照可能になるまで待機する（供給量はresolver.supplyで取得する）
+# 同時に待っている他のIDとまとめて、resolverのPOST /mosaicsで確認する
+async def wait_mosaic_ready(
+  resolver: MosaicNamespaceResolver, mosaic_id: int, **kwargs: Any
+) -> Any:
+  return await wait_resolved(
+    lambda: resolver.mosaic(mosaic_id),
+    f"/mosaics/{mosaic_id:016X}",
+    **kwargs,
+  )
+
+
+# ハッシュロックが参照可能になるまで待機する
+async def wait_hash_lock_ready(
+  node_url: str, hash: str, **kwargs: Any
+) -> Any:
+  return await wait_entity_ready(
+    node_url, f"/lock/hash/{hash}", **kwargs
+  )
+
+
+# シークレットロックが参照可能になるまで待機する
+async def wait_secret_lock_ready(
+  node_url: str, secret: str, **kwargs: Any
+) -> Any:
+  return await wait_entity_ready(
+    node_url, "/lock/secret", params={"secret": secret}, **kwargs
+  )
+
+
+# メタデータが参照可能になるまで待機する（queryは/metadataの検索条件）
+async def wait_metadata_ready(
+  node_url: str, query: dict, **kwargs: Any
+) -> Any:
+  return await wait_entity_ready(
+    node_url, "/metadata", params=query, **kwargs
+  )
@@ -1,37 +1,61 @@
-import time
-import requests
+import asyncio
 from typing import Literal
 
+import metrics
+from dry_run import is_dry_run
+from finalization_tracker import get_tracker, wait_finalized
+
+# 指定した状態になるまで待機する最大時間（秒）
+STATUS_TIMEOUT = 100
+
+
 # トランザクションハッシュを指定してトランザクションの状態を確認する関数
+# finalizedを指定すると、承認されたブロックがファイナライズされるまで待機する
+# ドライラン中はアナウンスしていないため、待機せずに戻る
 async def wait_tx_status(
   hash: str,
   node_url: str,
   transaction_status: Literal[
-    "confirmed", "unconfirmed", "partial"
+    "confirmed", "unconfirmed", "partial", "finalized"
   ],
+  finalization_timeout: float = 600,
 ) -> None:
+  if is_dry_run():
+    print(f"ドライランのため{transaction_status}状態の待機を省略します")
+    return
   print(f"{transaction_status}状態まで待機中..")
-  for _ in range(100):
-    time.sleep(1)
-    # トランザクションハッシュからステータスを確認
-    status = requests.get(
-      f"{node_url}/transactionStatus/{hash}",
-      headers={"Content-Type": "application/json"},
-    ).json()
-    # 指定したトランザクションステータスになっていたら結果を表示させる
-    if status["code"] == "ResourceNotFound":
-      continue
-    elif status["group"] == transaction_status:
-      print(f"{status['group']}完了!")
-      print("承認結果", status["code"])
-      print("承認状態", status["group"])
-      print("トランザクションハッシュ", hash)
-      print("ブロック高", status["height"])
-      print("Symbolエクスプローラー ")
-      print(f"https://testnet.symbol.fyi/transactions/{hash}")
-      return
-    elif status["group"] == "failed":
-      print("承認結果:", status["code"])
-      return
-
-  raise Exception("トランザクションが確認されませんでした。")
+  finalized = transaction_status == "finalized"
+  if finalized:
+    transaction_status = "confirmed"
+  with metrics.span("status_wait", status=transaction_status):
+    # 同時に待っているトランザクションとまとめて POST /transactionStatus で確認する
+    try:
+      status = await get_tracker(node_url).wait_status(
+        hash, transaction_status, STATUS_TIMEOUT
+      )
+    except asyncio.TimeoutError:
+      raise Exception("トランザクションが確認されませんでした。")
+  metrics.increment(
+    "symbol_transaction_status_total",
+    group=status.group,
+    code=status.code,
+  )
+  if status.group == "failed":
+    print("承認結果:", status.code)
+    return
+  print(f"{status.group}完了!")
+  print("承認結果", status.code)
+  print("承認状態", status.group)
+  print("トランザクションハッシュ", hash)
+  print("ブロック高", status.height)
+  if finalized:
+    try:
+      finalized_height = await wait_finalized(
+        node_url, status.height or 0, finalization_timeout
+      )
+    except asyncio.TimeoutError:
+      raise Exception("トランザクションがファイナライズされませんでした。")
+    print("finalized完了!")
+    print("ファイナライズ済みのブロック高", finalized_height)
+  print("Symbolエクスプローラー ")
+  print(f"https://testnet.symbol.fyi/transactions/{hash}")